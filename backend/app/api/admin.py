@@ -2,7 +2,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Dict, Any
-from app.utils.database import get_db
+from app.utils.database import get_db, get_pool_status
+from app.utils import metrics
 from app.dependencies import get_current_user
 from app.models.user import User
 from app.schemas.user import UserResponse
@@ -86,6 +87,28 @@ async def update_system_settings(
     """システム設定更新（管理者のみ）"""
     return update_settings(settings)
 
+@router.get("/tag-categories")
+async def get_tag_categories(
+    admin: User = Depends(get_current_admin)
+):
+    """タグカテゴリ定義（カテゴリ・同義語）取得（管理者のみ）"""
+    from app.utils.tag_normalizer import load_tag_categories
+    return load_tag_categories()
+
+@router.put("/tag-categories")
+async def update_tag_categories(
+    categories_data: Dict[str, Any],
+    admin: User = Depends(get_current_admin)
+):
+    """タグカテゴリ定義更新（管理者のみ。全ワーカーのキャッシュを無効化する）"""
+    from app.utils.tag_normalizer import save_tag_categories
+    if not isinstance(categories_data.get("categories"), dict) or not isinstance(categories_data.get("synonyms"), dict):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="categories と synonyms はオブジェクトで指定してください"
+        )
+    return save_tag_categories(categories_data)
+
 # --- Statistics & Dashboard ---
 
 @router.get("/stats")
@@ -112,3 +135,29 @@ async def get_trending_areas_endpoint(
 ):
     """人気急上昇エリア取得（管理者のみ）"""
     return get_trending_areas(db, limit)
+
+@router.get("/metrics")
+async def get_metrics(
+    admin: User = Depends(get_current_admin)
+):
+    """プロセス内メトリクスと接続プール・写真キャッシュ・外部 API のサーキット・Gemini ガバナー・スポットカタログ・移動行列・無効化バス・APIキー使用量の書き込み遅延・プランキャッシュの状態を取得（管理者のみ）"""
+    from app.services.api_key_usage_buffer import buffer_stats
+    from app.services.photo_cache_service import get_cache_stats
+    from app.services.spot_catalog_service import catalog_stats
+    from app.services.travel_matrix_service import matrix_stats
+    from app.utils.invalidation_bus import bus_stats
+    from app.utils.plan_cache import compaction_stats
+    from app.utils.resilience import breaker_states
+    from app.utils.gemini_governor import governor_stats
+    return {
+        "db_pool": get_pool_status(),
+        "photo_cache": get_cache_stats(),
+        "circuit_breakers": breaker_states(),
+        "gemini_governor": governor_stats(),
+        "spot_catalog": catalog_stats(),
+        "travel_matrices": matrix_stats(),
+        "invalidation_bus": bus_stats(),
+        "api_key_usage_buffer": buffer_stats(),
+        "plan_cache": compaction_stats(),
+        "metrics": metrics.snapshot(),
+    }
@@ -2,9 +2,9 @@
 AIエージェント向けプラン生成APIエンドポイント
 APIキー認証を使用
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Optional, Tuple
 from app.utils.database import get_db
 from app.dependencies import verify_api_key
 from app.models.api_key import ApiKey
@@ -15,10 +15,8 @@ from app.services.places_service import to_public_image_url
 from app.services.spot_service import get_spots_for_plan
 from app.utils.plan_cache import get_cached_plan, save_cached_plan
 from app.utils.rate_limiter import rate_limiter
-from app.services.api_key_service import (
-    check_api_key_plan_limit,
-    record_api_key_request
-)
+from app.services.api_key_service import record_api_key_request
+from app.services.entitlement_service import reserve_api_key_plan_generation
 from app.utils.geocoding import get_coordinates
 from app.utils.spot_matcher import create_spot_index, match_spot
 from app.utils.route_service import get_route_info, get_route_info_batch
@@ -26,8 +24,11 @@ from app.models.spot import Spot
 from app.api.plans import (
     filter_pending_spots_by_database,
     add_hotels_to_plan_spots,
-    convert_generated_spots_to_plan_spots
+    convert_generated_spots_to_plan_spots,
+    find_adapted_cached_plan,
+    plan_cache_headers
 )
+from app.config import settings
 import uuid
 from datetime import datetime
 from collections import defaultdict
@@ -38,6 +39,7 @@ router = APIRouter(prefix="/api/v1/ai", tags=["ai-agent"])
 @router.post("/generate-plan", response_model=PlanResponse, status_code=status.HTTP_201_CREATED)
 async def generate_ai_plan_for_agent(
     request: PlanGenerateRequest,
+    response: Response = None,
     api_key: ApiKey = Depends(verify_api_key),
     db: Session = Depends(get_db)
 ):
@@ -59,17 +61,32 @@ async def generate_ai_plan_for_agent(
             detail=rate_msg
         )
     
-    # 2. プラン生成上限チェック
-    can_gen, message, remaining = check_api_key_plan_limit(db, api_key.id)
-    if not can_gen:
+    # 2. プラン生成上限チェック（今月の枠を1回分原子的に確保する。同時生成でも上限を超えない）
+    reservation, message = reserve_api_key_plan_generation(db, api_key.id, api_key.monthly_plan_limit)
+    if reservation is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=message
         )
     
-    # 3. リクエストを記録
-    record_api_key_request(db, api_key.id, is_plan_generation=False)
+    # 3. リクエストを記録（書き込み遅延が有効ならまとめて反映）
+    record_api_key_request(db, api_key.id)
     
+    # 生成・保存のどこで失敗しても（例外・キャンセルとも）確保した枠を戻す
+    try:
+        return await _generate_and_save_plan_for_agent(request, response, api_key, db)
+    except BaseException:
+        reservation.refund()
+        raise
+
+
+async def _generate_and_save_plan_for_agent(
+    request: PlanGenerateRequest,
+    response: Optional[Response],
+    api_key: ApiKey,
+    db: Session,
+):
+    """AIでプランを生成して APIキーの所有者のプランとして保存する（利用枠は呼び出し元で確保済み）"""
     # 4. データベースからスポットを取得（フィルタリング用）
     db_spots = get_spots_for_plan(
         db=db,
@@ -104,6 +121,12 @@ async def generate_ai_plan_for_agent(
         end_time=request.end_time,
         transportation=request.transportation
     )
+    cache_mode = "hit"
+    
+    # 完全一致で外れたら、近いリクエストのプランを組み直して使う（Gemini を呼ばない）
+    if not cached_plan_data and settings.PLAN_CACHE_ADAPT_ENABLED:
+        cached_plan_data = find_adapted_cached_plan(db, request, db_spots, filtered_pending_spots)
+        cache_mode = "adapted"
     
     if cached_plan_data:
         # キャッシュからプランデータを取得
@@ -267,9 +290,6 @@ async def generate_ai_plan_for_agent(
             "check_out_date": getattr(request, "check_out_date", None)
         }
         
-        # プラン生成を記録
-        record_api_key_request(db, api_key.id, is_plan_generation=True)
-        
         # データベースに保存
         # APIキーにuser_idが設定されている場合はそれを使用、ない場合はエラー
         if not api_key.user_id:
@@ -280,6 +300,7 @@ async def generate_ai_plan_for_agent(
         
         try:
             plan = create_plan(db, api_key.user_id, plan_data)
+            plan_cache_headers(response, cache_mode)
             return plan
         except Exception as e:
             raise
@@ -305,12 +326,16 @@ async def generate_ai_plan_for_agent(
     ]
     
     # スポット間の距離・時間を計算
-    from app.utils.time_calculator import calculate_spot_distances
+    from app.utils.time_calculator import calculate_spot_distances, calculate_proximity_clusters
     all_spots_for_distance = db_spots_data[:20]
     spot_distances = calculate_spot_distances(
         all_spots_for_distance,
         transportation=request.transportation
     )
+    proximity_clusters = calculate_proximity_clusters(
+        db_spots_data,
+        transportation=request.transportation
+    )
     
     # themesが辞書のリストの場合、文字列のリストに変換
     themes_list = []
@@ -334,7 +359,8 @@ async def generate_ai_plan_for_agent(
         end_time=request.end_time,
         transportation=request.transportation,
         preferences=request.preferences,
-        spot_distances=spot_distances
+        spot_distances=spot_distances,
+        proximity_clusters=proximity_clusters
     )
     
     if not generated_plan:
@@ -518,10 +544,7 @@ async def generate_ai_plan_for_agent(
             {"destination": request.destination, "days": request.days}
         )
     
-    # 12. プラン生成を記録
-    record_api_key_request(db, api_key.id, is_plan_generation=True)
-    
-    # 13. データベースに保存
+    # 12-13. データベースに保存
     # APIキーにuser_idが設定されている場合はそれを使用、ない場合はエラー
     if not api_key.user_id:
         raise HTTPException(
@@ -531,6 +554,7 @@ async def generate_ai_plan_for_agent(
     
     try:
         plan = create_plan(db, api_key.user_id, plan_data)
+        plan_cache_headers(response, "miss")
         return plan
     except Exception as e:
         raise
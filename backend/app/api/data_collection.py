@@ -20,7 +20,7 @@ from app.schemas.data_collection import (
     CSVImportResponse
 )
 from app.services.youtube_collection_service import collect_youtube_data
-from app.services.geocoding_service import add_location_to_places
+from app.services.geocoding_service import add_location_to_places, available_providers
 from app.services.sns_collection_service import collect_trending_topics, collect_sns_data_with_summary
 from app.services.spot_import_service import (
     import_spots_from_youtube_data,
@@ -126,7 +126,8 @@ async def update_location_data(
     """
     既存のSpotに位置情報を付与（管理者専用）
     
-    OpenCage Geocoding APIを使用して位置情報を取得し、Spotに付与します。
+    ジオコーディング（Google → OpenCage → Yahoo の順。結果はキャッシュ）で位置情報を取得し、
+    Spotに付与します。
     """
     if not settings.DATA_COLLECTION_ENABLED:
         raise HTTPException(
@@ -134,10 +135,10 @@ async def update_location_data(
             detail="データ収集機能が無効になっています。DATA_COLLECTION_ENABLEDをTrueに設定してください。"
         )
     
-    if not settings.OPENCAGE_API_KEY:
+    if not available_providers():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="OPENCAGE_API_KEYが設定されていません。"
+            detail="ジオコーディング用のAPIキー（GOOGLE_MAPS_API_KEY / OPENCAGE_API_KEY / YAHOO_APP_ID）が設定されていません。"
         )
     
     try:
@@ -1,8 +1,8 @@
 """
 プラン管理APIエンドポイント
 """
-from fastapi import APIRouter, Depends, HTTPException, status, Response
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
+from fastapi.responses import FileResponse
 from sqlalchemy.orm import Session
 from typing import List, Optional, Tuple
 from app.utils.database import get_db
@@ -12,21 +12,29 @@ from app.schemas.plan import (
     PlanCreate,
     PlanUpdate,
     PlanResponse,
-    PlanGenerateRequest
+    PlanSummary,
+    PlanGenerateRequest,
+    plan_response_content,
 )
 from app.services.plan_service import (
     create_plan,
     get_user_plans,
+    get_user_plan_summaries,
     get_plan,
     update_plan,
     delete_plan
 )
 from app.services.gemini_service import generate_plan
 from app.services.spot_service import get_spots_for_plan
-from app.utils.plan_cache import get_cached_plan, save_cached_plan
-from app.utils.subscription import can_generate_plan, record_plan_generation, get_user_plan, check_feature_access
+from app.utils.plan_cache import get_cached_plan, save_cached_plan, find_similar_cached_plan
+from app.utils.plan_adapter import adapt_cached_plan
+from app.utils import metrics
+from app.utils.subscription import get_user_plan, check_feature_access
+from app.services.entitlement_service import get_entitlement, reserve_plan_generation
 from app.utils.rate_limiter import rate_limiter
-from app.utils.plan_export import export_to_pdf, export_to_ical
+from app.services.export_service import get_export_file, normalize_locale
+from app.config import settings
+from app.utils.fast_json import FastJSONResponse
 import asyncio
 import uuid
 from datetime import datetime
@@ -40,6 +48,26 @@ from typing import Dict, Any
 router = APIRouter(prefix="/api/plans", tags=["plans"])
 
 
+def _stored_plan_response(plan, status_code: int = status.HTTP_200_OK, headers: Optional[Dict[str, str]] = None):
+    """保存済みプランのレスポンス（PLAN_FAST_JSON_ENABLED なら PlanResponse の再検証を省いて直接 JSON 化）"""
+    if not settings.PLAN_FAST_JSON_ENABLED:
+        return plan
+    return FastJSONResponse(plan_response_content(plan), status_code=status_code, headers=headers)
+
+
+def plan_cache_headers(response: Optional[Response], cache_mode: str) -> Dict[str, str]:
+    """生成したプランの出所（hit / adapted / miss）をヘッダー X-Plan-Cache とメトリクスに記録する
+
+    response はエンドポイントを直接呼ぶ場合（ベンチマークなど）は None
+    """
+    metrics.increment("plan_generation.cache_mode", mode=cache_mode)
+    headers = {"X-Plan-Cache": cache_mode}
+    # Response を直接返さない経路（PLAN_FAST_JSON_ENABLED=false）向けに引数の response にも付ける
+    if response is not None:
+        response.headers.update(headers)
+    return headers
+
+
 def filter_pending_spots_by_database(
     pending_spots: List[Dict[str, Any]],
     db_spots: List[Spot]
@@ -108,9 +136,12 @@ def add_hotels_to_plan_spots(
     """
     if getattr(request, "include_hotels", True) is False:
         return plan_spots
+    # 日帰り（泊数 0）は宿泊施設を探さない
+    if request.days <= 1:
+        return plan_spots
     try:
         from datetime import datetime, timedelta
-        from app.services.spot_service import get_spots
+        from app.services.hotel_selection_service import select_hotels_for_nights
         import uuid
         
         # チェックイン/チェックアウト日時をパース（オプショナル）
@@ -127,45 +158,6 @@ def add_hotels_to_plan_spots(
             except Exception:
                 pass
         
-        # データベースから宿泊施設のスポットを取得
-        # エリア名で検索（部分一致）
-        hotel_spots = get_spots(
-            db=db,
-            area=area,
-            category="Hotel",
-            limit=10
-        )
-        
-        # エリア名で見つからない場合、エリア名の部分文字列で再検索を試みる
-        if not hotel_spots and area:
-            # エリア名から都道府県名を抽出（例：「鹿児島県」→「鹿児島」）
-            area_parts = area.replace("県", "").replace("府", "").replace("都", "").replace("道", "").strip()
-            if area_parts and area_parts != area:
-                hotel_spots = get_spots(
-                    db=db,
-                    area=area_parts,
-                    category="Hotel",
-                    limit=10
-                )
-        
-        # それでも見つからない場合、カテゴリのみで検索（エリア指定なし）
-        if not hotel_spots:
-            hotel_spots = get_spots(
-                db=db,
-                area=None,
-                category="Hotel",
-                limit=10
-            )
-        
-        if not hotel_spots:
-            # 宿泊施設が見つからない場合はスキップ
-            import logging
-            logging.warning(f"宿泊施設が見つかりませんでした（エリア: {area}）")
-            return plan_spots
-        
-        # 最初の宿泊施設を使用（複数ある場合は最初の1つ）
-        hotel_spot = hotel_spots[0]
-        
         # 日ごとにグループ化
         from collections import defaultdict
         spots_by_day = defaultdict(list)
@@ -173,14 +165,25 @@ def add_hotels_to_plan_spots(
             day = ps.get("day", 1)
             spots_by_day[day].append(ps)
         
+        # 泊ごとに、前後の日のスポットから最も近い宿泊施設を選ぶ
+        # （プロセス内の空間索引から選ぶため、読み込み済みなら DB には問い合わせない）
+        hotels_by_night = select_hotels_for_nights(db, area, spots_by_day, request.days)
+        
+        if not hotels_by_night:
+            # 宿泊施設が見つからない場合はスキップ
+            import logging
+            logging.warning(f"宿泊施設が見つかりませんでした（エリア: {area}）")
+            return plan_spots
+        
         # 各日の最後に宿泊施設を追加
         updated_plan_spots = []
         for day in range(1, request.days + 1):
             day_spots = spots_by_day.get(day, [])
             
             # 二日目以降の最初に宿泊施設（前日の宿泊施設から出発）を追加
-            if day > 1:
+            if day > 1 and hotels_by_night.get(day - 1):
                 # 前日の宿泊施設から出発することを示す宿泊施設を最初に追加
+                hotel_spot = hotels_by_night[day - 1]
                 hotel_departure_spot = {
                     "id": str(uuid.uuid4()),
                     "spotId": hotel_spot.id,
@@ -236,8 +239,9 @@ def add_hotels_to_plan_spots(
                 last_end_time = minutes_to_time(end_minutes)
             
             # 最終日以外の場合のみ宿泊施設を追加（最終日はチェックアウト日なので宿泊施設は不要）
-            if day < request.days:
+            if day < request.days and hotels_by_night.get(day):
                 # 宿泊施設をスポットとして追加
+                hotel_spot = hotels_by_night[day]
                 hotel_plan_spot = {
                     "id": str(uuid.uuid4()),
                     "spotId": hotel_spot.id,
@@ -341,7 +345,7 @@ def convert_generated_spots_to_plan_spots(
             "startTime": spot_data.get("startTime"),
             "transportMode": spot_data.get("transportMode", "train"),
             "transportDuration": spot_data.get("transportDuration", 20),
-            "isMustVisit": any(
+            "isMustVisit": bool(spot_data.get("isMustVisit")) or any(
                 ps.get("name", "") in spot_name or spot_name in ps.get("name", "")
                 for ps in request.pending_spots
             ),
@@ -352,9 +356,53 @@ def convert_generated_spots_to_plan_spots(
     return plan_spots, excluded_spots
 
 
+def find_adapted_cached_plan(
+    db: Session,
+    request: PlanGenerateRequest,
+    db_spots: List[Spot],
+    filtered_pending_spots: List[Dict[str, Any]],
+) -> Optional[Dict[str, Any]]:
+    """
+    開始・終了時刻や行きたい場所の追加だけが違う近いリクエストのキャッシュ済みプランを組み直す（共通関数）
+    
+    Returns:
+        組み直したプラン（Gemini の出力形式）。近いプランが無い・組み直せなければ None
+    """
+    similar = find_similar_cached_plan(
+        db=db,
+        destination=request.destination,
+        days=request.days,
+        budget=request.budget,
+        themes=request.themes,
+        pending_spots=filtered_pending_spots,
+        preferences=request.preferences,
+        start_time=request.start_time,
+        end_time=request.end_time,
+        transportation=request.transportation
+    )
+    if not similar:
+        return None
+    cached_plan_data, extra_names = similar
+    with metrics.timed("plan_cache.adapt_ms"):
+        adapted = adapt_cached_plan(
+            cached_plan_data,
+            db_spots=db_spots,
+            pending_spots=filtered_pending_spots,
+            extra_names=extra_names,
+            days=request.days,
+            start_time=request.start_time,
+            end_time=request.end_time,
+            transportation=request.transportation,
+            check_in_date=request.check_in_date
+        )
+    metrics.increment("plan_cache.adapt", result="ok" if adapted else "rejected")
+    return adapted
+
+
 @router.post("/generate-plan", response_model=PlanResponse, status_code=status.HTTP_201_CREATED)
 async def generate_ai_plan(
     request: PlanGenerateRequest,
+    response: Response = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -393,6 +441,12 @@ async def generate_ai_plan(
         end_time=request.end_time,
         transportation=request.transportation
     )
+    cache_mode = "hit"
+    
+    # 完全一致で外れたら、近いリクエストのプランを組み直して使う（Gemini を呼ばない）
+    if not cached_plan_data and settings.PLAN_CACHE_ADAPT_ENABLED:
+        cached_plan_data = find_adapted_cached_plan(db, request, db_spots, filtered_pending_spots)
+        cache_mode = "adapted"
     
     if cached_plan_data:
         # キャッシュからプランデータを取得して、PlanSpot形式に変換
@@ -595,11 +649,13 @@ async def generate_ai_plan(
         # データベースに保存（キャッシュからでも保存）
         plan = create_plan(db, current_user.id, plan_data)
         # 除外されたスポット情報をレスポンスに含める（PlanResponseに追加する必要がある）
-        return plan
+        return _stored_plan_response(
+            plan, status_code=status.HTTP_201_CREATED, headers=plan_cache_headers(response, cache_mode)
+        )
     
-    # 2. サブスクリプションチェック
-    can_gen, message, remaining = can_generate_plan(db, current_user.id)
-    if not can_gen:
+    # 2. サブスクリプションチェック（今月の枠を1回分原子的に確保する。同時生成でも上限を超えない）
+    reservation, message = reserve_plan_generation(db, current_user.id)
+    if reservation is None:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=message
@@ -609,11 +665,31 @@ async def generate_ai_plan(
     plan_name = get_user_plan(db, current_user.id)
     allowed, rate_msg = rate_limiter.check_limit(db, current_user.id, plan_name)
     if not allowed:
+        reservation.refund()
         raise HTTPException(
             status_code=status.HTTP_429_TOO_MANY_REQUESTS,
             detail=rate_msg
         )
     
+    # 生成・保存のどこで失敗しても（例外・キャンセルとも）確保した枠を戻す
+    try:
+        plan = await _generate_and_save_plan(request, current_user, db, db_spots, filtered_pending_spots)
+    except BaseException:
+        reservation.refund()
+        raise
+    return _stored_plan_response(
+        plan, status_code=status.HTTP_201_CREATED, headers=plan_cache_headers(response, "miss")
+    )
+
+
+async def _generate_and_save_plan(
+    request: PlanGenerateRequest,
+    current_user: User,
+    db: Session,
+    db_spots: List[Spot],
+    filtered_pending_spots: List[Dict[str, Any]],
+):
+    """AIでプランを生成して保存し、保存したプランを返す（利用枠は呼び出し元で確保済み）"""
     # Spotモデルを辞書形式に変換（プロンプト生成用のみ）
     db_spots_data = [
         {
@@ -637,12 +713,17 @@ async def generate_ai_plan(
     ]
     
     # スポット間の距離・時間を計算（プロンプトに含めるため）
-    from app.utils.time_calculator import calculate_spot_distances
+    from app.utils.time_calculator import calculate_spot_distances, calculate_proximity_clusters
     all_spots_for_distance = db_spots_data[:20]  # 最大20件まで計算（パフォーマンス考慮）
     spot_distances = calculate_spot_distances(
         all_spots_for_distance,
         transportation=request.transportation
     )
+    # 候補全体の近いスポットのまとまり（事前計算した移動行列から）
+    proximity_clusters = calculate_proximity_clusters(
+        db_spots_data,
+        transportation=request.transportation
+    )
     
     # Gemini APIでプラン生成（フィルタリングされたpending_spotsのみ使用）
     # themesが辞書のリストの場合、文字列のリストに変換
@@ -674,6 +755,7 @@ async def generate_ai_plan(
         preferences=request.preferences,
         spot_distances=spot_distances,
         check_in_date=request.check_in_date,
+        proximity_clusters=proximity_clusters,
     )
     
     if not generated_plan:
@@ -926,13 +1008,7 @@ async def generate_ai_plan(
         )
     
     # 5. データベースに保存
-    plan = create_plan(db, current_user.id, plan_data)
-
-    # 6. 使用量を記録（プラン保存が成功した後にのみ加算する。
-    #    保存前に記録すると、create_plan が失敗しても回数だけ消費されてしまう）
-    record_plan_generation(db, current_user.id)
-
-    return plan
+    return create_plan(db, current_user.id, plan_data)
 
 
 @router.get("/usage", status_code=status.HTTP_200_OK)
@@ -941,32 +1017,67 @@ def get_plan_usage(
     current_user: User = Depends(get_current_user)
 ):
     """プラン生成使用量を取得"""
-    can_gen, message, remaining = can_generate_plan(db, current_user.id)
-    plan_name = get_user_plan(db, current_user.id)
-    from app.utils.subscription import get_plan_features
-    plan_features = get_plan_features(db, current_user.id)
+    entitlement = get_entitlement(db, current_user.id)
     
     return {
-        "can_generate": can_gen,
-        "message": message,
-        "remaining": remaining,
-        "plan_name": plan_name,
-        "plan_features": plan_features
+        "can_generate": entitlement.can_generate,
+        "message": entitlement.message,
+        "remaining": entitlement.remaining,
+        "plan_name": entitlement.plan_name,
+        "plan_features": entitlement.features
     }
 
 
 @router.get("", response_model=List[PlanResponse])
 async def list_plans(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    folder_id: Optional[str] = Query(None, description="フォルダで絞り込み"),
+    favorite: Optional[bool] = Query(None, description="お気に入りで絞り込み"),
+    cursor: Optional[str] = Query(None, description="前ページの X-Next-Cursor（指定時は skip を無視）"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """ユーザーのプラン一覧取得"""
-    plans = get_user_plans(db, current_user.id, skip, limit)
+    """ユーザーのプラン一覧取得（次ページがあれば X-Next-Cursor ヘッダーを返す）"""
+    plans, next_cursor = get_user_plans(
+        db, current_user.id, skip, limit,
+        folder_id=folder_id, favorite=favorite, cursor=cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if settings.PLAN_FAST_JSON_ENABLED:
+        # Response を直接返すと引数の response のヘッダーは使われないため付け直す
+        return FastJSONResponse(
+            [plan_response_content(plan) for plan in plans],
+            headers={"X-Next-Cursor": next_cursor} if next_cursor else None,
+        )
     return plans
 
 
+@router.get("/summary", response_model=List[PlanSummary])
+async def list_plan_summaries(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    folder_id: Optional[str] = Query(None, description="フォルダで絞り込み"),
+    favorite: Optional[bool] = Query(None, description="お気に入りで絞り込み"),
+    cursor: Optional[str] = Query(None, description="前ページの X-Next-Cursor"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """プラン一覧（カード表示用の軽量版。spots 本体を含まない）
+
+    ※ /{plan_id} より先に定義すること（パスマッチ順の都合）
+    """
+    summaries, next_cursor = get_user_plan_summaries(
+        db, current_user.id, limit,
+        folder_id=folder_id, favorite=favorite, cursor=cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return summaries
+
+
 @router.get("/{plan_id}", response_model=PlanResponse)
 async def get_plan_detail(
     plan_id: str,
@@ -980,7 +1091,7 @@ async def get_plan_detail(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="プランが見つかりません"
         )
-    return plan
+    return _stored_plan_response(plan)
 
 
 @router.post("", response_model=PlanResponse, status_code=status.HTTP_201_CREATED)
@@ -1194,13 +1305,37 @@ async def delete_plan_endpoint(
     return None
 
 
+def _plan_export_dict(plan, with_summary: bool = False) -> Dict[str, Any]:
+    """エクスポート用にプランを辞書へ変換する"""
+    plan_dict = {
+        "title": plan.title,
+        "area": plan.area,
+        "days": plan.days,
+        "spots": plan.spots,
+    }
+    if with_summary:
+        plan_dict["summary"] = f"{plan.area}の{plan.days}日間旅行プラン"
+    return plan_dict
+
+
+def _export_file_response(export: Dict[str, str], plan_id: str) -> FileResponse:
+    return FileResponse(
+        export["path"],
+        media_type=export["media_type"],
+        headers={
+            "Content-Disposition": f"attachment; filename=travel_plan_{plan_id}.{export['extension']}"
+        }
+    )
+
+
 @router.get("/{plan_id}/export/pdf")
 async def export_plan_pdf(
     plan_id: str,
+    request: Request,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
-    """プランをPDF形式でエクスポート"""
+    """プランをPDF形式でエクスポート（描画はプロセスプール、結果はキャッシュ）"""
     # プラン取得
     plan = get_plan(db, plan_id, current_user.id)
     if not plan:
@@ -1216,24 +1351,15 @@ async def export_plan_pdf(
             detail="PDFエクスポートはベーシックプラン以上で利用可能です"
         )
     
-    # プランデータを辞書形式に変換
-    plan_dict = {
-        "title": plan.title,
-        "area": plan.area,
-        "days": plan.days,
-        "spots": plan.spots,
-        "summary": f"{plan.area}の{plan.days}日間旅行プラン"
-    }
-    
     try:
-        pdf_buffer = export_to_pdf(plan_dict)
-        return StreamingResponse(
-            pdf_buffer,
-            media_type="application/pdf",
-            headers={
-                "Content-Disposition": f"attachment; filename=travel_plan_{plan_id}.pdf"
-            }
+        export = await get_export_file(
+            plan_id,
+            plan.updated_at or plan.created_at,
+            "pdf",
+            _plan_export_dict(plan, with_summary=True),
+            locale=normalize_locale(request.headers.get("accept-language")),
         )
+        return _export_file_response(export, plan_id)
     except ImportError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -1249,6 +1375,7 @@ async def export_plan_pdf(
 @router.get("/{plan_id}/export/ical")
 async def export_plan_ical(
     plan_id: str,
+    request: Request,
     start_date: Optional[str] = None,
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
@@ -1271,23 +1398,16 @@ async def export_plan_ical(
     else:
         start_datetime = None
     
-    # プランデータを辞書形式に変換
-    plan_dict = {
-        "title": plan.title,
-        "area": plan.area,
-        "days": plan.days,
-        "spots": plan.spots
-    }
-    
     try:
-        ical_data = export_to_ical(plan_dict, start_datetime)
-        return Response(
-            content=ical_data,
-            media_type="text/calendar",
-            headers={
-                "Content-Disposition": f"attachment; filename=travel_plan_{plan_id}.ics"
-            }
+        export = await get_export_file(
+            plan_id,
+            plan.updated_at or plan.created_at,
+            "ical",
+            _plan_export_dict(plan),
+            locale=normalize_locale(request.headers.get("accept-language")),
+            start_date=start_datetime,
         )
+        return _export_file_response(export, plan_id)
     except ImportError:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
@@ -1300,6 +1420,42 @@ async def export_plan_ical(
         )
 
 
+@router.get("/{plan_id}/export/image")
+async def export_plan_image(
+    plan_id: str,
+    request: Request,
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """プランを画像（PNG）形式でエクスポート"""
+    plan = get_plan(db, plan_id, current_user.id)
+    if not plan:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="プランが見つかりません"
+        )
+    
+    try:
+        export = await get_export_file(
+            plan_id,
+            plan.updated_at or plan.created_at,
+            "image",
+            _plan_export_dict(plan),
+            locale=normalize_locale(request.headers.get("accept-language")),
+        )
+        return _export_file_response(export, plan_id)
+    except ImportError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="画像エクスポート機能を使用するには、Pillowライブラリが必要です"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"画像生成エラー: {str(e)}"
+        )
+
+
 @router.get("/{plan_id}/route")
 async def get_plan_route(
     plan_id: str,
@@ -3,10 +3,12 @@
 """
 import asyncio
 
-from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Response
+from fastapi import APIRouter, Depends, HTTPException, status, Query, BackgroundTasks, Request, Response
+from fastapi.responses import FileResponse, JSONResponse
+from pydantic import TypeAdapter
 from sqlalchemy.orm import Session
 from typing import List, Optional
-from app.utils.database import get_db
+from app.utils.database import get_db, get_read_db
 from app.dependencies import get_current_user, get_current_admin_user
 from app.models.user import User
 from app.schemas.spot import SpotCreate, SpotUpdate, SpotResponse, BulkAddRequest, BulkAddResponse
@@ -17,7 +19,6 @@ from app.utils.tag_normalizer import (
     load_tag_categories,
     TagSource
 )
-from collections import Counter
 from app.services.spot_service import (
     create_spot,
     get_spots,
@@ -26,6 +27,8 @@ from app.services.spot_service import (
     update_spot,
     delete_spot
 )
+from app.services.tag_stats_service import get_tag_stats, compute_tags_etag
+from app.utils.response_cache import cached_json_response
 from app.services.gemini_service import research_spot_info
 from app.services.spot_bulk_service import bulk_add_spots_by_prefecture
 from app.services.bulk_job_service import create_job, get_job, run_bulk_add_job
@@ -36,6 +39,13 @@ from app.utils.jwt_manager import verify_token
 
 router = APIRouter(prefix="/api/spots", tags=["spots"])
 
+_spot_list_adapter = TypeAdapter(List[SpotResponse])
+
+
+def _serialize_spots(spots) -> bytes:
+    """スポット一覧をレスポンス用 JSON にシリアライズする（response_model と同じ形）"""
+    return _spot_list_adapter.dump_json(_spot_list_adapter.validate_python(spots, from_attributes=True))
+
 # 一覧系エンドポイントは未ログインでも閲覧できるため、認証は任意扱いにする。
 # トークンがあり管理者のときだけ include_unverified を許可する用途に使う。
 _optional_security = HTTPBearer(auto_error=False)
@@ -59,36 +69,56 @@ async def get_optional_current_user(
 
 @router.get("", response_model=List[SpotResponse])
 async def list_spots(
+    request: Request,
     area: Optional[str] = Query(None, description="エリアでフィルタ"),
     category: Optional[str] = Query(None, description="カテゴリでフィルタ"),
-    keyword: Optional[str] = Query(None, description="キーワード検索"),
+    keyword: Optional[str] = Query(None, description="キーワード検索（名前・説明・エリア・タグ。関連度順）"),
+    highlight: bool = Query(False, description="キーワード一致箇所の抜粋（search_highlight）を返す"),
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     include_unverified: bool = Query(False, description="未検証・閉業も含める（管理者のみ有効）"),
     current_user: Optional[User] = Depends(get_optional_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """スポット一覧取得（フィルタリング対応）
 
     include_unverified は管理者のときのみ有効。非管理者が付けても無視して
     公開フィルタ（検証済み・閉業除外）を維持する。
+    公開フィルタの結果はカタログ世代ごとにキャッシュする（管理者の未検証込み一覧は対象外）。
     """
     allow_unverified = bool(include_unverified) and bool(current_user) and current_user.role == "admin"
-    spots = get_spots(db, area, category, keyword, skip, limit, include_unverified=allow_unverified)
-    return spots
+    if allow_unverified:
+        return get_spots(
+            db, area, category, keyword, skip, limit,
+            include_unverified=True,
+            highlight=highlight,
+        )
+    return cached_json_response(
+        request,
+        "spots.list",
+        {
+            "area": area, "category": category, "keyword": keyword,
+            "highlight": highlight, "skip": skip, "limit": limit,
+        },
+        lambda: _serialize_spots(get_spots(db, area, category, keyword, skip, limit, highlight=highlight)),
+    )
 
 
 @router.get("/photo")
 async def get_spot_photo(
-    ref: str = Query(..., description="Places の photo resource name（places/<id>/photos/<token>）")
+    request: Request,
+    ref: str = Query(..., description="Places の photo resource name（places/<id>/photos/<token>）"),
+    w: Optional[int] = Query(None, ge=16, le=4800, description="表示幅（px）。用意済みの幅に丸める"),
 ):
     """Google Places 写真プロキシ
 
     API キーをクライアントへ露出させないため、サーバ側でキーを付与して
-    Places Photo API から画像を取得し、そのまま返す。
+    Places Photo API から画像を取得する。取得結果はディスクにキャッシュし、
+    以降はファイルから配信する（Accept に image/webp があれば WebP を返す）。
     ※ /{spot_id} より先に定義すること（パスマッチ順の都合）
     """
-    from app.services.places_service import fetch_photo_media, is_valid_photo_resource_name
+    from app.services.places_service import is_valid_photo_resource_name
+    from app.services.photo_cache_service import get_cached_photo
 
     # photo resource name 形式のみ許可（SSRF対策）
     if not is_valid_photo_resource_name(ref):
@@ -97,20 +127,24 @@ async def get_spot_photo(
             detail="不正な写真参照です"
         )
 
-    # requests はブロッキングなのでスレッドへ逃がす
-    result = await asyncio.to_thread(fetch_photo_media, ref)
-    if result is None:
+    prefer_webp = "image/webp" in request.headers.get("accept", "")
+
+    # requests / ディスク I/O はブロッキングなのでスレッドへ逃がす
+    photo = await asyncio.to_thread(get_cached_photo, ref, w, prefer_webp)
+    if photo is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="写真が見つかりません"
         )
 
-    content, content_type = result
-    return Response(
-        content=content,
-        media_type=content_type,
-        headers={"Cache-Control": "public, max-age=86400"},
-    )
+    headers = {
+        "Cache-Control": "public, max-age=86400",
+        "ETag": photo["etag"],
+        "Vary": "Accept",
+    }
+    if request.headers.get("if-none-match") == photo["etag"]:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return FileResponse(photo["path"], media_type=photo["content_type"], headers=headers)
 
 
 @router.get("/places-usage", status_code=status.HTTP_200_OK)
@@ -126,37 +160,95 @@ async def get_places_usage(
     return check_details_budget(db)
 
 
+@router.get("/tags", response_model=TagResponse, status_code=status.HTTP_200_OK)
+async def get_tags(
+    request: Request,
+    db: Session = Depends(get_read_db),
+    category: Optional[str] = Query(None, description="カテゴリでフィルタ")
+):
+    """利用可能なタグ一覧を取得（統計情報付き）
+
+    統計は tag_stats テーブル（スポット書き込み時に差分更新）から読む。
+    内容が変わっていなければ If-None-Match に 304 を返す。
+    """
+    tag_stats_list = [
+        TagStats(
+            value=stat.value,
+            count=stat.count,
+            category=stat.category,
+            normalized=stat.normalized or stat.value
+        )
+        for stat in get_tag_stats(db, category)
+    ]
+
+    # カテゴリ一覧を取得
+    categories_data = load_tag_categories()
+    categories_dict = {}
+    for cat_key, cat_info in categories_data.get("categories", {}).items():
+        categories_dict[cat_key] = {
+            "name": cat_info.get("name", ""),
+            "description": cat_info.get("description", "")
+        }
+
+    body = TagResponse(
+        tags=tag_stats_list,
+        total=len(tag_stats_list),
+        categories=categories_dict
+    )
+    payload = body.model_dump()
+    etag = compute_tags_etag(payload)
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return JSONResponse(content=payload, headers=headers)
+
+
 @router.get("/{spot_id}", response_model=SpotResponse)
 async def get_spot_detail(
     spot_id: str,
+    request: Request,
     db: Session = Depends(get_db)
 ):
-    """スポット詳細取得"""
-    spot = get_spot(db, spot_id)
-    if not spot:
+    """スポット詳細取得（カタログ世代ごとにキャッシュ。404 はキャッシュしない）"""
+    def _build():
+        spot = get_spot(db, spot_id)
+        if not spot:
+            return None
+        return SpotResponse.model_validate(spot, from_attributes=True).model_dump_json().encode("utf-8")
+
+    response = cached_json_response(request, "spots.detail", {"id": spot_id}, _build)
+    if response is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="スポットが見つかりません"
         )
-    return spot
+    return response
 
 
 @router.get("/area/{area}", response_model=List[SpotResponse])
 async def get_spots_by_area_endpoint(
     area: str,
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(100, ge=1, le=1000),
     include_unverified: bool = Query(False, description="未検証・閉業も含める（管理者のみ有効）"),
     current_user: Optional[User] = Depends(get_optional_current_user),
-    db: Session = Depends(get_db)
+    db: Session = Depends(get_read_db)
 ):
     """エリア別スポット取得
 
     include_unverified は管理者のときのみ有効（非管理者は公開フィルタを維持）。
+    公開フィルタの結果はカタログ世代ごとにキャッシュする。
     """
     allow_unverified = bool(include_unverified) and bool(current_user) and current_user.role == "admin"
-    spots = get_spots_by_area(db, area, skip, limit, include_unverified=allow_unverified)
-    return spots
+    if allow_unverified:
+        return get_spots_by_area(db, area, skip, limit, include_unverified=True)
+    return cached_json_response(
+        request,
+        "spots.area",
+        {"area": area, "skip": skip, "limit": limit},
+        lambda: _serialize_spots(get_spots_by_area(db, area, skip, limit)),
+    )
 
 
 @router.post("/{spot_id}/research", status_code=status.HTTP_200_OK)
@@ -558,67 +650,6 @@ async def get_bulk_add_job_status(
     )
 
 
-@router.get("/tags", response_model=TagResponse, status_code=status.HTTP_200_OK)
-async def get_tags(
-    db: Session = Depends(get_db),
-    category: Optional[str] = Query(None, description="カテゴリでフィルタ")
-):
-    """利用可能なタグ一覧を取得（統計情報付き）"""
-    from app.models.spot import Spot
-    
-    # 全スポットからタグを収集
-    spots = db.query(Spot).filter(Spot.tags.isnot(None)).all()
-    
-    tag_counter = Counter()
-    tag_categories = {}
-    tag_normalized = {}
-    
-    for spot in spots:
-        if not spot.tags:
-            continue
-        
-        # タグを正規化
-        from app.utils.tag_normalizer import dict_list_to_tags
-        tags = dict_list_to_tags(spot.tags)
-        
-        for tag in tags:
-            tag_value = tag.value
-            tag_counter[tag_value] += 1
-            
-            if tag.category:
-                tag_categories[tag_value] = tag.category.value
-            tag_normalized[tag_value] = tag.normalized
-    
-    # タグ統計を作成
-    tag_stats_list = []
-    for tag_value, count in tag_counter.most_common():
-        # カテゴリフィルタ
-        if category and tag_categories.get(tag_value) != category:
-            continue
-        
-        tag_stats_list.append(TagStats(
-            value=tag_value,
-            count=count,
-            category=tag_categories.get(tag_value),
-            normalized=tag_normalized.get(tag_value, tag_value)
-        ))
-    
-    # カテゴリ一覧を取得
-    categories_data = load_tag_categories()
-    categories_dict = {}
-    for cat_key, cat_info in categories_data.get("categories", {}).items():
-        categories_dict[cat_key] = {
-            "name": cat_info.get("name", ""),
-            "description": cat_info.get("description", "")
-        }
-    
-    return TagResponse(
-        tags=tag_stats_list,
-        total=len(tag_stats_list),
-        categories=categories_dict
-    )
-
-
 @router.get("/tags/recommended", response_model=List[str], status_code=status.HTTP_200_OK)
 async def get_recommended_tags_endpoint(
     category: Optional[str] = Query(None, description="カテゴリでフィルタ")
@@ -3,9 +3,9 @@
 """
 import asyncio
 
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Query, Response
 from sqlalchemy.orm import Session
-from typing import List
+from typing import List, Optional
 from app.utils.database import get_db
 from app.dependencies import get_current_user
 from app.models.user import User
@@ -18,9 +18,9 @@ from app.schemas.user import (
     AccountDeleteRequest,
 )
 from app.services.user_service import update_user, delete_user_account
-from app.services.plan_service import get_user_plans
+from app.services.plan_service import get_user_plans, get_user_plan_summaries
 from app.services import preferences_service
-from app.schemas.plan import PlanResponse
+from app.schemas.plan import PlanResponse, PlanSummary
 from app.utils.security import hash_password, verify_password
 from app.utils.storage import save_avatar, ALLOWED_IMAGE_TYPES
 from app.config import settings
@@ -50,16 +50,45 @@ async def update_current_user(
 
 @router.get("/me/plans", response_model=List[PlanResponse])
 async def get_current_user_plans(
+    response: Response,
     skip: int = 0,
     limit: int = 100,
+    folder_id: Optional[str] = Query(None, description="フォルダで絞り込み"),
+    favorite: Optional[bool] = Query(None, description="お気に入りで絞り込み"),
+    cursor: Optional[str] = Query(None, description="前ページの X-Next-Cursor（指定時は skip を無視）"),
     current_user: User = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
     """ユーザーのプラン一覧（/api/plansのエイリアス）"""
-    plans = get_user_plans(db, current_user.id, skip, limit)
+    plans, next_cursor = get_user_plans(
+        db, current_user.id, skip, limit,
+        folder_id=folder_id, favorite=favorite, cursor=cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
     return plans
 
 
+@router.get("/me/plans/summary", response_model=List[PlanSummary])
+async def get_current_user_plan_summaries(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    folder_id: Optional[str] = Query(None, description="フォルダで絞り込み"),
+    favorite: Optional[bool] = Query(None, description="お気に入りで絞り込み"),
+    cursor: Optional[str] = Query(None, description="前ページの X-Next-Cursor"),
+    current_user: User = Depends(get_current_user),
+    db: Session = Depends(get_db)
+):
+    """ユーザーのプラン一覧（カード表示用の軽量版。/api/plans/summary のエイリアス）"""
+    summaries, next_cursor = get_user_plan_summaries(
+        db, current_user.id, limit,
+        folder_id=folder_id, favorite=favorite, cursor=cursor
+    )
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return summaries
+
+
 @router.get("/me/preferences", response_model=UserPreferencesResponse)
 async def get_my_preferences(
     current_user: User = Depends(get_current_user),
@@ -49,6 +49,27 @@ async def startup_event():
     logger.info("データベースを初期化しています...")
     init_db()
     logger.info("データベース初期化完了")
+    # 利用枠の原子的な確保が前提とする一意インデックスを確認する（無ければ起動しない）
+    from app.services.entitlement_service import verify_quota_indexes
+    verify_quota_indexes()
+    # 他ワーカーでの更新（スポット・設定・タグカテゴリ）を受けてプロセス内キャッシュを捨てる
+    from app.utils.invalidation_bus import start as start_invalidation_bus
+    start_invalidation_bus()
+    # APIキーのリクエスト数・最終使用日時をまとめて書き込む
+    from app.services.api_key_usage_buffer import start as start_api_key_usage_buffer
+    start_api_key_usage_buffer()
+    # プラン生成キャッシュの期限切れ削除・容量上限の適用
+    from app.utils.plan_cache import start_compaction as start_plan_cache_compaction
+    start_plan_cache_compaction()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """アプリケーション終了時の処理"""
+    from app.services.export_service import shutdown_export_pool
+    shutdown_export_pool()
+    from app.services.api_key_usage_buffer import shutdown as flush_api_key_usage
+    flush_api_key_usage()
 
 
 # ルーター登録
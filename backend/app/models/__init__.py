@@ -9,5 +9,11 @@ from app.models.spot_favorite import SpotFavorite
 from app.models.user_preferences import UserPreferences
 from app.models.password_reset_token import PasswordResetToken
 from app.models.places_usage import PlacesMonthlyUsage
+from app.models.tag_stat import TagStat
+from app.models.cache_version import CacheVersion
+from app.models.schema_migration import SchemaMigration
+from app.models.geocode_cache import GeocodeCache
+from app.models.travel_matrix import TravelMatrix
+from app.models.job_lease import JobLease
 
-__all__ = ["User", "Spot", "Plan", "Subscription", "Usage", "PlanCache", "ApiKey", "ApiKeyUsage", "SpotFavorite", "UserPreferences", "PasswordResetToken", "PlacesMonthlyUsage"]
+__all__ = ["User", "Spot", "Plan", "Subscription", "Usage", "PlanCache", "ApiKey", "ApiKeyUsage", "SpotFavorite", "UserPreferences", "PasswordResetToken", "PlacesMonthlyUsage", "TagStat", "CacheVersion", "SchemaMigration", "GeocodeCache", "TravelMatrix", "JobLease"]
@@ -2,7 +2,7 @@
 APIキーモデル
 AIエージェント向けAPIキー管理
 """
-from sqlalchemy import Column, String, Integer, DateTime, Boolean, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, Boolean, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.utils.database import Base
@@ -39,6 +39,10 @@ class ApiKey(Base):
 class ApiKeyUsage(Base):
     """APIキー使用量記録テーブル"""
     __tablename__ = "api_key_usage"
+    __table_args__ = (
+        # 今月の行は1件だけ（利用枠の確保で同時に INSERT されても重複させない）
+        Index("uq_api_key_usage_key_month", "api_key_id", "month", unique=True),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     api_key_id = Column(String, ForeignKey("api_keys.id"), nullable=False, index=True)
@@ -0,0 +1,19 @@
+"""
+キャッシュ世代モデル
+
+名前空間（例: 'spot_catalog'）ごとの世代番号。書き込みのたびに加算し、
+各ワーカーのキャッシュはこの番号をキーに含めることで古い内容を参照しなくなる。
+Redis 未使用時のワーカー間共有に使う。
+"""
+from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class CacheVersion(Base):
+    """名前空間ごとのキャッシュ世代番号"""
+    __tablename__ = "cache_versions"
+
+    namespace = Column(String, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
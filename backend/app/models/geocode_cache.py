@@ -0,0 +1,23 @@
+"""
+ジオコーディング結果のキャッシュモデル
+
+クエリ（正規化した 都道府県|エリア|場所名 または 住所）ごとの緯度経度を保持する。
+見つからなかったクエリも found=False で記録し、GEOCODE_NEGATIVE_TTL_DAYS の間は
+外部 API に問い合わせない（app/services/geocoding_service.py）。
+"""
+from sqlalchemy import Column, String, Float, Boolean, DateTime
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class GeocodeCache(Base):
+    """クエリ → 緯度経度のキャッシュ"""
+    __tablename__ = "geocode_cache"
+
+    query_key = Column(String, primary_key=True)      # 正規化したクエリ
+    found = Column(Boolean, nullable=False, default=False)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    provider = Column(String, nullable=True)          # google / opencage / yahoo
+    precision = Column(String, nullable=True)         # place（場所名で一致）/ area（エリアで近似）
+    checked_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
@@ -0,0 +1,19 @@
+"""
+ジョブのリースモデル
+
+複数ワーカーのうち1つだけに走らせたい裏の処理（移動行列の差分更新など）の実行権。
+expires_at を過ぎたリースは別のワーカーが取り直せる（保持中のワーカーが落ちても止まらない）。
+"""
+from sqlalchemy import Column, String, DateTime
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class JobLease(Base):
+    """ジョブ名ごとの実行権"""
+    __tablename__ = "job_leases"
+
+    name = Column(String, primary_key=True)
+    owner = Column(String, nullable=False)                       # 保持しているワーカー（プロセスごとの識別子）
+    expires_at = Column(DateTime(timezone=True), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
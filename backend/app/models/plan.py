@@ -1,7 +1,7 @@
 """
 プランモデル
 """
-from sqlalchemy import Column, String, Integer, Float, Text, DateTime, JSON, ForeignKey, Boolean
+from sqlalchemy import Column, String, Integer, Float, Text, DateTime, JSON, ForeignKey, Boolean, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.utils.database import Base
@@ -32,3 +32,8 @@ class Plan(Base):
     # リレーション
     user = relationship("User", backref="plans")
 
+    __table_args__ = (
+        # 一覧のキーセットページング（user_id で絞り created_at, id の降順で読む）
+        Index("ix_plans_user_created_id", "user_id", "created_at", "id"),
+    )
+
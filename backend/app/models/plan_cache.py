@@ -1,7 +1,7 @@
 """
 プランキャッシュモデル
 """
-from sqlalchemy import Column, String, DateTime, JSON, Index
+from sqlalchemy import Column, String, Integer, DateTime, JSON, LargeBinary, Index
 from sqlalchemy.sql import func
 from app.utils.database import Base
 import uuid
@@ -13,7 +13,16 @@ class PlanCache(Base):
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     cache_key = Column(String, nullable=False, unique=True, index=True)  # MD5ハッシュ
-    plan_data = Column(JSON, nullable=False)  # キャッシュされたプランデータ
+    # 旧形式（非圧縮 JSON）。新しい行は payload に圧縮して保存し、ここは JSON の null
+    plan_data = Column(JSON, nullable=True)
+    # 圧縮済みプラン（app/utils/plan_cache.py の形式: バージョン + 圧縮方式 + 本体）
+    payload = Column(LargeBinary, nullable=True)
+    payload_size = Column(Integer, nullable=True)  # payload のバイト数（容量上限の判定用）
+    # 近いリクエストの検索用: (目的地, 日数, テーマ) のハッシュと、比較に使う残りの条件
+    similarity_key = Column(String, nullable=True, index=True)
+    match_info = Column(JSON, nullable=True)
+    hit_count = Column(Integer, nullable=False, default=0)
+    last_hit_at = Column(DateTime(timezone=True), nullable=True, index=True)  # 保存時刻で初期化（LRU）
     cached_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
     expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
     
@@ -21,4 +30,3 @@ class PlanCache(Base):
     __table_args__ = (
         Index('idx_cache_expires', 'expires_at'),
     )
-
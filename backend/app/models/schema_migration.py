@@ -0,0 +1,18 @@
+"""
+スキーマ移行履歴モデル
+
+init_db の簡易マイグレーション（database.MIGRATIONS）のうち適用済みの version を記録する。
+起動時はこの表を1回読むだけで、未適用の移行が無ければ ALTER TABLE を試みない。
+"""
+from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class SchemaMigration(Base):
+    """適用済みの簡易マイグレーション"""
+    __tablename__ = "schema_migrations"
+
+    version = Column(Integer, primary_key=True, autoincrement=False)
+    name = Column(String, nullable=False)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -1,7 +1,7 @@
 """
 サブスクリプションと使用量モデル
 """
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.utils.database import Base
@@ -30,6 +30,10 @@ class Subscription(Base):
 class Usage(Base):
     """使用量記録テーブル"""
     __tablename__ = "usage"
+    __table_args__ = (
+        # 今月の行は1件だけ（利用枠の確保で同時に INSERT されても重複させない）
+        Index("uq_usage_user_month", "user_id", "month", unique=True),
+    )
     
     id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
     user_id = Column(String, ForeignKey("users.id"), nullable=False, index=True)
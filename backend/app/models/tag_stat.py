@@ -0,0 +1,26 @@
+"""
+タグ統計モデル
+
+スポットに付いたタグの出現数を集計済みの形で保持する（/api/spots/tags 用）。
+スポットの作成・マージ・更新・削除のたびに差分で更新する（app/services/tag_stats_service.py）。
+"""
+from sqlalchemy import Column, String, Integer, DateTime, Index
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class TagStat(Base):
+    """タグごとの出現数"""
+    __tablename__ = "tag_stats"
+
+    value = Column(String, primary_key=True)          # タグの値（表示用の原文）
+    count = Column(Integer, nullable=False, default=0)
+    category = Column(String, nullable=True)          # TagCategory の値（最後に付いたもの）
+    normalized = Column(String, nullable=True)        # 同義語統合後の値
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        # 一覧は「カテゴリ絞り込み + 出現数の多い順」で読む
+        Index("ix_tag_stats_category_count", "category", "count"),
+        Index("ix_tag_stats_count", "count"),
+    )
@@ -0,0 +1,24 @@
+"""
+エリアごとの移動時間・距離行列モデル
+
+エリア（都道府県、多すぎる場合は市区町村）× プロファイル（driving / walking）ごとに1行。
+spot_ids の並びが行列の行・列の順で、payload は app/services/travel_matrix_service.py の
+バイナリ形式（座標 + 移動秒数 uint16 + 距離メートル uint32）。
+"""
+from sqlalchemy import Column, String, Integer, LargeBinary, JSON, DateTime
+from sqlalchemy.sql import func
+from app.utils.database import Base
+
+
+class TravelMatrix(Base):
+    """エリア内の公開スポット間の移動時間・距離行列"""
+    __tablename__ = "travel_matrices"
+
+    area_key = Column(String, primary_key=True)       # 都道府県（または 都道府県 市区町村）
+    profile = Column(String, primary_key=True)        # driving / walking
+    spot_ids = Column(JSON, nullable=False)           # 行・列の順のスポットID
+    spot_count = Column(Integer, nullable=False, default=0)
+    payload = Column(LargeBinary, nullable=False)
+    source = Column(String, nullable=True)            # osrm / haversine / mixed
+    catalog_version = Column(Integer, nullable=True)  # 作成時のカタログ世代
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
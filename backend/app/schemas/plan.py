@@ -84,16 +84,85 @@ class PlanResponse(PlanBase):
         if isinstance(v, str):
             return to_public_image_url(v)
         if isinstance(v, list):
-            for ps in v:
-                spot = ps.get('spot') if isinstance(ps, dict) else None
-                if isinstance(spot, dict) and isinstance(spot.get('image'), str):
-                    spot['image'] = to_public_image_url(spot['image'])
+            return public_plan_spots(v)
         return v
 
     class Config:
         from_attributes = True
 
 
+def public_plan_spots(spots: List[Any]) -> List[Any]:
+    """spots 内のスポット image を応答用の URL にする（変わる要素だけコピーし、元の JSON は書き換えない）"""
+    from app.services.places_service import to_public_image_url
+    result = spots
+    for i, ps in enumerate(spots):
+        spot = ps.get('spot') if isinstance(ps, dict) else None
+        if not isinstance(spot, dict) or not isinstance(spot.get('image'), str):
+            continue
+        image = to_public_image_url(spot['image'])
+        if image == spot['image']:
+            continue
+        if result is spots:
+            result = list(spots)
+        result[i] = {**ps, 'spot': {**spot, 'image': image}}
+    return result
+
+
+def plan_response_content(plan: Any, excluded_spots: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """DB に保存済みのプランから PlanResponse と同じ形の辞書を作る（再検証を省く高速パス）
+
+    保存済みの spots / grounding_urls は保存時に検証済みのため、ここでは型の検証をしない。
+    PlanResponse の validator と同じく画像 URL の無害化だけは行う。
+    フィールドを増やしたときは PlanResponse と合わせること（キー順もスキーマ順）。
+    """
+    from app.services.places_service import to_public_image_url
+    return {
+        "title": plan.title,
+        "area": plan.area,
+        "days": plan.days,
+        "people": plan.people,
+        "budget": plan.budget,
+        "thumbnail": to_public_image_url(plan.thumbnail),
+        "spots": public_plan_spots(plan.spots or []),
+        "grounding_urls": plan.grounding_urls,
+        "is_favorite": bool(plan.is_favorite),
+        "check_in_date": plan.check_in_date,
+        "check_out_date": plan.check_out_date,
+        "id": plan.id,
+        "user_id": plan.user_id,
+        "folder_id": plan.folder_id,
+        "created_at": plan.created_at,
+        "updated_at": plan.updated_at,
+        "excluded_spots": excluded_spots if excluded_spots is not None else getattr(plan, "excluded_spots", None),
+    }
+
+
+class PlanSummary(BaseModel):
+    """プラン一覧カード用の軽量スキーマ（spots 本体を含まない）"""
+    id: str
+    title: str
+    area: Optional[str] = None
+    days: int
+    thumbnail: Optional[str] = None
+    is_favorite: bool = False
+    folder_id: Optional[str] = None
+    spot_count: int = 0
+    check_in_date: Optional[str] = None
+    check_out_date: Optional[str] = None
+    created_at: datetime
+    updated_at: Optional[datetime] = None
+
+    @field_validator('thumbnail', mode='before')
+    @classmethod
+    def sanitize_thumbnail(cls, v):
+        """APIキー入り Places 写真URLをプロキシURLに変換"""
+        from app.services.places_service import to_public_image_url
+        return to_public_image_url(v) if isinstance(v, str) else v
+
+    class Config:
+        from_attributes = True
+
+
 class PlanGenerateRequest(BaseModel):
     """プラン生成リクエスト（改善版）"""
     destination: str
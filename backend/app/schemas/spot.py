@@ -97,6 +97,8 @@ class SpotResponse(SpotBase):
     id: str
     created_at: Optional[datetime] = None
     updated_at: Optional[datetime] = None
+    # キーワード検索で highlight=true のときのみ。一致箇所を <mark> で囲んだ抜粋（HTMLエスケープ済み）
+    search_highlight: Optional[str] = None
 
     @field_validator('image', mode='after')
     @classmethod
@@ -1,34 +1,169 @@
 """
 管理者用統計情報サービス
+
+ダッシュボードの集計はスナップショットとしてメモリに保持する。
+- 集計は少数のグループ化クエリ（条件付き集計）でまとめて取る
+- ADMIN_STATS_TTL_SEC を過ぎたら古い値を返しつつバックグラウンドで再計算する
+- プラン作成・ユーザー登録時はスナップショットのカウンタを直接加算する
+ダッシュボードのポーリングは、初回と日付の切り替わり以外 DB に触れない。
 """
+import threading
+import time
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_
-from datetime import datetime, timedelta
-from typing import Dict, Any, List
+from sqlalchemy import func, and_, case
+from datetime import datetime, timedelta, date
+from typing import Dict, Any, List, Optional
+from app.config import settings
 from app.models.plan import Plan
 from app.models.spot import Spot
 from app.models.user import User
+from app.utils import metrics
+from app.utils.error_handler import log_error
+
+
+_snapshot_lock = threading.Lock()
+_snapshot: Optional[Dict[str, Any]] = None
+_refreshing = False
+
+
+def _day_boundaries(now: datetime) -> Dict[str, datetime]:
+    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    return {
+        "today_start": today_start,
+        "yesterday_start": today_start - timedelta(days=1),
+        "week_start": now - timedelta(days=7),
+        "two_weeks_start": now - timedelta(days=14),
+    }
+
+
+def _compute_snapshot(db: Session) -> Dict[str, Any]:
+    """ダッシュボード用の生カウントをまとめて集計する（クエリ4本）"""
+    now = datetime.utcnow()
+    b = _day_boundaries(now)
+
+    with metrics.timed("admin_stats.compute_ms"):
+        # プラン: 総数・本日・昨日を1クエリで
+        total_plans, plans_today, plans_yesterday = db.query(
+            func.count(Plan.id),
+            func.sum(case((Plan.created_at >= b["today_start"], 1), else_=0)),
+            func.sum(case((and_(
+                Plan.created_at >= b["yesterday_start"],
+                Plan.created_at < b["today_start"]
+            ), 1), else_=0)),
+        ).one()
+
+        # ユーザー: 総数・アクティブ数を1クエリで
+        total_users, active_users = db.query(
+            func.count(User.id),
+            func.sum(case((User.is_active == True, 1), else_=0)),  # noqa: E712
+        ).one()
+
+        total_spots = db.query(func.count(Spot.id)).scalar() or 0
+
+        # エリア別: 直近1週間と、その前の1週間を1回の GROUP BY で
+        area_rows = db.query(
+            Plan.area,
+            func.sum(case((Plan.created_at >= b["week_start"], 1), else_=0)),
+            func.sum(case((Plan.created_at < b["week_start"], 1), else_=0)),
+        ).filter(
+            Plan.created_at >= b["two_weeks_start"]
+        ).group_by(Plan.area).all()
+
+    return {
+        "day": now.date(),
+        "computed_at": time.monotonic(),
+        "total_plans": int(total_plans or 0),
+        "plans_today": int(plans_today or 0),
+        "plans_yesterday": int(plans_yesterday or 0),
+        "total_users": int(total_users or 0),
+        "active_users": int(active_users or 0),
+        "total_spots": int(total_spots),
+        # {area: [直近1週間, その前の1週間]}
+        "areas": {
+            area: [int(recent or 0), int(previous or 0)]
+            for area, recent, previous in area_rows if area
+        },
+    }
+
+
+def _refresh_in_background() -> None:
+    global _snapshot, _refreshing
+    # 関数内 import: database → models の循環 import を避けるため
+    from app.utils.database import ReadSessionLocal
+    db = ReadSessionLocal()
+    try:
+        fresh = _compute_snapshot(db)
+        with _snapshot_lock:
+            _snapshot = fresh
+        metrics.increment("admin_stats.refresh", mode="background")
+    except Exception as e:
+        log_error("ADMIN_STATS_ERROR", f"管理統計の再計算に失敗しました: {e}", {})
+    finally:
+        db.close()
+        with _snapshot_lock:
+            _refreshing = False
+
+
+def _get_snapshot(db: Session) -> Dict[str, Any]:
+    """スナップショットを返す。期限切れなら古い値を返しつつ裏で1本だけ再計算する"""
+    global _snapshot, _refreshing
+    today: date = datetime.utcnow().date()
+    with _snapshot_lock:
+        snap = _snapshot
+        expired = snap is not None and time.monotonic() - snap["computed_at"] > settings.ADMIN_STATS_TTL_SEC
+        start_refresh = expired and not _refreshing
+        if start_refresh:
+            _refreshing = True
+
+    if snap is None or snap["day"] != today:
+        # 初回・日付の切り替わりは「本日」の意味が変わるため同期で取り直す
+        fresh = _compute_snapshot(db)
+        with _snapshot_lock:
+            _snapshot = fresh
+        metrics.increment("admin_stats.refresh", mode="sync")
+        return fresh
+
+    if start_refresh:
+        threading.Thread(target=_refresh_in_background, daemon=True).start()
+    metrics.increment("admin_stats.cache_hit")
+    return snap
+
+
+def record_plan_created(area: Optional[str]) -> None:
+    """プラン作成をスナップショットに反映する（create_plan から呼ぶ）"""
+    with _snapshot_lock:
+        snap = _snapshot
+        if snap is None or snap["day"] != datetime.utcnow().date():
+            return
+        snap["total_plans"] += 1
+        snap["plans_today"] += 1
+        if area:
+            snap["areas"].setdefault(area, [0, 0])[0] += 1
+
+
+def record_user_registered(is_active: bool = True) -> None:
+    """ユーザー登録をスナップショットに反映する"""
+    with _snapshot_lock:
+        snap = _snapshot
+        if snap is None:
+            return
+        snap["total_users"] += 1
+        if is_active:
+            snap["active_users"] += 1
+
+
+def invalidate_admin_stats() -> None:
+    """スナップショットを破棄する（次回アクセスで同期再計算）"""
+    global _snapshot
+    with _snapshot_lock:
+        _snapshot = None
 
 
 def get_admin_stats(db: Session) -> Dict[str, Any]:
     """管理者ダッシュボード用統計情報を取得"""
-    now = datetime.utcnow()
-    today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    yesterday_start = today_start - timedelta(days=1)
-    week_start = today_start - timedelta(days=7)
-    
-    # プラン生成数（本日）
-    plans_today = db.query(func.count(Plan.id)).filter(
-        Plan.created_at >= today_start
-    ).scalar() or 0
-    
-    # プラン生成数（昨日）
-    plans_yesterday = db.query(func.count(Plan.id)).filter(
-        and_(
-            Plan.created_at >= yesterday_start,
-            Plan.created_at < today_start
-        )
-    ).scalar() or 0
+    snap = _get_snapshot(db)
+    plans_today = snap["plans_today"]
+    plans_yesterday = snap["plans_yesterday"]
     
     # プラン生成数の変化率
     plans_change = 0.0
@@ -37,20 +172,6 @@ def get_admin_stats(db: Session) -> Dict[str, Any]:
     elif plans_today > 0:
         plans_change = 100.0
     
-    # 総プラン数
-    total_plans = db.query(func.count(Plan.id)).scalar() or 0
-    
-    # 総スポット数
-    total_spots = db.query(func.count(Spot.id)).scalar() or 0
-    
-    # 総ユーザー数
-    total_users = db.query(func.count(User.id)).scalar() or 0
-    
-    # アクティブユーザー数
-    active_users = db.query(func.count(User.id)).filter(
-        User.is_active == True
-    ).scalar() or 0
-    
     # エラーレート（簡易版：エラーログから取得する場合は別途実装が必要）
     # 現時点では固定値0.21%を返す（実際のエラーログから計算する場合は要実装）
     error_rate = 0.21
@@ -75,10 +196,10 @@ def get_admin_stats(db: Session) -> Dict[str, Any]:
         "error_rate": error_rate,
         "error_rate_change": -0.1,  # 仮の値
         "error_rate_trend": "down",
-        "total_plans": total_plans,
-        "total_spots": total_spots,
-        "total_users": total_users,
-        "active_users": active_users
+        "total_plans": snap["total_plans"],
+        "total_spots": snap["total_spots"],
+        "total_users": snap["total_users"],
+        "active_users": snap["active_users"]
     }
 
 
@@ -118,44 +239,17 @@ def get_system_alerts(db: Session) -> List[Dict[str, Any]]:
 
 
 def get_trending_areas(db: Session, limit: int = 3) -> List[Dict[str, Any]]:
-    """人気急上昇エリアを取得"""
-    now = datetime.utcnow()
-    week_start = now - timedelta(days=7)
-    two_weeks_start = now - timedelta(days=14)
-    
-    # 過去1週間のエリア別プラン生成数
-    recent_plans = db.query(
-        Plan.area,
-        func.count(Plan.id).label('count')
-    ).filter(
-        Plan.created_at >= week_start
-    ).group_by(Plan.area).all()
-    
-    # 過去2週間前～1週間前のエリア別プラン生成数
-    previous_plans = db.query(
-        Plan.area,
-        func.count(Plan.id).label('count')
-    ).filter(
-        and_(
-            Plan.created_at >= two_weeks_start,
-            Plan.created_at < week_start
-        )
-    ).group_by(Plan.area).all()
-    
-    # エリア別の変化率を計算
-    previous_dict = {area: count for area, count in previous_plans if area}
+    """人気急上昇エリアを取得（集計はスナップショットから）"""
+    snap = _get_snapshot(db)
     trending = []
     
-    for area, count in recent_plans:
-        if not area:
+    for area, (count, previous_count) in snap["areas"].items():
+        if count <= 0:
             continue
-        previous_count = previous_dict.get(area, 0)
         if previous_count > 0:
             change_rate = ((count - previous_count) / previous_count) * 100
-        elif count > 0:
-            change_rate = 100.0
         else:
-            change_rate = 0.0
+            change_rate = 100.0
         
         trending.append({
             "area": area,
@@ -166,4 +260,3 @@ def get_trending_areas(db: Session, limit: int = 3) -> List[Dict[str, Any]]:
     # 変化率でソートして上位を返す
     trending.sort(key=lambda x: x["change_rate"], reverse=True)
     return trending[:limit]
-
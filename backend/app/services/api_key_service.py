@@ -8,6 +8,8 @@ from sqlalchemy import and_
 from datetime import datetime, timedelta
 from typing import Optional, Tuple
 from app.models.api_key import ApiKey, ApiKeyUsage
+from app.services.api_key_usage_buffer import note_last_used, note_request
+from app.services.entitlement_service import get_api_key_entitlement, record_api_key_usage
 from app.utils.security import hash_password, verify_password
 from fastapi import HTTPException, status
 
@@ -105,70 +107,41 @@ def create_api_key(
 
 
 def update_api_key_usage(db: Session, api_key_id: str):
-    """APIキーの使用量を更新（last_used_atを更新）"""
-    api_key = db.query(ApiKey).filter(ApiKey.id == api_key_id).first()
-    if api_key:
-        api_key.last_used_at = datetime.now()
-        db.commit()
+    """APIキーの使用量を更新（last_used_atを更新。書き込み遅延が有効ならまとめて反映）"""
+    if note_last_used(api_key_id):
+        return
+    db.query(ApiKey).filter(ApiKey.id == api_key_id).update(
+        {ApiKey.last_used_at: datetime.now()}, synchronize_session=False
+    )
+    db.commit()
 
 
 def record_api_key_request(db: Session, api_key_id: str, is_plan_generation: bool = False):
     """
     APIキーのリクエストを記録
+    リクエスト数は書き込み遅延が有効ならまとめて反映し、プラン生成回数は同期的に原子的に1加算する
+    （生成時は entitlement_service.reserve_api_key_plan_generation で上限内に枠を確保する）
     """
-    now = datetime.now()
-    current_month = f"{now.year}-{now.month:02d}"
-    
-    usage = db.query(ApiKeyUsage).filter(
-        and_(
-            ApiKeyUsage.api_key_id == api_key_id,
-            ApiKeyUsage.month == current_month
-        )
-    ).first()
-    
-    if usage:
-        usage.request_count += 1
-        if is_plan_generation:
-            usage.plan_generation_count += 1
-        usage.updated_at = datetime.now()
-    else:
-        usage = ApiKeyUsage(
-            api_key_id=api_key_id,
-            month=current_month,
-            request_count=1,
-            plan_generation_count=1 if is_plan_generation else 0
-        )
-        db.add(usage)
-    
-    db.commit()
+    if not is_plan_generation and note_request(api_key_id):
+        return
+    record_api_key_usage(db, api_key_id, is_plan_generation)
 
 
 def check_api_key_plan_limit(db: Session, api_key_id: str) -> Tuple[bool, str, int]:
     """
-    プラン生成上限をチェック
+    プラン生成上限をチェック（キーと今月の使用量を1クエリで取得）
     Returns: (can_generate, message, remaining)
     """
-    api_key = db.query(ApiKey).filter(ApiKey.id == api_key_id).first()
-    if not api_key:
+    entitlement = get_api_key_entitlement(db, api_key_id)
+    if entitlement is None:
         return False, "APIキーが見つかりません", 0
+    monthly_plan_limit, monthly_usage = entitlement
     
     # 無制限プラン
-    if api_key.monthly_plan_limit == -1:
+    if monthly_plan_limit == -1:
         return True, "", -1
     
-    # 使用量取得
-    now = datetime.now()
-    current_month = f"{now.year}-{now.month:02d}"
-    
-    usage = db.query(ApiKeyUsage).filter(
-        and_(
-            ApiKeyUsage.api_key_id == api_key_id,
-            ApiKeyUsage.month == current_month
-        )
-    ).first()
-    
-    monthly_usage = usage.plan_generation_count if usage else 0
-    remaining = api_key.monthly_plan_limit - monthly_usage
+    remaining = monthly_plan_limit - monthly_usage
     
     if remaining > 0:
         return True, f"残り{remaining}回", remaining
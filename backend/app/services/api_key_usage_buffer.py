@@ -0,0 +1,241 @@
+"""
+APIキーの使用量の書き込み遅延（write-behind）
+
+APIキーのリクエストごとに last_used_at の更新と api_key_usage の select → update/insert を
+それぞれコミットしており、エージェントの高頻度な呼び出しで本処理の前に書き込みトランザクションが2回ずつ増えていた。
+リクエスト数と最終使用日時はプロセス内に貯め、API_KEY_USAGE_FLUSH_SEC ごとにまとめて書き込む。
+
+- リクエスト数は (キー, 月) ごとの差分を INSERT ... ON CONFLICT DO UPDATE（加算）で一括反映する
+  （PostgreSQL / SQLite。それ以外は UPDATE → 無ければ INSERT）。各ワーカーは差分を足すだけなので複数ワーカーでも合う
+- 最終使用日時はキーごとに最新の値だけを一括 UPDATE する（他ワーカーが書いた新しい値は戻さない）
+- ON CONFLICT は一意インデックス uq_api_key_usage_key_month（簡易マイグレーション 4）が前提。
+  start() で有無を確認し、無ければ UPDATE → 無ければ INSERT で書き込む
+- 書き込みに失敗した差分は戻して次回に再試行する。_MAX_FLUSH_FAILURES 回続けて失敗したら捨てる
+  （貯まり続けてメモリを食わないように）
+- 上限に関わる値（プラン生成回数）はここを通さず entitlement_service で同期的・原子的に加算する。
+  リクエスト数の上限はレート制限（rate_limiter）が受け持つ
+- 反映の遅れは最大 API_KEY_USAGE_FLUSH_SEC 秒（管理画面の使用量もその分遅れる）。終了時にも書き出す
+- start() 前（スクリプト・テスト）や API_KEY_USAGE_WRITE_BEHIND=false のときは note_* が False を返し、
+  呼び出し側が従来どおり同期で書き込む
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import bindparam, or_, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+
+from app.config import settings
+from app.models.api_key import ApiKey, ApiKeyUsage
+from app.services.entitlement_service import current_month
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.Lock()
+# (APIキーID, 月) -> 未反映のリクエスト数
+_requests: Dict[Tuple[str, str], int] = {}
+# APIキーID -> 未反映の最終使用日時
+_last_used: Dict[str, datetime] = {}
+_wake = threading.Event()
+_flusher: Optional[threading.Thread] = None
+_stats: Dict[str, Any] = {"flushes": 0, "failures": 0, "dropped_requests": 0, "rows": 0, "last_flush_at": None}
+# 連続でこの回数だけ書き込みに失敗したら、貯めた差分を捨てる
+_MAX_FLUSH_FAILURES = 5
+_consecutive_failures = 0
+# (api_key_id, month) の一意インデックスがあるか（start() で確認。無ければ ON CONFLICT を使わない）
+_upsert_supported = False
+
+
+def _active() -> bool:
+    return settings.API_KEY_USAGE_WRITE_BEHIND and _flusher is not None
+
+
+def note_request(api_key_id: str, count: int = 1) -> bool:
+    """リクエスト数を貯める（書き込み遅延が無効なら False。呼び出し側で同期的に書き込む）"""
+    if not _active():
+        return False
+    key = (api_key_id, current_month())
+    with _lock:
+        _requests[key] = _requests.get(key, 0) + count
+        pending = len(_requests) + len(_last_used)
+    if pending >= settings.API_KEY_USAGE_MAX_PENDING:
+        _wake.set()
+    return True
+
+
+def note_last_used(api_key_id: str, used_at: Optional[datetime] = None) -> bool:
+    """最終使用日時を貯める（書き込み遅延が無効なら False）"""
+    if not _active():
+        return False
+    with _lock:
+        _last_used[api_key_id] = used_at or datetime.now()
+    return True
+
+
+def _take() -> Tuple[Dict[Tuple[str, str], int], Dict[str, datetime]]:
+    global _requests, _last_used
+    with _lock:
+        requests, last_used = _requests, _last_used
+        _requests, _last_used = {}, {}
+    return requests, last_used
+
+
+def _restore(requests: Dict[Tuple[str, str], int], last_used: Dict[str, datetime]) -> None:
+    """書き込めなかった差分を戻す（その間に貯まった分と合算する）"""
+    with _lock:
+        for key, count in requests.items():
+            _requests[key] = _requests.get(key, 0) + count
+        for api_key_id, used_at in last_used.items():
+            current = _last_used.get(api_key_id)
+            if current is None or used_at > current:
+                _last_used[api_key_id] = used_at
+
+
+def _upsert_requests(db: Session, requests: Dict[Tuple[str, str], int]) -> None:
+    rows = [
+        {"api_key_id": api_key_id, "month": month, "request_count": count}
+        for (api_key_id, month), count in requests.items()
+    ]
+    dialect = db.get_bind().dialect.name
+    if _upsert_supported and dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        # (api_key_id, month) の一意インデックス（uq_api_key_usage_key_month）で衝突させて加算する
+        stmt = insert(ApiKeyUsage)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[ApiKeyUsage.api_key_id, ApiKeyUsage.month],
+            set_={
+                "request_count": ApiKeyUsage.request_count + stmt.excluded.request_count,
+                "updated_at": func.now(),
+            },
+        )
+        db.execute(stmt, rows)
+        return
+    for row in rows:
+        updated = db.query(ApiKeyUsage).filter(
+            ApiKeyUsage.api_key_id == row["api_key_id"],
+            ApiKeyUsage.month == row["month"],
+        ).update(
+            {ApiKeyUsage.request_count: ApiKeyUsage.request_count + row["request_count"],
+             ApiKeyUsage.updated_at: datetime.now()},
+            synchronize_session=False,
+        )
+        if not updated:
+            db.add(ApiKeyUsage(**row))
+
+
+def _update_last_used(db: Session, last_used: Dict[str, datetime]) -> None:
+    table = ApiKey.__table__
+    stmt = update(table).where(
+        table.c.id == bindparam("b_id"),
+        or_(table.c.last_used_at.is_(None), table.c.last_used_at < bindparam("b_used_at")),
+    ).values(last_used_at=bindparam("b_used_at"))
+    db.execute(stmt, [{"b_id": api_key_id, "b_used_at": used_at} for api_key_id, used_at in last_used.items()])
+
+
+def flush() -> int:
+    """貯めた差分を書き込む
+
+    Returns:
+        書き込んだ行数（(キー, 月) の数 + 最終使用日時を更新したキーの数）
+    """
+    global _consecutive_failures
+    requests, last_used = _take()
+    if not requests and not last_used:
+        return 0
+    # 関数内 import: database → services の循環 import を避けるため
+    from app.utils.database import SessionLocal
+    db = SessionLocal()
+    start = time.perf_counter()
+    try:
+        if requests:
+            _upsert_requests(db, requests)
+        if last_used:
+            _update_last_used(db, last_used)
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        metrics.increment("api_key_usage.flush", result="error")
+        with _lock:
+            _stats["failures"] += 1
+            _consecutive_failures += 1
+            give_up = _consecutive_failures >= _MAX_FLUSH_FAILURES
+            if give_up:
+                _consecutive_failures = 0
+                _stats["dropped_requests"] += sum(requests.values())
+        if give_up:
+            metrics.increment("api_key_usage.dropped_requests", sum(requests.values()))
+            logger.error(
+                "APIキー使用量: %d回続けて書き込みに失敗したため、未反映の差分を破棄しました（リクエスト %d件）: %s",
+                _MAX_FLUSH_FAILURES, sum(requests.values()), e,
+            )
+            return 0
+        _restore(requests, last_used)
+        logger.warning("APIキー使用量: 書き込みに失敗したため次回に再試行します: %s", e)
+        return 0
+    finally:
+        db.close()
+    rows = len(requests) + len(last_used)
+    with _lock:
+        _consecutive_failures = 0
+        _stats["flushes"] += 1
+        _stats["rows"] += rows
+        _stats["last_flush_at"] = datetime.now().isoformat()
+    metrics.increment("api_key_usage.flush", result="ok")
+    metrics.observe("api_key_usage.flush_ms", (time.perf_counter() - start) * 1000)
+    metrics.increment("api_key_usage.flushed_rows", rows)
+    return rows
+
+
+def _flush_loop() -> None:
+    while True:
+        _wake.wait(max(0.1, settings.API_KEY_USAGE_FLUSH_SEC))
+        _wake.clear()
+        try:
+            flush()
+        except Exception as e:
+            logger.warning("APIキー使用量: 書き込みスレッドでエラーが発生しました: %s", e)
+
+
+def start() -> None:
+    """書き込みスレッドを起動する（アプリ起動時に1回）"""
+    global _flusher, _upsert_supported
+    if not settings.API_KEY_USAGE_WRITE_BEHIND:
+        return
+    from app.utils.database import has_index
+    supported = has_index("api_key_usage", "uq_api_key_usage_key_month")
+    if not supported:
+        logger.error(
+            "APIキー使用量: 一意インデックス uq_api_key_usage_key_month がありません。"
+            "UPDATE → INSERT で書き込みます（簡易マイグレーション 4 の失敗ログを確認してください）"
+        )
+    with _lock:
+        _upsert_supported = supported
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, name="api-key-usage-flush", daemon=True)
+    _flusher.start()
+
+
+def shutdown() -> None:
+    """残りを書き出す（アプリ終了時）"""
+    if _flusher is not None:
+        flush()
+
+
+def buffer_stats() -> Dict[str, Any]:
+    """管理画面用の状態"""
+    with _lock:
+        return {
+            "enabled": _active(),
+            "pending_keys": len(_requests),
+            "pending_requests": sum(_requests.values()),
+            "pending_last_used": len(_last_used),
+            **_stats,
+        }
@@ -11,6 +11,7 @@ from app.utils.security import (
     record_login_attempt
 )
 from app.utils.jwt_manager import generate_token
+from app.services.admin_service import record_user_registered
 from fastapi import HTTPException, status
 
 
@@ -49,6 +50,7 @@ def create_user(db: Session, username: str, email: str, password: str, name: str
     db.add(user)
     db.commit()
     db.refresh(user)
+    record_user_registered(bool(user.is_active))
     return user
 
 
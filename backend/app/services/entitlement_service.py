@@ -0,0 +1,310 @@
+"""
+利用権（プラン・機能・今月の残り回数）の解決と利用枠の予約
+
+プラン生成のたびに「サブスクリプション取得 → 使用量取得 → （生成後）使用量の select → update/insert」と
+往復しており、同時に生成すると両方が上限チェックを通って月間上限を超えることがあった。
+
+- get_entitlement: プラン・機能・今月の使用量を1クエリで解決する（/usage など表示用）
+- サブスクリプションの段階（free / basic / premium と有効期限）は ENTITLEMENT_TIER_TTL_SEC だけ
+  プロセス内に保持する。プラン変更時は無効化バスの subscriptions 名前空間で全ワーカーから捨てる
+- reserve_*: 生成の前に `UPDATE ... SET count = count + 1 WHERE count < 上限` で1回分を原子的に確保する。
+  今月の行が無ければ INSERT し、(ユーザー|APIキー, 月) の一意インデックスで同時作成を防ぐ。
+  インデックス（簡易マイグレーション 4）が無いと重複行ができて上限を超えるため、起動時に
+  verify_quota_indexes() で確認し、無ければ起動を止める
+  生成・保存に失敗したら QuotaReservation.refund() で戻す
+- ユーザーのプラン生成（usage）と APIキーのプラン生成（api_key_usage）で同じ処理を使う
+"""
+import logging
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional, Tuple
+
+from sqlalchemy import and_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.api_key import ApiKey, ApiKeyUsage
+from app.models.subscription import Subscription, Usage
+from app.models.user import User
+from app.utils import invalidation_bus, metrics
+from app.utils.error_handler import log_error
+from app.utils.subscription import PLANS
+
+logger = logging.getLogger(__name__)
+
+SUBSCRIPTIONS_NAMESPACE = "subscriptions"
+
+# ユーザーID -> (plan_name, expires_at, 読み込み時刻)
+_tier_cache: Dict[str, Tuple[str, Optional[datetime], float]] = {}
+_tier_lock = threading.Lock()
+
+
+def current_month() -> str:
+    """使用量を集計する月（YYYY-MM）"""
+    now = datetime.now()
+    return f"{now.year}-{now.month:02d}"
+
+
+def _effective_plan(plan_name: Optional[str], expires_at: Optional[datetime]) -> str:
+    """有効期限切れ・未契約・未知のプランは free"""
+    if not plan_name:
+        return "free"
+    if expires_at is not None:
+        now = datetime.now(expires_at.tzinfo) if expires_at.tzinfo else datetime.now()
+        if now > expires_at:
+            return "free"
+    return plan_name if plan_name in PLANS else "free"
+
+
+def _remember_tier(user_id: str, plan_name: Optional[str], expires_at: Optional[datetime]) -> None:
+    with _tier_lock:
+        _tier_cache[user_id] = (plan_name or "free", expires_at, time.monotonic())
+
+
+def invalidate_tier(payload: Optional[Dict[str, Any]] = None) -> None:
+    """サブスクリプションの段階のキャッシュを捨てる（payload に user_id があればそのユーザーだけ）"""
+    user_id = (payload or {}).get("user_id")
+    with _tier_lock:
+        if user_id:
+            _tier_cache.pop(user_id, None)
+        else:
+            _tier_cache.clear()
+
+
+invalidation_bus.register(SUBSCRIPTIONS_NAMESPACE, invalidate_tier)
+
+
+def publish_subscription_change(user_id: str) -> None:
+    """プランの変更（アップグレード・延長・降格）を全ワーカーに知らせる（commit 後に呼ぶ）"""
+    try:
+        invalidation_bus.publish(SUBSCRIPTIONS_NAMESPACE, {"user_id": user_id})
+    except Exception as e:
+        # 通知できなくても ENTITLEMENT_TIER_TTL_SEC 後には反映される
+        invalidate_tier({"user_id": user_id})
+        logger.warning("利用権: プラン変更の通知に失敗しました: %s", e)
+
+
+def get_plan_name(db: Session, user_id: str) -> str:
+    """ユーザーの有効なプラン名（短時間キャッシュ）"""
+    with _tier_lock:
+        cached = _tier_cache.get(user_id)
+    if cached is not None and time.monotonic() - cached[2] < settings.ENTITLEMENT_TIER_TTL_SEC:
+        metrics.increment("entitlement.tier_cache", result="hit")
+        return _effective_plan(cached[0], cached[1])
+    metrics.increment("entitlement.tier_cache", result="miss")
+    row = db.query(Subscription.plan_name, Subscription.expires_at).filter(
+        Subscription.user_id == user_id
+    ).first()
+    plan_name, expires_at = (row.plan_name, row.expires_at) if row else (None, None)
+    _remember_tier(user_id, plan_name, expires_at)
+    return _effective_plan(plan_name, expires_at)
+
+
+class Entitlement:
+    """ユーザーの利用権（プラン・機能・今月の使用量）"""
+    __slots__ = ("plan_name", "features", "monthly_limit", "used")
+
+    def __init__(self, plan_name: str, used: int) -> None:
+        self.plan_name = plan_name
+        self.features = PLANS[plan_name]
+        self.monthly_limit = self.features["monthly_plans"]
+        self.used = used
+
+    @property
+    def unlimited(self) -> bool:
+        return self.monthly_limit == -1
+
+    @property
+    def remaining(self) -> int:
+        """今月の残り回数（無制限は -1）"""
+        if self.unlimited:
+            return -1
+        return max(0, self.monthly_limit - self.used)
+
+    @property
+    def can_generate(self) -> bool:
+        return self.unlimited or self.remaining > 0
+
+    @property
+    def message(self) -> str:
+        if self.unlimited:
+            return ""
+        if self.remaining > 0:
+            return f"残り{self.remaining}回"
+        return _limit_message(self.used, self.monthly_limit)
+
+
+def _limit_message(used: int, limit: int) -> str:
+    return (
+        f"今月のプラン生成上限に達しました（{used}/{limit}回使用済み）。"
+        "来月までお待ちいただくか、プランをアップグレードしてください。"
+    )
+
+
+def get_entitlement(db: Session, user_id: str) -> Entitlement:
+    """プラン・機能・今月の使用量を1クエリで解決する（段階のキャッシュも更新する）"""
+    row = db.query(Subscription.plan_name, Subscription.expires_at, Usage.count).select_from(User).outerjoin(
+        Subscription, Subscription.user_id == User.id
+    ).outerjoin(
+        Usage, and_(Usage.user_id == User.id, Usage.month == current_month())
+    ).filter(User.id == user_id).first()
+    plan_name, expires_at, used = (row.plan_name, row.expires_at, row.count) if row else (None, None, None)
+    _remember_tier(user_id, plan_name, expires_at)
+    return Entitlement(_effective_plan(plan_name, expires_at), int(used or 0))
+
+
+# 利用枠の原子的な確保が前提とする一意インデックス: (テーブル, インデックス名)
+_QUOTA_UNIQUE_INDEXES = (
+    ("usage", "uq_usage_user_month"),
+    ("api_key_usage", "uq_api_key_usage_key_month"),
+)
+
+
+def verify_quota_indexes() -> None:
+    """利用枠の一意インデックスがあることを確認する（起動時。無ければ RuntimeError）"""
+    from app.utils.database import has_index
+    missing = [name for table, name in _QUOTA_UNIQUE_INDEXES if not has_index(table, name)]
+    if missing:
+        log_error("QUOTA_INDEX_MISSING", f"利用枠の一意インデックスがありません: {', '.join(missing)}")
+        raise RuntimeError(
+            f"利用枠の一意インデックスがありません（{', '.join(missing)}）。"
+            "今月の使用量の行が重複して上限を超えるため起動しません。"
+            "簡易マイグレーション 4 の失敗ログを確認し、重複行を解消してから再起動してください"
+        )
+
+
+# ---- 使用量の原子的な加算 ----
+
+def _increment(db: Session, model, keys: Dict[str, Any], columns: Tuple[str, ...],
+               limit_column: Optional[str] = None, limit: int = -1) -> bool:
+    """今月の行の columns を1ずつ加算する（limit >= 0 なら limit_column < limit の行だけ）
+
+    Returns:
+        加算できたか（上限に達していれば False）
+    """
+    conditions = [getattr(model, k) == v for k, v in keys.items()]
+    values = {getattr(model, c): getattr(model, c) + 1 for c in columns}
+    values[model.updated_at] = datetime.now()
+
+    def _update() -> int:
+        query = db.query(model).filter(*conditions)
+        if limit >= 0 and limit_column:
+            query = query.filter(getattr(model, limit_column) < limit)
+        return query.update(values, synchronize_session=False)
+
+    if _update():
+        db.commit()
+        return True
+    if limit == 0:
+        db.rollback()
+        return False
+    # 行が無い（今月初回）か、上限に達している
+    if db.query(model.id).filter(*conditions).first() is not None:
+        db.rollback()
+        return False
+    try:
+        db.add(model(**keys, **{c: 1 for c in columns}))
+        db.commit()
+        return True
+    except IntegrityError:
+        # 同時に今月の行が作られた: その行に対してもう一度加算を試みる
+        db.rollback()
+        if _update():
+            db.commit()
+            return True
+        db.rollback()
+        return False
+
+
+def _decrement(model, keys: Dict[str, Any], columns: Tuple[str, ...]) -> None:
+    """予約の取り消し（リクエストのセッションが失敗状態でも戻せるよう別セッションで行う）"""
+    from app.utils.database import SessionLocal
+    db = SessionLocal()
+    try:
+        conditions = [getattr(model, k) == v for k, v in keys.items()]
+        for column in columns:
+            col = getattr(model, column)
+            db.query(model).filter(*conditions, col > 0).update(
+                {col: col - 1, model.updated_at: datetime.now()}, synchronize_session=False
+            )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        log_error("QUOTA_REFUND_ERROR", f"利用枠の返却に失敗しました: {e}", {"table": model.__tablename__, **keys})
+    finally:
+        db.close()
+
+
+class QuotaReservation:
+    """確保した利用枠（失敗時に refund() で戻す。2回目以降の refund は何もしない）"""
+    __slots__ = ("_model", "_keys", "_columns", "_refunded")
+
+    def __init__(self, model, keys: Dict[str, Any], columns: Tuple[str, ...]) -> None:
+        self._model = model
+        self._keys = keys
+        self._columns = columns
+        self._refunded = False
+
+    def refund(self) -> None:
+        if self._refunded:
+            return
+        self._refunded = True
+        _decrement(self._model, self._keys, self._columns)
+        metrics.increment("entitlement.refunds", table=self._model.__tablename__)
+
+
+def reserve_plan_generation(db: Session, user_id: str) -> Tuple[Optional[QuotaReservation], str]:
+    """ユーザーのプラン生成1回分を確保する
+
+    Returns:
+        (予約, メッセージ)。上限に達していれば (None, 理由)
+    """
+    limit = PLANS[get_plan_name(db, user_id)]["monthly_plans"]
+    keys = {"user_id": user_id, "month": current_month()}
+    if not _increment(db, Usage, keys, ("count",), "count", limit):
+        metrics.increment("entitlement.reserve", table="usage", result="denied")
+        return None, _limit_message(limit, limit)
+    metrics.increment("entitlement.reserve", table="usage", result="ok")
+    return QuotaReservation(Usage, keys, ("count",)), ""
+
+
+def record_plan_generation(db: Session, user_id: str) -> None:
+    """ユーザーのプラン生成を上限なしで1回加算する"""
+    _increment(db, Usage, {"user_id": user_id, "month": current_month()}, ("count",))
+
+
+# ---- APIキー ----
+
+def get_api_key_entitlement(db: Session, api_key_id: str) -> Optional[Tuple[int, int]]:
+    """APIキーの (月間上限, 今月のプラン生成回数) を1クエリで取得（キーが無ければ None）"""
+    row = db.query(ApiKey.monthly_plan_limit, ApiKeyUsage.plan_generation_count).outerjoin(
+        ApiKeyUsage, and_(ApiKeyUsage.api_key_id == ApiKey.id, ApiKeyUsage.month == current_month())
+    ).filter(ApiKey.id == api_key_id).first()
+    if row is None:
+        return None
+    return int(row.monthly_plan_limit), int(row.plan_generation_count or 0)
+
+
+def reserve_api_key_plan_generation(
+    db: Session, api_key_id: str, monthly_plan_limit: int
+) -> Tuple[Optional[QuotaReservation], str]:
+    """APIキーのプラン生成1回分を確保する（リクエスト数は api_key_service.record_api_key_request で記録する）
+
+    Returns:
+        (予約, メッセージ)。上限に達していれば (None, 理由)
+    """
+    keys = {"api_key_id": api_key_id, "month": current_month()}
+    columns = ("plan_generation_count",)
+    if not _increment(db, ApiKeyUsage, keys, columns, "plan_generation_count", monthly_plan_limit):
+        metrics.increment("entitlement.reserve", table="api_key_usage", result="denied")
+        return None, "今月のプラン生成上限に達しました。"
+    metrics.increment("entitlement.reserve", table="api_key_usage", result="ok")
+    return QuotaReservation(ApiKeyUsage, keys, columns), ""
+
+
+def record_api_key_usage(db: Session, api_key_id: str, is_plan_generation: bool = False) -> None:
+    """APIキーのリクエスト（とプラン生成）を上限なしで1回加算する"""
+    columns = ("request_count", "plan_generation_count") if is_plan_generation else ("request_count",)
+    _increment(db, ApiKeyUsage, {"api_key_id": api_key_id, "month": current_month()}, columns)
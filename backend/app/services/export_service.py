@@ -0,0 +1,193 @@
+"""
+プランエクスポートサービス（PDF / iCal / 画像）
+
+- 描画（ReportLab / icalendar / Pillow）は CPU バウンドのため、プロセスプールで実行して
+  イベントループと他リクエストを止めない（EXPORT_PROCESS_WORKERS=0 ならスレッドで実行）
+- 出力は (プランID, 更新日時, 形式, ロケール, 開始日) をキーにディスクへ保存し、
+  2回目以降はファイルをそのまま配信する（プランが更新されればキーが変わる）
+- フォント・スタイルはワーカー起動時に1回だけ読み込む（plan_export.warm_up）
+"""
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.utils import metrics
+
+# 形式ごとの拡張子と Content-Type
+EXPORT_FORMATS = {
+    "pdf": ("pdf", "application/pdf"),
+    "ical": ("ics", "text/calendar"),
+    "image": ("png", "image/png"),
+}
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+# キャッシュキー -> 描画中の Future（同じ出力の同時リクエストは1回だけ描画する）
+_inflight: Dict[str, "asyncio.Future"] = {}
+
+
+def _init_worker() -> None:
+    from app.utils.plan_export import warm_up
+    warm_up()
+
+
+def _get_pool() -> Optional[ProcessPoolExecutor]:
+    global _pool
+    if settings.EXPORT_PROCESS_WORKERS <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            # fork だと親のスレッド・DB 接続を引き継ぐため spawn で起動する
+            _pool = ProcessPoolExecutor(
+                max_workers=settings.EXPORT_PROCESS_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _pool
+
+
+def shutdown_export_pool() -> None:
+    """プロセスプールを停止する（アプリ終了時）"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+            _pool = None
+
+
+def _cache_dir() -> str:
+    path = os.path.abspath(settings.EXPORT_CACHE_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def normalize_locale(accept_language: Optional[str]) -> str:
+    """Accept-Language の先頭言語（例: 'ja-JP,ja;q=0.9' -> 'ja'）。未指定は 'ja'"""
+    if not accept_language:
+        return "ja"
+    primary = accept_language.split(",")[0].split(";")[0].strip().lower()
+    return primary.split("-")[0] or "ja"
+
+
+def build_cache_key(
+    plan_id: str,
+    updated_at: Optional[datetime],
+    fmt: str,
+    locale: str,
+    start_date: Optional[datetime] = None,
+) -> str:
+    stamp = updated_at.isoformat() if updated_at else ""
+    start = start_date.isoformat() if start_date else ""
+    raw = f"{plan_id}|{stamp}|{fmt}|{locale}|{start}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def render_to_file(fmt: str, plan: Dict[str, Any], start_date: Optional[datetime], path: str) -> str:
+    """描画してファイルに書き出す（ワーカープロセス側で実行。結果のバイト列を親に送らない）"""
+    from app.utils.plan_export import export_to_pdf, export_to_ical, export_to_image
+
+    if fmt == "pdf":
+        data = export_to_pdf(plan).getvalue()
+    elif fmt == "ical":
+        data = export_to_ical(plan, start_date)
+    elif fmt == "image":
+        data = export_to_image(plan).getvalue()
+    else:
+        raise ValueError(f"未対応のエクスポート形式です: {fmt}")
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+    return path
+
+
+def _prune_cache() -> None:
+    """EXPORT_CACHE_MAX_BYTES を超えた分を古い順に削除する（描画のたびに呼ぶ）"""
+    base = _cache_dir()
+    entries = []
+    total = 0
+    for name in os.listdir(base):
+        if name.endswith(".tmp"):
+            continue
+        path = os.path.join(base, name)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        entries.append((stat.st_atime, stat.st_size, path))
+        total += stat.st_size
+    if total <= settings.EXPORT_CACHE_MAX_BYTES:
+        return
+    entries.sort()
+    for _, size, path in entries:
+        if total <= settings.EXPORT_CACHE_MAX_BYTES:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+async def get_export_file(
+    plan_id: str,
+    updated_at: Optional[datetime],
+    fmt: str,
+    plan: Dict[str, Any],
+    locale: str = "ja",
+    start_date: Optional[datetime] = None,
+) -> Dict[str, str]:
+    """エクスポートファイルを返す（キャッシュ済みなら描画しない）
+
+    Returns:
+        {"path": ファイルパス, "media_type": Content-Type, "extension": 拡張子}
+
+    Raises:
+        ImportError: 描画ライブラリ未導入
+    """
+    ext, media_type = EXPORT_FORMATS[fmt]
+    key = build_cache_key(plan_id, updated_at, fmt, locale, start_date)
+    path = os.path.join(_cache_dir(), f"{key}.{ext}")
+    result = {"path": path, "media_type": media_type, "extension": ext}
+
+    if os.path.exists(path):
+        metrics.increment("export.cache_hits", format=fmt)
+        return result
+
+    pending = _inflight.get(key)
+    if pending is not None:
+        await asyncio.shield(pending)
+        return result
+
+    loop = asyncio.get_running_loop()
+    future = loop.create_future()
+    _inflight[key] = future
+    try:
+        metrics.increment("export.cache_misses", format=fmt)
+        with metrics.timed("export.render_ms", format=fmt):
+            pool = _get_pool()
+            if pool is not None:
+                await loop.run_in_executor(pool, render_to_file, fmt, plan, start_date, path)
+            else:
+                await asyncio.to_thread(render_to_file, fmt, plan, start_date, path)
+        future.set_result(path)
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # 待っている側が無くても "exception was never retrieved" を出さない
+        future.exception()
+        raise
+    finally:
+        _inflight.pop(key, None)
+
+    await asyncio.to_thread(_prune_cache)
+    return result
@@ -2,22 +2,37 @@
 Gemini API統合サービス
 既存のSatoTripプロジェクトの実装を参考
 """
-import google.generativeai as genai
+import itertools
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from app.config import settings
+from app.utils.lazy_import import lazy_module
 from app.utils.error_handler import (
     retry_on_error,
-    safe_json_parse,
     generate_template_plan,
     log_error
 )
 from app.utils.tag_normalizer import normalize_tags, tags_to_dict_list, TagSource
+from app.utils.resilience import CircuitOpenError
+from app.utils.gemini_governor import INTERACTIVE, generate_content
+from app.utils.gemini_output import (
+    PLAN_SCHEMA,
+    SPOT_RESEARCH_SCHEMA,
+    json_format_instruction,
+    json_output_kwargs,
+    parse_json,
+    record_retry,
+)
 
 
 # Gemini API設定
-if settings.GEMINI_API_KEY:
-    genai.configure(api_key=settings.GEMINI_API_KEY)
+def _configure_genai(module) -> None:
+    if settings.GEMINI_API_KEY:
+        module.configure(api_key=settings.GEMINI_API_KEY)
+
+
+# SDK の import は重いため、最初の API 呼び出し時に読み込む（起動時間短縮）
+genai = lazy_module("google.generativeai", on_load=_configure_genai)
 
 
 def format_places_for_prompt(places: List[Dict[str, Any]], include_details: bool = True) -> str:
@@ -114,6 +129,7 @@ def build_plan_generation_prompt(
     preferences: Optional[str] = None,
     spot_distances: Optional[List[Dict[str, Any]]] = None,
     check_in_date: Optional[str] = None,
+    proximity_clusters: Optional[List[List[str]]] = None,
 ) -> str:
     """
     プラン生成用プロンプトを構築（品質向上版）
@@ -129,6 +145,7 @@ def build_plan_generation_prompt(
         end_time: 終了時間（オプション）
         transportation: 交通手段（オプション）
         preferences: 希望・要望（オプション）
+        proximity_clusters: 移動行列上で互いに近いスポット名のまとまり（オプション）
     
     Returns:
         構築されたプロンプト文字列
@@ -169,6 +186,14 @@ def build_plan_generation_prompt(
                 distance_info += f"- {from_name} → {to_name}: 距離 {distance_km:.1f}km, 移動時間 約{duration_min:.0f}分\n"
         distance_info += "\n"
     
+    # 2.6. 近いスポットのまとまり（事前計算した移動行列から）
+    if proximity_clusters:
+        distance_info += "\n【近いスポットのまとまり】\n"
+        distance_info += f"各行のスポット同士は移動{settings.TRAVEL_MATRIX_CLUSTER_MINUTES}分程度以内でつながっています。同じ日にまとめて回ると移動が短くなります：\n"
+        for names in proximity_clusters[:8]:  # 最大8件まで
+            distance_info += f"- {', '.join(names[:12])}\n"
+        distance_info += "\n"
+    
     # 3. プラン要件セクション（条件付き）
     # themesが文字列のリストであることを確認
     themes_list = []
@@ -273,13 +298,7 @@ def build_plan_generation_prompt(
 """
     
     # 5. 出力形式セクション（デュアル形式）
-    output_format = f"""
-【出力形式】
-必ず以下のJSONフォーマットのみを含むコードブロック(```json ... ```)を出力してください。
-両方の形式（days配列とspots配列）を含めてください。
-
-```json
-{{
+    output_example = f"""{{
   "title": "プランのタイトル (例: 【SatoTrip厳選】{destination}の最旬トレンド旅)",
   "summary": "プランの概要（100文字程度）",
   "area": "エリア名",
@@ -313,9 +332,11 @@ def build_plan_generation_prompt(
     }}
   ],
   "tips": ["ヒント1", "ヒント2"]
-}}
-```
-"""
+}}"""
+    output_format = (
+        "\n【出力形式】\n両方の形式（days配列とspots配列）を含めてください。\n"
+        + json_format_instruction(output_example)
+    )
     
     return basic_info + db_info + distance_info + travel_dates_text + instructions + output_format
 
@@ -435,6 +456,7 @@ def generate_plan(
     spot_distances: Optional[List[Dict[str, Any]]] = None,
     check_in_date: Optional[str] = None,
     use_fallback: bool = True,
+    proximity_clusters: Optional[List[List[str]]] = None,
 ) -> Optional[Dict[str, Any]]:
     """
     旅行プランを生成
@@ -473,14 +495,24 @@ def generate_plan(
         preferences=preferences,
         spot_distances=spot_distances,
         check_in_date=check_in_date,
+        proximity_clusters=proximity_clusters,
     )
 
+    attempts = itertools.count()
+
     try:
-        @retry_on_error(max_retries=3, delay=1.0, backoff=2.0)
+        @retry_on_error(max_retries=3, delay=1.0, backoff=2.0, deadline_sec=settings.GEMINI_RETRY_DEADLINE_SEC)
         def _generate():
+            if next(attempts):
+                record_retry("generate_plan")
             try:
                 model = genai.GenerativeModel(settings.GEMINI_MODEL)
-                response = model.generate_content(prompt)
+                response = generate_content(
+                    model, prompt, caller="generate_plan", **json_output_kwargs(PLAN_SCHEMA)
+                )
+            except CircuitOpenError:
+                # 障害中は待たずにフォールバックへ
+                raise
             except Exception as api_error:
                 # API呼び出しエラー（クォータエラーなど）を処理
                 error_str = str(api_error)
@@ -502,13 +534,14 @@ def generate_plan(
             
             response_text = response.text
             log_error("DEBUG_RAW_RESPONSE", response_text[:1000] if len(response_text) > 1000 else response_text)
-            parsed = safe_json_parse(response_text)
+            # 解析できない出力は再試行せずテンプレートへ（スキーマ指定のため通常は起きない）
+            parsed = parse_json(response_text, "generate_plan")
             log_error("DEBUG_PARSED_JSON", str(parsed)[:1000] if parsed else "None")
             return parsed
         
         plan = _generate()
         
-        if plan:
+        if isinstance(plan, dict) and plan:
             plan["selected_places_count"] = len(pending_spots)
             plan["generated_at"] = datetime.now().isoformat()
             
@@ -562,6 +595,7 @@ def research_spot_info(
     spot_name: str,
     area: Optional[str] = None,
     prefecture: Optional[str] = None,
+    priority: int = INTERACTIVE,
 ) -> Optional[Dict[str, Any]]:
     """
     スポット名を元に詳細情報を生成する
@@ -570,6 +604,7 @@ def research_spot_info(
         spot_name: スポット名
         area: 既知のエリア（市区町村・地区名など、曖昧な店名の同定に使う）
         prefecture: 既知の都道府県名
+        priority: Gemini ガバナーの優先度（一括取り込みからは BATCH）
         
     Returns:
         JSON形式の非事実系スポット情報 (name, area(分類補助), category, description, duration_minutes, tags)
@@ -590,6 +625,15 @@ def research_spot_info(
     if area:
         context_parts.append(f"エリア: {area}")
     context_block = ("\n".join(context_parts) + "\n") if context_parts else ""
+
+    research_example = f"""{{
+  "name": "{spot_name}",
+  "area": "都道府県＋市区町村（分類の補助用。例: 鹿児島県鹿児島市、京都府京都市東山区。不明なら空文字 \"\"）",
+  "category": "History" | "Nature" | "Food" | "Shopping" | "Art" | "Relax" | "Culture" の中から最も適切なものを1つ,
+  "description": "そのスポット固有の魅力や雰囲気を100〜200文字程度で主観的に記述してください。同名・同ジャンルの他店舗の特徴は混ぜないでください。検証できない事実（受賞・最上級・由来・数値・営業/料金）は書かないでください。",
+  "duration_minutes": 標準滞在時間の目安（分単位、数値。上記のルールに従って算出してください。最小15分、最大480分）,
+  "tags": ["タグ1", "タグ2", "タグ3"]
+}}"""
     
     prompt = f"""
 あなたは日本の観光スポットに詳しいAIアシスタントです。
@@ -629,19 +673,8 @@ def research_spot_info(
    - 混雑状況や待ち時間は考慮しない（標準的な滞在時間）
    - スポットの特徴（見学コースの長さ、展示物の量など）を考慮
 
-出力形式は必ず以下のJSONフォーマットのみを含むコードブロック(```json ... ```)としてください。
-
-```json
-{{
-  "name": "{spot_name}",
-  "area": "都道府県＋市区町村（分類の補助用。例: 鹿児島県鹿児島市、京都府京都市東山区。不明なら空文字 \"\"）",
-  "category": "History" | "Nature" | "Food" | "Shopping" | "Art" | "Relax" | "Culture" の中から最も適切なものを1つ,
-  "description": "そのスポット固有の魅力や雰囲気を100〜200文字程度で主観的に記述してください。同名・同ジャンルの他店舗の特徴は混ぜないでください。検証できない事実（受賞・最上級・由来・数値・営業/料金）は書かないでください。",
-  "duration_minutes": 標準滞在時間の目安（分単位、数値。上記のルールに従って算出してください。最小15分、最大480分）,
-  "tags": ["タグ1", "タグ2", "タグ3"]
-}}
-```
-
+【出力形式】
+{json_format_instruction(research_example)}
 【タグ生成のルール】
 - スポットの特徴を表す3〜5個のタグを生成してください
 - カテゴリに応じた適切なタグを選択してください（例: Foodカテゴリなら「グルメ」「美食」「レストラン」など）
@@ -653,12 +686,22 @@ def research_spot_info(
 - description / category / tags / duration_minutes 以外の事実項目は生成せず、不明な項目は null または空にしてください
 """
 
+    attempts = itertools.count()
+
     try:
-        @retry_on_error(max_retries=3, delay=1.0, backoff=2.0)
+        @retry_on_error(max_retries=3, delay=1.0, backoff=2.0, deadline_sec=settings.GEMINI_RETRY_DEADLINE_SEC)
         def _research():
+            if next(attempts):
+                record_retry("research_spot_info")
             try:
                 model = genai.GenerativeModel(settings.GEMINI_MODEL)
-                response = model.generate_content(prompt)
+                response = generate_content(
+                    model, prompt, caller="research_spot_info", priority=priority,
+                    **json_output_kwargs(SPOT_RESEARCH_SCHEMA)
+                )
+            except CircuitOpenError:
+                # 障害中は待たずにフォールバックへ
+                raise
             except Exception as api_error:
                 # API呼び出しエラー（クォータエラーなど）を処理
                 error_str = str(api_error)
@@ -686,14 +729,13 @@ def research_spot_info(
                 log_error("GEMINI_EMPTY_RESPONSE", error_msg)
                 raise ValueError(error_msg)
             
-            response_text = response.text
-            parsed = safe_json_parse(response_text)
-            return parsed
+            # 解析できない出力は再試行せず PARSE_ERROR を返す
+            return parse_json(response.text, "research_spot_info")
         
         result = _research()
         
         # 成功時は通常の辞書を返す（タグを構造化タグに変換）
-        if result and not result.get("error"):
+        if isinstance(result, dict) and result and not result.get("error"):
             # タグを構造化タグに変換
             if "tags" in result and isinstance(result["tags"], list):
                 try:
@@ -712,6 +754,13 @@ def research_spot_info(
                 "message": "AIからのレスポンスの解析に失敗しました"
             }
         
+    except CircuitOpenError as ce:
+        # Gemini 障害中（サーキット遮断中）
+        return {
+            "error": True,
+            "error_type": "SERVICE_UNAVAILABLE",
+            "message": str(ce)
+        }
     except ValueError as ve:
         # クォータエラーやAPIエラーの場合
         error_message = str(ve)
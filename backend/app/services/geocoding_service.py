@@ -1,12 +1,29 @@
 """
 位置情報取得サービス
 既存のadd_location_data.pyから移植
+
+ジオコーディングはすべてこのサービスを通す（utils/geocoding.get_coordinates もここに委譲）。
+- プロバイダは GEOCODE_PROVIDERS の順（既定: Google → OpenCage → Yahoo）にフォールバック
+- プロバイダごとに秒間レート（トークンバケット）と1日の上限を守る
+- 結果は geocode_cache に永続化し、見つからなかったクエリも一定期間キャッシュする
+- geocode_batch で数千件を並列に解決し、キャッシュはまとめて書き込む
 """
+import threading
 import time
-from typing import Optional, Tuple, Dict, Any, List
-from opencage.geocoder import OpenCageGeocode
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta, timezone
+from typing import Callable, Optional, Tuple, Dict, Any, List
+
+import requests
+from sqlalchemy import text
+
 from app.config import settings
+from app.utils import metrics
 from app.utils.error_handler import log_error
+from app.utils.lazy_import import lazy_module
+from app.utils.resilience import CircuitOpenError, get_breaker
+
+opencage_geocoder = lazy_module("opencage.geocoder")
 
 
 # 都道府県の境界データ（必要に応じて拡張）
@@ -20,23 +37,39 @@ PREFECTURE_BOUNDS: Dict[str, Dict[str, float]] = {
     # 他の都道府県も必要に応じて追加可能
 }
 
+# キャッシュ書き込みを1文にまとめる件数
+_CACHE_CHUNK = 500
+
+_UPSERT_CACHE_SQL = text(
+    "INSERT INTO geocode_cache (query_key, found, latitude, longitude, provider, precision, checked_at) "
+    "VALUES (:query_key, :found, :latitude, :longitude, :provider, :precision, :checked_at) "
+    "ON CONFLICT (query_key) DO UPDATE SET found = excluded.found, latitude = excluded.latitude, "
+    "longitude = excluded.longitude, provider = excluded.provider, precision = excluded.precision, "
+    "checked_at = excluded.checked_at"
+)
+
+Coordinates = Tuple[float, float]
+
+# 問い合わせられなかった（上限・遮断中・エラー）ことを表す。「見つからなかった」（None）と区別し、否定結果をキャッシュしない
+UNAVAILABLE = object()
+
 
 def is_in_prefecture(lat: float, lng: float, prefecture: str) -> bool:
     """
     緯度経度が指定都道府県内か判定
-    
+
     Args:
         lat: 緯度
         lng: 経度
         prefecture: 都道府県名
-    
+
     Returns:
         都道府県内の場合True
     """
     if prefecture not in PREFECTURE_BOUNDS:
         # 境界データがない場合は判定をスキップ
         return True
-    
+
     bounds = PREFECTURE_BOUNDS[prefecture]
     return (
         bounds["lat_min"] <= lat <= bounds["lat_max"]
@@ -44,28 +77,218 @@ def is_in_prefecture(lat: float, lng: float, prefecture: str) -> bool:
     )
 
 
-def get_geo(place_name: str, area: str, prefecture: str = "鹿児島県") -> Tuple[Optional[float], Optional[float]]:
-    """
-    地名から緯度経度を取得。県名固定・信頼度確認・県内判定を実施
-    
-    Args:
-        place_name: 場所名
-        area: エリア名
-        prefecture: 都道府県名
-    
-    Returns:
-        (緯度, 経度) のタプル。取得失敗時は (None, None)
-    """
-    if not settings.OPENCAGE_API_KEY:
-        log_error("OPENCAGE_API_KEY_NOT_SET", "OPENCAGE_API_KEYが設定されていません")
-        return None, None
-    
+# ---- プロバイダとレート制限 ----
+
+class _RateLimiter:
+    """プロバイダごとのトークンバケット（秒間レート）と1日の呼び出し上限"""
+
+    def __init__(self, per_second: float, daily_limit: int = 0) -> None:
+        self.interval = 1.0 / per_second if per_second > 0 else 0.0
+        self.daily_limit = daily_limit
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+        self._day = date.today()
+        self._count = 0
+
+    def acquire(self) -> bool:
+        """呼び出し枠を1つ確保する（必要なら待つ）。1日の上限に達していれば False"""
+        with self._lock:
+            today = date.today()
+            if today != self._day:
+                self._day, self._count = today, 0
+            if self.daily_limit and self._count >= self.daily_limit:
+                return False
+            self._count += 1
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+        return True
+
+
+def _google_geocode(query: str) -> Optional[Coordinates]:
+    response = requests.get(
+        "https://maps.googleapis.com/maps/api/geocode/json",
+        params={"address": query, "key": settings.GOOGLE_MAPS_API_KEY, "language": "ja", "region": "jp"},
+        timeout=settings.GEOCODE_TIMEOUT_SEC,
+    )
+    response.raise_for_status()
+    data = response.json()
+    if data.get("status") == "OK" and data.get("results"):
+        location = data["results"][0]["geometry"]["location"]
+        return location["lat"], location["lng"]
+    return None
+
+
+_opencage_client = None
+_opencage_lock = threading.Lock()
+
+
+def _opencage_geocode(query: str) -> Optional[Coordinates]:
+    global _opencage_client
+    with _opencage_lock:
+        if _opencage_client is None:
+            # クライアントはプロセスで1つだけ作る（呼び出しごとに作らない）
+            _opencage_client = opencage_geocoder.OpenCageGeocode(settings.OPENCAGE_API_KEY)
+    result = _opencage_client.geocode(query, language="ja", countrycode="jp", limit=1, no_annotations=1)
+    if not result:
+        return None
+    # 信頼度スコア確認
+    confidence = result[0].get("confidence", 10)
+    if confidence < 6:
+        log_error("LOW_CONFIDENCE", f"低信頼度検出 ({query}): confidence={confidence}")
+        return None
+    return result[0]["geometry"]["lat"], result[0]["geometry"]["lng"]
+
+
+def _yahoo_geocode(query: str) -> Optional[Coordinates]:
+    from app.utils.api_clients import get_yahoo_geocode
+    result = get_yahoo_geocode(query)
+    if not result:
+        return None
+    return result["latitude"], result["longitude"]
+
+
+def _yahoo_configured() -> bool:
+    from app.utils.api_clients import YAHOO_APP_ID
+    return bool(YAHOO_APP_ID)
+
+
+# プロバイダ名 -> (問い合わせ関数, 設定済みか, 秒間レート, 1日の上限)
+_PROVIDER_SPECS: Dict[str, Tuple[Callable[[str], Optional[Coordinates]], Callable[[], bool], Callable[[], float], Callable[[], int]]] = {
+    "google": (
+        _google_geocode,
+        lambda: bool(settings.GOOGLE_MAPS_API_KEY),
+        lambda: settings.GEOCODE_GOOGLE_QPS,
+        lambda: 0,
+    ),
+    "opencage": (
+        _opencage_geocode,
+        lambda: bool(settings.OPENCAGE_API_KEY),
+        lambda: settings.GEOCODE_OPENCAGE_QPS,
+        lambda: settings.GEOCODE_OPENCAGE_DAILY_LIMIT,
+    ),
+    "yahoo": (
+        _yahoo_geocode,
+        _yahoo_configured,
+        lambda: settings.GEOCODE_YAHOO_QPS,
+        lambda: 0,
+    ),
+}
+
+_limiters: Dict[str, _RateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def _limiter(name: str) -> _RateLimiter:
+    with _limiters_lock:
+        limiter = _limiters.get(name)
+        if limiter is None:
+            _, _, qps, daily = _PROVIDER_SPECS[name]
+            limiter = _RateLimiter(qps(), daily())
+            _limiters[name] = limiter
+        return limiter
+
+
+def available_providers() -> List[str]:
+    """キーが設定済みのプロバイダ（フォールバック順）"""
+    names = [n.strip() for n in settings.GEOCODE_PROVIDERS.split(",") if n.strip()]
+    return [n for n in names if n in _PROVIDER_SPECS and _PROVIDER_SPECS[n][1]()]
+
+
+def _query_provider(name: str, query: str):
+    """座標、見つからなければ None、問い合わせられなければ UNAVAILABLE"""
+    if not _limiter(name).acquire():
+        metrics.increment("geocode.quota_exhausted", provider=name)
+        return UNAVAILABLE
+    metrics.increment("geocode.provider_calls", provider=name)
     try:
-        geocoder = OpenCageGeocode(settings.OPENCAGE_API_KEY)
+        return get_breaker(name).call(_PROVIDER_SPECS[name][0], query)
+    except CircuitOpenError:
+        # 障害中のプロバイダは待たずに次へ
+        return UNAVAILABLE
     except Exception as e:
-        log_error("OPENCAGE_INIT_ERROR", f"OpenCage Geocoder初期化エラー: {e}")
-        return None, None
-    
+        metrics.increment("geocode.provider_errors", provider=name)
+        log_error("GEOCODING_ERROR", f"位置情報取得エラー ({name}: {query}): {e}")
+        return UNAVAILABLE
+
+
+# ---- キャッシュ ----
+
+def _place_key(place_name: str, area: str, prefecture: str) -> str:
+    return "place|" + "|".join(" ".join((v or "").split()) for v in (prefecture, area, place_name))
+
+
+def _address_key(address: str) -> str:
+    return "address|" + " ".join(address.split())
+
+
+def _load_cached(keys: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+    """キャッシュ済みのキー -> 結果（見つからなかったクエリは None）。期限切れの否定結果は除く"""
+    from app.utils.database import SessionLocal
+    from app.models.geocode_cache import GeocodeCache
+
+    cutoff = datetime.now(timezone.utc) - timedelta(days=settings.GEOCODE_NEGATIVE_TTL_DAYS)
+    found: Dict[str, Optional[Dict[str, Any]]] = {}
+    db = SessionLocal()
+    try:
+        for i in range(0, len(keys), _CACHE_CHUNK):
+            chunk = keys[i:i + _CACHE_CHUNK]
+            for row in db.query(GeocodeCache).filter(GeocodeCache.query_key.in_(chunk)):
+                if row.found:
+                    found[row.query_key] = {
+                        "lat": row.latitude, "lng": row.longitude,
+                        "provider": row.provider, "precision": row.precision,
+                    }
+                    continue
+                checked_at = row.checked_at
+                if checked_at is not None and checked_at.tzinfo is None:
+                    checked_at = checked_at.replace(tzinfo=timezone.utc)
+                if checked_at is not None and checked_at >= cutoff:
+                    found[row.query_key] = None
+    finally:
+        db.close()
+    return found
+
+
+def _store_cached(results: Dict[str, Any]) -> None:
+    """結果をまとめて upsert する（UNAVAILABLE は保存しない。キャッシュの失敗でジオコーディング自体は失敗させない）"""
+    results = {key: value for key, value in results.items() if value is not UNAVAILABLE}
+    if not results:
+        return
+    from app.utils.database import engine
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "query_key": key,
+            "found": value is not None,
+            "latitude": value["lat"] if value else None,
+            "longitude": value["lng"] if value else None,
+            "provider": value["provider"] if value else None,
+            "precision": value["precision"] if value else None,
+            "checked_at": now,
+        }
+        for key, value in results.items()
+    ]
+    try:
+        with engine.begin() as conn:
+            for i in range(0, len(rows), _CACHE_CHUNK):
+                conn.execute(_UPSERT_CACHE_SQL, rows[i:i + _CACHE_CHUNK])
+    except Exception as e:
+        log_error("GEOCODE_CACHE_WRITE_ERROR", f"ジオコーディングキャッシュの保存に失敗しました: {e}", {"count": len(rows)})
+
+
+# ---- 解決ロジック ----
+
+def _resolve_place(place_name: str, area: str, prefecture: str, providers: List[str]):
+    """場所名を外部 API で解決する（キャッシュは見ない）
+
+    Returns:
+        結果の辞書。すべての問い合わせが「見つからない」なら None、
+        見つからず問い合わせられなかったもの（上限・遮断中・エラー）があれば UNAVAILABLE
+    """
     # クエリリスト（優先度順）
     queries = [
         f"{prefecture} {area} {place_name}",      # 最優先: 県+エリア+場所名
@@ -73,51 +296,139 @@ def get_geo(place_name: str, area: str, prefecture: str = "鹿児島県") -> Tup
         f"{area} {place_name}",                    # エリア+場所名
         f"{place_name}, {area}, {prefecture}, Japan",  # 英語形式
     ]
-
-    for q in queries:
-        try:
-            result = geocoder.geocode(q)
-            if result and len(result) > 0:
-                lat = result[0]["geometry"]["lat"]
-                lng = result[0]["geometry"]["lng"]
-                
-                # 信頼度スコア確認
-                confidence = result[0].get("confidence", 10)
-                if confidence < 6:
-                    log_error("LOW_CONFIDENCE", f"低信頼度検出 ({place_name}): confidence={confidence}")
-                    continue
-                
-                # 県内判定
-                if not is_in_prefecture(lat, lng, prefecture):
-                    log_error("OUT_OF_PREFECTURE", f"{prefecture}外位置検出 ({place_name}): ({lat}, {lng})")
-                    continue
-                
-                return lat, lng
-        except Exception as e:
-            log_error("GEOCODING_ERROR", f"位置情報取得エラー ({q}): {e}")
-        time.sleep(1)  # レート制限回避
+    unavailable = False
+    for provider in providers:
+        for q in queries:
+            coords = _query_provider(provider, q)
+            if coords is UNAVAILABLE:
+                unavailable = True
+                continue
+            if coords is None:
+                continue
+            lat, lng = coords
+            # 県内判定
+            if not is_in_prefecture(lat, lng, prefecture):
+                log_error("OUT_OF_PREFECTURE", f"{prefecture}外位置検出 ({place_name}): ({lat}, {lng})")
+                continue
+            return {"lat": lat, "lng": lng, "provider": provider, "precision": "place"}
 
     # 最終手段：area単体から住所レベルで近似（県名付き）
-    try:
-        area_queries = [
-            f"{prefecture} {area}",
-            area
-        ]
-        for aq in area_queries:
-            area_result = geocoder.geocode(aq)
-            if area_result and len(area_result) > 0:
-                lat = area_result[0]["geometry"]["lat"]
-                lng = area_result[0]["geometry"]["lng"]
-                
-                # 県内判定
-                if is_in_prefecture(lat, lng, prefecture):
-                    return lat, lng
-    except Exception as e:
-        log_error("AREA_GEOCODING_ERROR", f"エリア位置情報取得エラー ({place_name}): {e}")
+    if area:
+        for provider in providers:
+            for aq in (f"{prefecture} {area}", area):
+                coords = _query_provider(provider, aq)
+                if coords is UNAVAILABLE:
+                    unavailable = True
+                    continue
+                if coords and is_in_prefecture(coords[0], coords[1], prefecture):
+                    return {"lat": coords[0], "lng": coords[1], "provider": provider, "precision": "area"}
 
     # 全て失敗
     log_error("GEOCODING_FAILED", f"位置情報取得失敗: {place_name} ({area})")
-    return None, None
+    if unavailable:
+        # 一時的な失敗は否定結果としてキャッシュしない（次回また問い合わせる）
+        metrics.increment("geocode.unavailable")
+        return UNAVAILABLE
+    return None
+
+
+def get_geo(place_name: str, area: str, prefecture: str = "鹿児島県") -> Tuple[Optional[float], Optional[float]]:
+    """
+    地名から緯度経度を取得。県名固定・信頼度確認・県内判定を実施
+
+    Args:
+        place_name: 場所名
+        area: エリア名
+        prefecture: 都道府県名
+
+    Returns:
+        (緯度, 経度) のタプル。取得失敗時は (None, None)
+    """
+    results = geocode_batch([{"name": place_name, "area": area}], prefecture)
+    coords = results.get(0)
+    return coords if coords else (None, None)
+
+
+def geocode_address(address: str) -> Optional[Dict[str, float]]:
+    """住所または場所名から {"lat", "lng"} を取得（キャッシュ経由）。失敗時は None"""
+    key = _address_key(address)
+    cached = _load_cached([key])
+    if key in cached:
+        metrics.increment("geocode.cache_hits")
+        value = cached[key]
+        return {"lat": value["lat"], "lng": value["lng"]} if value else None
+
+    providers = available_providers()
+    if not providers:
+        log_error("GEOCODING_NO_PROVIDER", "ジオコーディング用の API キーが設定されていません")
+        return None
+    metrics.increment("geocode.cache_misses")
+    value = None
+    for provider in providers:
+        coords = _query_provider(provider, address)
+        if coords is UNAVAILABLE:
+            value = UNAVAILABLE
+            continue
+        if coords:
+            value = {"lat": coords[0], "lng": coords[1], "provider": provider, "precision": "address"}
+            break
+    _store_cached({key: value})
+    if value is None or value is UNAVAILABLE:
+        return None
+    return {"lat": value["lat"], "lng": value["lng"]}
+
+
+def geocode_batch(
+    places: List[Dict[str, Any]],
+    prefecture: str = "鹿児島県",
+    max_workers: Optional[int] = None,
+) -> Dict[int, Optional[Coordinates]]:
+    """複数の場所をまとめて解決する
+
+    キャッシュを1回でまとめて引き、未解決分だけを並列に外部 API へ問い合わせる
+    （プロバイダごとのレート制限は全スレッドで共有）。新しい結果はまとめて保存する。
+
+    Args:
+        places: {"name": 場所名, "area": エリア名} のリスト
+        prefecture: 都道府県名
+        max_workers: 並列数（None なら GEOCODE_BATCH_WORKERS）
+
+    Returns:
+        places のインデックス -> (緯度, 経度)。解決できなかったものは None
+    """
+    keys = [_place_key(p.get("name", ""), p.get("area", ""), prefecture) for p in places]
+    unique_keys = list(dict.fromkeys(keys))
+    cached = _load_cached(unique_keys)
+    metrics.increment("geocode.cache_hits", value=len(cached))
+
+    pending = {}
+    for key, place in zip(keys, places):
+        if key not in cached and key not in pending:
+            pending[key] = place
+
+    resolved: Dict[str, Optional[Dict[str, Any]]] = dict(cached)
+    if pending:
+        providers = available_providers()
+        if not providers:
+            log_error("GEOCODING_NO_PROVIDER", "ジオコーディング用の API キーが設定されていません")
+        else:
+            metrics.increment("geocode.cache_misses", value=len(pending))
+            workers = max(1, min(max_workers or settings.GEOCODE_BATCH_WORKERS, len(pending)))
+
+            def _work(item):
+                key, place = item
+                return key, _resolve_place(place.get("name", ""), place.get("area", ""), prefecture, providers)
+
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                fresh = dict(executor.map(_work, pending.items()))
+            _store_cached(fresh)
+            resolved.update(fresh)
+
+    results: Dict[int, Optional[Coordinates]] = {}
+    for i, key in enumerate(keys):
+        value = resolved.get(key)
+        results[i] = (value["lat"], value["lng"]) if value and value is not UNAVAILABLE else None
+    return results
 
 
 def add_location_to_places(
@@ -126,29 +437,29 @@ def add_location_to_places(
 ) -> List[Dict[str, Any]]:
     """
     スポットリストに位置情報を付与
-    
+
     Args:
         places_data: スポットデータのリスト（各要素に "name" と "area" が必要）
         prefecture: 都道府県名
-    
+
     Returns:
         位置情報が付与されたスポットデータのリスト
     """
+    targets = [place for place in places_data if place.get("name", "")]
+    coords = geocode_batch(
+        [{"name": place.get("name", ""), "area": place.get("area", "")} for place in targets],
+        prefecture,
+    )
+
     result = []
-    for place in places_data:
-        place_name = place.get("name", "")
-        area = place.get("area", "")
-        
-        if not place_name:
-            continue
-        
-        lat, lng = get_geo(place_name, area, prefecture)
-        
+    for i, place in enumerate(targets):
+        lat, lng = coords.get(i) or (None, None)
+
         # 位置情報を追加
         place_with_location = place.copy()
         place_with_location["latitude"] = lat
         place_with_location["longitude"] = lng
-        
+
         # 位置精度メタデータ
         if lat and lng:
             if is_in_prefecture(lat, lng, prefecture):
@@ -157,9 +468,7 @@ def add_location_to_places(
                 place_with_location["location_status"] = "out_of_prefecture"
         else:
             place_with_location["location_status"] = "failed"
-        
+
         result.append(place_with_location)
-        time.sleep(1)  # レート制限回避
-    
-    return result
 
+    return result
@@ -11,6 +11,7 @@ from fastapi import HTTPException, status
 
 from app.models.user import User
 from app.utils.security import hash_password
+from app.services.admin_service import record_user_registered
 from app.config import settings
 
 logger = logging.getLogger(__name__)
@@ -84,5 +85,6 @@ def get_or_create_google_user(db: Session, idinfo: dict) -> User:
     db.add(user)
     db.commit()
     db.refresh(user)
+    record_user_registered(bool(user.is_active))
     logger.info("Googleログインで新規ユーザーを作成しました")
     return user
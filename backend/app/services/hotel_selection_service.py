@@ -0,0 +1,275 @@
+"""
+宿泊施設の選定サービス（プラン生成時の add_hotels_to_plan_spots 用）
+
+従来はプラン生成のたびに category="Hotel" を最大3回検索し、先頭の1件を使っていたため、
+別の県のホテルが選ばれて移動区間が極端に長くなることがあった。
+
+- 公開中の宿泊施設をプロセス内に1回だけ読み込み、緯度経度のグリッドで索引する
+  （スポットカタログのスナップショットから取り出す。カタログ世代が変わったら作り直す）
+- 各泊について「その日の最後のスポット → ホテル → 翌日の最初のスポット」の距離が最小のホテルを選ぶ
+- HOTEL_SELECTION_PER_NIGHT=False（既定）なら全泊の合計距離が最小の1軒に泊まり続ける
+"""
+import logging
+import math
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# グリッドの1セルの大きさ（度）。緯度 0.05 度 ≒ 5.5km
+_GRID_DEG = 0.05
+# 1回の探索で厳密に距離を評価する候補数
+_CANDIDATES_PER_ANCHOR = 8
+# 候補がこれ以下のエリアはグリッドを使わず全件評価する
+_BRUTE_FORCE_LIMIT = 64
+# グリッド探索の最大周回数（これを超えて見つからなければ全件評価。40周 ≒ 220km）
+_MAX_RING = 40
+
+Point = Tuple[float, float]
+
+
+class HotelEntry:
+    """プランに差し込む宿泊施設の情報（Spot の必要な属性だけを保持）"""
+
+    __slots__ = (
+        "id", "name", "description", "area", "rating", "image", "price", "tags",
+        "latitude", "longitude",
+    )
+
+    def __init__(self, spot) -> None:
+        self.id = spot.id
+        self.name = spot.name
+        self.description = spot.description
+        self.area = spot.area
+        self.rating = spot.rating
+        self.image = spot.image
+        self.price = spot.price
+        self.tags = list(spot.tags or [])
+        self.latitude = spot.latitude
+        self.longitude = spot.longitude
+
+    @property
+    def point(self) -> Optional[Point]:
+        if self.latitude is None or self.longitude is None:
+            return None
+        if self.latitude == 0.0 and self.longitude == 0.0:
+            return None
+        return (self.latitude, self.longitude)
+
+
+class _HotelIndex:
+    """宿泊施設の空間索引（緯度経度グリッド）"""
+
+    def __init__(self, hotels: Sequence[HotelEntry]) -> None:
+        self.hotels = list(hotels)
+        self.located = [h for h in self.hotels if h.point is not None]
+        self._cells: Dict[Tuple[int, int], List[HotelEntry]] = {}
+        for hotel in self.located:
+            self._cells.setdefault(_cell(hotel.point), []).append(hotel)
+        if self._cells:
+            rows = [c[0] for c in self._cells]
+            cols = [c[1] for c in self._cells]
+            self._max_ring = max(max(rows) - min(rows), max(cols) - min(cols)) + 1
+        else:
+            self._max_ring = 0
+
+    def nearest(self, point: Point, k: int = _CANDIDATES_PER_ANCHOR) -> List[HotelEntry]:
+        """point に近い宿泊施設を最大 k 件返す（グリッドを内側からリング状に探索）"""
+        if len(self.located) <= _BRUTE_FORCE_LIMIT:
+            return sorted(self.located, key=lambda h: _haversine_km(point, h.point))[:k]
+
+        center = _cell(point)
+        found: List[HotelEntry] = []
+        for ring in range(min(self._max_ring, _MAX_RING) + 1):
+            for cell in _ring_cells(center, ring):
+                found.extend(self._cells.get(cell, ()))
+            # 1周外側のセルにもっと近い施設がある可能性があるため、k 件集まった次の周まで見る
+            if len(found) >= k and ring > 0:
+                break
+        if not found:
+            # 近くに無い（エリア外の遠方のみ）場合は全件から選ぶ
+            found = self.located
+        found = sorted(found, key=lambda h: _haversine_km(point, h.point))
+        return found[:k]
+
+    def best_rated(self) -> Optional[HotelEntry]:
+        """座標で選べない場合の代替（評価が高い順、同点は読み込み順）"""
+        if not self.hotels:
+            return None
+        return max(self.hotels, key=lambda h: h.rating or 0.0)
+
+
+_lock = threading.Lock()
+_loaded_version: Optional[int] = None
+_all_hotels: List[HotelEntry] = []
+# エリア名 -> 索引（エリアごとに初回のみ作る）
+_area_indexes: Dict[str, _HotelIndex] = {}
+
+
+def _cell(point: Point) -> Tuple[int, int]:
+    return (math.floor(point[0] / _GRID_DEG), math.floor(point[1] / _GRID_DEG))
+
+
+def _ring_cells(center: Tuple[int, int], ring: int):
+    row, col = center
+    if ring == 0:
+        yield center
+        return
+    for d in range(-ring, ring + 1):
+        yield (row - ring, col + d)
+        yield (row + ring, col + d)
+    for d in range(-ring + 1, ring):
+        yield (row + d, col - ring)
+        yield (row + d, col + ring)
+
+
+def _haversine_km(a: Point, b: Point) -> float:
+    lat1, lng1 = map(math.radians, a)
+    lat2, lng2 = map(math.radians, b)
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371.0 * math.asin(math.sqrt(h))
+
+
+def _ensure_loaded(db: Session) -> None:
+    """カタログ世代が変わっていれば宿泊施設を読み直す
+
+    スポットカタログのスナップショットがあればそこから取り出し、無ければ DB を引く（公開フィルタ適用済み・1クエリ）。
+    """
+    global _loaded_version, _all_hotels
+    from app.services.spot_catalog_service import get_snapshot
+    from app.utils.response_cache import get_catalog_version
+    snapshot = get_snapshot(db)
+    version = snapshot.version if snapshot is not None else get_catalog_version()
+    if _loaded_version == version:
+        return
+
+    if snapshot is not None:
+        indexes = snapshot.category_mask("Hotel").nonzero()[0]
+        hotels = [HotelEntry(spot) for spot in snapshot.spots(indexes)]
+    else:
+        from app.models.spot import Spot
+        from app.services.spot_service import _apply_public_visibility_filter
+
+        query = _apply_public_visibility_filter(db.query(Spot)).filter(Spot.category == "Hotel")
+        hotels = [HotelEntry(spot) for spot in query.all()]
+    _all_hotels = hotels
+    _area_indexes.clear()
+    _loaded_version = version
+    metrics.set_gauge("hotel_selection.hotels", len(hotels))
+    logger.info("宿泊施設の索引を作成しました: %d件（世代 %s）", len(hotels), version)
+
+
+def _strip_prefecture_suffix(area: str) -> str:
+    return area.replace("県", "").replace("府", "").replace("都", "").replace("道", "").strip()
+
+
+def _index_for_area(area: Optional[str]) -> _HotelIndex:
+    """エリアに該当する宿泊施設の索引（該当なしなら都道府県名の接尾辞を外して再照合、最後は全件）"""
+    key = area or ""
+    index = _area_indexes.get(key)
+    if index is not None:
+        return index
+
+    hotels: List[HotelEntry] = []
+    if area:
+        hotels = [h for h in _all_hotels if h.area and area in h.area]
+        stripped = _strip_prefecture_suffix(area)
+        if not hotels and stripped and stripped != area:
+            hotels = [h for h in _all_hotels if h.area and stripped in h.area]
+    if not hotels:
+        # エリア外でも、座標があれば旅程に最も近い施設が選ばれる
+        hotels = _all_hotels
+    index = _HotelIndex(hotels)
+    _area_indexes[key] = index
+    return index
+
+
+def _spot_point(plan_spot: Dict[str, Any]) -> Optional[Point]:
+    location = (plan_spot.get("spot") or {}).get("location") or {}
+    lat, lng = location.get("lat"), location.get("lng")
+    if lat is None or lng is None or (lat == 0.0 and lng == 0.0):
+        return None
+    return (float(lat), float(lng))
+
+
+def _night_anchors(spots_by_day: Dict[int, List[Dict[str, Any]]], days: int) -> Dict[int, List[Point]]:
+    """各泊（day 日目の夜）について、ホテルとの間を移動する地点（当日最後・翌日最初のスポット）"""
+    anchors: Dict[int, List[Point]] = {}
+    for night in range(1, days):
+        points = []
+        evening = [p for p in map(_spot_point, spots_by_day.get(night, [])) if p]
+        morning = [p for p in map(_spot_point, spots_by_day.get(night + 1, [])) if p]
+        if evening:
+            points.append(evening[-1])
+        if morning:
+            points.append(morning[0])
+        anchors[night] = points
+    return anchors
+
+
+def _cost(hotel: HotelEntry, points: Sequence[Point]) -> float:
+    return sum(_haversine_km(p, hotel.point) for p in points)
+
+
+def _pick(index: _HotelIndex, points: Sequence[Point]) -> Optional[HotelEntry]:
+    """points への合計距離が最小の宿泊施設（座標が無ければ評価順）"""
+    if not points or not index.located:
+        return index.best_rated()
+    candidates: Dict[str, HotelEntry] = {}
+    for point in points:
+        for hotel in index.nearest(point):
+            candidates[hotel.id] = hotel
+    return min(candidates.values(), key=lambda h: _cost(h, points))
+
+
+def select_hotels_for_nights(
+    db: Session,
+    area: Optional[str],
+    spots_by_day: Dict[int, List[Dict[str, Any]]],
+    days: int,
+    per_night: Optional[bool] = None,
+) -> Dict[int, HotelEntry]:
+    """各泊の宿泊施設を選ぶ
+
+    Args:
+        db: 初回（またはカタログ更新後）の読み込みにだけ使う
+        area: プランのエリア名
+        spots_by_day: 日 -> その日のプランスポット（宿泊施設を除く、訪問順）
+        days: 日数（泊数は days - 1）
+        per_night: 泊ごとに別の施設を選ぶか（None なら HOTEL_SELECTION_PER_NIGHT）
+
+    Returns:
+        泊（1〜days-1 日目）-> 宿泊施設。施設が無ければ空
+    """
+    if days < 2:
+        return {}
+    if per_night is None:
+        per_night = settings.HOTEL_SELECTION_PER_NIGHT
+
+    with _lock:
+        _ensure_loaded(db)
+        index = _index_for_area(area)
+
+    if not index.hotels:
+        return {}
+
+    with metrics.timed("hotel_selection.select_ms"):
+        anchors = _night_anchors(spots_by_day, days)
+        if per_night:
+            return {night: _pick(index, points) for night, points in anchors.items()}
+        all_points = [p for points in anchors.values() for p in points]
+        hotel = _pick(index, all_points)
+        return {night: hotel for night in anchors}
+
+
+def invalidate_hotel_index() -> None:
+    """索引を破棄して次回の選定時に読み直す"""
+    global _loaded_version
+    with _lock:
+        _loaded_version = None
+        _area_indexes.clear()
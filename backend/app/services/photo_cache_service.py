@@ -0,0 +1,283 @@
+"""
+Places 写真のディスクキャッシュ（/api/spots/photo 用）
+
+同じ写真を訪問者ごとに Places Photo API（従量課金）から取り直さないよう、
+photo resource name × 幅 × 形式 ごとにディスクへ保存して FileResponse で配信する。
+
+- キャッシュキーは (ref, 幅, 形式) のハッシュ。ファイル名に内容ハッシュ（= ETag）を含める
+- 合計サイズが PHOTO_CACHE_MAX_BYTES を超えたら最終アクセスの古い順に削除（LRU）
+- 同じ写真の同時ミスは1本だけ取得し、他は完了を待ってキャッシュを読む（single-flight）
+- Places からは最大幅の原本だけを取得し、小さい幅・WebP は Pillow でサーバ側生成する
+  （Pillow 未導入時は幅ごとに Places から取得し、WebP は作らない）
+"""
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils import metrics
+from app.utils.error_handler import log_error
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+_EXT_BY_TYPE = {
+    "image/jpeg": "jpg",
+    "image/png": "png",
+    "image/webp": "webp",
+    "image/gif": "gif",
+}
+_TYPE_BY_EXT = {ext: content_type for content_type, ext in _EXT_BY_TYPE.items()}
+
+# 原本（Places から取得したまま）を表す形式名
+ORIGINAL_FORMAT = "orig"
+WEBP_FORMAT = "webp"
+
+_lock = threading.Lock()
+# キャッシュキー -> (パス, ETag, サイズ)。末尾ほど最近使ったもの
+_index: "OrderedDict[str, Tuple[str, str, int]]" = OrderedDict()
+_total_bytes = 0
+_loaded = False
+# キャッシュキー -> 取得中ロック（single-flight）
+_inflight: Dict[str, threading.Lock] = {}
+
+
+def _cache_dir() -> str:
+    path = os.path.abspath(settings.PHOTO_CACHE_DIR)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def variant_widths() -> List[int]:
+    """生成する幅のバリエーション（昇順）。原本の最大幅を必ず含む"""
+    widths = set()
+    for raw in settings.PHOTO_CACHE_WIDTHS.split(","):
+        raw = raw.strip()
+        if raw.isdigit() and int(raw) > 0:
+            widths.add(min(int(raw), settings.PLACES_PHOTO_MAX_WIDTH_PX))
+    widths.add(settings.PLACES_PHOTO_MAX_WIDTH_PX)
+    return sorted(widths)
+
+
+def snap_width(requested: Optional[int]) -> int:
+    """要求幅を、それ以上で最小のバリエーション幅に丸める（キャッシュの断片化を防ぐ）"""
+    widths = variant_widths()
+    if not requested:
+        return widths[-1]
+    for width in widths:
+        if width >= requested:
+            return width
+    return widths[-1]
+
+
+def _cache_key(ref: str, width: int, fmt: str) -> str:
+    return hashlib.sha256(f"{ref}|{width}|{fmt}".encode("utf-8")).hexdigest()
+
+
+def _load_index() -> None:
+    """起動後初回にキャッシュディレクトリを走査してインデックスを作る（古い順に並べる）"""
+    global _loaded, _total_bytes
+    if _loaded:
+        return
+    base = _cache_dir()
+    entries = []
+    for sub in os.listdir(base):
+        sub_path = os.path.join(base, sub)
+        if not os.path.isdir(sub_path):
+            continue
+        for name in os.listdir(sub_path):
+            # <key>-<etag>.<ext>
+            stem, _, ext = name.rpartition(".")
+            key, _, etag = stem.partition("-")
+            if not key or not etag or ext not in _TYPE_BY_EXT:
+                continue
+            path = os.path.join(sub_path, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_atime, key, path, etag, stat.st_size))
+    entries.sort()
+    _index.clear()
+    _total_bytes = 0
+    for _, key, path, etag, size in entries:
+        _index[key] = (path, etag, size)
+        _total_bytes += size
+    _loaded = True
+
+
+def _lookup(key: str) -> Optional[Tuple[str, str, int]]:
+    global _total_bytes
+    with _lock:
+        _load_index()
+        entry = _index.get(key)
+        if entry is None:
+            return None
+        if not os.path.exists(entry[0]):
+            # 別ワーカーの追い出しなどで消えている
+            _index.pop(key, None)
+            _total_bytes -= entry[2]
+            return None
+        _index.move_to_end(key)
+        return entry
+
+
+def _evict_locked() -> None:
+    global _total_bytes
+    while _total_bytes > settings.PHOTO_CACHE_MAX_BYTES and len(_index) > 1:
+        key, (path, _, size) = _index.popitem(last=False)
+        _total_bytes -= size
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        metrics.increment("photo_cache.evictions")
+
+
+def _store(key: str, content: bytes, content_type: str) -> Tuple[str, str, int]:
+    """一時ファイルに書いてから rename する（読み手に書きかけを見せない）"""
+    global _total_bytes
+    etag = hashlib.sha256(content).hexdigest()[:32]
+    ext = _EXT_BY_TYPE.get(content_type, "jpg")
+    directory = os.path.join(_cache_dir(), key[:2])
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{key}-{etag}.{ext}")
+    tmp_path = f"{path}.{threading.get_ident()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+    entry = (path, etag, len(content))
+    with _lock:
+        _load_index()
+        previous = _index.pop(key, None)
+        if previous:
+            _total_bytes -= previous[2]
+            if previous[0] != path:
+                try:
+                    os.remove(previous[0])
+                except OSError:
+                    pass
+        _index[key] = entry
+        _total_bytes += len(content)
+        _evict_locked()
+        metrics.set_gauge("photo_cache.bytes", _total_bytes)
+    return entry
+
+
+def _inflight_lock(key: str) -> threading.Lock:
+    with _lock:
+        lock = _inflight.get(key)
+        if lock is None:
+            lock = threading.Lock()
+            _inflight[key] = lock
+        return lock
+
+
+def _release_inflight(key: str, lock: threading.Lock) -> None:
+    with _lock:
+        if _inflight.get(key) is lock and not lock.locked():
+            _inflight.pop(key, None)
+
+
+def _fetch_from_places(ref: str, width: int) -> Optional[Tuple[bytes, str]]:
+    from app.services.places_service import fetch_photo_media
+    metrics.increment("photo_cache.upstream_fetches")
+    return fetch_photo_media(ref, width)
+
+
+def _resize(content: bytes, width: int, fmt: str) -> Optional[Tuple[bytes, str]]:
+    """原本から指定幅・形式のバリエーションを作る（縦横比維持・拡大はしない）"""
+    try:
+        with Image.open(io.BytesIO(content)) as image:
+            image.load()
+            if image.width > width:
+                height = max(1, round(image.height * width / image.width))
+                image = image.resize((width, height), Image.LANCZOS)
+            out = io.BytesIO()
+            if fmt == WEBP_FORMAT:
+                image.save(out, format="WEBP", quality=settings.PHOTO_CACHE_QUALITY, method=4)
+                return out.getvalue(), "image/webp"
+            if image.mode not in ("RGB", "L"):
+                image = image.convert("RGB")
+            image.save(out, format="JPEG", quality=settings.PHOTO_CACHE_QUALITY, optimize=True, progressive=True)
+            return out.getvalue(), "image/jpeg"
+    except Exception as e:
+        log_error("PHOTO_CACHE_RESIZE_ERROR", f"写真の縮小に失敗しました: {e}", {"width": width, "format": fmt})
+        return None
+
+
+def _get_or_create(key: str, producer) -> Optional[Tuple[str, str, int]]:
+    """キャッシュにあれば返し、無ければ single-flight で producer() の結果を保存して返す"""
+    entry = _lookup(key)
+    if entry is not None:
+        metrics.increment("photo_cache.hits")
+        return entry
+
+    lock = _inflight_lock(key)
+    try:
+        with lock:
+            # 待っている間に別リクエストが作った可能性がある
+            entry = _lookup(key)
+            if entry is not None:
+                metrics.increment("photo_cache.hits", shared="1")
+                return entry
+            metrics.increment("photo_cache.misses")
+            produced = producer()
+            if produced is None:
+                return None
+            return _store(key, produced[0], produced[1])
+    finally:
+        _release_inflight(key, lock)
+
+
+def _get_original(ref: str) -> Optional[Tuple[str, str, int]]:
+    width = settings.PLACES_PHOTO_MAX_WIDTH_PX
+    return _get_or_create(
+        _cache_key(ref, width, ORIGINAL_FORMAT),
+        lambda: _fetch_from_places(ref, width),
+    )
+
+
+def get_cached_photo(ref: str, width: Optional[int] = None, prefer_webp: bool = False) -> Optional[Dict[str, str]]:
+    """写真をキャッシュ経由で取得し、配信用の {path, content_type, etag} を返す（失敗時 None）
+
+    ブロッキング I/O を含むため、async からは asyncio.to_thread で呼ぶこと。
+    """
+    width = snap_width(width)
+    fmt = WEBP_FORMAT if (prefer_webp and PIL_AVAILABLE) else ORIGINAL_FORMAT
+
+    if width == settings.PLACES_PHOTO_MAX_WIDTH_PX and fmt == ORIGINAL_FORMAT:
+        entry = _get_original(ref)
+    elif PIL_AVAILABLE:
+        def _produce():
+            original = _get_original(ref)
+            if original is None:
+                return None
+            with open(original[0], "rb") as f:
+                return _resize(f.read(), width, fmt)
+        entry = _get_or_create(_cache_key(ref, width, fmt), _produce)
+    else:
+        entry = _get_or_create(
+            _cache_key(ref, width, ORIGINAL_FORMAT),
+            lambda: _fetch_from_places(ref, width),
+        )
+
+    if entry is None:
+        return None
+    path, etag, _ = entry
+    ext = path.rpartition(".")[2]
+    return {"path": path, "content_type": _TYPE_BY_EXT.get(ext, "image/jpeg"), "etag": f'"{etag}"'}
+
+
+def get_cache_stats() -> Dict[str, int]:
+    """管理画面向けのキャッシュ使用状況"""
+    with _lock:
+        _load_index()
+        return {"entries": len(_index), "bytes": _total_bytes, "max_bytes": settings.PHOTO_CACHE_MAX_BYTES}
@@ -32,11 +32,12 @@ import requests
 
 from app.config import settings
 from app.utils.error_handler import log_error
+from app.utils.resilience import guarded_request
 
 
-PLACES_TEXT_SEARCH_URL = "https://places.googleapis.com/v1/places:searchText"
-PLACES_DETAILS_URL = "https://places.googleapis.com/v1/places/{place_id}"
-PLACE_PHOTO_URL = "https://places.googleapis.com/v1/{photo_name}/media"
+PLACES_TEXT_SEARCH_URL = f"{settings.PLACES_API_BASE_URL}/v1/places:searchText"
+PLACES_DETAILS_URL = f"{settings.PLACES_API_BASE_URL}/v1/places/{{place_id}}"
+PLACE_PHOTO_URL = f"{settings.PLACES_API_BASE_URL}/v1/{{photo_name}}/media"
 
 # 写真配信用の自前プロキシ（APIキーをクライアントへ露出させないため、
 # DB・レスポンスにはこのプロキシURLだけを載せる）
@@ -347,7 +348,9 @@ def text_search(
         body["includedType"] = included_type
 
     try:
-        res = requests.post(
+        res = guarded_request(
+            "places",
+            "POST",
             PLACES_TEXT_SEARCH_URL,
             headers=headers,
             json=body,
@@ -406,7 +409,9 @@ def get_place_details(place_id: str) -> Optional[Dict[str, Any]]:
 
     url = PLACES_DETAILS_URL.format(place_id=place_id)
     try:
-        res = requests.get(
+        res = guarded_request(
+            "places",
+            "GET",
             url,
             headers=headers,
             params=params,
@@ -491,7 +496,9 @@ def fetch_photo_media(
     width = max_width_px or settings.PLACES_PHOTO_MAX_WIDTH_PX
     url = PLACE_PHOTO_URL.format(photo_name=photo_resource_name)
     try:
-        res = requests.get(
+        res = guarded_request(
+            "places",
+            "GET",
             url,
             params={"maxWidthPx": int(width), "key": api_key},
             timeout=settings.PLACES_API_TIMEOUT_SEC,
@@ -711,7 +718,9 @@ def get_place_business_status(place_id: str) -> Optional[str]:
         "X-Goog-FieldMask": "id,businessStatus",
     }
     try:
-        res = requests.get(
+        res = guarded_request(
+            "places",
+            "GET",
             PLACES_DETAILS_URL.format(place_id=place_id),
             headers=headers,
             params={"regionCode": settings.PLACES_REGION},
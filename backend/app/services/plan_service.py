@@ -2,12 +2,15 @@
 プランサービス
 """
 from sqlalchemy.orm import Session
+from sqlalchemy import String, and_, bindparam, func, or_, type_coerce
 from app.models.plan import Plan
 from app.models.user import User
-from typing import List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from fastapi import HTTPException, status
+import base64
 import uuid
 from datetime import datetime
+from app.services.admin_service import record_plan_created
 
 
 def create_plan(db: Session, user_id: str, plan_data: dict) -> Plan:
@@ -96,6 +99,9 @@ def create_plan(db: Session, user_id: str, plan_data: dict) -> Plan:
                 detail=f"プランの作成に失敗しました。エラー: {error_type} - {error_str}"
             )
     
+    # 管理ダッシュボードの統計スナップショットに反映
+    record_plan_created(plan.area)
+    
     # excluded_spotsをplanオブジェクトに一時的に追加（レスポンス用）
     if "excluded_spots" in plan_data:
         plan.excluded_spots = plan_data["excluded_spots"]
@@ -103,11 +109,128 @@ def create_plan(db: Session, user_id: str, plan_data: dict) -> Plan:
     return plan
 
 
-def get_user_plans(db: Session, user_id: str, skip: int = 0, limit: int = 100) -> List[Plan]:
-    """ユーザーのプラン一覧を取得"""
-    return db.query(Plan).filter(
-        Plan.user_id == user_id
-    ).order_by(Plan.created_at.desc()).offset(skip).limit(limit).all()
+# 一覧カード用に読むカラム（spots 本体は読まず、件数だけ DB 側で数える）
+_SUMMARY_COLUMNS = (
+    Plan.id,
+    Plan.title,
+    Plan.area,
+    Plan.days,
+    Plan.thumbnail,
+    Plan.is_favorite,
+    Plan.folder_id,
+    Plan.check_in_date,
+    Plan.check_out_date,
+    Plan.created_at,
+    Plan.updated_at,
+    func.coalesce(func.json_array_length(Plan.spots), 0).label("spot_count"),
+)
+
+# カーソル比較用の created_at 生値。SQLite は保存文字列のまま比較しないと
+# 秒精度の既定値（CURRENT_TIMESTAMP）とマイクロ秒付きのバインド値が一致しない
+_CREATED_AT_RAW = type_coerce(Plan.created_at, String).label("created_at_raw")
+
+
+def encode_plan_cursor(created_at_raw: Any, plan_id: str) -> str:
+    """(created_at, id) を不透明なカーソル文字列にする"""
+    if isinstance(created_at_raw, datetime):
+        created_at_raw = created_at_raw.isoformat()
+    raw = f"{created_at_raw}|{plan_id}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decode_plan_cursor(db: Session, cursor: str) -> Tuple[Any, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at_raw, plan_id = base64.urlsafe_b64decode(padded).decode("utf-8").rsplit("|", 1)
+        if db.get_bind().dialect.name == "sqlite":
+            return bindparam("cursor_created_at", created_at_raw, type_=String()), plan_id
+        return datetime.fromisoformat(created_at_raw), plan_id
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="不正なカーソルです"
+        )
+
+
+def _user_plans_query(
+    query,
+    db: Session,
+    user_id: str,
+    folder_id: Optional[str] = None,
+    favorite: Optional[bool] = None,
+    cursor: Optional[str] = None,
+):
+    """一覧共通の絞り込み・並び順（ix_plans_user_created_id を使う）"""
+    query = query.filter(Plan.user_id == user_id)
+    if folder_id is not None:
+        query = query.filter(Plan.folder_id == folder_id)
+    if favorite is not None:
+        query = query.filter(Plan.is_favorite == favorite)
+    if cursor:
+        created_at, plan_id = _decode_plan_cursor(db, cursor)
+        query = query.filter(
+            or_(
+                Plan.created_at < created_at,
+                and_(Plan.created_at == created_at, Plan.id < plan_id),
+            )
+        )
+    return query.order_by(Plan.created_at.desc(), Plan.id.desc())
+
+
+def get_user_plans(
+    db: Session,
+    user_id: str,
+    skip: int = 0,
+    limit: int = 100,
+    folder_id: Optional[str] = None,
+    favorite: Optional[bool] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Plan], Optional[str]]:
+    """ユーザーのプラン一覧を取得
+
+    Returns:
+        (プラン一覧, 次ページのカーソル)。cursor 指定時は skip を無視してキーセットで読む。
+    """
+    query = _user_plans_query(db.query(Plan, _CREATED_AT_RAW), db, user_id, folder_id, favorite, cursor)
+    if not cursor:
+        query = query.offset(skip)
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_plan, last_raw = rows[-1]
+        next_cursor = encode_plan_cursor(last_raw, last_plan.id)
+    return [plan for plan, _ in rows], next_cursor
+
+
+def get_user_plan_summaries(
+    db: Session,
+    user_id: str,
+    limit: int = 50,
+    folder_id: Optional[str] = None,
+    favorite: Optional[bool] = None,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """プラン一覧カード用の軽量データを取得（spots 列を読まない）
+
+    Returns:
+        (一覧カードの辞書リスト, 次ページのカーソル)
+    """
+    query = _user_plans_query(
+        db.query(*_SUMMARY_COLUMNS, _CREATED_AT_RAW), db, user_id, folder_id, favorite, cursor
+    )
+    rows = query.limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_plan_cursor(rows[-1].created_at_raw, rows[-1].id)
+    summaries = []
+    for row in rows:
+        summary = dict(row._mapping)
+        summary.pop("created_at_raw", None)
+        summary["is_favorite"] = bool(summary.get("is_favorite"))
+        summaries.append(summary)
+    return summaries, next_cursor
 
 
 def get_plan(db: Session, plan_id: str, user_id: Optional[str] = None) -> Optional[Plan]:
@@ -1,7 +1,10 @@
 
+import copy
 import json
 import os
-from typing import Dict, Any
+import threading
+from typing import Dict, Any, Optional
+from app.utils import invalidation_bus
 
 SETTINGS_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "system_settings.json")
 
@@ -14,6 +17,23 @@ DEFAULT_SETTINGS = {
 出力は必ずJSON形式で行い、以下のスキーマに従ってください..."""
 }
 
+# 読み込んだ設定のキャッシュ（更新時は無効化バスで全ワーカーから捨てる）
+SETTINGS_NAMESPACE = "system_settings"
+_settings_cache: Optional[Dict[str, Any]] = None
+_settings_generation = 0
+_settings_lock = threading.Lock()
+
+
+def _invalidate_settings(payload: Optional[Dict[str, Any]] = None) -> None:
+    global _settings_cache, _settings_generation
+    with _settings_lock:
+        _settings_cache = None
+        _settings_generation += 1
+
+
+invalidation_bus.register(SETTINGS_NAMESPACE, _invalidate_settings)
+
+
 def ensure_settings_file():
     if not os.path.exists(os.path.dirname(SETTINGS_FILE)):
         os.makedirs(os.path.dirname(SETTINGS_FILE), exist_ok=True)
@@ -23,13 +43,25 @@ def ensure_settings_file():
             json.dump(DEFAULT_SETTINGS, f, indent=2, ensure_ascii=False)
 
 def get_settings() -> Dict[str, Any]:
+    global _settings_cache
+    with _settings_lock:
+        cached = _settings_cache
+        generation = _settings_generation
+    if cached is not None:
+        # 呼び出し側が書き換えてもキャッシュに影響しないようコピーを返す
+        return copy.deepcopy(cached)
     ensure_settings_file()
     try:
         with open(SETTINGS_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
+            loaded = json.load(f)
     except Exception as e:
         print(f"Error loading settings: {e}")
         return DEFAULT_SETTINGS
+    with _settings_lock:
+        # 読み込み中に無効化されていたら古い内容をキャッシュしない
+        if generation == _settings_generation:
+            _settings_cache = loaded
+    return copy.deepcopy(loaded)
 
 def update_settings(new_settings: Dict[str, Any]) -> Dict[str, Any]:
     ensure_settings_file()
@@ -42,5 +74,6 @@ def update_settings(new_settings: Dict[str, Any]) -> Dict[str, Any]:
     except Exception as e:
         print(f"Error saving settings: {e}")
         raise e
-        
+    
+    invalidation_bus.publish(SETTINGS_NAMESPACE)
     return current_settings
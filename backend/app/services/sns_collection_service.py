@@ -3,14 +3,20 @@ SNS/Web検索データ収集サービス
 既存のcollect_sns_data.pyから移植
 RSSフィード対応、AI要約機能追加
 """
-import feedparser
+import json
 import time
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from urllib.parse import quote
-import google.generativeai as genai
 from app.config import settings
 from app.utils.error_handler import log_error
+from app.utils.lazy_import import lazy_module
+from app.utils.gemini_governor import BATCH, generate_content
+from app.utils.gemini_output import SUMMARY_SCHEMA, json_output_kwargs, parse_json
+
+# 重い SDK は最初の使用時に import する（起動時間短縮）
+feedparser = lazy_module("feedparser")
+genai = lazy_module("google.generativeai")
 
 
 def collect_trending_topics(keyword: str = "鹿児島 観光") -> List[Dict[str, Any]]:
@@ -96,7 +102,10 @@ def summarize_sns_article_with_gemini(article_title: str, article_link: str) ->
     try:
         genai.configure(api_key=settings.GEMINI_API_KEY)
         model = genai.GenerativeModel(settings.GEMINI_MODEL)
-        response = model.generate_content(prompt)
+        response = generate_content(
+            model, prompt, caller="sns_summary", priority=BATCH,
+            **json_output_kwargs(SUMMARY_SCHEMA)
+        )
         
         # レスポンスのテキストを安全に取得
         if not hasattr(response, 'text') or not response.text:
@@ -106,7 +115,11 @@ def summarize_sns_article_with_gemini(article_title: str, article_link: str) ->
             log_error("GEMINI_EMPTY_RESPONSE", error_msg)
             return None
         
-        return response.text.strip()
+        # JSON 文字列に揃えて返す（読めない出力は None）
+        summary = parse_json(response.text, "sns_summary")
+        if summary is None:
+            return None
+        return json.dumps(summary, ensure_ascii=False)
     except Exception as e:
         log_error("GEMINI_SNS_SUMMARY_ERROR", f"Gemini要約失敗: {e}")
         return None
@@ -0,0 +1,490 @@
+"""
+公開スポットカタログのプロセス内スナップショット（プラン生成・編集・宿泊施設選定の候補取得用）
+
+プラン生成・編集のたびに Spot の ORM インスタンス（長い説明文、field_provenance / source_videos の JSON を含む）
+を読み込み直していたが、カタログは読み取り中心なので、公開スポットをプロセス内に列指向で保持する。
+
+- 座標・評価・滞在時間・料金は NumPy 配列、エリア・カテゴリは文字列表への番号、
+  タグは正規化済みタグ番号の CSR 配列（オフセット + 番号）で持つ
+- 返すのは必要な属性だけを持つ CatalogSpot（候補として返す件数分だけ作る）
+- カタログ世代（response_cache）が変わったら差分だけ読み直す:
+  created_at / updated_at が前回の最大値（から1秒遡った時刻）以降の行と、公開 ID 一覧との差（削除・非公開化・取りこぼし）。
+  SPOT_CATALOG_FULL_RELOAD_SEC ごと、または差分が大きい場合は全件を読み直す
+- タグの正規化結果を持つため、タグカテゴリ定義の更新（無効化バスの tag_categories）でも全件を読み直す
+- NumPy が無い場合・SPOT_CATALOG_ENABLED=False の場合は get_snapshot() が None を返し、呼び出し側は DB を引く
+"""
+import logging
+import math
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.models.spot import Spot
+from app.utils import invalidation_bus, metrics
+from app.utils.lazy_import import is_available, lazy_module
+from app.utils.tag_normalizer import TAG_CATEGORIES_NAMESPACE
+
+logger = logging.getLogger(__name__)
+
+np = lazy_module("numpy")
+NUMPY_AVAILABLE = is_available("numpy")
+
+PUBLIC_VERIFICATION_STATUSES = ("verified", "unverified")
+# 差分がこの割合を超えたら全件を読み直す
+_DELTA_FULL_RELOAD_RATIO = 0.5
+_ID_CHUNK = 500
+# 差分の読み込みは前回の最大値から少し遡る（SQLite の CURRENT_TIMESTAMP は秒単位の文字列で、
+# マイクロ秒付きの比較値より同じ秒の後の行が小さく比較されるため。読み直しは冪等）
+_WATERMARK_MARGIN = timedelta(seconds=1)
+_YIELD_PER = 2000
+
+_COLUMNS = (
+    Spot.id, Spot.name, Spot.description, Spot.area, Spot.category, Spot.duration_minutes,
+    Spot.rating, Spot.image, Spot.price, Spot.tags, Spot.latitude, Spot.longitude,
+    Spot.opening_hours, Spot.verification_status, Spot.business_status, Spot.created_at, Spot.updated_at,
+)
+# 営業時間はプロンプト・営業時間判定に使うキーだけ残す
+_OPENING_HOURS_KEYS = ("periods", "weekdayDescriptions")
+
+
+class CatalogSpot:
+    """スナップショットの1行（プラン生成で使う Spot の属性だけを持つ）"""
+
+    __slots__ = (
+        "id", "name", "description", "area", "category", "duration_minutes", "rating",
+        "image", "price", "tags", "latitude", "longitude", "opening_hours",
+    )
+
+    def __repr__(self) -> str:
+        return f"<CatalogSpot {self.id} {self.name}>"
+
+
+def _is_public(row) -> bool:
+    """_apply_public_visibility_filter と同じ条件（Python 側の判定）"""
+    return (
+        row.verification_status in PUBLIC_VERIFICATION_STATUSES
+        and row.business_status != "CLOSED_PERMANENTLY"
+    )
+
+
+def _tag_pairs(tags: Any) -> List[Tuple[str, str]]:
+    """スポットのタグを (値, 正規化した値) に変換する
+
+    get_spots_for_plan の従来の判定と同じく、先頭要素が文字列か辞書のリストだけを対象にする。
+    """
+    from app.utils.tag_normalizer import normalize_tag_value
+
+    if not isinstance(tags, list) or not tags or not isinstance(tags[0], (str, dict)):
+        return []
+    pairs = []
+    for tag in tags:
+        if isinstance(tag, str):
+            value = tag
+        elif isinstance(tag, dict):
+            value = tag.get("value", "")
+            if not value:
+                continue
+        else:
+            continue
+        pairs.append((value, normalize_tag_value(value)))
+    return pairs
+
+
+def _compact_opening_hours(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {k: value[k] for k in _OPENING_HOURS_KEYS if k in value}
+    return value
+
+
+class _Interner:
+    """文字列 -> 番号（0 は None）。スナップショット間で追記のみ"""
+
+    def __init__(self, values: Sequence[Optional[str]] = (None,)) -> None:
+        self.values: List[Optional[str]] = list(values)
+        self.codes: Dict[Optional[str], int] = {v: i for i, v in enumerate(self.values)}
+
+    def code(self, value: Optional[str]) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+    def copy(self) -> "_Interner":
+        return _Interner(self.values)
+
+
+class _Columns:
+    """行を列ごとのリストに溜める（最後に NumPy 配列へ変換）"""
+
+    def __init__(self, areas: _Interner, categories: _Interner, tags: _Interner) -> None:
+        self.areas = areas
+        self.categories = categories
+        self.tags = tags
+        self.ids: List[str] = []
+        self.names: List[str] = []
+        self.descriptions: List[Optional[str]] = []
+        self.images: List[Optional[str]] = []
+        self.raw_tags: List[Any] = []
+        self.opening_hours: List[Any] = []
+        self.area_codes: List[int] = []
+        self.category_codes: List[int] = []
+        self.lat: List[float] = []
+        self.lng: List[float] = []
+        self.rating: List[float] = []
+        self.price: List[float] = []
+        self.duration: List[int] = []
+        self.tag_ids: List[Tuple[int, ...]] = []
+
+    def add_row(self, row) -> None:
+        self.ids.append(row.id)
+        self.names.append(row.name)
+        self.descriptions.append(row.description)
+        self.images.append(row.image)
+        self.raw_tags.append(row.tags)
+        self.opening_hours.append(_compact_opening_hours(row.opening_hours))
+        self.area_codes.append(self.areas.code(row.area))
+        self.category_codes.append(self.categories.code(row.category))
+        self.lat.append(math.nan if row.latitude is None else row.latitude)
+        self.lng.append(math.nan if row.longitude is None else row.longitude)
+        self.rating.append(math.nan if row.rating is None else row.rating)
+        self.price.append(math.nan if row.price is None else row.price)
+        self.duration.append(-1 if row.duration_minutes is None else row.duration_minutes)
+        # タグ番号は (値, 正規化値) の組に振る（値が同じでも正規化の結果は1通り）
+        self.tag_ids.append(tuple(self.tags.code(pair) for pair in _tag_pairs(row.tags)))
+
+    def add_snapshot_rows(self, snapshot: "CatalogSnapshot", indexes: List[int]) -> None:
+        """既存スナップショットの行をそのまま引き継ぐ（番号表は引き継いでいるため再計算しない）"""
+        for i in indexes:
+            self.ids.append(snapshot.ids[i])
+            self.names.append(snapshot.names[i])
+            self.descriptions.append(snapshot.descriptions[i])
+            self.images.append(snapshot.images[i])
+            self.raw_tags.append(snapshot.raw_tags[i])
+            self.opening_hours.append(snapshot.opening_hours[i])
+            self.tag_ids.append(snapshot.tag_ids_of(i))
+        idx = np.asarray(indexes, dtype=np.int64)
+        self.area_codes.extend(snapshot.area_codes[idx].tolist())
+        self.category_codes.extend(snapshot.category_codes[idx].tolist())
+        self.lat.extend(snapshot.lat[idx].tolist())
+        self.lng.extend(snapshot.lng[idx].tolist())
+        self.rating.extend(snapshot.rating[idx].tolist())
+        self.price.extend(snapshot.price[idx].tolist())
+        self.duration.extend(snapshot.duration[idx].tolist())
+
+
+class CatalogSnapshot:
+    """公開スポットの列指向スナップショット（作成後は変更しない。更新時は新しいものに差し替える）"""
+
+    def __init__(self, columns: _Columns, version: int, watermark, loaded_at: float) -> None:
+        self.version = version
+        self.watermark = watermark
+        self.loaded_at = loaded_at
+        self.areas = columns.areas
+        self.categories = columns.categories
+        self.tags = columns.tags
+        self.ids = columns.ids
+        self.names = columns.names
+        self.descriptions = columns.descriptions
+        self.images = columns.images
+        self.raw_tags = columns.raw_tags
+        self.opening_hours = columns.opening_hours
+        self.positions: Dict[str, int] = {spot_id: i for i, spot_id in enumerate(self.ids)}
+        self.area_codes = np.asarray(columns.area_codes, dtype=np.int32)
+        self.category_codes = np.asarray(columns.category_codes, dtype=np.int32)
+        self.lat = np.asarray(columns.lat, dtype=np.float64)
+        self.lng = np.asarray(columns.lng, dtype=np.float64)
+        self.rating = np.asarray(columns.rating, dtype=np.float64)
+        self.price = np.asarray(columns.price, dtype=np.float64)
+        self.duration = np.asarray(columns.duration, dtype=np.int32)
+        lengths = np.fromiter((len(t) for t in columns.tag_ids), dtype=np.int64, count=len(columns.tag_ids))
+        self.tag_offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.tag_offsets[1:])
+        self.tag_ids = np.fromiter(
+            (t for ids in columns.tag_ids for t in ids), dtype=np.int32, count=int(self.tag_offsets[-1])
+        )
+        # タグ番号 -> その番号を持つ行（CSR を展開した行番号）
+        self.tag_rows = np.repeat(np.arange(len(lengths), dtype=np.int32), lengths)
+        self._memo_lock = threading.Lock()
+        self._area_memo: Dict[str, Any] = {}
+        self._tag_memo: Dict[str, Any] = {}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def nbytes(self) -> int:
+        """NumPy 配列の合計サイズ（文字列列は含まない）"""
+        return sum(a.nbytes for a in (
+            self.area_codes, self.category_codes, self.lat, self.lng, self.rating, self.price,
+            self.duration, self.tag_offsets, self.tag_ids, self.tag_rows,
+        ))
+
+    def tag_ids_of(self, i: int) -> Tuple[int, ...]:
+        return tuple(self.tag_ids[self.tag_offsets[i]:self.tag_offsets[i + 1]].tolist())
+
+    # ---- ベクトル化した絞り込み ----
+
+    def area_mask(self, area: str):
+        """area を部分文字列として含むエリアの行（Spot.area.contains と同じ）"""
+        with self._memo_lock:
+            codes = self._area_memo.get(area)
+            if codes is None:
+                codes = np.asarray(
+                    [c for c, v in enumerate(self.areas.values) if v is not None and area in v], dtype=np.int32
+                )
+                self._area_memo[area] = codes
+        return np.isin(self.area_codes, codes)
+
+    def category_mask(self, category: str):
+        code = self.categories.codes.get(category)
+        if code is None:
+            return np.zeros(len(self), dtype=bool)
+        return self.category_codes == code
+
+    def _matching_tag_ids(self, search_tag: str):
+        """検索タグに一致するタグ番号（値の一致・正規化値の一致・どちらかが他方を含む）"""
+        from app.utils.tag_normalizer import normalize_tag_value
+
+        with self._memo_lock:
+            ids = self._tag_memo.get(search_tag)
+            if ids is None:
+                normalized = normalize_tag_value(search_tag)
+                ids = np.asarray([
+                    code for code, pair in enumerate(self.tags.values)
+                    if pair is not None and (
+                        pair[0] == search_tag or pair[1] == normalized
+                        or search_tag in pair[0] or pair[0] in search_tag
+                    )
+                ], dtype=np.int32)
+                self._tag_memo[search_tag] = ids
+        return ids
+
+    def tag_mask(self, search_tags: Sequence[str]):
+        """いずれかの検索タグに一致するタグを持つ行"""
+        if not search_tags:
+            return np.zeros(len(self), dtype=bool)
+        ids = np.unique(np.concatenate([self._matching_tag_ids(t) for t in search_tags]))
+        hit_rows = self.tag_rows[np.isin(self.tag_ids, ids)]
+        mask = np.zeros(len(self), dtype=bool)
+        mask[hit_rows] = True
+        return mask
+
+    # ---- 行の取り出し ----
+
+    def spot(self, i: int) -> CatalogSpot:
+        spot = CatalogSpot()
+        spot.id = self.ids[i]
+        spot.name = self.names[i]
+        spot.description = self.descriptions[i]
+        spot.area = self.areas.values[self.area_codes[i]]
+        spot.category = self.categories.values[self.category_codes[i]]
+        duration = int(self.duration[i])
+        spot.duration_minutes = None if duration < 0 else duration
+        rating = float(self.rating[i])
+        spot.rating = None if math.isnan(rating) else rating
+        spot.image = self.images[i]
+        price = float(self.price[i])
+        spot.price = None if math.isnan(price) else price
+        # 呼び出し側がプランに書き込むため、リストは複製して渡す
+        tags = self.raw_tags[i]
+        spot.tags = list(tags) if isinstance(tags, list) else tags
+        lat, lng = float(self.lat[i]), float(self.lng[i])
+        spot.latitude = None if math.isnan(lat) else lat
+        spot.longitude = None if math.isnan(lng) else lng
+        spot.opening_hours = self.opening_hours[i]
+        return spot
+
+    def spots(self, indexes) -> List[CatalogSpot]:
+        return [self.spot(int(i)) for i in indexes]
+
+    def get(self, spot_id: str) -> Optional[CatalogSpot]:
+        i = self.positions.get(spot_id)
+        return None if i is None else self.spot(i)
+
+    def spots_for_plan(self, area: str, search_tags: Sequence[str], limit: int) -> List[CatalogSpot]:
+        """get_spots_for_plan と同じ結果をメモリ上で返す
+
+        エリアに一致する先頭 limit * 2 件のうちタグに一致する行を limit 件。
+        タグ一致が無ければエリア一致の先頭 limit 件（従来と同じフォールバック）。
+        """
+        candidates = np.flatnonzero(self.area_mask(area))[:limit * 2]
+        if search_tags and len(candidates):
+            matched = candidates[self.tag_mask(search_tags)[candidates]]
+            if len(matched):
+                return self.spots(matched[:limit])
+        return self.spots(candidates[:limit])
+
+
+# ---- 読み込み ----
+
+def _row_timestamp(row):
+    return row.updated_at or row.created_at
+
+
+def _max_watermark(current, rows) -> Any:
+    for row in rows:
+        stamp = _row_timestamp(row)
+        if stamp is not None and (current is None or stamp > current):
+            current = stamp
+    return current
+
+
+def _load_full(db: Session, version: int) -> CatalogSnapshot:
+    from app.services.spot_service import _apply_public_visibility_filter
+
+    columns = _Columns(_Interner(), _Interner(), _Interner())
+    watermark = None
+    query = _apply_public_visibility_filter(db.query(*_COLUMNS)).yield_per(_YIELD_PER)
+    for row in query:
+        columns.add_row(row)
+        stamp = _row_timestamp(row)
+        if stamp is not None and (watermark is None or stamp > watermark):
+            watermark = stamp
+    metrics.increment("spot_catalog.full_loads")
+    return CatalogSnapshot(columns, version, watermark, time.monotonic())
+
+
+def _fetch_by_ids(db: Session, ids: Sequence[str]) -> List[Any]:
+    rows = []
+    for start in range(0, len(ids), _ID_CHUNK):
+        rows.extend(db.query(*_COLUMNS).filter(Spot.id.in_(ids[start:start + _ID_CHUNK])).all())
+    return rows
+
+
+def _load_delta(db: Session, current: CatalogSnapshot, version: int) -> Optional[CatalogSnapshot]:
+    """前回以降に変わった行だけを読み、新しいスナップショットを作る（差分が大きければ None）"""
+    from app.services.spot_service import _apply_public_visibility_filter
+
+    changed = []
+    if current.watermark is not None:
+        since = current.watermark - _WATERMARK_MARGIN
+        changed = db.query(*_COLUMNS).filter(
+            or_(Spot.updated_at >= since, Spot.created_at >= since)
+        ).all()
+    # 削除・非公開化と、タイムスタンプが付かない更新経路での追加を ID 一覧の差で拾う
+    public_ids = {spot_id for (spot_id,) in _apply_public_visibility_filter(db.query(Spot.id))}
+    changed_ids = {row.id for row in changed}
+    missing = [spot_id for spot_id in public_ids if spot_id not in current.positions and spot_id not in changed_ids]
+    if missing:
+        changed.extend(_fetch_by_ids(db, missing))
+
+    if len(changed) > max(len(current), 1) * _DELTA_FULL_RELOAD_RATIO:
+        return None
+
+    updates: Dict[int, Any] = {}
+    appended = []
+    for row in changed:
+        if not _is_public(row) or row.id not in public_ids:
+            continue
+        i = current.positions.get(row.id)
+        if i is None:
+            appended.append(row)
+        else:
+            updates[i] = row
+    kept = [i for i, spot_id in enumerate(current.ids) if spot_id in public_ids]
+
+    columns = _Columns(current.areas.copy(), current.categories.copy(), current.tags.copy())
+    # 読み込み順（従来の DB の並び）を保つため、変わった行は元の位置で差し替え、新規は末尾に足す
+    run: List[int] = []
+    for i in kept:
+        row = updates.get(i)
+        if row is None:
+            run.append(i)
+            continue
+        if run:
+            columns.add_snapshot_rows(current, run)
+            run = []
+        columns.add_row(row)
+    if run:
+        columns.add_snapshot_rows(current, run)
+    for row in appended:
+        columns.add_row(row)
+
+    watermark = _max_watermark(current.watermark, changed)
+    metrics.increment("spot_catalog.delta_loads")
+    metrics.observe("spot_catalog.delta_rows", len(changed))
+    return CatalogSnapshot(columns, version, watermark, current.loaded_at)
+
+
+_lock = threading.Lock()
+_snapshot: Optional[CatalogSnapshot] = None
+
+
+def is_enabled() -> bool:
+    return settings.SPOT_CATALOG_ENABLED and NUMPY_AVAILABLE
+
+
+def get_snapshot(db: Session) -> Optional[CatalogSnapshot]:
+    """最新のカタログ世代に追従したスナップショット（無効なら None）
+
+    Args:
+        db: 読み込み（初回・世代更新後）にだけ使う
+    """
+    global _snapshot
+    if not is_enabled():
+        return None
+    from app.utils.response_cache import get_catalog_version
+
+    version = get_catalog_version()
+    current = _snapshot
+    if current is not None and current.version == version and not _full_reload_due(current):
+        return current
+
+    with _lock:
+        current = _snapshot
+        if current is not None and current.version == version and not _full_reload_due(current):
+            return current
+        with metrics.timed("spot_catalog.refresh_ms"):
+            snapshot = None
+            mode = "差分"
+            if current is not None and not _full_reload_due(current):
+                snapshot = _load_delta(db, current, version)
+            if snapshot is None:
+                mode = "全件"
+                snapshot = _load_full(db, version)
+        _snapshot = snapshot
+    metrics.set_gauge("spot_catalog.spots", len(snapshot))
+    metrics.set_gauge("spot_catalog.array_bytes", snapshot.nbytes)
+    logger.info("スポットカタログを更新しました: %d件（世代 %s、%s）", len(snapshot), version, mode)
+    return snapshot
+
+
+def _full_reload_due(snapshot: CatalogSnapshot) -> bool:
+    interval = settings.SPOT_CATALOG_FULL_RELOAD_SEC
+    return bool(interval) and time.monotonic() - snapshot.loaded_at >= interval
+
+
+def invalidate_spot_catalog() -> None:
+    """スナップショットを破棄して次回に全件を読み直す"""
+    global _snapshot
+    with _lock:
+        _snapshot = None
+
+
+# 正規化済みタグ・テーマ検索のメモは古いカテゴリ定義で作られているため捨てる
+invalidation_bus.register(TAG_CATEGORIES_NAMESPACE, lambda payload: invalidate_spot_catalog())
+
+
+def catalog_stats() -> Dict[str, Any]:
+    """管理画面用の状態"""
+    snapshot = _snapshot
+    if snapshot is None:
+        return {"enabled": is_enabled(), "loaded": False}
+    return {
+        "enabled": is_enabled(),
+        "loaded": True,
+        "version": snapshot.version,
+        "spots": len(snapshot),
+        "areas": len(snapshot.areas.values) - 1,
+        "categories": len(snapshot.categories.values) - 1,
+        "tags": len(snapshot.tags.values) - 1,
+        "array_bytes": snapshot.nbytes,
+        "age_sec": round(time.monotonic() - snapshot.loaded_at, 1),
+    }
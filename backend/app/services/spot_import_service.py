@@ -9,10 +9,12 @@ import uuid
 import time
 from datetime import datetime
 from typing import List, Dict, Any, Optional
+from sqlalchemy import update
 from sqlalchemy.orm import Session
 from app.config import settings
 from app.models.spot import Spot
 from app.utils.error_handler import log_error
+from app.utils.response_cache import CATALOG_DIRTY_KEY
 from app.utils.debug_logger import log_debug_step
 from app.utils.tag_normalizer import normalize_tags, tags_to_dict_list, TagSource
 
@@ -325,8 +327,9 @@ def enrich_spot_data(
             metrics["gemini_enrich_call_count"] = metrics.get("gemini_enrich_call_count", 0) + 1
         try:
             from app.services.gemini_service import research_spot_info
+            from app.utils.gemini_governor import BATCH
 
-            research = research_spot_info(name, area=enriched.get("area") or "", prefecture=pref)
+            research = research_spot_info(name, area=enriched.get("area") or "", prefecture=pref, priority=BATCH)
             if research and not research.get("error"):
                 research_desc = (research.get("description") or "").strip()
                 if research_desc:
@@ -995,11 +998,11 @@ def add_location_to_existing_spots(
     Returns:
         処理結果（成功件数、失敗件数等）
     """
-    from app.services.geocoding_service import get_geo
+    from app.services.geocoding_service import available_providers, geocode_batch
 
     # Places API で事前補完したうえでここに来るケースが多いため、
-    # OpenCage キー未設定時はエラー連発を避けて安全にスキップする。
-    if not settings.OPENCAGE_API_KEY:
+    # ジオコーディングのキーが1つも無いときはエラー連発を避けて安全にスキップする。
+    if not available_providers():
         total = 0
         try:
             if spot_ids:
@@ -1009,8 +1012,8 @@ def add_location_to_existing_spots(
         except Exception:
             total = len(spot_ids) if spot_ids else 0
         log_error(
-            "LOCATION_ASSIGNMENT_SKIPPED_NO_OPENCAGE_KEY",
-            "OPENCAGE_API_KEY 未設定のため OpenCage 補完をスキップしました",
+            "LOCATION_ASSIGNMENT_SKIPPED_NO_GEOCODER_KEY",
+            "ジオコーディング用の API キー未設定のため位置情報の補完をスキップしました",
             {"prefecture": prefecture, "target_count": total},
         )
         return {
@@ -1020,11 +1023,12 @@ def add_location_to_existing_spots(
             "total_processed": total,
         }
     
-    # 対象Spotを取得
+    # 対象Spotを取得（必要な列だけをタプルで読む。commit でインスタンスが期限切れになり1件ずつ再読み込みされるのを避ける）
+    query = db.query(Spot.id, Spot.name, Spot.area, Spot.latitude, Spot.longitude)
     if spot_ids:
-        spots = db.query(Spot).filter(Spot.id.in_(spot_ids)).all()
+        spots = query.filter(Spot.id.in_(spot_ids)).all()
     else:
-        spots = db.query(Spot).limit(10000).all()  # 全件取得
+        spots = query.limit(10000).all()  # 全件取得
     
     updated_count = 0
     error_count = 0
@@ -1039,59 +1043,64 @@ def add_location_to_existing_spots(
         }
     )
     
+    targets = []
     for spot in spots:
-        # 既に位置情報がある場合はスキップ
-        if spot.latitude and spot.longitude:
+        # 既に位置情報がある場合・名前やエリアが無い場合はスキップ
+        if (spot.latitude and spot.longitude) or not spot.name or not spot.area:
             skipped_count += 1
             continue
-        
-        if not spot.name or not spot.area:
-            skipped_count += 1
-            continue
-        
-        # 位置情報を取得
-        lat, lng = get_geo(spot.name, spot.area, prefecture)
-        if lat and lng:
-            try:
-                spot.latitude = lat
-                spot.longitude = lng
-                db.commit()
-                db.refresh(spot)
-                updated_count += 1
-                log_debug_step(
-                    step="location_assignment",
-                    status="updated",
-                    data={
-                        "spot_name": spot.name,
-                        "spot_id": spot.id,
-                        "latitude": lat,
-                        "longitude": lng
-                    }
-                )
-            except Exception as e:
-                db.rollback()
+        targets.append(spot)
+    
+    # 位置情報をまとめて取得（キャッシュ済みは API を呼ばず、残りは並列に解決）
+    coords = geocode_batch(
+        [{"name": spot.name, "area": spot.area} for spot in targets],
+        prefecture,
+    )
+    
+    # 一定件数ごとにまとめて commit する（1件ずつの commit を避ける）
+    chunk_size = settings.GEOCODE_COMMIT_CHUNK
+    indexed = list(enumerate(targets))
+    for start in range(0, len(indexed), chunk_size):
+        chunk = indexed[start:start + chunk_size]
+        chunk_updates = []
+        for i, spot in chunk:
+            if coords.get(i):
+                lat, lng = coords[i]
+                chunk_updates.append({"id": spot.id, "latitude": lat, "longitude": lng})
+            else:
                 log_debug_step(
                     step="location_assignment",
                     status="error",
                     data={
                         "spot_name": spot.name,
                         "spot_id": spot.id,
-                        "error": str(e)
+                        "error": "Geocoding returned None"
                     }
                 )
-                log_error("SPOT_UPDATE_ERROR", f"Spot更新エラー ({spot.name}): {e}")
                 error_count += 1
-        else:
+        if not chunk_updates:
+            continue
+        try:
+            # 主キー指定の一括 UPDATE（executemany）。ORM の変更検知を通らないため、
+            # commit 時にカタログ世代を進める印を自分で付ける（スナップショット・ETag 等の無効化）
+            db.execute(update(Spot), chunk_updates)
+            db.info[CATALOG_DIRTY_KEY] = True
+            db.commit()
+            updated_count += len(chunk_updates)
+            log_debug_step(
+                step="location_assignment",
+                status="updated",
+                data={"count": len(chunk_updates), "spot_ids": [row["id"] for row in chunk_updates]}
+            )
+        except Exception as e:
+            db.rollback()
             log_debug_step(
                 step="location_assignment",
                 status="error",
-                data={
-                    "spot_name": spot.name,
-                    "spot_id": spot.id,
-                    "error": "Geocoding returned None"
-                }
+                data={"count": len(chunk_updates), "error": str(e)}
             )
-            error_count += 1
+            log_error("SPOT_UPDATE_ERROR", f"Spot更新エラー（{len(chunk_updates)}件）: {e}")
+            error_count += len(chunk_updates)
     
     result = {
         "updated": updated_count,
@@ -15,6 +15,8 @@ from app.utils.tag_normalizer import (
     TagSource
 )
 from app.schemas.tag import TagCategory
+from app.utils.spot_search import apply_keyword_search, build_highlight, render_snippet
+from app.services.spot_catalog_service import get_snapshot
 import uuid
 
 
@@ -71,12 +73,15 @@ def get_spots(
     keyword: Optional[str] = None,
     skip: int = 0,
     limit: int = 100,
-    include_unverified: bool = False
+    include_unverified: bool = False,
+    highlight: bool = False
 ) -> List[Spot]:
     """スポット一覧を取得（フィルタリング対応）
 
     include_unverified=True のときのみ公開フィルタを外し全件対象にする
     （管理者用）。デフォルトは公開挙動（検証済み・閉業除外）。
+    keyword 指定時は全文検索インデックスで関連度順に並べ、highlight=True なら
+    一致箇所を <mark> で囲んだ抜粋を spot.search_highlight に付ける。
     """
     query = db.query(Spot)
 
@@ -88,15 +93,23 @@ def get_spots(
         query = query.filter(Spot.area.contains(area))
     if category:
         query = query.filter(Spot.category == category)
-    if keyword:
-        query = query.filter(
-            or_(
-                Spot.name.contains(keyword),
-                Spot.description.contains(keyword)
-            )
-        )
-    
-    return query.offset(skip).limit(limit).all()
+    if not keyword:
+        return query.offset(skip).limit(limit).all()
+
+    query, with_snippet = apply_keyword_search(query, keyword)
+    rows = query.offset(skip).limit(limit).all()
+    if not with_snippet:
+        if highlight:
+            for spot in rows:
+                spot.search_highlight = build_highlight(spot, keyword)
+        return rows
+
+    spots = []
+    for spot, snippet in rows:
+        if highlight:
+            spot.search_highlight = render_snippet(snippet)
+        spots.append(spot)
+    return spots
 
 
 def get_spot(db: Session, spot_id: str) -> Optional[Spot]:
@@ -188,9 +201,17 @@ def get_spots_for_plan(
     themes: List[str],
     limit: int = 100
 ) -> List[Spot]:
-    """プラン生成用にスポットを取得（エリアとテーマでフィルタリング）"""
+    """プラン生成用にスポットを取得（エリアとテーマでフィルタリング）
+
+    スポットカタログのスナップショットが使えれば、DB に問い合わせずメモリ上で絞り込む
+    （戻り値は Spot と同じ属性を持つ CatalogSpot）。使えなければ従来どおり DB を引く。
+    """
     # テーマをタグにマッピング
     tags = map_themes_to_tags(themes)
+
+    snapshot = get_snapshot(db)
+    if snapshot is not None:
+        return snapshot.spots_for_plan(area, tags, limit)
     
     # エリアでフィルタリング
     # プランには未検証・閉業スポットを出さないため、常に公開フィルタを適用する。
@@ -0,0 +1,228 @@
+"""
+タグ統計サービス
+
+/api/spots/tags の集計を tag_stats テーブルに実体化する。
+- Session の before_flush でスポットのタグ差分を拾い、同じトランザクション内で加減算する
+  （API・インポート・マージなど ORM 経由の書き込みはすべて対象）
+- rebuild_tag_stats で全件から作り直す（初回バックフィル・ずれの修復用）
+"""
+import hashlib
+import json
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, attributes
+
+from app.models.spot import Spot
+from app.models.tag_stat import TagStat
+from app.utils.tag_normalizer import dict_list_to_tags
+
+logger = logging.getLogger(__name__)
+
+# session.info にこのキーを立てると差分更新を行わない（再構築中など）
+SKIP_TAG_STATS_KEY = "skip_tag_stats"
+
+_UPSERT_SQL = text(
+    "INSERT INTO tag_stats (value, count, category, normalized, updated_at) "
+    "VALUES (:value, :delta, :category, :normalized, CURRENT_TIMESTAMP) "
+    "ON CONFLICT (value) DO UPDATE SET "
+    "count = tag_stats.count + excluded.count, "
+    "category = COALESCE(excluded.category, tag_stats.category), "
+    "normalized = COALESCE(excluded.normalized, tag_stats.normalized), "
+    "updated_at = CURRENT_TIMESTAMP"
+)
+_DECREMENT_SQL = text(
+    "UPDATE tag_stats SET count = count - :delta, updated_at = CURRENT_TIMESTAMP WHERE value = :value"
+)
+_PRUNE_SQL = text("DELETE FROM tag_stats WHERE count <= 0")
+
+
+def _category_value(category: Any) -> Optional[str]:
+    if category is None:
+        return None
+    return getattr(category, "value", category)
+
+
+def _tag_entries(tags: Any) -> List[Tuple[str, Optional[str], str]]:
+    """スポットの tags 列を (value, category, normalized) のリストにする（旧エンドポイントと同じ数え方）"""
+    if not tags or not isinstance(tags, list):
+        return []
+    try:
+        parsed = dict_list_to_tags(tags)
+    except Exception as e:
+        logger.warning("タグ統計: タグの解析に失敗しました: %s", e)
+        return []
+    return [(tag.value, _category_value(tag.category), tag.normalized) for tag in parsed]
+
+
+def _old_tags_from_db(session: Session, spot: Spot) -> Any:
+    """未ロードの旧値を DB から読む（UPDATE 発行前の before_flush で呼ぶ）"""
+    row = session.connection().execute(
+        text("SELECT tags FROM spots WHERE id = :id"), {"id": spot.id}
+    ).first()
+    if not row:
+        return None
+    value = row[0]
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return None
+    return value
+
+
+def collect_tag_deltas(session: Session) -> Tuple[Counter, Dict[str, Tuple[Optional[str], str]]]:
+    """flush 対象のスポットからタグ出現数の差分を集める"""
+    deltas: Counter = Counter()
+    meta: Dict[str, Tuple[Optional[str], str]] = {}
+
+    def _add(tags: Any, sign: int) -> None:
+        for value, category, normalized in _tag_entries(tags):
+            deltas[value] += sign
+            if sign > 0:
+                meta[value] = (category, normalized)
+
+    for obj in session.new:
+        if isinstance(obj, Spot):
+            _add(obj.tags, 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, Spot):
+            _add(obj.tags, -1)
+
+    for obj in session.dirty:
+        if not isinstance(obj, Spot) or obj in session.deleted:
+            continue
+        history = attributes.get_history(obj, "tags")
+        if not history.added and not history.deleted:
+            continue
+        if history.deleted:
+            old_tags = history.deleted[0]
+        else:
+            # 期限切れ（commit 後）の属性に代入した場合は旧値が履歴に無い
+            old_tags = _old_tags_from_db(session, obj)
+        new_tags = history.added[0] if history.added else None
+        _add(old_tags, -1)
+        _add(new_tags, 1)
+
+    return deltas, meta
+
+
+def apply_tag_deltas(session: Session, deltas: Counter, meta: Dict[str, Tuple[Optional[str], str]]) -> None:
+    """差分を tag_stats に反映する（呼び出し元のトランザクション内）"""
+    changes = {value: delta for value, delta in deltas.items() if delta}
+    if not changes and not meta:
+        return
+    conn = session.connection()
+    decremented = False
+    for value, delta in changes.items():
+        if delta > 0:
+            category, normalized = meta.get(value, (None, value))
+            conn.execute(
+                _UPSERT_SQL,
+                {"value": value, "delta": delta, "category": category, "normalized": normalized},
+            )
+        else:
+            conn.execute(_DECREMENT_SQL, {"value": value, "delta": -delta})
+            decremented = True
+    # 出現数が変わらなくてもカテゴリ・正規化値の更新は反映する（タグの付け替え等）
+    for value, (category, normalized) in meta.items():
+        if value not in changes:
+            conn.execute(
+                _UPSERT_SQL,
+                {"value": value, "delta": 0, "category": category, "normalized": normalized},
+            )
+    if decremented:
+        conn.execute(_PRUNE_SQL)
+
+
+def sync_tag_stats_before_flush(session: Session) -> None:
+    """before_flush フックの本体。統計の SQL が失敗してもスポットの書き込み自体は止めない
+
+    PostgreSQL では失敗した文がトランザクション全体を中断状態にし、続くスポットの flush まで
+    失敗させるため、セーブポイント内で実行して失敗時はそこまで戻す
+    （session.begin_nested() は flush を呼ぶため、セッションの接続のセーブポイントを使う）。
+    SQLite（pysqlite）のセーブポイントは外側のトランザクションと独立に確定してしまうため使わず、
+    セッションのトランザクションにそのまま書く（失敗した文だけが取り消され、続きは実行できる）。
+    SQL 以外の例外（バグ）はそのまま送出する。
+    """
+    if session.info.get(SKIP_TAG_STATS_KEY):
+        return
+    if not any(isinstance(obj, Spot) for obj in (*session.new, *session.dirty, *session.deleted)):
+        return
+    conn = session.connection()
+    try:
+        if conn.dialect.name == "postgresql":
+            with conn.begin_nested():
+                deltas, meta = collect_tag_deltas(session)
+                apply_tag_deltas(session, deltas, meta)
+        else:
+            deltas, meta = collect_tag_deltas(session)
+            apply_tag_deltas(session, deltas, meta)
+    except SQLAlchemyError as e:
+        # 統計がずれても rebuild_tag_stats で修復できるため、ここでは記録のみ
+        logger.warning("タグ統計の差分更新に失敗しました: %s", e)
+
+
+def rebuild_tag_stats(db: Session) -> int:
+    """全スポットからタグ統計を作り直す。登録したタグ数を返す"""
+    counter: Counter = Counter()
+    meta: Dict[str, Tuple[Optional[str], str]] = {}
+    rows = db.query(Spot.tags).filter(Spot.tags.isnot(None)).yield_per(1000)
+    for (tags,) in rows:
+        for value, category, normalized in _tag_entries(tags):
+            counter[value] += 1
+            if category:
+                meta[value] = (category, normalized)
+            else:
+                meta.setdefault(value, (None, normalized))
+
+    db.info[SKIP_TAG_STATS_KEY] = True
+    try:
+        db.query(TagStat).delete(synchronize_session=False)
+        db.bulk_insert_mappings(
+            TagStat,
+            [
+                {
+                    "value": value,
+                    "count": count,
+                    "category": meta[value][0],
+                    "normalized": meta[value][1],
+                }
+                for value, count in counter.items()
+            ],
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.info.pop(SKIP_TAG_STATS_KEY, None)
+    return len(counter)
+
+
+def ensure_tag_stats(db: Session) -> None:
+    """tag_stats が空でタグ付きスポットがあれば一度だけバックフィルする（起動時）"""
+    if db.query(TagStat.value).first() is not None:
+        return
+    if db.query(Spot.id).filter(Spot.tags.isnot(None)).first() is None:
+        return
+    count = rebuild_tag_stats(db)
+    logger.info("タグ統計をバックフィルしました: %d件", count)
+
+
+def get_tag_stats(db: Session, category: Optional[str] = None) -> List[TagStat]:
+    """タグ統計を出現数の多い順に返す（インデックスのみで読める単一クエリ）"""
+    query = db.query(TagStat).filter(TagStat.count > 0)
+    if category:
+        query = query.filter(TagStat.category == category)
+    return query.order_by(TagStat.count.desc(), TagStat.value).all()
+
+
+def compute_tags_etag(payload: Dict[str, Any]) -> str:
+    """レスポンス内容から ETag を作る（If-None-Match で 304 を返すため）"""
+    raw = json.dumps(payload, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return '"' + hashlib.sha1(raw.encode("utf-8")).hexdigest() + '"'
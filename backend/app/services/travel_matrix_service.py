@@ -0,0 +1,637 @@
+"""
+エリアごとの移動時間・距離行列（事前計算）
+
+プロンプトの spot_distances は任意の並びの連続20組だけで、時刻の再計算は区間ごとに OSRM を呼んでいた。
+公開スポットをエリア（都道府県。TRAVEL_MATRIX_MAX_SPOTS を超える場合は市区町村）に分け、
+プロファイル（driving / walking）ごとの全組み合わせの行列を裏で作っておく。
+
+- 計算: OSRM の table API を TRAVEL_MATRIX_OSRM_BATCH 座標ずつのブロックに分けて呼ぶ。
+  失敗したブロック（サーキット遮断を含む）は直線距離 × 迂回係数 ÷ 平均速度で埋める
+- 保存: travel_matrices テーブルに スポットID の並び + バイナリ（座標 float64、移動秒数 uint16、距離 m uint32、zlib）
+- 更新: カタログ世代が変わったら裏で差分更新する（job_leases のリースで全ワーカーのうち1本だけ）。追加・座標が変わったスポットの行と列だけを計算し、
+  削除・非公開になったスポットは落とす
+- 通知: 更新後に無効化バスの travel_matrices 名前空間へ publish し、各ワーカーは次の参照で読み直す
+- 参照: 座標（小数5桁）から行を引くため、route_service.get_leg_info / get_route_info_batch は
+  同じ行列に載っている2点なら外部 API を呼ばない
+- proximity_clusters: 行列上で互いに近いスポットのまとまり（プロンプト用）
+"""
+import logging
+import re
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.utils import invalidation_bus, job_lease, metrics
+from app.utils.error_handler import log_error
+from app.utils.lazy_import import is_available, lazy_module
+
+logger = logging.getLogger(__name__)
+
+np = lazy_module("numpy")
+NUMPY_AVAILABLE = is_available("numpy")
+
+TRAVEL_MATRIX_NAMESPACE = "travel_matrices"
+_REFRESH_LEASE = "travel_matrix_refresh"
+FORMAT_VERSION = 1
+_FLAG_ZLIB = 0x01
+_HEADER = struct.Struct("<BBI")
+# 移動秒数・距離の「不明」（到達不能など）。uint16 の秒数は約18時間で頭打ち
+UNKNOWN_SECONDS = 0xFFFF
+UNKNOWN_METERS = 0xFFFFFFFF
+
+# 直線距離からの推定（OSRM が使えない場合）: 迂回係数と平均速度（km/h）
+_FALLBACK_MODEL = {
+    "driving": (1.3, 40.0),
+    "walking": (1.2, 4.0),
+}
+
+_PREFECTURE_RE = re.compile(r"^(.{2,3}?[都道府県])")
+_MUNICIPALITY_RE = re.compile(r"([^\s]+?[市区町村郡])")
+
+Coord = Tuple[float, float]
+
+
+def matrix_profile(profile: Optional[str]) -> str:
+    """ルートのプロファイルを行列のプロファイルに寄せる（transit などは driving）"""
+    return "walking" if profile == "walking" else "driving"
+
+
+def _coord_key(lat: float, lng: float) -> str:
+    return f"{lat:.5f},{lng:.5f}"
+
+
+def _prefecture_key(area: Optional[str]) -> str:
+    text = (area or "").strip()
+    match = _PREFECTURE_RE.match(text)
+    if match:
+        return match.group(1)
+    return text.split()[0] if text.split() else ""
+
+
+def _municipality_key(area: Optional[str]) -> str:
+    text = (area or "").strip()
+    prefecture = _prefecture_key(text)
+    match = _MUNICIPALITY_RE.search(text[len(prefecture):])
+    return f"{prefecture} {match.group(1)}" if match else prefecture
+
+
+def group_spots(rows: Sequence[Tuple[str, Optional[str], float, float]]) -> Dict[str, List[Tuple[str, float, float]]]:
+    """(id, area, lat, lng) をエリアキーごとにまとめる（大きすぎる都道府県は市区町村に分ける）"""
+    by_prefecture: Dict[str, List[Tuple[str, Optional[str], float, float]]] = {}
+    for row in rows:
+        by_prefecture.setdefault(_prefecture_key(row[1]), []).append(row)
+
+    groups: Dict[str, List[Tuple[str, float, float]]] = {}
+    limit = settings.TRAVEL_MATRIX_MAX_SPOTS
+    for prefecture, members in by_prefecture.items():
+        if len(members) <= limit:
+            groups[prefecture] = [(r[0], r[2], r[3]) for r in members]
+            continue
+        for row in members:
+            groups.setdefault(_municipality_key(row[1]), []).append((row[0], row[2], row[3]))
+    for key in list(groups):
+        if len(groups[key]) > limit:
+            log_error(
+                "TRAVEL_MATRIX_GROUP_TOO_LARGE",
+                f"エリア '{key}' のスポットが多すぎるため先頭 {limit} 件だけ行列にします",
+                {"area_key": key, "spots": len(groups[key])},
+            )
+            groups[key] = groups[key][:limit]
+    return groups
+
+
+# ---- バイナリ形式 ----
+
+def encode_payload(lat, lng, seconds, meters) -> bytes:
+    n = len(lat)
+    body = b"".join((
+        np.asarray(lat, dtype="<f8").tobytes(),
+        np.asarray(lng, dtype="<f8").tobytes(),
+        np.asarray(seconds, dtype="<u2").tobytes(),
+        np.asarray(meters, dtype="<u4").tobytes(),
+    ))
+    return _HEADER.pack(FORMAT_VERSION, _FLAG_ZLIB, n) + zlib.compress(body, 1)
+
+
+def decode_payload(payload: bytes):
+    """(lat, lng, 秒数 n×n, 距離 n×n) を返す"""
+    version, flags, n = _HEADER.unpack_from(payload)
+    if version != FORMAT_VERSION:
+        raise ValueError(f"未対応の行列形式です: {version}")
+    body = payload[_HEADER.size:]
+    if flags & _FLAG_ZLIB:
+        body = zlib.decompress(body)
+    offset = 0
+    lat = np.frombuffer(body, dtype="<f8", count=n, offset=offset)
+    offset += 8 * n
+    lng = np.frombuffer(body, dtype="<f8", count=n, offset=offset)
+    offset += 8 * n
+    seconds = np.frombuffer(body, dtype="<u2", count=n * n, offset=offset).reshape(n, n)
+    offset += 2 * n * n
+    meters = np.frombuffer(body, dtype="<u4", count=n * n, offset=offset).reshape(n, n)
+    return lat, lng, seconds, meters
+
+
+# ---- 計算 ----
+
+def _fallback_block(profile: str, src: Sequence[Coord], dst: Sequence[Coord]):
+    """直線距離 × 迂回係数 ÷ 平均速度（秒, m）"""
+    detour, speed_kmh = _FALLBACK_MODEL[profile]
+    a = np.radians(np.asarray(src, dtype=np.float64))
+    b = np.radians(np.asarray(dst, dtype=np.float64))
+    dlat = b[None, :, 0] - a[:, None, 0]
+    dlng = b[None, :, 1] - a[:, None, 1]
+    h = np.sin(dlat / 2) ** 2 + np.cos(a[:, None, 0]) * np.cos(b[None, :, 0]) * np.sin(dlng / 2) ** 2
+    km = 2 * 6371.0 * np.arcsin(np.sqrt(np.clip(h, 0.0, 1.0))) * detour
+    return km / speed_kmh * 3600, km * 1000
+
+
+def _osrm_block(profile: str, src: Sequence[Coord], dst: Sequence[Coord]):
+    """OSRM table API で src × dst を取得（失敗時 None）"""
+    from app.utils.resilience import CircuitOpenError, guarded_request
+
+    coords = list(src) + list(dst)
+    coords_str = ";".join(f"{lng},{lat}" for lat, lng in coords)
+    params = {
+        "sources": ";".join(str(i) for i in range(len(src))),
+        "destinations": ";".join(str(len(src) + j) for j in range(len(dst))),
+        "annotations": "duration,distance",
+    }
+    url = f"{settings.OSRM_BASE_URL}/table/v1/{profile}/{coords_str}"
+    try:
+        response = guarded_request("osrm", "GET", url, params=params, timeout=settings.TRAVEL_MATRIX_OSRM_TIMEOUT_SEC)
+    except CircuitOpenError:
+        return None
+    except Exception as e:
+        log_error("TRAVEL_MATRIX_OSRM_ERROR", f"OSRM table の取得に失敗しました: {e}", {"coords": len(coords)})
+        return None
+    if response.status_code != 200:
+        return None
+    data = response.json()
+    if data.get("code") != "Ok" or not data.get("durations"):
+        return None
+    seconds = np.array(data["durations"], dtype=np.float64)
+    meters = np.array(data.get("distances") or np.full(seconds.shape, np.nan), dtype=np.float64)
+    return seconds, meters
+
+
+def _fill_block(profile: str, coords: Sequence[Coord], src_idx, dst_idx, seconds, meters) -> Tuple[int, int]:
+    """行列の src_idx × dst_idx を埋める（(OSRM のブロック数, 推定で埋めたブロック数) を返す）"""
+    half = max(1, settings.TRAVEL_MATRIX_OSRM_BATCH // 2)
+    osrm_blocks = fallback_blocks = 0
+    for s in range(0, len(src_idx), half):
+        rows = src_idx[s:s + half]
+        for d in range(0, len(dst_idx), half):
+            cols = dst_idx[d:d + half]
+            src = [coords[i] for i in rows]
+            dst = [coords[j] for j in cols]
+            block = _osrm_block(profile, src, dst) if settings.TRAVEL_MATRIX_USE_OSRM else None
+            est_sec, est_m = _fallback_block(profile, src, dst)
+            if block is None:
+                block_sec, block_m = est_sec, est_m
+                fallback_blocks += 1
+            else:
+                # OSRM が null（到達不能）を返したセルは推定で埋める
+                block_sec = np.where(np.isnan(block[0]), est_sec, block[0])
+                block_m = np.where(np.isnan(block[1]), est_m, block[1])
+                osrm_blocks += 1
+            grid = np.ix_(rows, cols)
+            seconds[grid] = np.clip(np.rint(block_sec), 0, UNKNOWN_SECONDS - 1)
+            meters[grid] = np.clip(np.rint(block_m), 0, UNKNOWN_METERS - 1)
+    return osrm_blocks, fallback_blocks
+
+
+def _merge_source(previous: Optional[str], osrm_blocks: int, fallback_blocks: int) -> str:
+    sources = set()
+    if previous:
+        sources.update(("osrm", "haversine") if previous == "mixed" else (previous,))
+    if osrm_blocks:
+        sources.add("osrm")
+    if fallback_blocks:
+        sources.add("haversine")
+    if len(sources) > 1:
+        return "mixed"
+    return sources.pop() if sources else (previous or "haversine")
+
+
+def build_area_matrix(
+    profile: str,
+    spots: Sequence[Tuple[str, float, float]],
+    existing: Optional[Tuple[List[str], Any, Any, Any, Any]] = None,
+    previous_source: Optional[str] = None,
+) -> Optional[Tuple[List[str], bytes, str, int]]:
+    """エリアの行列を作る（existing があれば変わった行・列だけ計算）
+
+    Args:
+        spots: (id, lat, lng) のリスト
+        existing: (spot_ids, lat, lng, 秒数, 距離)（保存済みの行列）
+
+    Returns:
+        (spot_ids, payload, source, 計算したスポット数)。変更が無ければ None
+    """
+    current = {spot_id: (lat, lng) for spot_id, lat, lng in spots}
+    kept: List[int] = []
+    if existing is not None:
+        old_ids, old_lat, old_lng, _, _ = existing
+        for i, spot_id in enumerate(old_ids):
+            point = current.get(spot_id)
+            if point is not None and abs(point[0] - old_lat[i]) < 1e-6 and abs(point[1] - old_lng[i]) < 1e-6:
+                kept.append(i)
+        if len(kept) == len(old_ids) == len(current):
+            return None
+    # 半分以上が入れ替わるなら差分より全件計算の方が単純で速い
+    if existing is not None and len(kept) < len(current) / 2:
+        kept = []
+
+    kept_ids = [existing[0][i] for i in kept] if kept else []
+    kept_set = set(kept_ids)
+    fresh = [(spot_id, lat, lng) for spot_id, lat, lng in spots if spot_id not in kept_set]
+    ids = kept_ids + [spot_id for spot_id, _, _ in fresh]
+    coords = [(float(existing[1][i]), float(existing[2][i])) for i in kept] + [(lat, lng) for _, lat, lng in fresh]
+    n, k = len(ids), len(kept)
+
+    seconds = np.full((n, n), UNKNOWN_SECONDS, dtype=np.uint16)
+    meters = np.full((n, n), UNKNOWN_METERS, dtype=np.uint32)
+    if k:
+        old_idx = np.asarray(kept, dtype=np.int64)
+        seconds[:k, :k] = existing[3][np.ix_(old_idx, old_idx)]
+        meters[:k, :k] = existing[4][np.ix_(old_idx, old_idx)]
+    fresh_idx = np.arange(k, n)
+    all_idx = np.arange(n)
+    osrm_blocks, fallback_blocks = _fill_block(profile, coords, fresh_idx, all_idx, seconds, meters)
+    if k:
+        more = _fill_block(profile, coords, np.arange(k), fresh_idx, seconds, meters)
+        osrm_blocks += more[0]
+        fallback_blocks += more[1]
+    np.fill_diagonal(seconds, 0)
+    np.fill_diagonal(meters, 0)
+
+    lat = np.asarray([c[0] for c in coords], dtype=np.float64)
+    lng = np.asarray([c[1] for c in coords], dtype=np.float64)
+    source = _merge_source(previous_source if k else None, osrm_blocks, fallback_blocks)
+    return ids, encode_payload(lat, lng, seconds, meters), source, n - k
+
+
+def refresh_matrices(db: Session, full: bool = False) -> Dict[str, int]:
+    """公開スポットからエリアごとの行列を作成・差分更新する（スクリプト・バックグラウンド更新から呼ぶ）
+
+    Args:
+        full: True なら保存済みの行列を使わず全件を計算し直す
+
+    Returns:
+        集計（更新したエリア数・計算したスポット数・削除した行列数）
+    """
+    from app.models.spot import Spot
+    from app.models.travel_matrix import TravelMatrix
+    from app.services.spot_service import _apply_public_visibility_filter
+    from app.utils.response_cache import get_catalog_version
+
+    version = get_catalog_version()
+    rows = _apply_public_visibility_filter(
+        db.query(Spot.id, Spot.area, Spot.latitude, Spot.longitude)
+    ).filter(Spot.latitude.isnot(None), Spot.longitude.isnot(None)).all()
+    rows = [r for r in rows if not (r.latitude == 0.0 and r.longitude == 0.0)]
+    groups = {key: members for key, members in group_spots(rows).items() if len(members) >= 2}
+
+    stats = {"areas_updated": 0, "spots_computed": 0, "matrices_deleted": 0}
+    stored = {(m.area_key, m.profile): m for m in db.query(TravelMatrix).all()}
+    for profile in _profiles():
+        for key, members in groups.items():
+            row = stored.get((key, profile))
+            existing = None
+            if row is not None and not full:
+                try:
+                    existing = (list(row.spot_ids), *decode_payload(row.payload))
+                except Exception as e:
+                    logger.warning("行列を読めないため作り直します（%s / %s）: %s", key, profile, e)
+            with metrics.timed("travel_matrix.build_ms", profile=profile):
+                built = build_area_matrix(profile, members, existing, row.source if row is not None else None)
+            if built is None:
+                continue
+            ids, payload, source, computed = built
+            values = {
+                "spot_ids": ids,
+                "spot_count": len(ids),
+                "payload": payload,
+                "source": source,
+                "catalog_version": version,
+            }
+            if row is None:
+                _insert_matrix(db, key, profile, values)
+            else:
+                for column, value in values.items():
+                    setattr(row, column, value)
+                db.commit()
+            stats["areas_updated"] += 1
+            stats["spots_computed"] += computed
+            metrics.increment("travel_matrix.spots_computed", computed, profile=profile)
+            logger.info("移動行列を更新しました: %s / %s（%d件中 %d件を計算、%s）", key, profile, len(ids), computed, source)
+        for key, stored_profile in list(stored):
+            if stored_profile == profile and key not in groups:
+                db.query(TravelMatrix).filter(
+                    TravelMatrix.area_key == key, TravelMatrix.profile == profile
+                ).delete(synchronize_session=False)
+                db.commit()
+                stats["matrices_deleted"] += 1
+    if stats["areas_updated"] or stats["matrices_deleted"]:
+        # 全ワーカーの参照用の行列を読み直させる
+        invalidation_bus.publish(TRAVEL_MATRIX_NAMESPACE)
+    return stats
+
+
+def _insert_matrix(db: Session, key: str, profile: str, values: Dict[str, Any]) -> None:
+    """新しいエリアの行列を保存する（同時に作られていれば上書きする）"""
+    from app.models.travel_matrix import TravelMatrix
+
+    dialect = db.get_bind().dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        if dialect == "postgresql":
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        stmt = insert(TravelMatrix).values(area_key=key, profile=profile, **values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[TravelMatrix.area_key, TravelMatrix.profile],
+            set_={**values, "updated_at": func.now()},
+        )
+        db.execute(stmt)
+        db.commit()
+        return
+    try:
+        db.add(TravelMatrix(area_key=key, profile=profile, **values))
+        db.commit()
+    except IntegrityError:
+        db.rollback()
+        db.query(TravelMatrix).filter(
+            TravelMatrix.area_key == key, TravelMatrix.profile == profile
+        ).update(values, synchronize_session=False)
+        db.commit()
+
+
+def _profiles() -> List[str]:
+    return [p.strip() for p in settings.TRAVEL_MATRIX_PROFILES.split(",") if p.strip() in _FALLBACK_MODEL]
+
+
+# ---- 参照（プロセス内） ----
+
+class _Matrix:
+    __slots__ = ("area_key", "profile", "ids", "seconds", "meters", "rows")
+
+    def __init__(self, row) -> None:
+        lat, lng, seconds, meters = decode_payload(row.payload)
+        self.area_key = row.area_key
+        self.profile = row.profile
+        self.ids = list(row.spot_ids)
+        self.seconds = seconds
+        self.meters = meters
+        self.rows = {_coord_key(a, b): i for i, (a, b) in enumerate(zip(lat.tolist(), lng.tolist()))}
+
+
+class _Store:
+    """保存済みの行列を読み込んで座標から引けるようにする（TRAVEL_MATRIX_RELOAD_SEC ごとに更新を確認）"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._matrices: Dict[Tuple[str, str], _Matrix] = {}
+        # プロファイル -> 座標キー -> [(行列, 行)]
+        self._index: Dict[str, Dict[str, List[Tuple[_Matrix, int]]]] = {}
+        self._signature: Optional[Tuple[Any, Any]] = None
+        self._checked_at = 0.0
+        self._refreshing = False
+        self._refreshed_version: Optional[int] = None
+        # 他のワーカーが更新中だったときに次に確認する時刻
+        self._retry_at = 0.0
+
+    def mark_stale(self) -> None:
+        """次の参照で読み直す（このプロセスで行列を書き換えた直後）"""
+        with self._lock:
+            self._checked_at = 0.0
+            self._signature = None
+
+    def _reload_if_changed(self) -> None:
+        if time.monotonic() - self._checked_at < settings.TRAVEL_MATRIX_RELOAD_SEC:
+            return
+        from app.models.travel_matrix import TravelMatrix
+        from app.utils.database import ReadSessionLocal
+
+        db = ReadSessionLocal()
+        try:
+            # updated_at は DB によって秒単位のため、件数・世代も合わせて変更を判定する
+            signature = tuple(db.query(
+                func.count(TravelMatrix.area_key),
+                func.max(TravelMatrix.updated_at),
+                func.sum(TravelMatrix.spot_count),
+                func.max(TravelMatrix.catalog_version),
+            ).one())
+            if signature != self._signature:
+                matrices = {}
+                for row in db.query(TravelMatrix).all():
+                    try:
+                        matrices[(row.area_key, row.profile)] = _Matrix(row)
+                    except Exception as e:
+                        logger.warning("行列を読み込めませんでした（%s / %s）: %s", row.area_key, row.profile, e)
+                index: Dict[str, Dict[str, List[Tuple[_Matrix, int]]]] = {}
+                for matrix in matrices.values():
+                    by_coord = index.setdefault(matrix.profile, {})
+                    for coord, i in matrix.rows.items():
+                        by_coord.setdefault(coord, []).append((matrix, i))
+                self._matrices = matrices
+                self._index = index
+                self._signature = signature
+                metrics.set_gauge("travel_matrix.matrices", len(matrices))
+                metrics.set_gauge("travel_matrix.bytes", sum(m.seconds.nbytes + m.meters.nbytes for m in matrices.values()))
+        finally:
+            db.close()
+        self._checked_at = time.monotonic()
+
+    def _maybe_start_refresh(self) -> None:
+        """カタログ世代が変わっていれば差分更新を裏で走らせる（実行はリースを取れたワーカーだけ）"""
+        if not settings.TRAVEL_MATRIX_AUTO_REFRESH or self._refreshing or time.monotonic() < self._retry_at:
+            return
+        from app.utils.response_cache import get_catalog_version
+        version = get_catalog_version()
+        if version == self._refreshed_version:
+            return
+        self._refreshing = True
+        self._refreshed_version = version
+        threading.Thread(target=self._refresh_in_background, name="travel-matrix-refresh", daemon=True).start()
+
+    def _refresh_in_background(self) -> None:
+        from app.utils.database import SessionLocal
+        owner = None
+        db = None
+        try:
+            owner = job_lease.acquire(_REFRESH_LEASE, settings.TRAVEL_MATRIX_REFRESH_LEASE_SEC)
+            if owner is None:
+                # 他のワーカーが更新中。結果は無効化バスで届くが、その更新が古い世代から始まった可能性があるため
+                # TRAVEL_MATRIX_RELOAD_SEC 後にもう一度確認する
+                metrics.increment("travel_matrix.refresh_skipped")
+                with self._lock:
+                    self._refreshed_version = None
+                    self._retry_at = time.monotonic() + settings.TRAVEL_MATRIX_RELOAD_SEC
+                return
+            db = SessionLocal()
+            with metrics.timed("travel_matrix.refresh_ms"):
+                refresh_matrices(db)
+            metrics.increment("travel_matrix.refresh")
+        except Exception as e:
+            log_error("TRAVEL_MATRIX_REFRESH_ERROR", f"移動行列の更新に失敗しました: {e}", {})
+            with self._lock:
+                # 次の参照で再試行する
+                self._refreshed_version = None
+        finally:
+            if db is not None:
+                db.close()
+            if owner is not None:
+                job_lease.release(_REFRESH_LEASE, owner)
+            with self._lock:
+                self._refreshing = False
+
+    def index_for(self, profile: str) -> Dict[str, List[Tuple[_Matrix, int]]]:
+        with self._lock:
+            try:
+                self._reload_if_changed()
+            except Exception as e:
+                # テーブル未作成などで読めない間は行列なしで動かす
+                logger.warning("移動行列を読み込めませんでした: %s", e)
+                self._checked_at = time.monotonic()
+            self._maybe_start_refresh()
+            return self._index.get(profile, {})
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "matrices": len(self._matrices),
+                "spots": sum(len(m.ids) for m in self._matrices.values()),
+                "bytes": sum(m.seconds.nbytes + m.meters.nbytes for m in self._matrices.values()),
+                "refreshing": self._refreshing,
+                "refreshed_version": self._refreshed_version,
+            }
+
+
+_store = _Store()
+invalidation_bus.register(TRAVEL_MATRIX_NAMESPACE, lambda payload: _store.mark_stale())
+
+
+def is_enabled() -> bool:
+    return settings.TRAVEL_MATRIX_ENABLED and NUMPY_AVAILABLE
+
+
+def _locate(index, a: Coord, b: Coord) -> Optional[Tuple[_Matrix, int, int]]:
+    rows_a = index.get(_coord_key(*a))
+    rows_b = index.get(_coord_key(*b))
+    if not rows_a or not rows_b:
+        return None
+    for matrix, i in rows_a:
+        for other, j in rows_b:
+            if other is matrix:
+                return matrix, i, j
+    return None
+
+
+def lookup_leg(coordinates: Sequence[Coord], profile: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """2点が同じ行列に載っていればルート情報（get_route_info と同じ形、geometry なし）を返す"""
+    if len(coordinates) != 2 or not is_enabled():
+        return None
+    index = _store.index_for(matrix_profile(profile))
+    found = _locate(index, coordinates[0], coordinates[1])
+    if found is None:
+        metrics.increment("travel_matrix.lookup", result="miss")
+        return None
+    matrix, i, j = found
+    seconds = int(matrix.seconds[i, j])
+    meters = int(matrix.meters[i, j])
+    if seconds == UNKNOWN_SECONDS or meters == UNKNOWN_METERS:
+        metrics.increment("travel_matrix.lookup", result="unknown")
+        return None
+    metrics.increment("travel_matrix.lookup", result="hit")
+    return {
+        "distance_meters": meters,
+        "distance_km": meters / 1000,
+        "duration_seconds": seconds,
+        "duration_minutes": seconds / 60,
+        "source": "matrix",
+    }
+
+
+def estimate_leg_minutes(a: Coord, b: Coord, profile: Optional[str] = None) -> float:
+    """2点間の移動分数（行列に載っていれば行列、無ければ直線距離からの推定。外部 API は呼ばない）"""
+    leg = lookup_leg([a, b], profile)
+    if leg:
+        return leg["duration_minutes"]
+    seconds, _ = _fallback_block(matrix_profile(profile), [a], [b])
+    return float(seconds[0, 0]) / 60
+
+
+def proximity_clusters(
+    spots: Sequence[Dict[str, Any]],
+    profile: Optional[str] = None,
+    max_minutes: Optional[float] = None,
+) -> List[List[str]]:
+    """行列上で移動 max_minutes 分以内でつながるスポットのまとまり（2件以上、大きい順）
+
+    Args:
+        spots: name と location（lat / lng）を持つスポット（プロンプト用の辞書）
+    """
+    if not is_enabled() or len(spots) < 2:
+        return []
+    if max_minutes is None:
+        max_minutes = settings.TRAVEL_MATRIX_CLUSTER_MINUTES
+    index = _store.index_for(matrix_profile(profile))
+    if not index:
+        return []
+
+    located: List[Tuple[str, _Matrix, int]] = []
+    for spot in spots:
+        location = spot.get("location") or {}
+        lat, lng = location.get("lat"), location.get("lng")
+        if not lat or not lng:
+            continue
+        entries = index.get(_coord_key(lat, lng))
+        if entries:
+            matrix, row = entries[0]
+            located.append((spot.get("name", ""), matrix, row))
+
+    # 同じ行列に載っているスポット同士を、往復のうち短い方がしきい値以内ならつなぐ（Union-Find）
+    parent = list(range(len(located)))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    limit = max_minutes * 60
+    by_matrix: Dict[int, List[int]] = {}
+    for n, (_, matrix, _) in enumerate(located):
+        by_matrix.setdefault(id(matrix), []).append(n)
+    for members in by_matrix.values():
+        if len(members) < 2:
+            continue
+        matrix = located[members[0]][1]
+        rows = np.asarray([located[n][2] for n in members], dtype=np.int64)
+        sub = matrix.seconds[np.ix_(rows, rows)].astype(np.int64)
+        near = np.minimum(sub, sub.T) <= limit
+        for a, b in zip(*np.nonzero(np.triu(near, k=1))):
+            ra, rb = find(members[a]), find(members[b])
+            if ra != rb:
+                parent[ra] = rb
+
+    clusters: Dict[int, List[str]] = {}
+    for n, (name, _, _) in enumerate(located):
+        clusters.setdefault(find(n), []).append(name)
+    result = [names for names in clusters.values() if len(names) >= 2]
+    result.sort(key=len, reverse=True)
+    return result
+
+
+def matrix_stats() -> Dict[str, Any]:
+    """管理画面用の状態"""
+    return {"enabled": is_enabled(), **_store.stats()}
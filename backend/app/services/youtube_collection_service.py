@@ -9,11 +9,17 @@ import requests
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from itertools import product
-import google.generativeai as genai
 from app.config import settings
 from app.utils.error_handler import log_error
+from app.utils.lazy_import import lazy_module
+from app.utils.resilience import guarded_request
+from app.utils.gemini_governor import BATCH, generate_content
+from app.utils.gemini_output import SUMMARY_SCHEMA, json_output_kwargs, parse_json
 from app.utils.debug_logger import log_debug_step
 
+# 重い SDK は最初の使用時に import する（起動時間短縮）
+genai = lazy_module("google.generativeai")
+
 
 def load_keyword_config(keywords_config_path: str = "data/search_keywords.json") -> dict:
     """キーワード管理JSONを読み込み"""
@@ -60,7 +66,7 @@ def get_youtube_videos(keyword: str, max_results: int = 5) -> tuple[List[Dict[st
         log_error("YOUTUBE_API_KEY_NOT_SET", "YOUTUBE_API_KEYが設定されていません")
         return [], "other"
     
-    url = "https://www.googleapis.com/youtube/v3/search"
+    url = f"{settings.YOUTUBE_API_BASE_URL}/youtube/v3/search"
     params = {
         "part": "snippet",
         "q": keyword,
@@ -70,7 +76,7 @@ def get_youtube_videos(keyword: str, max_results: int = 5) -> tuple[List[Dict[st
     }
     
     try:
-        res = requests.get(url, params=params, timeout=10)
+        res = guarded_request("youtube", "GET", url, params=params, timeout=10)
         res.raise_for_status()
         data = res.json()
         videos = []
@@ -164,7 +170,10 @@ def summarize_with_gemini(video_title: str, video_url: str) -> Optional[str]:
     try:
         genai.configure(api_key=settings.GEMINI_API_KEY)
         model = genai.GenerativeModel(settings.GEMINI_MODEL)
-        response = model.generate_content(prompt)
+        response = generate_content(
+            model, prompt, caller="summarize_with_gemini", priority=BATCH,
+            **json_output_kwargs(SUMMARY_SCHEMA)
+        )
         
         # レスポンスのテキストを安全に取得
         if not hasattr(response, 'text') or not response.text:
@@ -174,8 +183,11 @@ def summarize_with_gemini(video_title: str, video_url: str) -> Optional[str]:
             log_error("GEMINI_EMPTY_RESPONSE", error_msg)
             return None
         
-        summary_text = response.text.strip()
-        return summary_text
+        # JSON 文字列に揃えて返す（読めない出力は None）
+        summary = parse_json(response.text, "summarize_with_gemini")
+        if summary is None:
+            return None
+        return json.dumps(summary, ensure_ascii=False)
     except Exception as e:
         error_str = str(e)
         log_error("GEMINI_SUMMARY_ERROR", f"Gemini要約失敗: {e}")
@@ -317,15 +329,8 @@ def collect_youtube_data(
                 if summary:
                     # 要約をパースして構造化データを取得（プレビュー用）
                     summary_preview = summary[:500] if len(summary) > 500 else summary
-                    try:
-                        import re
-                        clean_json_str = re.sub(r"^```json\s*|\s*```$", "", summary.strip())
-                        if clean_json_str.strip() != "[]":
-                            summary_parsed = json.loads(clean_json_str)
-                        else:
-                            summary_parsed = None
-                    except:
-                        summary_parsed = None
+                    # summarize_with_gemini は JSON 文字列を返す
+                    summary_parsed = json.loads(summary) or None
                     
                     log_debug_step(
                         step="gemini_summary",
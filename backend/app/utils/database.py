@@ -1,31 +1,144 @@
 """
 データベース接続とセッション管理
 SQLAlchemyを使用
+
+エンジンは設定（app.config）から組み立てる:
+- SQLite: 接続ごとに PRAGMA（WAL / synchronous / busy_timeout / cache_size）を適用
+- PostgreSQL 等: プールサイズ・オーバーフロー・pre_ping・recycle・statement_timeout を適用
+- DATABASE_READ_REPLICA_URL 設定時は読み取り専用セッションをレプリカへ振り分ける
+- プールからの接続取得待ち時間をメトリクス（db.pool.checkout_wait_ms）に記録する
 """
-from sqlalchemy import create_engine
+import logging
+import time
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker, Session
+from sqlalchemy.pool import QueuePool
 from app.config import settings
+from app.utils import metrics
 import os
 
-# データベースディレクトリを作成
-db_path = settings.DATABASE_URL.replace("sqlite:///", "")
-if db_path != settings.DATABASE_URL:  # SQLiteの場合
-    os.makedirs(os.path.dirname(db_path) if os.path.dirname(db_path) else ".", exist_ok=True)
+logger = logging.getLogger(__name__)
+
+
+class _TimedQueuePool(QueuePool):
+    """接続の取得待ち時間を計測する QueuePool（プール枯渇の検知用）"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.observe(
+                "db.pool.checkout_wait_ms",
+                (time.perf_counter() - start) * 1000,
+                pool=getattr(self, "_metrics_label", "primary"),
+            )
+
+
+def _is_sqlite(url: str) -> bool:
+    return url.startswith("sqlite")
+
+
+def _ensure_sqlite_dir(url: str) -> None:
+    """SQLite のファイルを置くディレクトリを作成"""
+    db_path = url.replace("sqlite:///", "")
+    if db_path != url and db_path != ":memory:":
+        os.makedirs(os.path.dirname(db_path) if os.path.dirname(db_path) else ".", exist_ok=True)
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """SQLite 接続ごとの PRAGMA を適用（connect イベント）"""
+    cursor = dbapi_connection.cursor()
+    try:
+        if settings.SQLITE_JOURNAL_MODE:
+            cursor.execute(f"PRAGMA journal_mode={settings.SQLITE_JOURNAL_MODE}")
+        if settings.SQLITE_SYNCHRONOUS:
+            cursor.execute(f"PRAGMA synchronous={settings.SQLITE_SYNCHRONOUS}")
+        cursor.execute(f"PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}")
+        if settings.SQLITE_CACHE_SIZE_KB:
+            # 負値は KiB 指定（正値だとページ数扱いになる）
+            cursor.execute(f"PRAGMA cache_size=-{int(settings.SQLITE_CACHE_SIZE_KB)}")
+    finally:
+        cursor.close()
+
+
+def _create_engine(url: str, label: str):
+    """設定に基づいてエンジンを作成"""
+    if _is_sqlite(url):
+        _ensure_sqlite_dir(url)
+        kwargs = {"connect_args": {"check_same_thread": False}}
+        if ":memory:" not in url:
+            kwargs.update(
+                poolclass=_TimedQueuePool,
+                pool_size=settings.DB_POOL_SIZE,
+                max_overflow=settings.DB_MAX_OVERFLOW,
+                pool_timeout=settings.DB_POOL_TIMEOUT_SEC,
+            )
+        created = create_engine(url, **kwargs)
+        event.listen(created, "connect", _apply_sqlite_pragmas)
+    else:
+        connect_args = {}
+        if settings.DB_STATEMENT_TIMEOUT_MS > 0 and url.startswith("postgresql"):
+            connect_args["options"] = f"-c statement_timeout={int(settings.DB_STATEMENT_TIMEOUT_MS)}"
+        created = create_engine(
+            url,
+            poolclass=_TimedQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT_SEC,
+            pool_recycle=settings.DB_POOL_RECYCLE_SEC,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+            connect_args=connect_args,
+        )
+    created.pool._metrics_label = label
+    return created
+
 
 # SQLAlchemyエンジン
-engine = create_engine(
-    settings.DATABASE_URL,
-    connect_args={"check_same_thread": False} if "sqlite" in settings.DATABASE_URL else {}
-)
+engine = _create_engine(settings.DATABASE_URL, "primary")
+
+# 読み取り専用エンジン（レプリカ未設定ならプライマリを共用）
+if settings.DATABASE_READ_REPLICA_URL:
+    read_engine = _create_engine(settings.DATABASE_READ_REPLICA_URL, "replica")
+else:
+    read_engine = engine
 
 # セッションファクトリ
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+ReadSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=read_engine)
 
 # ベースクラス
 Base = declarative_base()
 
 
+@event.listens_for(SessionLocal, "before_flush")
+def _sync_tag_stats(session, flush_context, instances):
+    """スポットのタグ変更を tag_stats に差分反映する（同じトランザクション内）"""
+    # 関数内 import: database → models/services の循環 import を避けるため
+    from app.services.tag_stats_service import sync_tag_stats_before_flush
+    sync_tag_stats_before_flush(session)
+
+
+@event.listens_for(SessionLocal, "after_flush")
+def _mark_spot_catalog_changed(session, flush_context):
+    """スポットの追加・更新・削除を記録する（commit 後にレスポンスキャッシュを無効化）"""
+    from app.utils.response_cache import mark_catalog_changed_if_needed
+    mark_catalog_changed_if_needed(session)
+
+
+@event.listens_for(SessionLocal, "after_commit")
+def _publish_spot_catalog_change(session):
+    from app.utils.response_cache import publish_catalog_change_if_needed
+    publish_catalog_change_if_needed(session)
+
+
+@event.listens_for(SessionLocal, "after_rollback")
+def _discard_spot_catalog_change(session):
+    from app.utils.response_cache import CATALOG_DIRTY_KEY
+    session.info.pop(CATALOG_DIRTY_KEY, None)
+
+
 def get_db() -> Session:
     """
     データベースセッションを取得
@@ -38,29 +151,82 @@ def get_db() -> Session:
         db.close()
 
 
+def get_read_db() -> Session:
+    """
+    読み取り専用セッションを取得（スポット一覧・タグ統計など）
+    レプリカ未設定時はプライマリに接続する。書き込みには使わないこと。
+    """
+    db = ReadSessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+
+def get_pool_status() -> dict:
+    """接続プールの使用状況を返す（監視用）"""
+    status = {}
+    for label, eng in (("primary", engine), ("replica", read_engine)):
+        if label == "replica" and eng is engine:
+            continue
+        pool = eng.pool
+        if isinstance(pool, QueuePool):
+            status[label] = {
+                "size": pool.size(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+            }
+            metrics.set_gauge("db.pool.checked_out", pool.checkedout(), pool=label)
+    return status
+
+
 def init_db():
     """データベースを初期化（テーブル作成）"""
     # 全モデルを metadata に登録してから create_all する。
     # （関数内 import: database → models の循環 import を避けるため）
     import app.models  # noqa: F401
+    from sqlalchemy import inspect
+    # 新規DBなら create_all が最新スキーマで作るため、移行は記録だけでよい
+    fresh = not inspect(engine).has_table("spots")
     Base.metadata.create_all(bind=engine)
-    _apply_simple_migrations()
+    _apply_simple_migrations(fresh=fresh)
 
+    # スポットの全文検索インデックス（FTS5 / pg_trgm）。失敗しても従来検索で動く
+    from app.utils.spot_search import ensure_search_index
+    ensure_search_index(engine)
 
-def _apply_simple_migrations():
-    """
-    既存テーブルへの後付けカラム追加（簡易マイグレーション）。
-    create_all は新規テーブルしか作らないため、既存テーブルに対しては
-    「存在しなければ ALTER TABLE ADD COLUMN」を試みる。
-    SQLite / PostgreSQL どちらも「既に存在する」場合はエラーになるので、
-    素朴に try/except で握りつぶす（冪等）。
-    """
-    from sqlalchemy import text
+    # タグ統計（tag_stats）が未作成なら全件から作る
+    from app.services.tag_stats_service import ensure_tag_stats
+    db = SessionLocal()
+    try:
+        ensure_tag_stats(db)
+    except Exception as e:
+        logger.warning("タグ統計の初期化に失敗しました: %s", e)
+    finally:
+        db.close()
+
+
+def has_index(table_name: str, index_name: str) -> bool:
+    """テーブルにその名前のインデックス（一意制約を含む）があるか（起動時の前提条件の確認用）"""
+    from sqlalchemy import inspect
+    inspector = inspect(engine)
+    if not inspector.has_table(table_name):
+        return False
+    names = {index["name"] for index in inspector.get_indexes(table_name)}
+    names.update(constraint["name"] for constraint in inspector.get_unique_constraints(table_name))
+    return index_name in names
 
-    statements = [
+
+# 簡易マイグレーション: (version, 説明, SQL 文)。追加するときは末尾に新しい version で足す。
+# 適用済みの version は schema_migrations に記録し、次回起動以降は実行しない。
+# 特定の DB でだけ実行する文は (方言名, SQL) のタプルで書く（例: SQLite に無い ALTER COLUMN）。
+MIGRATIONS = [
+    (1, "subscriptions の Stripe ID カラム", [
         "ALTER TABLE subscriptions ADD COLUMN stripe_customer_id VARCHAR",
         "ALTER TABLE subscriptions ADD COLUMN stripe_subscription_id VARCHAR",
-        # スポットの出所・検証カラム（docs/design/SPOT_FIELD_SPEC.md §2）
+    ]),
+    # スポットの出所・検証カラム（docs/design/SPOT_FIELD_SPEC.md §2）
+    (2, "spots の出所・検証カラム", [
         "ALTER TABLE spots ADD COLUMN source VARCHAR",
         "ALTER TABLE spots ADD COLUMN verification_status VARCHAR DEFAULT 'unverified'",
         "ALTER TABLE spots ADD COLUMN verified_at TIMESTAMP",
@@ -74,13 +240,104 @@ def _apply_simple_migrations():
         "ALTER TABLE spots ADD COLUMN description_source VARCHAR",
         "ALTER TABLE spots ADD COLUMN field_provenance JSON",
         "ALTER TABLE spots ADD COLUMN rejected_reason VARCHAR",
-    ]
-    for stmt in statements:
-        # DDLごとに接続を分ける（失敗したトランザクションを持ち越さないため）
-        try:
-            with engine.connect() as conn:
-                conn.execute(text(stmt))
-                conn.commit()
-        except Exception:
-            # カラムが既に存在する等。起動を妨げない。
-            pass
+    ]),
+    # プラン一覧のキーセットページング用（既存DBには create_all で付かないため）
+    (3, "plans のキーセットページング用インデックス", [
+        "CREATE INDEX IF NOT EXISTS ix_plans_user_created_id ON plans (user_id, created_at, id)",
+    ]),
+    # 利用枠の原子的な確保（entitlement_service）用。既存の重複行は最小の id に合算してから一意にする
+    (4, "usage / api_key_usage の (キー, 月) 一意インデックス", [
+        "UPDATE usage SET count = (SELECT SUM(u2.count) FROM usage u2 "
+        "WHERE u2.user_id = usage.user_id AND u2.month = usage.month) "
+        "WHERE id IN (SELECT MIN(id) FROM usage GROUP BY user_id, month HAVING COUNT(*) > 1)",
+        "DELETE FROM usage WHERE id NOT IN (SELECT MIN(id) FROM usage GROUP BY user_id, month)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_usage_user_month ON usage (user_id, month)",
+        "UPDATE api_key_usage SET "
+        "request_count = (SELECT SUM(a2.request_count) FROM api_key_usage a2 "
+        "WHERE a2.api_key_id = api_key_usage.api_key_id AND a2.month = api_key_usage.month), "
+        "plan_generation_count = (SELECT SUM(a2.plan_generation_count) FROM api_key_usage a2 "
+        "WHERE a2.api_key_id = api_key_usage.api_key_id AND a2.month = api_key_usage.month) "
+        "WHERE id IN (SELECT MIN(id) FROM api_key_usage GROUP BY api_key_id, month HAVING COUNT(*) > 1)",
+        "DELETE FROM api_key_usage WHERE id NOT IN (SELECT MIN(id) FROM api_key_usage GROUP BY api_key_id, month)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_api_key_usage_key_month ON api_key_usage (api_key_id, month)",
+    ]),
+    # プランキャッシュの圧縮・容量上限（既存行は plan_data のまま読め、圧縮タスクが順次 payload に移す）。
+    # SQLite は NOT NULL を外せないが、新しい行の plan_data は JSON の null なので書き込める
+    (5, "plan_cache の圧縮ペイロードとヒット記録", [
+        "ALTER TABLE plan_cache ADD COLUMN payload BYTEA",
+        "ALTER TABLE plan_cache ADD COLUMN payload_size INTEGER",
+        "ALTER TABLE plan_cache ADD COLUMN hit_count INTEGER NOT NULL DEFAULT 0",
+        "ALTER TABLE plan_cache ADD COLUMN last_hit_at TIMESTAMP",
+        ("postgresql", "ALTER TABLE plan_cache ALTER COLUMN plan_data DROP NOT NULL"),
+        "CREATE INDEX IF NOT EXISTS ix_plan_cache_last_hit_at ON plan_cache (last_hit_at)",
+    ]),
+    # 近いリクエストのキャッシュ済みプランの再利用（既存行は対象外。新しく保存した行から検索できる）
+    (6, "plan_cache の類似検索キー", [
+        "ALTER TABLE plan_cache ADD COLUMN similarity_key VARCHAR",
+        "ALTER TABLE plan_cache ADD COLUMN match_info JSON",
+        "CREATE INDEX IF NOT EXISTS ix_plan_cache_similarity_key ON plan_cache (similarity_key)",
+    ]),
+]
+
+
+def _is_already_applied_error(exc: Exception) -> bool:
+    """「既に存在する」系のエラーか（カラム・テーブル・インデックスが既にある = 適用済み）"""
+    # PostgreSQL: 42701 duplicate_column / 42P07 duplicate_table / 42710 duplicate_object
+    if getattr(getattr(exc, "orig", None), "pgcode", None) in ("42701", "42P07", "42710"):
+        return True
+    message = str(getattr(exc, "orig", exc)).lower()
+    return "already exists" in message or "duplicate column" in message
+
+
+def _apply_simple_migrations(fresh: bool = False):
+    """
+    既存テーブルへの後付けカラム追加（簡易マイグレーション）。
+    create_all は新規テーブルしか作らないため、既存テーブルに対しては
+    「存在しなければ ALTER TABLE ADD COLUMN」を試みる。
+    SQLite / PostgreSQL どちらも「既に存在する」場合はエラーになるので、
+    そのエラーだけを適用済みとみなして進める（冪等）。
+    それ以外のエラーで失敗した version は記録せずに残し（以降の version も実行しない）、次回起動時に再試行する。
+    適用済みの version は schema_migrations に記録し、未適用のものだけ実行する
+    （通常の起動では1クエリで終わる）。fresh=True（新規DB）は実行せず記録だけ行う。
+    複数ワーカーが同時に起動しても記録が衝突しないよう、記録は ON CONFLICT DO NOTHING で行う。
+    """
+    from sqlalchemy import text
+
+    with engine.connect() as conn:
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+    pending = [m for m in MIGRATIONS if m[0] not in applied]
+    if not pending:
+        return
+
+    dialect = engine.dialect.name
+    for version, name, statements in pending:
+        failed = False
+        for stmt in ([] if fresh else statements):
+            if isinstance(stmt, tuple):
+                only_dialect, stmt = stmt
+                if only_dialect != dialect:
+                    continue
+            # DDLごとに接続を分ける（失敗したトランザクションを持ち越さないため）
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(stmt))
+                    conn.commit()
+            except Exception as e:
+                if _is_already_applied_error(e):
+                    # カラムが既に存在する等（他のワーカーが先に適用した場合も含む）
+                    continue
+                logger.error("マイグレーションに失敗しました: %d %s: %s | SQL: %s", version, name, e, stmt)
+                failed = True
+                break
+        if failed:
+            # 後続の version は前の version に依存しうるため、ここで止めて次回起動時に再試行する
+            break
+        with engine.begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO schema_migrations (version, name) VALUES (:version, :name) "
+                    "ON CONFLICT (version) DO NOTHING"
+                ),
+                {"version": version, "name": name},
+            )
+        logger.info("マイグレーションを適用しました: %d %s", version, name)
@@ -1,14 +1,28 @@
 """
 デバッグログユーティリティ
 YouTube検索からデータベース追加までの各処理ステップをJSON形式で記録
+
+- セッションは contextvars で保持する（同時に走る一括追加ジョブ同士で混ざらない）
+- 各ステップは上限付きキューに積むだけで、ファイルへの書き込みはバックグラウンドの
+  書き込みスレッドがまとめて行う（パイプライン側はディスク I/O を待たない）
+- 出力は1行1JSON（NDJSON）。DEBUG_LOG_MAX_BYTES を超えたら debug.log.1, .2 ... にローテーション
+- 件数の多いステップは DEBUG_LOG_SAMPLE_RATES で間引く（error は常に記録）
+- キューが溢れた場合は捨てて件数だけ数える（debug_log.dropped）
 """
+import atexit
+import contextvars
 import os
 import json
+import queue
+import random
+import threading
 import uuid
 import time
 from datetime import datetime
 from typing import Dict, Any, Optional, List
-from threading import Lock
+
+from app.config import settings
+from app.utils import metrics
 
 # デバッグログファイルパス
 DEBUG_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'logs', 'debug.log')
@@ -16,57 +30,165 @@ DEBUG_LOG_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__
 log_dir = os.path.dirname(DEBUG_LOG_PATH)
 os.makedirs(log_dir, exist_ok=True)
 
-# スレッドセーフなログ管理
-_log_lock = Lock()
-_current_session: Optional[Dict[str, Any]] = None
+# 書き込みスレッドが1回にまとめて書く最大件数
+_BATCH_SIZE = 500
+
+# 実行中のセッション（ジョブ・リクエストごとのコンテキスト）
+_current_session: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "debug_log_session", default=None
+)
+
+_queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue(maxsize=settings.DEBUG_LOG_QUEUE_SIZE)
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+
+
+def _parse_sample_rates(raw: str) -> Dict[str, float]:
+    """'gemini_summary=0.1,youtube_search=0.5' -> {ステップ名: 記録する割合}"""
+    rates: Dict[str, float] = {}
+    for part in raw.split(","):
+        name, sep, value = part.partition("=")
+        if not sep:
+            continue
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            continue
+    return rates
+
+
+_sample_rates = _parse_sample_rates(settings.DEBUG_LOG_SAMPLE_RATES)
+
+
+# ---- 書き込みスレッド ----
+
+def _rotate(f):
+    """現在のファイルを閉じて debug.log.N に送り、新しいファイルを開く"""
+    f.close()
+    backups = settings.DEBUG_LOG_BACKUP_COUNT
+    if backups > 0:
+        for i in range(backups - 1, 0, -1):
+            src = f"{DEBUG_LOG_PATH}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{DEBUG_LOG_PATH}.{i + 1}")
+        os.replace(DEBUG_LOG_PATH, f"{DEBUG_LOG_PATH}.1")
+    else:
+        os.remove(DEBUG_LOG_PATH)
+    return open(DEBUG_LOG_PATH, 'a', encoding='utf-8')
+
+
+def _writer_loop() -> None:
+    f = open(DEBUG_LOG_PATH, 'a', encoding='utf-8')
+    try:
+        while True:
+            entry = _queue.get()
+            batch: List[Optional[Dict[str, Any]]] = [entry]
+            # 溜まっている分はまとめて書く
+            while len(batch) < _BATCH_SIZE:
+                try:
+                    batch.append(_queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                for item in batch:
+                    if item is not None:
+                        f.write(json.dumps(item, ensure_ascii=False, default=str) + '\n')
+                f.flush()
+                if settings.DEBUG_LOG_MAX_BYTES > 0 and f.tell() >= settings.DEBUG_LOG_MAX_BYTES:
+                    f = _rotate(f)
+            except Exception:
+                metrics.increment("debug_log.write_errors")  # ログ書き込みエラーは無視
+            finally:
+                for _ in batch:
+                    _queue.task_done()
+    finally:
+        f.close()
+
+
+def _ensure_writer() -> None:
+    global _writer
+    if _writer is not None and _writer.is_alive():
+        return
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _writer = threading.Thread(target=_writer_loop, name="debug-log-writer", daemon=True)
+            _writer.start()
+
+
+def _enqueue(entry: Dict[str, Any]) -> None:
+    """キューに積む（溢れたら捨てる。呼び出し側を待たせない）"""
+    if not settings.DEBUG_LOG_ENABLED:
+        return
+    _ensure_writer()
+    try:
+        _queue.put_nowait(entry)
+    except queue.Full:
+        metrics.increment("debug_log.dropped")
+
+
+def flush_debug_log(timeout: float = 5.0) -> bool:
+    """キューに積まれた分が書き終わるまで待つ（終了時・検証用）。書き切れたら True"""
+    if _writer is None or not _writer.is_alive():
+        return _queue.unfinished_tasks == 0
+    deadline = time.monotonic() + timeout
+    while _queue.unfinished_tasks and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return _queue.unfinished_tasks == 0
+
+
+atexit.register(flush_debug_log)
+
+
+def _should_sample(step: str, status: str) -> bool:
+    if status == "error":
+        return True
+    rate = _sample_rates.get(step)
+    if rate is None or rate >= 1.0:
+        return True
+    return random.random() < rate
 
 
+# ---- 公開 API ----
+
 def init_debug_log(prefecture: str, **kwargs) -> str:
     """
-    デバッグログセッションを開始
-    
+    デバッグログセッションを開始（呼び出したコンテキストに紐づく）
+
     Args:
         prefecture: 都道府県名
         **kwargs: 追加情報（max_keywords, max_total_videos等）
-    
+
     Returns:
         セッションID
     """
-    global _current_session
-    
     session_id = str(uuid.uuid4())
     timestamp = datetime.now().isoformat()
-    
-    with _log_lock:
-        _current_session = {
+
+    _current_session.set({
+        "session_id": session_id,
+        "prefecture": prefecture,
+        "started_at": timestamp,
+        "config": kwargs,
+        "step_counts": {},
+        "sampled_out": 0,
+        "summary": {}
+    })
+
+    # セッション開始を1行JSON形式でdebug.logに追記
+    _enqueue({
+        "location": "debug_logger.py:init_debug_log",
+        "message": "Debug session started",
+        "data": {
             "session_id": session_id,
             "prefecture": prefecture,
-            "started_at": timestamp,
-            "config": kwargs,
-            "steps": [],
-            "summary": {}
-        }
-        
-        # セッション開始を1行JSON形式でdebug.logに追記
-        try:
-            log_entry = {
-                "location": "debug_logger.py:init_debug_log",
-                "message": "Debug session started",
-                "data": {
-                    "session_id": session_id,
-                    "prefecture": prefecture,
-                    "config": kwargs
-                },
-                "timestamp": int(time.time() * 1000),
-                "sessionId": session_id,
-                "runId": "run1",
-                "hypothesisId": "SESSION_START"
-            }
-            with open(DEBUG_LOG_PATH, 'a', encoding='utf-8') as f:
-                f.write(json.dumps(log_entry, ensure_ascii=False) + '\n')
-        except Exception:
-            pass  # ログ書き込みエラーは無視
-    
+            "config": kwargs
+        },
+        "timestamp": int(time.time() * 1000),
+        "sessionId": session_id,
+        "runId": "run1",
+        "hypothesisId": "SESSION_START"
+    })
+
     return session_id
 
 
@@ -80,7 +202,7 @@ def log_debug_step(
 ) -> None:
     """
     各処理ステップのログを記録
-    
+
     Args:
         step: ステップ名（keyword_generation, youtube_search, gemini_summary, spot_import, location_assignment）
         status: ステータス（started, completed, error）
@@ -89,129 +211,92 @@ def log_debug_step(
         video_title: 動画タイトル（gemini_summaryの場合）
         error: エラーメッセージ（エラー時）
     """
-    global _current_session
-    
-    if _current_session is None:
+    session = _current_session.get()
+    if session is None:
         return  # セッションが開始されていない場合は何もしない
-    
-    timestamp = datetime.now().isoformat()
-    
-    step_entry: Dict[str, Any] = {
+
+    counts = session["step_counts"]
+    counts[step] = counts.get(step, 0) + 1
+    if not _should_sample(step, status):
+        session["sampled_out"] += 1
+        return
+
+    log_data: Dict[str, Any] = {
         "step": step,
-        "timestamp": timestamp,
         "status": status
     }
-    
     if keyword:
-        step_entry["keyword"] = keyword
-    
+        log_data["keyword"] = keyword
     if video_title:
-        step_entry["video_title"] = video_title
-    
+        log_data["video_title"] = video_title
     if data:
-        step_entry["data"] = data
-    
+        log_data.update(data)
     if error:
-        step_entry["error"] = error
-    
-    with _log_lock:
-        if _current_session:
-            _current_session["steps"].append(step_entry)
-            
-            # 各ステップを1行JSON形式でdebug.logにリアルタイム追記
-            try:
-                log_data = {
-                    "step": step,
-                    "status": status
-                }
-                if keyword:
-                    log_data["keyword"] = keyword
-                if video_title:
-                    log_data["video_title"] = video_title
-                if data:
-                    log_data.update(data)
-                if error:
-                    log_data["error"] = error
-                
-                log_entry = {
-                    "location": f"debug_logger.py:log_debug_step",
-                    "message": f"{step} - {status}",
-                    "data": log_data,
-                    "timestamp": int(time.time() * 1000),
-                    "sessionId": _current_session.get("session_id", "unknown"),
-                    "runId": "run1",
-                    "hypothesisId": step.upper()
-                }
-                with open(DEBUG_LOG_PATH, 'a', encoding='utf-8') as f:
-                    f.write(json.dumps(log_entry, ensure_ascii=False) + '\n')
-            except Exception:
-                pass  # ログ書き込みエラーは無視
+        log_data["error"] = error
+
+    _enqueue({
+        "location": "debug_logger.py:log_debug_step",
+        "message": f"{step} - {status}",
+        "data": log_data,
+        "timestamp": int(time.time() * 1000),
+        "sessionId": session.get("session_id", "unknown"),
+        "runId": "run1",
+        "hypothesisId": step.upper()
+    })
 
 
 def finalize_debug_log(summary: Optional[Dict[str, Any]] = None) -> Optional[str]:
     """
     ログセッションを終了してdebug.logに記録
-    
+
     Args:
         summary: サマリー情報
-    
+
     Returns:
         常にNone（以前の互換性のため）
     """
-    global _current_session
-    
-    if _current_session is None:
+    session = _current_session.get()
+    if session is None:
         return None
-    
+
     timestamp = datetime.now().isoformat()
-    
-    with _log_lock:
-        if _current_session:
-            _current_session["completed_at"] = timestamp
-            
-            if summary:
-                _current_session["summary"] = summary
-            
-            # セッション終了を1行JSON形式でdebug.logに追記
-            try:
-                log_data = {
-                    "session_id": _current_session.get("session_id"),
-                    "prefecture": _current_session.get("prefecture"),
-                    "started_at": _current_session.get("started_at"),
-                    "completed_at": timestamp,
-                    "total_steps": len(_current_session.get("steps", []))
-                }
-                if summary:
-                    log_data["summary"] = summary
-                
-                log_entry = {
-                    "location": "debug_logger.py:finalize_debug_log",
-                    "message": "Debug session completed",
-                    "data": log_data,
-                    "timestamp": int(time.time() * 1000),
-                    "sessionId": _current_session.get("session_id", "unknown"),
-                    "runId": "run1",
-                    "hypothesisId": "SESSION_END"
-                }
-                with open(DEBUG_LOG_PATH, 'a', encoding='utf-8') as f:
-                    f.write(json.dumps(log_entry, ensure_ascii=False) + '\n')
-            except Exception:
-                pass  # ログ書き込みエラーは無視
-            
-            # セッションをクリア
-            _current_session = None
-            
-            return None
-    
+    session["completed_at"] = timestamp
+    if summary:
+        session["summary"] = summary
+
+    # セッション終了を1行JSON形式でdebug.logに追記
+    log_data = {
+        "session_id": session.get("session_id"),
+        "prefecture": session.get("prefecture"),
+        "started_at": session.get("started_at"),
+        "completed_at": timestamp,
+        "total_steps": sum(session["step_counts"].values()),
+        "step_counts": session["step_counts"],
+        "sampled_out": session["sampled_out"],
+    }
+    if summary:
+        log_data["summary"] = summary
+
+    _enqueue({
+        "location": "debug_logger.py:finalize_debug_log",
+        "message": "Debug session completed",
+        "data": log_data,
+        "timestamp": int(time.time() * 1000),
+        "sessionId": session.get("session_id", "unknown"),
+        "runId": "run1",
+        "hypothesisId": "SESSION_END"
+    })
+
+    # セッションをクリア
+    _current_session.set(None)
     return None
 
 
 def get_current_session() -> Optional[Dict[str, Any]]:
     """
-    現在のセッション情報を取得（デバッグ用）
-    
+    現在のコンテキストのセッション情報を取得（デバッグ用）
+
     Returns:
         現在のセッション情報（セッションがない場合はNone）
     """
-    return _current_session
-
+    return _current_session.get()
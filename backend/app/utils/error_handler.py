@@ -3,13 +3,11 @@
 リトライ機能、フォールバック機能、エラーログ記録
 既存のSatoTripプロジェクトの実装を参考
 """
-import time
 import json
 import logging
 import os
 from datetime import datetime
-from typing import Optional, Callable, Any, List, Dict
-from functools import wraps
+from typing import Optional, Any, List, Dict
 
 # ログ記録の設定
 LOGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "logs")
@@ -32,43 +30,32 @@ file_handler.setFormatter(formatter)
 logger.addHandler(file_handler)
 
 
-def retry_on_error(max_retries: int = 3, delay: float = 1.0, backoff: float = 2.0):
+def retry_on_error(
+    max_retries: int = 3,
+    delay: float = 1.0,
+    backoff: float = 2.0,
+    deadline_sec: Optional[float] = None,
+):
     """
-    リトライデコレータ
-    
+    リトライデコレータ（app.utils.resilience.retry の互換ラッパー）
+
+    待機はジッター付きの指数バックオフ（0〜delay×backoff^n 秒）。deadline_sec を超える待機はせず、
+    サーキットが開いている（CircuitOpenError）場合は再試行しない。async def にも使える。
+
     Args:
-        max_retries: 最大リトライ回数
-        delay: 初回待機時間（秒）
+        max_retries: 最大試行回数
+        delay: 初回待機時間の上限（秒）
         backoff: 指数バックオフ係数
+        deadline_sec: 初回呼び出しからの期限（秒）
     """
-    def decorator(func: Callable) -> Callable:
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-            last_exception = None
-            
-            for attempt in range(max_retries):
-                try:
-                    return func(*args, **kwargs)
-                except Exception as e:
-                    last_exception = e
-                    if attempt < max_retries - 1:
-                        wait_time = delay * (backoff ** attempt)
-                        logger.warning(
-                            f"{func.__name__} 失敗 (試行 {attempt + 1}/{max_retries}): {str(e)}. "
-                            f"{wait_time:.1f}秒後に再試行します。"
-                        )
-                        time.sleep(wait_time)
-                    else:
-                        logger.error(
-                            f"{func.__name__} 最終失敗 (総試行 {max_retries}回): {str(e)}"
-                        )
-                        break
-            
-            # 全てのリトライが失敗した場合
-            raise last_exception
-        
-        return wrapper
-    return decorator
+    from app.utils.resilience import retry
+    return retry(
+        max_attempts=max_retries,
+        base_delay=delay,
+        max_delay=delay * (backoff ** max(0, max_retries - 1)),
+        multiplier=backoff,
+        deadline_sec=deadline_sec,
+    )
 
 
 def generate_template_plan(
@@ -0,0 +1,58 @@
+"""
+大きな JSON レスポンスの高速シリアライズ
+
+プラン詳細・一覧・生成のレスポンスは spots（スポット本体を含む入れ子の辞書）が数百KBになり、
+response_model 経由だと「PlanResponse での再検証 → 辞書化 → JSON 化」を毎回通る。
+DB に保存済みのプラン JSON は保存時に検証済みのため、呼び出し側で辞書を組み立てて
+FastJSONResponse で直接返す（orjson があれば orjson、無ければ標準 json）。
+
+- 出力は response_model 経由と同じ形（datetime は ISO 8601、UTC は "Z"、キー順もスキーマ順）
+- orjson は任意依存（未インストールでも動く）
+"""
+import json
+from datetime import date, datetime, timezone
+from typing import Any
+
+from fastapi.responses import Response
+
+from app.utils.lazy_import import is_available, lazy_module
+
+orjson = lazy_module("orjson")
+ORJSON_AVAILABLE = is_available("orjson")
+
+
+def _default(value: Any) -> Any:
+    """標準 json で扱えない値（pydantic の JSON 出力に合わせる）"""
+    if isinstance(value, datetime):
+        text = value.isoformat()
+        if value.tzinfo is not None and value.utcoffset() == timezone.utc.utcoffset(None):
+            text = text[:-6] + "Z"
+        return text
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"JSON に変換できない型です: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """JSON バイト列に変換（orjson があれば orjson）"""
+    if ORJSON_AVAILABLE:
+        # OPT_UTC_Z: UTC を "+00:00" ではなく "Z" で出す（pydantic と同じ）
+        return orjson.dumps(content, option=orjson.OPT_UTC_Z | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(
+        content, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=_default,
+    ).encode("utf-8")
+
+
+def loads(data: bytes) -> Any:
+    """JSON バイト列を読む（orjson があれば orjson）"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+class FastJSONResponse(Response):
+    """検証済みの辞書・リストをそのまま JSON にするレスポンス"""
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
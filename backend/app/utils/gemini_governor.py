@@ -0,0 +1,258 @@
+"""
+Gemini 呼び出しのガバナー（プロセス全体の同時実行数・RPM・TPM の予算管理）
+
+- プラン生成・スポットリサーチ・動画要約・SNS 要約はすべて generate_content() を通して呼ぶ
+- 優先度付きキュー: INTERACTIVE（ユーザー操作）は BATCH（一括収集）より常に先に通す。
+  BATCH は予算の GEMINI_BATCH_MAX_SHARE までしか使わず、残りはユーザー操作用に空けておく
+- 予算は直近60秒のスライディングウィンドウ（プロセス内）。REDIS_URL があれば
+  分単位の固定ウィンドウのカウンタで複数ワーカー間でも共有する
+- 待ち時間が上限を超えたら GeminiQueueTimeout（呼び出し側は既存のフォールバックへ進む）
+- 呼び出し元ごとの待ち時間は gemini.queue_wait_ms{caller} に記録する
+"""
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.utils import metrics
+from app.utils.resilience import CircuitOpenError, get_breaker
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = 0
+BATCH = 1
+
+_PRIORITY_NAMES = {INTERACTIVE: "interactive", BATCH: "batch"}
+
+# 予算のウィンドウ（秒）
+_WINDOW_SEC = 60.0
+# 日本語プロンプトのおおよその文字数/トークン
+_CHARS_PER_TOKEN = 2
+# Redis の予算が埋まっているときの再確認間隔（秒）
+_REDIS_RETRY_SEC = 0.25
+_REDIS_PREFIX = "gemini_governor:"
+
+_redis = None
+if settings.REDIS_URL and settings.GEMINI_GOVERNOR_USE_REDIS:
+    try:
+        import redis as _redis_lib
+        _redis = _redis_lib.from_url(settings.REDIS_URL, decode_responses=True)
+        _redis.ping()
+    except Exception:
+        _redis = None
+
+
+class GeminiQueueTimeout(CircuitOpenError):
+    """予算待ちが上限時間を超えた（遮断中と同じく再試行せずフォールバックへ進む）"""
+
+    def __init__(self, caller: str, waited: float) -> None:
+        Exception.__init__(self, f"Gemini の呼び出し待ちがタイムアウトしました（{caller}、{waited:.1f}秒）")
+        self.provider = "gemini"
+        self.retry_after = 0.0
+        self.caller = caller
+
+
+class _Ticket:
+    __slots__ = ("caller", "priority", "tokens", "granted_at", "redis_key")
+
+    def __init__(self, caller: str, priority: int, tokens: int) -> None:
+        self.caller = caller
+        self.priority = priority
+        self.tokens = tokens
+        self.granted_at = 0.0
+        self.redis_key: Optional[str] = None
+
+
+def estimate_tokens(prompt: Any) -> int:
+    """プロンプトから入力 + 出力の消費トークンを見積もる"""
+    return len(str(prompt)) // _CHARS_PER_TOKEN + settings.GEMINI_EST_OUTPUT_TOKENS
+
+
+def _usage_tokens(response: Any) -> Optional[int]:
+    usage = getattr(response, "usage_metadata", None)
+    total = getattr(usage, "total_token_count", None)
+    return int(total) if total else None
+
+
+def _share_limit(limit: int, priority: int) -> int:
+    """優先度ごとの上限（0 は無制限）。BATCH は GEMINI_BATCH_MAX_SHARE 分だけ"""
+    if limit <= 0 or priority == INTERACTIVE:
+        return limit
+    return max(1, int(limit * settings.GEMINI_BATCH_MAX_SHARE))
+
+
+class _Governor:
+    def __init__(self) -> None:
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._waiting: List[Tuple[int, int, _Ticket]] = []
+        self._in_flight = 0
+        # 直近60秒に通した呼び出し（ticket.granted_at / ticket.tokens を参照）
+        self._window: Deque[_Ticket] = deque()
+
+    # ---- 予算 ----
+
+    def _prune(self, now: float) -> None:
+        while self._window and now - self._window[0].granted_at >= _WINDOW_SEC:
+            self._window.popleft()
+
+    def _local_wait(self, ticket: _Ticket, now: float) -> Optional[float]:
+        """プロセス内の予算で通せるなら None、通せなければ空くまでの目安秒数"""
+        self._prune(now)
+        concurrency = _share_limit(settings.GEMINI_MAX_CONCURRENCY, ticket.priority)
+        if concurrency and self._in_flight >= concurrency:
+            return _WINDOW_SEC  # release() で起こされる
+        rpm = _share_limit(settings.GEMINI_RPM_LIMIT, ticket.priority)
+        tpm = _share_limit(settings.GEMINI_TPM_LIMIT, ticket.priority)
+        over_rpm = rpm and len(self._window) >= rpm
+        over_tpm = tpm and self._window and sum(t.tokens for t in self._window) + ticket.tokens > tpm
+        if over_rpm or over_tpm:
+            return max(0.01, self._window[0].granted_at + _WINDOW_SEC - now)
+        return None
+
+    def _reserve_global(self, ticket: _Ticket) -> bool:
+        """Redis の分単位カウンタで予約する（Redis なし・障害時は常に True）"""
+        if _redis is None:
+            return True
+        key = f"{_REDIS_PREFIX}{int(time.time() // _WINDOW_SEC)}"
+        try:
+            pipe = _redis.pipeline()
+            pipe.hincrby(key, "req", 1)
+            pipe.hincrby(key, "tok", ticket.tokens)
+            pipe.expire(key, int(_WINDOW_SEC * 2))
+            req, tok, _ = pipe.execute()
+            rpm = _share_limit(settings.GEMINI_RPM_LIMIT, ticket.priority)
+            tpm = _share_limit(settings.GEMINI_TPM_LIMIT, ticket.priority)
+            if (rpm and req > rpm) or (tpm and tok > tpm):
+                pipe = _redis.pipeline()
+                pipe.hincrby(key, "req", -1)
+                pipe.hincrby(key, "tok", -ticket.tokens)
+                pipe.execute()
+                return False
+        except Exception as e:
+            # Redis 障害時はプロセス内の予算だけで続ける
+            logger.warning("Gemini ガバナー: Redis で予約できませんでした: %s", e)
+            return True
+        ticket.redis_key = key
+        return True
+
+    def _publish_depth(self) -> None:
+        counts = {INTERACTIVE: 0, BATCH: 0}
+        for _, _, t in self._waiting:
+            counts[t.priority] = counts.get(t.priority, 0) + 1
+        for priority, count in counts.items():
+            metrics.set_gauge("gemini.queue_depth", count, priority=_PRIORITY_NAMES.get(priority, str(priority)))
+
+    # ---- 取得・解放 ----
+
+    def acquire(self, caller: str, priority: int, tokens: int, timeout: float) -> _Ticket:
+        ticket = _Ticket(caller, priority, tokens)
+        entry = (priority, next(self._seq), ticket)
+        start = time.monotonic()
+        deadline = start + timeout
+        with self._cond:
+            heapq.heappush(self._waiting, entry)
+            self._publish_depth()
+            try:
+                while True:
+                    now = time.monotonic()
+                    # 先頭（最も優先度が高く古い）の呼び出しだけが通れる
+                    if self._waiting[0] is entry:
+                        wait = self._local_wait(ticket, now)
+                        if wait is None:
+                            if self._reserve_global(ticket):
+                                break
+                            wait = _REDIS_RETRY_SEC
+                    else:
+                        wait = _WINDOW_SEC
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        self._waiting.remove(entry)
+                        heapq.heapify(self._waiting)
+                        metrics.increment("gemini.queue_timeouts", caller=caller)
+                        raise GeminiQueueTimeout(caller, now - start)
+                    self._cond.wait(min(wait, remaining))
+                heapq.heappop(self._waiting)
+                ticket.granted_at = time.monotonic()
+                self._window.append(ticket)
+                self._in_flight += 1
+            finally:
+                self._publish_depth()
+                # 先頭が入れ替わったので次の待ち手を起こす
+                self._cond.notify_all()
+        waited_ms = (ticket.granted_at - start) * 1000
+        metrics.observe("gemini.queue_wait_ms", waited_ms, caller=caller)
+        metrics.observe("gemini.queue_wait_ms", waited_ms, priority=_PRIORITY_NAMES.get(priority, str(priority)))
+        return ticket
+
+    def release(self, ticket: _Ticket, actual_tokens: Optional[int]) -> None:
+        if actual_tokens is not None:
+            metrics.increment("gemini.tokens", actual_tokens, caller=ticket.caller)
+            diff = actual_tokens - ticket.tokens
+            if ticket.redis_key and diff and _redis is not None:
+                try:
+                    _redis.hincrby(ticket.redis_key, "tok", diff)
+                except Exception:
+                    pass
+        with self._cond:
+            if actual_tokens is not None:
+                # 見積もりを実績で置き換える（ウィンドウ内の TPM に反映）
+                ticket.tokens = actual_tokens
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            self._prune(time.monotonic())
+            waiting = {name: 0 for name in _PRIORITY_NAMES.values()}
+            for _, _, t in self._waiting:
+                waiting[_PRIORITY_NAMES.get(t.priority, str(t.priority))] += 1
+            return {
+                "in_flight": self._in_flight,
+                "waiting": waiting,
+                "requests_last_minute": len(self._window),
+                "tokens_last_minute": sum(t.tokens for t in self._window),
+                "rpm_limit": settings.GEMINI_RPM_LIMIT,
+                "tpm_limit": settings.GEMINI_TPM_LIMIT,
+                "max_concurrency": settings.GEMINI_MAX_CONCURRENCY,
+                "redis": _redis is not None,
+            }
+
+
+_governor = _Governor()
+
+
+def generate_content(model: Any, prompt: Any, caller: str, priority: int = INTERACTIVE, **kwargs):
+    """ガバナーの予算内で model.generate_content を呼ぶ（サーキットブレーカー込み）
+
+    Args:
+        model: genai.GenerativeModel
+        prompt: プロンプト
+        caller: 呼び出し元の名前（メトリクスのラベル）
+        priority: INTERACTIVE（ユーザー操作）または BATCH（一括収集）
+        **kwargs: generate_content にそのまま渡す
+
+    Raises:
+        GeminiQueueTimeout: 予算待ちが上限時間を超えた
+        CircuitOpenError: Gemini が遮断中
+    """
+    timeout = (
+        settings.GEMINI_QUEUE_TIMEOUT_SEC if priority == INTERACTIVE
+        else settings.GEMINI_BATCH_QUEUE_TIMEOUT_SEC
+    )
+    ticket = _governor.acquire(caller, priority, estimate_tokens(prompt), timeout)
+    response = None
+    try:
+        response = get_breaker("gemini").call(model.generate_content, prompt, **kwargs)
+        return response
+    finally:
+        _governor.release(ticket, _usage_tokens(response) if response is not None else None)
+
+
+def governor_stats() -> Dict[str, Any]:
+    """現在の待ち行列と予算の使用状況（管理画面向け）"""
+    return _governor.stats()
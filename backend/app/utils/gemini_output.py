@@ -0,0 +1,183 @@
+"""
+Gemini の構造化出力（レスポンススキーマ指定の JSON）
+
+自由文の出力をコードブロック除去 → json.loads で読んでおり、崩れた出力は
+プラン生成ではテンプレートへのフォールバック、または数秒かかる呼び出しごとの再試行になっていた。
+response_mime_type=application/json とスキーマを指定し、モデル側で形を保証させる。
+
+- スキーマ: プラン（days / spots）・スポットリサーチ・要約（動画 / SNS）
+- 指定は generation_config（dict）で渡す。GEMINI_STRUCTURED_OUTPUT=false で従来の自由文に戻せる
+- プロンプトの出力形式の指示は json_format_instruction() で作る（構造化出力ではコードブロックを指示しない）
+- 解析は parse_json()。読めなければ従来のコードブロック除去も試し、それでも駄目なら None
+  （再試行はしない。同じプロンプトで崩れた出力は再試行しても直りにくいため）
+- 呼び出し種別ごとに gemini.parse{caller, result=ok|recovered|error} と gemini.retries{caller} を記録する
+"""
+import logging
+from typing import Any, Dict, Optional
+
+from app.config import settings
+from app.utils import fast_json, metrics
+
+logger = logging.getLogger(__name__)
+
+PLAN_CATEGORIES = [
+    "History", "Nature", "Food", "Culture", "Shopping", "Art", "Relax", "Tourism", "Experience",
+    "Event", "HotSpring", "ScenicView", "Cafe", "Hotel", "Drink", "Fashion", "Date", "Drive",
+]
+RESEARCH_CATEGORIES = ["History", "Nature", "Food", "Shopping", "Art", "Relax", "Culture"]
+TRANSPORT_MODES = ["walk", "train", "car", "bus"]
+
+
+def _string(**extra: Any) -> Dict[str, Any]:
+    return {"type": "STRING", **extra}
+
+
+def _enum(values) -> Dict[str, Any]:
+    return {"type": "STRING", "format": "enum", "enum": list(values)}
+
+
+def _string_list() -> Dict[str, Any]:
+    return {"type": "ARRAY", "items": _string()}
+
+
+# プラン生成（build_plan_generation_prompt の出力形式。days は省略可で、無ければ spots から作る）
+PLAN_SCHEMA: Dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "title": _string(),
+        "summary": _string(),
+        "area": _string(),
+        "budget": {"type": "NUMBER"},
+        "days": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "day": {"type": "INTEGER"},
+                    "theme": _string(),
+                    "schedule": {
+                        "type": "ARRAY",
+                        "items": {
+                            "type": "OBJECT",
+                            "properties": {
+                                "time": _string(),
+                                "activity": _string(),
+                                "place": _string(),
+                                "duration": _string(),
+                                "description": _string(),
+                            },
+                            "required": ["time", "place"],
+                        },
+                    },
+                },
+                "required": ["day", "schedule"],
+            },
+        },
+        "spots": {
+            "type": "ARRAY",
+            "items": {
+                "type": "OBJECT",
+                "properties": {
+                    "day": {"type": "INTEGER"},
+                    "name": _string(),
+                    "description": _string(),
+                    "category": _enum(PLAN_CATEGORIES),
+                    "tags": _string_list(),
+                    "durationMinutes": {"type": "INTEGER"},
+                    "transportMode": _enum(TRANSPORT_MODES),
+                    "transportDuration": {"type": "INTEGER"},
+                    "startTime": _string(),
+                },
+                "required": ["day", "name", "category", "durationMinutes", "startTime"],
+            },
+        },
+        "tips": _string_list(),
+    },
+    "required": ["title", "area", "spots"],
+}
+
+# スポットリサーチ（非事実系の項目のみ。不明な項目は null）
+SPOT_RESEARCH_SCHEMA: Dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "name": _string(),
+        "area": _string(nullable=True),
+        "category": _enum(RESEARCH_CATEGORIES),
+        "description": _string(nullable=True),
+        "duration_minutes": {"type": "INTEGER", "nullable": True},
+        "tags": _string_list(),
+    },
+    "required": ["name", "category", "description", "duration_minutes", "tags"],
+}
+
+# 動画・SNS 記事の要約（spot_import_service.parse_gemini_summary が読む形式）
+SUMMARY_SCHEMA: Dict[str, Any] = {
+    "type": "OBJECT",
+    "properties": {
+        "theme": _string(),
+        "area": _string(),
+        "places": _string_list(),
+        "items": _string_list(),
+        "recommend": _string(),
+        "mood": _string(),
+    },
+    "required": ["theme", "area", "places"],
+}
+
+
+def json_output_kwargs(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """generate_content に渡す構造化出力の指定（GEMINI_STRUCTURED_OUTPUT=false なら空）"""
+    if not settings.GEMINI_STRUCTURED_OUTPUT:
+        return {}
+    return {
+        "generation_config": {
+            "response_mime_type": "application/json",
+            "response_schema": schema,
+        }
+    }
+
+
+def json_format_instruction(example: str) -> str:
+    """プロンプトの出力形式の指示と JSON の例
+
+    構造化出力ではスキーマどおりの JSON がそのまま返るため、コードブロックで囲む指示はしない
+    （GEMINI_STRUCTURED_OUTPUT=false の自由文では従来どおり ```json ... ``` を指示する）。
+    """
+    if settings.GEMINI_STRUCTURED_OUTPUT:
+        return f"必ず以下のフォーマットの JSON のみを出力してください。\n\n{example}\n"
+    return f"必ず以下のJSONフォーマットのみを含むコードブロック(```json ... ```)を出力してください。\n\n```json\n{example}\n```\n"
+
+
+def _strip_code_fence(text: str) -> str:
+    if "```json" in text:
+        return text.split("```json")[1].split("```")[0].strip()
+    if "```" in text:
+        return text.split("```")[1].split("```")[0].strip()
+    return text.strip()
+
+
+def parse_json(text: Optional[str], caller: str) -> Optional[Any]:
+    """応答テキストを JSON として読む（読めなければ None。結果は gemini.parse{caller} に記録）"""
+    if not text:
+        metrics.increment("gemini.parse", caller=caller, result="error")
+        return None
+    try:
+        value = fast_json.loads(text)
+        metrics.increment("gemini.parse", caller=caller, result="ok")
+        return value
+    except ValueError:
+        pass
+    # 自由文の出力（構造化出力が無効・未対応のモデル）はコードブロックを外して読む
+    try:
+        value = fast_json.loads(_strip_code_fence(text))
+        metrics.increment("gemini.parse", caller=caller, result="recovered")
+        return value
+    except ValueError as e:
+        metrics.increment("gemini.parse", caller=caller, result="error")
+        logger.warning("Gemini 出力の JSON 解析に失敗しました（%s）: %s テキスト: %s...", caller, e, text[:100])
+        return None
+
+
+def record_retry(caller: str) -> None:
+    """再試行（2回目以降の呼び出し）を数える"""
+    metrics.increment("gemini.retries", caller=caller)
@@ -0,0 +1,246 @@
+"""
+ワーカー間のキャッシュ無効化バス
+
+プロセス内キャッシュ（スポットカタログ・レスポンスキャッシュ・タグカテゴリ・システム設定など）は
+ワーカーごとに持つため、管理者の編集後も他ワーカーが古い内容を返し続ける。
+名前空間ごとの世代番号を共有し、書き込み側が publish、キャッシュ側が register したコールバックで捨てる。
+
+- 世代番号: REDIS_URL 設定時は Redis（INCR）、無ければ cache_versions テーブル
+- 通知: Redis があれば pub/sub で即時に届く。無ければ INVALIDATION_POLL_SEC ごとに世代番号を読み比べる
+  （Redis 使用時も取りこぼし対策として INVALIDATION_RECONCILE_SEC ごとに読み比べる）
+- 自プロセスの publish はその場でコールバックを呼ぶ（pub/sub で戻ってきた自分の通知は無視）
+- コールバックは監視スレッドから呼ばれるため、短く・スレッドセーフにすること
+
+使い方:
+    register("system_settings", lambda payload: _cache.clear())
+    publish("system_settings")   # 書き込みの後
+"""
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from app.config import settings
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+_REDIS_VERSION_PREFIX = "satotrip:cache_version:"
+_REDIS_CHANNEL = "satotrip:invalidate"
+
+# pub/sub で戻ってきた自分の通知を見分ける
+_ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+Callback = Callable[[Optional[Dict[str, Any]]], None]
+
+# Redis クライアントの初期化（任意）
+_redis = None
+if settings.REDIS_URL:
+    try:
+        import redis as _redis_lib
+        _redis = _redis_lib.from_url(settings.REDIS_URL)
+        _redis.ping()
+    except Exception as e:
+        logger.warning("無効化バス: Redis 接続に失敗したため DB の世代番号を読み比べます: %s", str(e))
+        _redis = None
+
+_lock = threading.Lock()
+_callbacks: Dict[str, List[Callback]] = {}
+# 名前空間ごとの最後に確認した世代番号
+_seen: Dict[str, int] = {}
+_listener: Optional[threading.Thread] = None
+_subscribed = False
+
+
+def read_version(namespace: str) -> int:
+    """名前空間の現在の世代番号"""
+    if _redis is not None:
+        try:
+            return int(_redis.get(_REDIS_VERSION_PREFIX + namespace) or 0)
+        except Exception as e:
+            logger.warning("無効化バス: Redis から世代番号を読めませんでした: %s", e)
+    # 関数内 import: database → utils の循環 import を避けるため
+    from sqlalchemy import text
+    from app.utils.database import engine
+    with engine.connect() as conn:
+        value = conn.execute(
+            text("SELECT version FROM cache_versions WHERE namespace = :ns"),
+            {"ns": namespace},
+        ).scalar()
+    return int(value or 0)
+
+
+def _read_versions(namespaces: List[str]) -> Dict[str, int]:
+    if _redis is not None:
+        try:
+            values = _redis.mget([_REDIS_VERSION_PREFIX + ns for ns in namespaces])
+            return {ns: int(v or 0) for ns, v in zip(namespaces, values)}
+        except Exception as e:
+            logger.warning("無効化バス: Redis から世代番号を読めませんでした: %s", e)
+    from sqlalchemy import bindparam, text
+    from app.utils.database import engine
+    with engine.connect() as conn:
+        rows = conn.execute(
+            text("SELECT namespace, version FROM cache_versions WHERE namespace IN :ns")
+            .bindparams(bindparam("ns", expanding=True)),
+            {"ns": namespaces},
+        ).all()
+    versions = {ns: 0 for ns in namespaces}
+    versions.update({row[0]: int(row[1] or 0) for row in rows})
+    return versions
+
+
+def _bump_version(namespace: str) -> int:
+    if _redis is not None:
+        try:
+            return int(_redis.incr(_REDIS_VERSION_PREFIX + namespace))
+        except Exception as e:
+            logger.warning("無効化バス: Redis の世代番号を更新できませんでした: %s", e)
+    from sqlalchemy import text
+    from app.utils.database import engine
+    with engine.begin() as conn:
+        updated = conn.execute(
+            text(
+                "UPDATE cache_versions SET version = version + 1, updated_at = CURRENT_TIMESTAMP "
+                "WHERE namespace = :ns"
+            ),
+            {"ns": namespace},
+        ).rowcount
+        if not updated:
+            conn.execute(
+                text("INSERT INTO cache_versions (namespace, version) VALUES (:ns, 1)"),
+                {"ns": namespace},
+            )
+        return int(conn.execute(
+            text("SELECT version FROM cache_versions WHERE namespace = :ns"),
+            {"ns": namespace},
+        ).scalar() or 0)
+
+
+def register(namespace: str, callback: Callback) -> None:
+    """名前空間の無効化時に呼ぶコールバックを登録する（モジュールの import 時に呼んでよい）"""
+    with _lock:
+        _callbacks.setdefault(namespace, []).append(callback)
+
+
+def _dispatch(namespace: str, version: Optional[int], payload: Optional[Dict[str, Any]], source: str) -> None:
+    with _lock:
+        if version is not None:
+            if version <= _seen.get(namespace, -1):
+                return
+            _seen[namespace] = version
+        callbacks = list(_callbacks.get(namespace, ()))
+    metrics.increment("invalidation_bus.received", namespace=namespace, source=source)
+    for callback in callbacks:
+        try:
+            callback(payload)
+        except Exception as e:
+            logger.warning("無効化バス: コールバックでエラーが発生しました（%s）: %s", namespace, e)
+
+
+def publish(namespace: str, payload: Optional[Dict[str, Any]] = None) -> int:
+    """名前空間の世代を進め、全ワーカーのキャッシュを無効化する（書き込みの commit 後に呼ぶ）
+
+    Args:
+        payload: コールバックに渡す補足情報（変更したIDなど。JSON にできる値）
+
+    Returns:
+        新しい世代番号
+    """
+    version = _bump_version(namespace)
+    metrics.increment("invalidation_bus.published", namespace=namespace)
+    if _redis is not None:
+        try:
+            _redis.publish(_REDIS_CHANNEL, json.dumps(
+                {"ns": namespace, "version": version, "origin": _ORIGIN, "payload": payload},
+                ensure_ascii=False,
+            ))
+        except Exception as e:
+            # 他ワーカーは世代番号の読み比べで追いつく
+            logger.warning("無効化バス: Redis への通知に失敗しました: %s", e)
+    _dispatch(namespace, version, payload, "local")
+    return version
+
+
+def _poll_once() -> None:
+    with _lock:
+        namespaces = list(_callbacks)
+    if not namespaces:
+        return
+    for namespace, version in _read_versions(namespaces).items():
+        with _lock:
+            first = namespace not in _seen
+            if first:
+                # 監視開始時点の世代は基準にするだけ（起動直後のキャッシュは空のため）
+                _seen[namespace] = version
+        if not first:
+            _dispatch(namespace, version, None, "poll")
+
+
+def _subscribe_loop() -> None:
+    """Redis pub/sub を購読する（切れたら読み比べだけで動き、再接続を試みる）"""
+    global _subscribed
+    while True:
+        try:
+            pubsub = _redis.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(_REDIS_CHANNEL)
+            _subscribed = True
+            # 購読が切れていた間の取りこぼしを拾う
+            _poll_once()
+            for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                try:
+                    event = json.loads(message["data"])
+                except (TypeError, ValueError):
+                    continue
+                if event.get("origin") == _ORIGIN:
+                    continue
+                _dispatch(event.get("ns", ""), event.get("version"), event.get("payload"), "pubsub")
+        except Exception as e:
+            logger.warning("無効化バス: Redis の購読が切れました: %s", e)
+        _subscribed = False
+        time.sleep(settings.INVALIDATION_POLL_SEC)
+
+
+def _poll_loop() -> None:
+    while True:
+        interval = settings.INVALIDATION_RECONCILE_SEC if _subscribed else settings.INVALIDATION_POLL_SEC
+        time.sleep(max(0.1, interval))
+        try:
+            _poll_once()
+        except Exception as e:
+            logger.warning("無効化バス: 世代番号の読み比べに失敗しました: %s", e)
+
+
+def start() -> None:
+    """監視スレッドを起動する（アプリ起動時に1回。スクリプトからの publish だけなら不要）"""
+    global _listener
+    if not settings.INVALIDATION_BUS_ENABLED:
+        return
+    with _lock:
+        if _listener is not None:
+            return
+        _listener = threading.Thread(target=_poll_loop, name="invalidation-poll", daemon=True)
+    try:
+        _poll_once()
+    except Exception as e:
+        logger.warning("無効化バス: 世代番号を読めませんでした: %s", e)
+    _listener.start()
+    if _redis is not None:
+        threading.Thread(target=_subscribe_loop, name="invalidation-pubsub", daemon=True).start()
+    logger.info("無効化バス: 監視を開始しました（%s）", "Redis pub/sub" if _redis is not None else "DB の世代番号")
+
+
+def bus_stats() -> Dict[str, Any]:
+    """管理画面用の状態"""
+    with _lock:
+        return {
+            "transport": "redis" if _redis is not None else "db_poll",
+            "running": _listener is not None,
+            "subscribed": _subscribed,
+            "namespaces": {ns: {"callbacks": len(cbs), "version": _seen.get(ns)} for ns, cbs in _callbacks.items()},
+        }
@@ -0,0 +1,82 @@
+"""
+ワーカー間のジョブのリース（DB の job_leases テーブル）
+
+各ワーカーが同じ裏の処理（例: カタログ更新後の移動行列の差分更新）を同時に始めると、
+外部 API への同じ問い合わせと同じ行への書き込みが重なる。リースを取れたワーカーだけが実行する。
+
+- acquire: 行が無ければ INSERT、期限切れなら UPDATE で取る（どちらも1文で原子的）
+- release: 自分のリースだけを期限切れにする
+- 期限（ttl_sec）は処理の最長時間より長くする。保持中のワーカーが落ちても期限後には別のワーカーが取れる
+
+使い方:
+    owner = acquire("travel_matrix_refresh", 900)
+    if owner:
+        try:
+            ...
+        finally:
+            release("travel_matrix_refresh", owner)
+"""
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# リースの保持者（プロセスごと）
+_OWNER_PREFIX = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def acquire(name: str, ttl_sec: float) -> Optional[str]:
+    """リースを取る
+
+    Returns:
+        取れたら保持者のトークン（release に渡す）。他のワーカーが保持中なら None
+    """
+    # 関数内 import: database → utils の循環 import を避けるため
+    from app.utils.database import engine
+
+    owner = f"{_OWNER_PREFIX}-{uuid.uuid4().hex[:8]}"
+    now = datetime.now(timezone.utc)
+    params = {"name": name, "owner": owner, "now": now, "expires_at": now + timedelta(seconds=ttl_sec)}
+    with engine.begin() as conn:
+        taken = conn.execute(
+            text(
+                "UPDATE job_leases SET owner = :owner, expires_at = :expires_at, updated_at = CURRENT_TIMESTAMP "
+                "WHERE name = :name AND expires_at < :now"
+            ),
+            params,
+        ).rowcount
+    if not taken:
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO job_leases (name, owner, expires_at) VALUES (:name, :owner, :expires_at)"),
+                    params,
+                )
+        except IntegrityError:
+            # 他のワーカーが保持中（または同時に作成した）
+            metrics.increment("job_lease.acquire", job=name, result="held")
+            return None
+    metrics.increment("job_lease.acquire", job=name, result="ok")
+    return owner
+
+
+def release(name: str, owner: str) -> None:
+    """リースを返す（自分が保持している場合だけ。失敗しても期限切れで解放される）"""
+    from app.utils.database import engine
+
+    try:
+        with engine.begin() as conn:
+            conn.execute(
+                text("UPDATE job_leases SET expires_at = :now WHERE name = :name AND owner = :owner"),
+                {"name": name, "owner": owner, "now": datetime.now(timezone.utc)},
+            )
+    except Exception as e:
+        logger.warning("ジョブのリースを返せませんでした（%s）: %s", name, e)
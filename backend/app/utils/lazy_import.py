@@ -0,0 +1,63 @@
+"""
+重い SDK の遅延 import
+
+google.generativeai / reportlab / stripe / feedparser / PIL などは import だけで数百ms〜秒かかり、
+ルーター読み込み時にまとめて読むと起動（ヘルスチェック応答まで）が遅くなる。
+lazy_module() で作ったプロキシは、最初に属性へアクセスした時点で実際に import する。
+"""
+import importlib
+import importlib.util
+import threading
+from typing import Callable, Optional
+
+
+class LazyModule:
+    """属性アクセス時に import するモジュールのプロキシ"""
+
+    def __init__(self, name: str, on_load: Optional[Callable] = None) -> None:
+        self.__dict__["_name"] = name
+        self.__dict__["_on_load"] = on_load
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is not None:
+            return module
+        with self.__dict__["_lock"]:
+            module = self.__dict__["_module"]
+            if module is None:
+                module = importlib.import_module(self.__dict__["_name"])
+                on_load = self.__dict__["_on_load"]
+                if on_load is not None:
+                    on_load(module)
+                self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr: str, value) -> None:
+        setattr(self._load(), attr, value)
+
+    def __repr__(self) -> str:
+        state = "loaded" if self.__dict__["_module"] is not None else "not loaded"
+        return f"<LazyModule {self.__dict__['_name']} ({state})>"
+
+
+def lazy_module(name: str, on_load: Optional[Callable] = None) -> LazyModule:
+    """遅延 import するモジュールを返す
+
+    Args:
+        name: モジュール名（例: 'google.generativeai'）
+        on_load: 初回 import 直後に1回だけ呼ぶ初期化処理（API キー設定など）
+    """
+    return LazyModule(name, on_load)
+
+
+def is_available(name: str) -> bool:
+    """モジュールが import 可能か（実際には import しない）"""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
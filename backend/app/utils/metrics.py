@@ -0,0 +1,97 @@
+"""
+プロセス内メトリクス
+カウンタ・ゲージ・処理時間の集計をメモリ上に保持し、管理画面/監視から参照する
+
+外部の監視基盤（Prometheus 等）を導入するまでの簡易実装。値はワーカープロセスごとに
+独立しており、再起動でリセットされる。
+"""
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Tuple
+
+_lock = threading.Lock()
+
+# キー: (メトリクス名, ラベルのタプル)
+_counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_gauges: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+_timings: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Dict[str, float]] = {}
+
+
+def _key(name: str, labels: Dict[str, Any]) -> Tuple[str, Tuple[Tuple[str, str], ...]]:
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def increment(name: str, value: float = 1, **labels: Any) -> None:
+    """カウンタを加算する"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def set_gauge(name: str, value: float, **labels: Any) -> None:
+    """ゲージ（現在値）を設定する"""
+    key = _key(name, labels)
+    with _lock:
+        _gauges[key] = value
+
+
+def observe(name: str, value: float, **labels: Any) -> None:
+    """処理時間などの観測値を記録する（件数・合計・最大・直近値）"""
+    key = _key(name, labels)
+    with _lock:
+        stat = _timings.get(key)
+        if stat is None:
+            stat = {"count": 0, "sum": 0.0, "max": 0.0, "last": 0.0}
+            _timings[key] = stat
+        stat["count"] += 1
+        stat["sum"] += value
+        stat["last"] = value
+        if value > stat["max"]:
+            stat["max"] = value
+
+
+@contextmanager
+def timed(name: str, **labels: Any):
+    """ブロックの経過時間（ミリ秒）を observe するコンテキストマネージャー"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, (time.perf_counter() - start) * 1000, **labels)
+
+
+def _format_key(key: Tuple[str, Tuple[Tuple[str, str], ...]]) -> str:
+    name, labels = key
+    if not labels:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in labels) + "}"
+
+
+def snapshot(prefix: Optional[str] = None) -> Dict[str, Any]:
+    """現在のメトリクスを辞書で返す（prefix 指定時は名前で絞り込む）"""
+    def _match(key) -> bool:
+        return prefix is None or key[0].startswith(prefix)
+
+    with _lock:
+        counters = {_format_key(k): v for k, v in _counters.items() if _match(k)}
+        gauges = {_format_key(k): v for k, v in _gauges.items() if _match(k)}
+        timings = {}
+        for k, stat in _timings.items():
+            if not _match(k):
+                continue
+            timings[_format_key(k)] = {
+                "count": stat["count"],
+                "avg": round(stat["sum"] / stat["count"], 3) if stat["count"] else 0,
+                "max": round(stat["max"], 3),
+                "last": round(stat["last"], 3),
+            }
+    return {"counters": counters, "gauges": gauges, "timings": timings}
+
+
+def reset() -> None:
+    """全メトリクスを破棄する（ベンチマーク・検証用）"""
+    with _lock:
+        _counters.clear()
+        _gauges.clear()
+        _timings.clear()
@@ -6,18 +6,23 @@ from typing import Optional, Dict, Any
 
 from app.config import settings
 from app.utils.subscription import PLANS
+from app.utils.lazy_import import lazy_module, is_available
 
 logger = logging.getLogger(__name__)
 
+def _configure_stripe(module) -> None:
+    module.api_key = settings.STRIPE_SECRET_KEY
+
+
+# stripe SDK の import は重いため、最初の API 呼び出し時に読み込む（起動時間短縮）。
+# 利用可否はパッケージの有無だけを確認して判定する。
 STRIPE_AVAILABLE = False
 stripe = None
-try:
-    import stripe as _stripe
-    stripe = _stripe
+if is_available("stripe"):
+    stripe = lazy_module("stripe", on_load=_configure_stripe)
     if settings.STRIPE_SECRET_KEY:
-        stripe.api_key = settings.STRIPE_SECRET_KEY
         STRIPE_AVAILABLE = True
-except ImportError:
+else:
     logger.warning("stripe パッケージが見つかりません。決済機能は無効です。")
 
 # Stripe のゼロ十進通貨（最小単位が通貨単位そのもの。例: JPY は「円」が最小単位）
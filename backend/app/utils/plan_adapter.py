@@ -0,0 +1,257 @@
+"""
+キャッシュ済みプランの部分再利用
+
+開始・終了時刻や行きたい場所が1件多いだけのリクエストは、完全一致のキャッシュキーでは外れて
+Gemini を呼び直していた。plan_cache.find_similar_cached_plan が見つけた近いプラン（Gemini の出力形式）を
+手元で組み直す。外部 API は呼ばない（移動時間は事前計算した移動行列、無ければ直線距離からの推定）。
+
+1. 追加の行きたい場所を、移動時間の増分が最も小さい日・位置に挿入する
+2. 日ごとにリクエストの開始時刻から時刻を振り直す
+3. 営業時間外になる・終了時刻を過ぎるスポットを外す
+   （行きたい場所は外さない。外さざるを得ない場合や半分以上外れる場合は再利用をあきらめて None）
+
+結果はエンドポイントで通常のキャッシュヒットと同じ変換（PlanSpot 化・宿泊施設の追加・時刻の再計算）を通る。
+"""
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from app.models.spot import Spot
+from app.services.travel_matrix_service import estimate_leg_minutes
+from app.utils.spot_matcher import create_spot_index, match_spot
+
+DEFAULT_START_TIME = "09:00"
+
+# 移動手段 → ルーティングプロファイル（plans.py の時刻再計算と同じ対応）
+_PROFILE_MAP = {
+    "車": "driving",
+    "公共交通機関": "transit",
+    "電車": "transit",
+    "バス": "transit",
+    "徒歩": "walking",
+    "その他": "driving",
+}
+
+Entry = Tuple[Dict[str, Any], Optional[Spot]]
+
+
+def to_minutes(value: Optional[str]) -> Optional[int]:
+    """"HH:MM" → 0時からの分（解釈できなければ None）"""
+    try:
+        hour, minute = str(value).split(":")[:2]
+        return int(hour) * 60 + int(minute)
+    except (TypeError, ValueError):
+        return None
+
+
+def _format_time(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def _open_intervals(opening_hours: Any, google_day: int) -> Optional[List[Tuple[int, int]]]:
+    """その曜日（0=日曜、Places の表記）の営業時間帯 [(開始分, 終了分)]。情報が無ければ None"""
+    if not isinstance(opening_hours, dict) or not isinstance(opening_hours.get("periods"), list):
+        return None
+    intervals = []
+    for period in opening_hours["periods"]:
+        opening = period.get("open") or {}
+        closing = period.get("close")
+        if closing is None:
+            # close の無い期間は24時間営業
+            return [(0, 24 * 60)]
+        open_min = opening.get("hour", 0) * 60 + opening.get("minute", 0)
+        close_min = closing.get("hour", 0) * 60 + closing.get("minute", 0)
+        if opening.get("day") == google_day:
+            # 日付をまたぐ営業は翌日分を足す
+            intervals.append((open_min, close_min if closing.get("day") == google_day else close_min + 24 * 60))
+        elif closing.get("day") == google_day:
+            intervals.append((0, close_min))
+    return intervals
+
+
+def fits_opening_hours(opening_hours: Any, google_day: Optional[int], start: int, end: int) -> bool:
+    """滞在 [start, end) が営業時間内か（営業時間が不明なら True。曜日が不明ならいずれかの曜日で営業していれば True）"""
+    days = range(7) if google_day is None else (google_day,)
+    for day in days:
+        intervals = _open_intervals(opening_hours, day)
+        if intervals is None:
+            return True
+        if any(open_min <= start and end <= close_min for open_min, close_min in intervals):
+            return True
+    return False
+
+
+def _google_day(check_in_date: Optional[str], day: int) -> Optional[int]:
+    if not check_in_date:
+        return None
+    try:
+        date = datetime.strptime(check_in_date, "%Y-%m-%d").date() + timedelta(days=day - 1)
+    except ValueError:
+        return None
+    return (date.weekday() + 1) % 7
+
+
+def _location(spot: Optional[Spot]) -> Optional[Tuple[float, float]]:
+    if spot is None or not spot.latitude or not spot.longitude:
+        return None
+    return (spot.latitude, spot.longitude)
+
+
+def _is_must_visit(name: str, pending_names: Sequence[str]) -> bool:
+    # convert_generated_spots_to_plan_spots の isMustVisit と同じ判定
+    return any(p in name or name in p for p in pending_names if p)
+
+
+def _find_entry(by_day: Dict[int, List[Entry]], name: str, spot: Spot) -> Optional[Dict[str, Any]]:
+    """プランに既にあるスポット（同じ DB スポット、または _is_must_visit と同じ名前の部分一致）"""
+    for entries in by_day.values():
+        for item, existing in entries:
+            if existing is not None and existing.id == spot.id:
+                return item
+            if _is_must_visit(item.get("name", ""), [name]):
+                return item
+    return None
+
+
+def _insertion_cost(entries: List[Entry], index: int, location: Tuple[float, float], profile: str) -> float:
+    """entries の index の位置に location を挟んだときの移動分数の増分"""
+    before = _location(entries[index - 1][1]) if index > 0 else None
+    after = _location(entries[index][1]) if index < len(entries) else None
+    cost = 0.0
+    if before:
+        cost += estimate_leg_minutes(before, location, profile)
+    if after:
+        cost += estimate_leg_minutes(location, after, profile)
+    if before and after:
+        cost -= estimate_leg_minutes(before, after, profile)
+    return cost
+
+
+def _insert_spot(by_day: Dict[int, List[Entry]], spot: Spot, days: int, profile: str) -> None:
+    location = _location(spot)
+    item = {
+        "name": spot.name,
+        "description": spot.description or "",
+        "category": spot.category or "Culture",
+        "tags": spot.tags or [],
+        "durationMinutes": spot.duration_minutes or 60,
+        "transportMode": "train",
+        "transportDuration": 0,
+    }
+    best = None
+    for day in range(1, days + 1):
+        entries = by_day[day]
+        for index in range(len(entries) + 1):
+            # 同じ増分なら予定の少ない日に入れる
+            cost = (_insertion_cost(entries, index, location, profile) if location else 0.0, len(entries))
+            if best is None or cost < best[0]:
+                best = (cost, day, index)
+    _, day, index = best
+    item["day"] = day
+    by_day[day].insert(index, (item, spot))
+
+
+def adapt_cached_plan(
+    plan: Dict[str, Any],
+    db_spots: List[Spot],
+    pending_spots: List[Dict[str, Any]],
+    extra_names: List[str],
+    days: int,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    transportation: Optional[str] = None,
+    check_in_date: Optional[str] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    近いリクエストのキャッシュ済みプランを今回のリクエストに合わせて組み直す
+
+    Args:
+        plan: キャッシュ済みのプラン（Gemini の出力形式）
+        db_spots: 候補スポット（位置・滞在時間・営業時間の参照用）
+        pending_spots: 今回の行きたい場所（外さないスポット）
+        extra_names: キャッシュ済みプランに無い行きたい場所の名前（挿入する）
+
+    Returns:
+        組み直したプラン。組み直せなければ None
+    """
+    from app.services.gemini_service import convert_days_to_spots
+
+    spots = plan.get("spots") or []
+    if not spots and plan.get("days"):
+        spots = convert_days_to_spots(plan["days"])
+    if not spots:
+        return None
+
+    spot_index = create_spot_index(db_spots)
+    profile = _PROFILE_MAP.get(transportation or "", "driving")
+    pending_names = [p.get("name", "") for p in pending_spots]
+
+    def resolve(name: str) -> Optional[Spot]:
+        found = match_spot(name, spot_index)
+        return found[0] if found else None
+
+    by_day: Dict[int, List[Entry]] = defaultdict(list)
+    for source in spots:
+        item = dict(source)
+        day = int(item.get("day") or 1)
+        if 1 <= day <= days:
+            by_day[day].append((item, resolve(item.get("name", ""))))
+    for entries in by_day.values():
+        entries.sort(key=lambda entry: to_minutes(entry[0].get("startTime")) or 0)
+
+    # 1. 追加の行きたい場所を挿入（プランに既にあれば行きたい場所として残すだけ）
+    for name in extra_names:
+        spot = resolve(name)
+        if spot is None:
+            return None
+        existing = _find_entry(by_day, name, spot)
+        if existing is not None:
+            existing["isMustVisit"] = True
+            continue
+        _insert_spot(by_day, spot, days, profile)
+
+    # 2-3. 時刻を振り直し、営業時間外・終了時刻超過のスポットを外す
+    day_start = to_minutes(start_time)
+    if day_start is None:
+        day_start = to_minutes(DEFAULT_START_TIME)
+    day_end = to_minutes(end_time)
+    adapted_spots = []
+    kept = dropped = 0
+    for day in sorted(by_day):
+        google_day = _google_day(check_in_date, day)
+        current = day_start
+        previous: Optional[Dict[str, Any]] = None
+        previous_location = None
+        for item, spot in by_day[day]:
+            if spot is None:
+                # DB に無いスポットは変換時に除外されるため時間を使わない（除外の記録のため残す）
+                adapted_spots.append(item)
+                continue
+            location = _location(spot)
+            travel = round(estimate_leg_minutes(previous_location, location, profile)) \
+                if previous_location and location else 0
+            arrive = current + travel
+            duration = int(spot.duration_minutes or item.get("durationMinutes") or 60)
+            leave = arrive + duration
+            is_hotel = (spot.category or item.get("category")) == "Hotel"
+            fits = is_hotel or (
+                (day_end is None or leave <= day_end)
+                and fits_opening_hours(spot.opening_hours, google_day, arrive, leave)
+            )
+            if not fits:
+                if item.get("isMustVisit") or _is_must_visit(item.get("name", ""), pending_names):
+                    return None
+                dropped += 1
+                continue
+            if previous is not None:
+                previous["transportDuration"] = travel
+            item.update({"day": day, "startTime": _format_time(arrive), "durationMinutes": duration, "transportDuration": 0})
+            adapted_spots.append(item)
+            kept += 1
+            previous, previous_location, current = item, location, leave
+
+    if not kept or dropped * 2 > len(spots):
+        return None
+    adapted = {key: value for key, value in plan.items() if key != "days"}
+    adapted["spots"] = adapted_spots
+    return adapted
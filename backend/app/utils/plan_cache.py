@@ -1,14 +1,84 @@
 """
 プラン生成キャッシュ機能（データベースベース）
+
+- プランは JSON を圧縮して payload に保存する（zstandard があれば zstd、無ければ zlib）。
+  先頭2バイトは 形式バージョン・圧縮方式で、未知のバージョンや展開できない行はミスとして扱う
+- ヒットごとに hit_count・last_hit_at を更新する（last_hit_at は保存時刻で初期化）
+- 圧縮タスク（start_compaction）が PLAN_CACHE_COMPACT_INTERVAL_SEC ごとに、PLAN_CACHE_COMPACT_BATCH 件ずつ
+  期限切れ行の削除 → 旧形式（非圧縮の plan_data）の行の圧縮 → 容量上限の適用 を行う。
+  容量上限（PLAN_CACHE_MAX_ENTRIES 件 / PLAN_CACHE_MAX_BYTES バイト）を超えた分は
+  last_hit_at の古い順（同時刻ならヒットの少ない順）に追い出す
+- 完全一致で外れたときのために (目的地, 日数, テーマ) のハッシュ（similarity_key）でも引けるようにし、
+  find_similar_cached_plan が開始・終了時刻や行きたい場所の追加だけが違う近いプランを探す
+  （組み直しは app/utils/plan_adapter.py）
 """
 import json
 import hashlib
-from typing import Optional, Dict, Any, List
+import logging
+import struct
+import threading
+import time
+import zlib
+from typing import Optional, Dict, Any, List, Tuple
 from datetime import datetime, timedelta
+from sqlalchemy import func
 from sqlalchemy.orm import Session
+from app.config import settings
 from app.models.plan_cache import PlanCache
+from app.utils import fast_json, metrics
+from app.utils.lazy_import import is_available, lazy_module
+from app.utils.plan_adapter import to_minutes
+
+logger = logging.getLogger(__name__)
+
+zstandard = lazy_module("zstandard")
+ZSTD_AVAILABLE = is_available("zstandard")
+
+FORMAT_VERSION = 1
+_CODEC_ZLIB = 1
+_CODEC_ZSTD = 2
+_HEADER = struct.Struct("<BB")  # 形式バージョン, 圧縮方式
+
+# 近いプランを探すときに比べる候補数（最近ヒットした順）
+_SIMILAR_CANDIDATES = 20
+
+# 1回の圧縮タスクで処理するバッチ数の上限（残りは次回）
+_MAX_BATCHES_PER_RUN = 50
+
+_compaction_lock = threading.Lock()
+_compactor: Optional[threading.Thread] = None
+_last_compaction: Dict[str, Any] = {}
+
+
+def encode_plan(plan: Dict[str, Any]) -> bytes:
+    """プランを保存形式（ヘッダー + 圧縮 JSON）にする"""
+    body = fast_json.dumps(plan)
+    if ZSTD_AVAILABLE:
+        return _HEADER.pack(FORMAT_VERSION, _CODEC_ZSTD) + zstandard.ZstdCompressor(level=3).compress(body)
+    return _HEADER.pack(FORMAT_VERSION, _CODEC_ZLIB) + zlib.compress(body, 6)
 
-CACHE_EXPIRY_DAYS = 30
+
+def decode_plan(payload: bytes) -> Optional[Dict[str, Any]]:
+    """保存形式からプランを戻す（未知の形式・展開できないものは None）"""
+    if not payload or len(payload) < _HEADER.size:
+        return None
+    version, codec = _HEADER.unpack_from(payload)
+    if version != FORMAT_VERSION:
+        return None
+    body = bytes(payload[_HEADER.size:])
+    try:
+        if codec == _CODEC_ZSTD:
+            if not ZSTD_AVAILABLE:
+                return None
+            body = zstandard.ZstdDecompressor().decompress(body)
+        elif codec == _CODEC_ZLIB:
+            body = zlib.decompress(body)
+        else:
+            return None
+        return fast_json.loads(body)
+    except Exception as e:
+        logger.warning("プランキャッシュ: 展開できない行をミスとして扱います: %s", e)
+        return None
 
 
 def _get_cache_key(
@@ -41,6 +111,101 @@ def _get_cache_key(
     return hashlib.md5(cache_str.encode('utf-8')).hexdigest()
 
 
+def _theme_names(themes: List[Any]) -> List[str]:
+    names = []
+    for theme in themes or []:
+        if isinstance(theme, dict):
+            names.append(str(theme.get("name", theme)))
+        else:
+            names.append(str(theme))
+    return sorted(names)
+
+
+def _similarity_key(destination: str, days: int, themes: List[Any]) -> str:
+    """近いリクエストを引くためのキー（目的地・日数・テーマ）"""
+    key_str = json.dumps(
+        {"destination": destination, "days": days, "themes": _theme_names(themes)},
+        sort_keys=True, ensure_ascii=False,
+    )
+    return hashlib.md5(key_str.encode('utf-8')).hexdigest()
+
+
+def _time_gap(cached: Optional[str], requested: Optional[str]) -> int:
+    """時刻の差（分）。片方だけ未指定なら60分の差として扱う"""
+    if not cached and not requested:
+        return 0
+    if not cached or not requested:
+        return 60
+    a, b = to_minutes(cached), to_minutes(requested)
+    return abs(a - b) if a is not None and b is not None else 60
+
+
+def find_similar_cached_plan(
+    db: Session,
+    destination: str,
+    days: int,
+    budget: str,
+    themes: List[str],
+    pending_spots: List[Dict[str, Any]],
+    preferences: Optional[str] = None,
+    start_time: Optional[str] = None,
+    end_time: Optional[str] = None,
+    transportation: Optional[str] = None,
+) -> Optional[Tuple[Dict[str, Any], List[str]]]:
+    """
+    完全一致では外れたリクエストに近いキャッシュ済みプランを探す
+
+    予算・こだわり・移動手段が同じで、キャッシュ済みの行きたい場所が今回の部分集合
+    （追加は PLAN_CACHE_ADAPT_MAX_EXTRA_SPOTS 件まで）のものから、追加件数と開始・終了時刻の差が最も小さいものを選ぶ。
+
+    Returns:
+        (プラン, 追加で入れる行きたい場所の名前)。見つからなければ None
+    """
+    requested_names = {spot.get("name", "") for spot in pending_spots}
+    now = datetime.now()
+    candidates = db.query(PlanCache.id, PlanCache.match_info, PlanCache.hit_count).filter(
+        PlanCache.similarity_key == _similarity_key(destination, days, themes),
+        PlanCache.expires_at > now
+    ).order_by(PlanCache.last_hit_at.desc()).limit(_SIMILAR_CANDIDATES).all()
+    
+    best = None
+    for candidate in candidates:
+        info = candidate.match_info or {}
+        if (info.get("budget") != budget
+                or (info.get("preferences") or "") != (preferences or "")
+                or (info.get("transportation") or "") != (transportation or "")):
+            continue
+        cached_names = set(info.get("spot_names") or [])
+        if not cached_names <= requested_names:
+            continue
+        extra_names = sorted(requested_names - cached_names)
+        if len(extra_names) > settings.PLAN_CACHE_ADAPT_MAX_EXTRA_SPOTS:
+            continue
+        score = (
+            len(extra_names) * 60
+            + _time_gap(info.get("start_time"), start_time)
+            + _time_gap(info.get("end_time"), end_time),
+            -(candidate.hit_count or 0),
+        )
+        if best is None or score < best[0]:
+            best = (score, candidate.id, extra_names)
+    if best is None:
+        metrics.increment("plan_cache.similar_lookup", result="miss")
+        return None
+    
+    _, entry_id, extra_names = best
+    entry = db.query(PlanCache.payload, PlanCache.plan_data).filter(PlanCache.id == entry_id).first()
+    plan = None
+    if entry:
+        plan = decode_plan(entry.payload) if entry.payload is not None else entry.plan_data
+    if plan is None:
+        metrics.increment("plan_cache.similar_lookup", result="miss")
+        return None
+    metrics.increment("plan_cache.similar_lookup", result="hit")
+    _record_hit(db, entry_id, now)
+    return plan, extra_names
+
+
 def get_cached_plan(
     db: Session,
     destination: str,
@@ -61,15 +226,35 @@ def get_cached_plan(
     
     # 期限切れでないキャッシュを取得
     now = datetime.now()
-    cached_entry = db.query(PlanCache).filter(
+    cached_entry = db.query(PlanCache.id, PlanCache.payload, PlanCache.plan_data).filter(
         PlanCache.cache_key == cache_key,
         PlanCache.expires_at > now
     ).first()
     
+    plan = None
     if cached_entry:
-        return cached_entry.plan_data
+        # payload が無いのは旧形式（非圧縮）の行
+        plan = decode_plan(cached_entry.payload) if cached_entry.payload is not None else cached_entry.plan_data
+    if plan is None:
+        metrics.increment("plan_cache.lookup", result="miss")
+        return None
     
-    return None
+    metrics.increment("plan_cache.lookup", result="hit")
+    _record_hit(db, cached_entry.id, now)
+    return plan
+
+
+def _record_hit(db: Session, entry_id: str, now: datetime) -> None:
+    """ヒット数・最終ヒット時刻を更新（失敗してもキャッシュの返却は妨げない）"""
+    try:
+        db.query(PlanCache).filter(PlanCache.id == entry_id).update(
+            {PlanCache.hit_count: PlanCache.hit_count + 1, PlanCache.last_hit_at: now},
+            synchronize_session=False,
+        )
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning("プランキャッシュ: ヒットの記録に失敗しました: %s", e)
 
 
 def save_cached_plan(
@@ -85,13 +270,24 @@ def save_cached_plan(
     end_time: Optional[str] = None,
     transportation: Optional[str] = None,
 ):
-    """プランをキャッシュに保存"""
+    """プランをキャッシュに保存（圧縮して保存する）"""
     cache_key = _get_cache_key(
         destination, days, budget, themes, pending_spots,
         preferences, start_time, end_time, transportation
     )
     
-    expires_at = datetime.now() + timedelta(days=CACHE_EXPIRY_DAYS)
+    now = datetime.now()
+    expires_at = now + timedelta(days=settings.PLAN_CACHE_TTL_DAYS)
+    payload = encode_plan(plan)
+    similarity_key = _similarity_key(destination, days, themes)
+    match_info = {
+        "budget": budget,
+        "preferences": preferences or "",
+        "transportation": transportation or "",
+        "start_time": start_time or "",
+        "end_time": end_time or "",
+        "spot_names": sorted(spot.get("name", "") for spot in pending_spots),
+    }
     
     # 既存のキャッシュを確認
     existing_cache = db.query(PlanCache).filter(
@@ -100,27 +296,186 @@ def save_cached_plan(
     
     if existing_cache:
         # 既存のキャッシュを更新
-        existing_cache.plan_data = plan
-        existing_cache.cached_at = datetime.now()
+        existing_cache.plan_data = None
+        existing_cache.payload = payload
+        existing_cache.payload_size = len(payload)
+        existing_cache.cached_at = now
+        existing_cache.last_hit_at = now
         existing_cache.expires_at = expires_at
+        existing_cache.similarity_key = similarity_key
+        existing_cache.match_info = match_info
     else:
-        # 新しいキャッシュを作成
+        # 新しいキャッシュを作成（plan_data は JSON の null。旧スキーマの NOT NULL でも書ける）
         new_cache = PlanCache(
             cache_key=cache_key,
-            plan_data=plan,
+            plan_data=None,
+            payload=payload,
+            payload_size=len(payload),
+            hit_count=0,
+            last_hit_at=now,
+            similarity_key=similarity_key,
+            match_info=match_info,
             expires_at=expires_at
         )
         db.add(new_cache)
     
     db.commit()
+    metrics.observe("plan_cache.payload_bytes", len(payload))
 
 
-def clear_old_cache(db: Session):
-    """期限切れキャッシュを削除"""
-    now = datetime.now()
-    deleted_count = db.query(PlanCache).filter(
-        PlanCache.expires_at <= now
-    ).delete()
+# ---- 圧縮タスク ----
+
+def _delete_ids(db: Session, ids: List[str]) -> None:
+    db.query(PlanCache).filter(PlanCache.id.in_(ids)).delete(synchronize_session=False)
     db.commit()
-    return deleted_count
 
+
+def delete_expired(db: Session, batch_size: int, max_batches: int = _MAX_BATCHES_PER_RUN) -> int:
+    """期限切れ行を batch_size 件ずつ削除する（長いロックを取らないため）"""
+    now = datetime.now()
+    deleted = 0
+    for _ in range(max_batches):
+        ids = [row.id for row in db.query(PlanCache.id).filter(PlanCache.expires_at <= now).limit(batch_size)]
+        if not ids:
+            break
+        _delete_ids(db, ids)
+        deleted += len(ids)
+        if len(ids) < batch_size:
+            break
+    return deleted
+
+
+def compress_legacy(db: Session, batch_size: int, max_batches: int = _MAX_BATCHES_PER_RUN) -> int:
+    """旧形式（非圧縮の plan_data）の行を payload に移す"""
+    converted = 0
+    for _ in range(max_batches):
+        rows = db.query(PlanCache).filter(PlanCache.payload.is_(None)).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            if row.plan_data is None:
+                db.delete(row)
+                continue
+            payload = encode_plan(row.plan_data)
+            row.payload = payload
+            row.payload_size = len(payload)
+            row.plan_data = None
+            row.last_hit_at = row.last_hit_at or row.cached_at or datetime.now()
+        db.commit()
+        converted += len(rows)
+        if len(rows) < batch_size:
+            break
+    return converted
+
+
+def evict_over_budget(db: Session, batch_size: int, max_batches: int = _MAX_BATCHES_PER_RUN) -> Dict[str, int]:
+    """容量上限を超えた分を last_hit_at の古い順（同時刻ならヒットの少ない順）に削除する"""
+    max_entries = settings.PLAN_CACHE_MAX_ENTRIES
+    max_bytes = settings.PLAN_CACHE_MAX_BYTES
+    entries, total_bytes = db.query(
+        func.count(PlanCache.id), func.coalesce(func.sum(PlanCache.payload_size), 0)
+    ).one()
+    entries, total_bytes = int(entries), int(total_bytes)
+    evicted = 0
+    for _ in range(max_batches):
+        over_entries = entries - max_entries if max_entries > 0 else 0
+        over_bytes = total_bytes - max_bytes if max_bytes > 0 else 0
+        if over_entries <= 0 and over_bytes <= 0:
+            break
+        rows = db.query(PlanCache.id, PlanCache.payload_size).order_by(
+            PlanCache.last_hit_at.asc().nulls_first(), PlanCache.hit_count.asc()
+        ).limit(batch_size).all()
+        victims = []
+        for row in rows:
+            if over_entries <= 0 and over_bytes <= 0:
+                break
+            size = row.payload_size or 0
+            victims.append(row.id)
+            over_entries -= 1
+            over_bytes -= size
+            entries -= 1
+            total_bytes -= size
+        if not victims:
+            break
+        _delete_ids(db, victims)
+        evicted += len(victims)
+    return {"evicted": evicted, "entries": entries, "bytes": total_bytes}
+
+
+def compact(db: Optional[Session] = None) -> Dict[str, Any]:
+    """期限切れの削除・旧形式の圧縮・容量上限の適用を1回行う"""
+    own_session = db is None
+    if own_session:
+        # 関数内 import: database → utils の循環 import を避けるため
+        from app.utils.database import SessionLocal
+        db = SessionLocal()
+    start = time.perf_counter()
+    batch_size = max(1, settings.PLAN_CACHE_COMPACT_BATCH)
+    try:
+        expired = delete_expired(db, batch_size)
+        converted = compress_legacy(db, batch_size)
+        budget = evict_over_budget(db, batch_size)
+    finally:
+        if own_session:
+            db.close()
+    result = {
+        "expired": expired,
+        "compressed": converted,
+        "evicted": budget["evicted"],
+        "entries": budget["entries"],
+        "bytes": budget["bytes"],
+        "elapsed_ms": round((time.perf_counter() - start) * 1000, 1),
+        "at": datetime.now().isoformat(),
+    }
+    metrics.increment("plan_cache.compaction.deleted", expired, reason="expired")
+    metrics.increment("plan_cache.compaction.deleted", budget["evicted"], reason="evicted")
+    metrics.increment("plan_cache.compaction.compressed", converted)
+    metrics.set_gauge("plan_cache.entries", budget["entries"])
+    metrics.set_gauge("plan_cache.bytes", budget["bytes"])
+    with _compaction_lock:
+        _last_compaction.clear()
+        _last_compaction.update(result)
+    return result
+
+
+def _compaction_loop() -> None:
+    while True:
+        time.sleep(max(1.0, settings.PLAN_CACHE_COMPACT_INTERVAL_SEC))
+        try:
+            result = compact()
+            if result["expired"] or result["compressed"] or result["evicted"]:
+                logger.info(
+                    "プランキャッシュ: 期限切れ %d 件削除・%d 件圧縮・%d 件追い出し（残り %d 件 / %d バイト）",
+                    result["expired"], result["compressed"], result["evicted"], result["entries"], result["bytes"],
+                )
+        except Exception as e:
+            logger.warning("プランキャッシュ: 圧縮タスクでエラーが発生しました: %s", e)
+
+
+def start_compaction() -> None:
+    """圧縮タスクを起動する（アプリ起動時に1回。PLAN_CACHE_COMPACT_INTERVAL_SEC=0 で無効）"""
+    global _compactor
+    if settings.PLAN_CACHE_COMPACT_INTERVAL_SEC <= 0:
+        return
+    with _compaction_lock:
+        if _compactor is not None:
+            return
+        _compactor = threading.Thread(target=_compaction_loop, name="plan-cache-compaction", daemon=True)
+    _compactor.start()
+
+
+def compaction_stats() -> Dict[str, Any]:
+    """管理画面用の状態（件数・バイト数は直近の圧縮タスク時点）"""
+    with _compaction_lock:
+        return {
+            "running": _compactor is not None,
+            "codec": "zstd" if ZSTD_AVAILABLE else "zlib",
+            "max_entries": settings.PLAN_CACHE_MAX_ENTRIES,
+            "max_bytes": settings.PLAN_CACHE_MAX_BYTES,
+            "last_compaction": dict(_last_compaction) or None,
+        }
+
+
+def clear_old_cache(db: Session):
+    """期限切れキャッシュを削除"""
+    return delete_expired(db, max(1, settings.PLAN_CACHE_COMPACT_BATCH), max_batches=1_000_000)
@@ -4,6 +4,7 @@ PDF、カレンダー、画像形式での出力
 """
 import json
 from datetime import datetime, timedelta
+from functools import lru_cache
 from typing import Dict, Any
 from io import BytesIO
 
@@ -31,6 +32,62 @@ except ImportError:
     PIL_AVAILABLE = False
 
 
+@lru_cache(maxsize=1)
+def _get_pdf_styles() -> Dict[str, Any]:
+    """PDF のスタイル一式（プロセス内で1回だけ作る）"""
+    styles = getSampleStyleSheet()
+    return {
+        "sheet": styles,
+        "title": ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=24,
+            textColor=colors.HexColor('#1f77b4'),
+            spaceAfter=30,
+        ),
+        "day": ParagraphStyle(
+            'DayTitle',
+            parent=styles['Heading2'],
+            fontSize=18,
+            textColor=colors.HexColor('#ff7f0e'),
+            spaceAfter=12,
+        ),
+        "table": TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 12),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ]),
+    }
+
+
+@lru_cache(maxsize=1)
+def _get_image_fonts() -> Dict[str, Any]:
+    """画像出力用フォント（プロセス内で1回だけ読み込む）"""
+    try:
+        return {
+            "large": ImageFont.truetype("arial.ttf", 24),
+            "normal": ImageFont.truetype("arial.ttf", 16),
+        }
+    except Exception:
+        return {
+            "large": ImageFont.load_default(),
+            "normal": ImageFont.load_default(),
+        }
+
+
+def warm_up() -> None:
+    """フォント・スタイルを事前に読み込む（エクスポート用ワーカープロセスの初期化時に呼ぶ）"""
+    if REPORTLAB_AVAILABLE:
+        _get_pdf_styles()
+    if PIL_AVAILABLE:
+        _get_image_fonts()
+
+
 def export_to_pdf(plan: Dict[str, Any]) -> BytesIO:
     """プランをPDF形式で出力"""
     if not REPORTLAB_AVAILABLE:
@@ -39,16 +96,11 @@ def export_to_pdf(plan: Dict[str, Any]) -> BytesIO:
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     story = []
-    styles = getSampleStyleSheet()
+    cached_styles = _get_pdf_styles()
+    styles = cached_styles["sheet"]
     
     # タイトル
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        textColor=colors.HexColor('#1f77b4'),
-        spaceAfter=30,
-    )
+    title_style = cached_styles["title"]
     story.append(Paragraph(plan.get("title", "旅行プラン"), title_style))
     story.append(Spacer(1, 12))
     
@@ -72,13 +124,7 @@ def export_to_pdf(plan: Dict[str, Any]) -> BytesIO:
             day_spots = days_dict[day]
             
             # 日見出し
-            day_style = ParagraphStyle(
-                'DayTitle',
-                parent=styles['Heading2'],
-                fontSize=18,
-                textColor=colors.HexColor('#ff7f0e'),
-                spaceAfter=12,
-            )
+            day_style = cached_styles["day"]
             story.append(Paragraph(f"{day}日目", day_style))
             story.append(Spacer(1, 12))
             
@@ -94,16 +140,7 @@ def export_to_pdf(plan: Dict[str, Any]) -> BytesIO:
                 ])
             
             table = Table(schedule_data, colWidths=[30*mm, 50*mm, 60*mm, 20*mm])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
+            table.setStyle(cached_styles["table"])
             story.append(table)
             story.append(PageBreak())
     # SatoTrip のプラン形式（days配列）に対応
@@ -113,13 +150,7 @@ def export_to_pdf(plan: Dict[str, Any]) -> BytesIO:
             theme = day_data.get("theme", "")
             
             # 日見出し
-            day_style = ParagraphStyle(
-                'DayTitle',
-                parent=styles['Heading2'],
-                fontSize=18,
-                textColor=colors.HexColor('#ff7f0e'),
-                spaceAfter=12,
-            )
+            day_style = cached_styles["day"]
             story.append(Paragraph(f"{day_num}日目: {theme}", day_style))
             story.append(Spacer(1, 12))
             
@@ -134,16 +165,7 @@ def export_to_pdf(plan: Dict[str, Any]) -> BytesIO:
                 ])
             
             table = Table(schedule_data, colWidths=[30*mm, 50*mm, 60*mm, 20*mm])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 12),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
+            table.setStyle(cached_styles["table"])
             story.append(table)
             story.append(PageBreak())
     
@@ -249,12 +271,9 @@ def export_to_image(plan: Dict[str, Any]) -> BytesIO:
     img = Image.new('RGB', (800, 1200), color='white')
     draw = ImageDraw.Draw(img)
     
-    try:
-        font_large = ImageFont.truetype("arial.ttf", 24)
-        font_normal = ImageFont.truetype("arial.ttf", 16)
-    except:
-        font_large = ImageFont.load_default()
-        font_normal = ImageFont.load_default()
+    fonts = _get_image_fonts()
+    font_large = fonts["large"]
+    font_normal = fonts["normal"]
     
     y = 30
     draw.text((50, y), plan.get("title", "旅行プラン"), fill='black', font=font_large)
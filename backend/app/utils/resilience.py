@@ -0,0 +1,291 @@
+"""
+外部 API 呼び出しの耐障害性（サーキットブレーカーとリトライ）
+
+- サーキットブレーカー: プロバイダ（gemini / osrm / google_directions / places / youtube / opencage 等）ごとに
+  連続失敗を数え、CIRCUIT_FAILURE_THRESHOLD 回続いたら CIRCUIT_RECOVERY_SEC の間は呼び出さずに
+  即座に CircuitOpenError を返す（呼び出し側は既存のフォールバックへ進む）。
+  期間経過後は1件だけ試し（half-open）、成功すれば閉じる。
+- リトライ: 指数バックオフ + フルジッター。期限（deadline）を超える待機はしない。
+  CircuitOpenError は再試行しない。同期・非同期（async def）どちらの関数にも使える。
+- 状態はメトリクス（circuit.state / circuit.short_circuited / circuit.opened）と
+  breaker_states() で確認できる（/api/admin/metrics）。
+"""
+import asyncio
+import functools
+import logging
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple, Type
+
+import requests
+
+from app.config import settings
+from app.utils import metrics
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# メトリクス用の数値表現
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    """サーキットが開いている（プロバイダ障害中）ため呼び出さなかった"""
+
+    def __init__(self, provider: str, retry_after: float) -> None:
+        super().__init__(f"{provider} は一時的に停止中です（約{retry_after:.0f}秒後に再試行）")
+        self.provider = provider
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """プロバイダ1つ分のサーキットブレーカー（スレッドセーフ）"""
+
+    def __init__(self, name: str, failure_threshold: int, recovery_sec: float) -> None:
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_sec = recovery_sec
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        metrics.set_gauge("circuit.state", _STATE_VALUES[state], provider=self.name)
+
+    def allow(self) -> bool:
+        """呼び出してよいか。開いている間は False（half-open では試行を1件だけ通す）"""
+        with self._lock:
+            if self._state == CLOSED:
+                return True
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.recovery_sec:
+                self._set_state(HALF_OPEN)
+                self._probe_in_flight = False
+            if self._state == HALF_OPEN and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+        metrics.increment("circuit.short_circuited", provider=self.name)
+        return False
+
+    def retry_after(self) -> float:
+        with self._lock:
+            return max(0.0, self.recovery_sec - (time.monotonic() - self._opened_at))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            if self._state != CLOSED:
+                logger.info("サーキット復旧: %s", self.name)
+                self._set_state(CLOSED)
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == HALF_OPEN or (self._state == CLOSED and self._failures >= self.failure_threshold):
+                self._opened_at = time.monotonic()
+                if self._state != OPEN:
+                    logger.warning("サーキット遮断: %s（連続失敗 %d回）", self.name, self._failures)
+                    metrics.increment("circuit.opened", provider=self.name)
+                self._set_state(OPEN)
+
+    def check(self) -> None:
+        """開いていれば CircuitOpenError を送出する"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after())
+
+    def call(self, func: Callable, *args, **kwargs):
+        """func を呼び、例外なら失敗として数える"""
+        self.check()
+        try:
+            result = func(*args, **kwargs)
+        except Exception:
+            self.record_failure()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "retry_after_sec": round(max(0.0, self.recovery_sec - (time.monotonic() - self._opened_at)), 1)
+                if self._state == OPEN else 0.0,
+            }
+
+
+_breakers: Dict[str, CircuitBreaker] = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name: str) -> CircuitBreaker:
+    """プロバイダ名に対応するブレーカー（初回に作成）"""
+    with _breakers_lock:
+        breaker = _breakers.get(name)
+        if breaker is None:
+            breaker = CircuitBreaker(name, settings.CIRCUIT_FAILURE_THRESHOLD, settings.CIRCUIT_RECOVERY_SEC)
+            _breakers[name] = breaker
+        return breaker
+
+
+def breaker_states() -> Dict[str, Dict[str, Any]]:
+    """全ブレーカーの状態（管理画面向け）"""
+    with _breakers_lock:
+        breakers = list(_breakers.values())
+    return {b.name: b.snapshot() for b in breakers}
+
+
+def _is_upstream_failure(response: requests.Response) -> bool:
+    # 4xx（キー不正・見つからない等）は呼び出し側の問題なので障害として数えない
+    return response.status_code >= 500 or response.status_code == 429
+
+
+def guarded_request(provider: str, method: str, url: str, **kwargs) -> requests.Response:
+    """ブレーカー付きで HTTP リクエストを送る
+
+    通信エラー・タイムアウト・5xx・429 を失敗として数える。
+
+    Raises:
+        CircuitOpenError: プロバイダが停止中（リクエストは送らない）
+        requests.RequestException: 通信エラー
+    """
+    breaker = get_breaker(provider)
+    breaker.check()
+    try:
+        response = requests.request(method, url, **kwargs)
+    except requests.RequestException:
+        breaker.record_failure()
+        raise
+    if _is_upstream_failure(response):
+        breaker.record_failure()
+    else:
+        breaker.record_success()
+    return response
+
+
+# ---- リトライ ----
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float, multiplier: float = 2.0) -> float:
+    """attempt 回目（0始まり）の待機秒数（指数バックオフ + フルジッター）"""
+    return random.uniform(0, min(max_delay, base_delay * (multiplier ** attempt)))
+
+
+def _next_delay(
+    attempt: int, base_delay: float, max_delay: float, multiplier: float, deadline: Optional[float]
+) -> Optional[float]:
+    """次の試行までの待機秒数。期限までに次の試行ができなければ None"""
+    wait = backoff_delay(attempt, base_delay, max_delay, multiplier)
+    if deadline is not None and time.monotonic() + wait >= deadline:
+        return None
+    return wait
+
+
+def retry_call(
+    func: Callable,
+    *args,
+    max_attempts: int = 3,
+    base_delay: float = 0.5,
+    max_delay: float = 4.0,
+    multiplier: float = 2.0,
+    deadline_sec: Optional[float] = None,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    **kwargs,
+):
+    """func をリトライ付きで呼ぶ（同期）
+
+    Args:
+        max_attempts: 最大試行回数（初回を含む）
+        base_delay / max_delay: バックオフの基準・上限（秒）
+        multiplier: 指数バックオフの係数
+        deadline_sec: 初回呼び出しからの期限（秒）。超える待機はせず最後の例外を送出する
+        retry_on: 再試行する例外。CircuitOpenError は常に再試行しない
+    """
+    deadline = time.monotonic() + deadline_sec if deadline_sec else None
+    for attempt in range(max_attempts):
+        try:
+            return func(*args, **kwargs)
+        except CircuitOpenError:
+            raise
+        except retry_on as e:
+            wait = _next_delay(attempt, base_delay, max_delay, multiplier, deadline) if attempt < max_attempts - 1 else None
+            name = getattr(func, "__name__", "call")
+            if wait is None:
+                logger.error(f"{name} 最終失敗 (試行 {attempt + 1}回): {str(e)}")
+                raise
+            metrics.increment("retry.attempts", func=name)
+            logger.warning(
+                f"{name} 失敗 (試行 {attempt + 1}/{max_attempts}): {str(e)}. {wait:.1f}秒後に再試行します。"
+            )
+            time.sleep(wait)
+
+
+async def async_retry_call(
+    func: Callable,
+    *args,
+    max_attempts: int = 3,
+    base_delay: float = 0.5,
+    max_delay: float = 4.0,
+    multiplier: float = 2.0,
+    deadline_sec: Optional[float] = None,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+    **kwargs,
+):
+    """retry_call の非同期版（func は coroutine 関数。待機中はイベントループを止めない）"""
+    deadline = time.monotonic() + deadline_sec if deadline_sec else None
+    for attempt in range(max_attempts):
+        try:
+            return await func(*args, **kwargs)
+        except CircuitOpenError:
+            raise
+        except retry_on as e:
+            wait = _next_delay(attempt, base_delay, max_delay, multiplier, deadline) if attempt < max_attempts - 1 else None
+            name = getattr(func, "__name__", "call")
+            if wait is None:
+                logger.error(f"{name} 最終失敗 (試行 {attempt + 1}回): {str(e)}")
+                raise
+            metrics.increment("retry.attempts", func=name)
+            logger.warning(
+                f"{name} 失敗 (試行 {attempt + 1}/{max_attempts}): {str(e)}. {wait:.1f}秒後に再試行します。"
+            )
+            await asyncio.sleep(wait)
+
+
+def retry(
+    max_attempts: int = 3,
+    base_delay: float = 0.5,
+    max_delay: float = 4.0,
+    multiplier: float = 2.0,
+    deadline_sec: Optional[float] = None,
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+):
+    """リトライデコレータ（async def にも対応）"""
+    options = dict(
+        max_attempts=max_attempts, base_delay=base_delay, max_delay=max_delay,
+        multiplier=multiplier, deadline_sec=deadline_sec, retry_on=retry_on,
+    )
+
+    def decorator(func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await async_retry_call(func, *args, **options, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return retry_call(func, *args, **options, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,203 @@
+"""
+公開スポット API のレスポンスキャッシュ
+
+スポットカタログは管理者の編集やインポート時にしか変わらないため、
+一覧・詳細・エリア別のレスポンス（シリアライズ済み JSON）をキャッシュする。
+
+- キー: 名前空間 + 正規化したクエリパラメータ + カタログ世代番号
+- 保存先: プロセス内 LRU（必須）＋ Redis（REDIS_URL 設定時。ワーカー間で共有）
+- 世代番号: スポットを含むトランザクションの commit で加算する（database.py のセッションフック）。
+  無効化バス（invalidation_bus.py）の spot_catalog 名前空間として共有し、他ワーカーの加算は
+  バスの通知で即時に（通知が届かなくても RESPONSE_CACHE_VERSION_TTL_SEC 以内に）反映される。
+- ETag は世代番号とキーから作るため、変更が無い間はクライアントに 304 を返せる
+"""
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from fastapi import Request, Response, status
+
+from app.config import settings
+from app.utils import invalidation_bus, metrics
+
+logger = logging.getLogger(__name__)
+
+CATALOG_NAMESPACE = "spot_catalog"
+_REDIS_PREFIX = "satotrip:respcache:"
+
+# セッション単位で「スポットが変わった」ことを記録するキー（commit 時に世代を進める）
+CATALOG_DIRTY_KEY = "spot_catalog_dirty"
+
+# Redis クライアントの初期化（任意）
+_redis = None
+if settings.REDIS_URL:
+    try:
+        import redis as _redis_lib
+        _redis = _redis_lib.from_url(settings.REDIS_URL)
+        _redis.ping()
+        logger.info("レスポンスキャッシュ: Redis を使用します")
+    except Exception as e:
+        logger.warning("レスポンスキャッシュ: Redis 接続に失敗したためメモリのみで動作します: %s", str(e))
+        _redis = None
+
+_lock = threading.Lock()
+_lru: "OrderedDict[str, bytes]" = OrderedDict()
+# 世代番号の読み取りメモ（値, 読み取り時刻）
+_version_memo: Tuple[int, float] = (0, 0.0)
+
+
+def get_catalog_version() -> int:
+    """現在のカタログ世代番号（短時間メモ化して毎リクエストの問い合わせを避ける）"""
+    global _version_memo
+    value, read_at = _version_memo
+    if time.monotonic() - read_at < settings.RESPONSE_CACHE_VERSION_TTL_SEC:
+        return value
+    try:
+        value = invalidation_bus.read_version(CATALOG_NAMESPACE)
+    except Exception as e:
+        # 読めない間は直前の値で動かす（キャッシュは TTL で自然に入れ替わる）
+        logger.warning("レスポンスキャッシュ: 世代番号の取得に失敗しました: %s", e)
+    _version_memo = (value, time.monotonic())
+    return value
+
+
+def bump_catalog_version() -> int:
+    """カタログ世代番号を進める（スポットの作成・更新・削除・検証・インポートの commit 後）
+
+    無効化バス経由で他ワーカーにも通知し、各ワーカーの LRU とメモが即時に捨てられる。
+    """
+    global _version_memo
+    value = invalidation_bus.publish(CATALOG_NAMESPACE)
+    _version_memo = (value, time.monotonic())
+    metrics.increment("response_cache.version_bumps")
+    return value
+
+
+def _on_catalog_invalidated(payload) -> None:
+    """カタログが変わった（自他ワーカー）: 古い世代のエントリを捨て、次の参照で世代番号を読み直す"""
+    global _version_memo
+    _version_memo = (_version_memo[0], 0.0)
+    with _lock:
+        _lru.clear()
+
+
+invalidation_bus.register(CATALOG_NAMESPACE, _on_catalog_invalidated)
+
+
+def mark_catalog_changed_if_needed(session) -> None:
+    """flush 対象にスポットが含まれていれば、commit 時に世代を進める印を付ける"""
+    from app.models.spot import Spot
+    for obj in (*session.new, *session.deleted):
+        if isinstance(obj, Spot):
+            session.info[CATALOG_DIRTY_KEY] = True
+            return
+    for obj in session.dirty:
+        if isinstance(obj, Spot) and session.is_modified(obj):
+            session.info[CATALOG_DIRTY_KEY] = True
+            return
+
+
+def publish_catalog_change_if_needed(session) -> None:
+    """commit 後に印があれば世代を進める（失敗してもリクエストは失敗させない）"""
+    if not session.info.pop(CATALOG_DIRTY_KEY, False):
+        return
+    try:
+        bump_catalog_version()
+    except Exception as e:
+        logger.warning("レスポンスキャッシュ: 世代番号の更新に失敗しました: %s", e)
+
+
+def _normalize_params(params: Dict[str, Any]) -> str:
+    parts = []
+    for key in sorted(params):
+        value = params[key]
+        if value is None or value == "":
+            continue
+        if isinstance(value, str):
+            value = value.strip()
+        parts.append(f"{key}={value}")
+    return "&".join(parts)
+
+
+def _lru_get(key: str) -> Optional[bytes]:
+    with _lock:
+        body = _lru.get(key)
+        if body is not None:
+            _lru.move_to_end(key)
+        return body
+
+
+def _lru_put(key: str, body: bytes) -> None:
+    with _lock:
+        _lru[key] = body
+        _lru.move_to_end(key)
+        while len(_lru) > settings.RESPONSE_CACHE_MAX_ENTRIES:
+            _lru.popitem(last=False)
+
+
+def _lookup(key: str) -> Optional[bytes]:
+    body = _lru_get(key)
+    if body is not None:
+        return body
+    if _redis is not None:
+        try:
+            body = _redis.get(_REDIS_PREFIX + key)
+        except Exception:
+            body = None
+        if body is not None:
+            _lru_put(key, body)
+            return body
+    return None
+
+
+def _store(key: str, body: bytes) -> None:
+    _lru_put(key, body)
+    if _redis is not None:
+        try:
+            _redis.setex(_REDIS_PREFIX + key, settings.RESPONSE_CACHE_TTL_SEC, body)
+        except Exception:
+            pass
+
+
+def cached_json_response(
+    request: Request,
+    namespace: str,
+    params: Dict[str, Any],
+    build: Callable[[], Optional[bytes]],
+) -> Optional[Response]:
+    """キャッシュ経由で JSON レスポンスを返す
+
+    Args:
+        namespace: エンドポイント名（キーの接頭辞）
+        params: レスポンスを決めるパラメータ（正規化してキーにする）
+        build: キャッシュミス時にシリアライズ済み JSON を返す関数。None はキャッシュしない
+
+    Returns:
+        Response。build が None を返した場合は None（呼び出し側で 404 等を返す）
+    """
+    version = get_catalog_version()
+    key = f"{namespace}:{version}:{_normalize_params(params)}"
+    etag = f'W/"{version}-{hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]}"'
+    headers = {"ETag": etag, "Cache-Control": "public, max-age=0, must-revalidate"}
+
+    if not settings.RESPONSE_CACHE_ENABLED:
+        body = build()
+        return None if body is None else Response(content=body, media_type="application/json")
+
+    if request.headers.get("if-none-match") == etag:
+        metrics.increment("response_cache.not_modified", namespace=namespace)
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    body = _lookup(key)
+    if body is None:
+        metrics.increment("response_cache.misses", namespace=namespace)
+        body = build()
+        if body is None:
+            return None
+        _store(key, body)
+    else:
+        metrics.increment("response_cache.hits", namespace=namespace)
+    return Response(content=body, media_type="application/json", headers=headers)
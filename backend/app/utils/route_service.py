@@ -2,7 +2,6 @@
 ルート情報取得サービス
 OSRM、Google Maps Directions APIなどを使用してルート情報を取得
 """
-import requests
 from typing import List, Dict, Any, Optional, Tuple
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from functools import lru_cache
@@ -10,6 +9,7 @@ import time
 import hashlib
 from app.config import settings
 from app.utils.error_handler import log_error
+from app.utils.resilience import guarded_request
 
 # ルート情報キャッシュ（メモリ内、TTL: 1時間）
 _route_cache: Dict[str, Tuple[Dict[str, Any], float]] = {}
@@ -37,13 +37,13 @@ def get_route_from_osrm(
         # 座標を文字列に変換（lng,lat;lng,lat;...）
         coords_str = ";".join([f"{lng},{lat}" for lat, lng in coordinates])
         
-        url = f"https://router.project-osrm.org/route/v1/{profile}/{coords_str}"
+        url = f"{settings.OSRM_BASE_URL}/route/v1/{profile}/{coords_str}"
         params = {
             "overview": "full",
             "geometries": "geojson",
         }
         
-        response = requests.get(url, params=params, timeout=5)
+        response = guarded_request("osrm", "GET", url, params=params, timeout=5)
         
         if response.status_code == 200:
             data = response.json()
@@ -111,7 +111,7 @@ def get_route_from_google_maps(
             waypoints_str = "|".join([f"{lat},{lng}" for lat, lng in waypoints])
             params["waypoints"] = waypoints_str
         
-        response = requests.get(url, params=params, timeout=5)
+        response = guarded_request("google_directions", "GET", url, params=params, timeout=5)
         
         if response.status_code == 200:
             data = response.json()
@@ -223,6 +223,29 @@ def get_route_info(
     }
 
 
+def get_leg_info(
+    coordinates: List[Tuple[float, float]],
+    profile: str = "driving"
+) -> Optional[Dict[str, Any]]:
+    """
+    区間の距離・所要時間を取得（geometry 不要の時刻計算用）
+    事前計算した移動行列に2点とも載っていれば外部APIを呼ばずに返し、無ければ get_route_info
+    
+    Args:
+        coordinates: [(lat, lng), (lat, lng)] の形式の座標リスト
+        profile: ルーティングプロファイル
+    
+    Returns:
+        ルート情報またはNone
+    """
+    from app.services.travel_matrix_service import lookup_leg
+
+    route_info = lookup_leg(coordinates, profile)
+    if route_info:
+        return route_info
+    return get_route_info(coordinates, profile)
+
+
 def get_route_info_batch(
     route_requests: List[Tuple[List[Tuple[float, float]], str]],
     max_workers: int = 10
@@ -240,13 +263,24 @@ def get_route_info_batch(
     if not route_requests:
         return []
     
+    from app.services.travel_matrix_service import lookup_leg
+
     results = [None] * len(route_requests)
     
+    # 移動行列で引ける区間は先に埋め、残りだけ外部APIに問い合わせる
+    pending = []
+    for i, (coordinates, profile) in enumerate(route_requests):
+        results[i] = lookup_leg(coordinates, profile)
+        if results[i] is None:
+            pending.append(i)
+    if not pending:
+        return results
+    
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
         # 各リクエストを並列実行
         future_to_index = {
-            executor.submit(get_route_info, coordinates, profile): i
-            for i, (coordinates, profile) in enumerate(route_requests)
+            executor.submit(get_route_info, *route_requests[i]): i
+            for i in pending
         }
         
         # 完了した順に結果を取得
@@ -0,0 +1,323 @@
+"""
+スポットの全文検索インデックス
+/api/spots の keyword 検索を全件スキャン（LIKE '%kw%'）から索引検索に置き換える
+
+- SQLite: FTS5 仮想テーブル spots_fts（trigram トークナイザ。日本語の分かち書き不要）。
+  spots テーブルのトリガーで同期するため、API・インポート等どの経路の書き込みでも追従する。
+- PostgreSQL: pg_trgm 拡張 + GIN 式インデックス。インデックスは DB が自動で保守する。
+
+対象カラムは name / description / area / tags（構造化タグの value）。
+trigram は 3 文字未満の語を索引で引けないため、短い語は部分一致で絞り込む。
+"""
+import html
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import Float, String, text
+from sqlalchemy.engine import Engine
+
+from app.config import settings
+from app.utils import metrics
+from app.utils.error_handler import log_error
+
+FTS_TABLE = "spots_fts"
+PG_INDEX_NAME = "ix_spots_search_trgm"
+
+# trigram で索引を引ける最小文字数
+MIN_INDEXED_TOKEN_LENGTH = 3
+
+# 列ごとの bm25 重み（spot_id, name, description, area, tags）。名前一致を最優先する。
+_BM25_WEIGHTS = "0.0, 10.0, 1.0, 3.0, 5.0"
+
+# ハイライトの目印。エスケープ後に <mark> へ置き換える（本文中の HTML を無害化するため）
+_HL_OPEN = "\x02"
+_HL_CLOSE = "\x03"
+_SNIPPET_CHARS = 40
+
+# 構造化タグ（[{"value": ...}]）と文字列タグ（["..."]）の両方から値を連結する式
+_SQLITE_TAGS_EXPR = (
+    "COALESCE((SELECT group_concat("
+    "CASE WHEN j.type = 'object' THEN json_extract(j.value, '$.value') ELSE j.value END, ' ') "
+    "FROM json_each(CASE WHEN json_valid({row}.tags) THEN {row}.tags ELSE '[]' END) AS j), '')"
+)
+
+_SQLITE_INSERT_ROW = (
+    f"INSERT INTO {FTS_TABLE}(rowid, spot_id, name, description, area, tags) "
+    "VALUES ({row}.rowid, {row}.id, {row}.name, COALESCE({row}.description, ''), "
+    "COALESCE({row}.area, ''), " + _SQLITE_TAGS_EXPR + ");"
+)
+
+# spots の rowid を FTS 側の rowid にそろえ、更新・削除を rowid 一発で引けるようにする
+_SQLITE_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "spot_id UNINDEXED, name, description, area, tags, tokenize='trigram')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON spots BEGIN "
+    + _SQLITE_INSERT_ROW.format(row="NEW") + " END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON spots BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = OLD.rowid; END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF id, name, description, area, tags ON spots BEGIN "
+    f"DELETE FROM {FTS_TABLE} WHERE rowid = OLD.rowid; "
+    + _SQLITE_INSERT_ROW.format(row="NEW") + " END",
+]
+
+_SQLITE_BACKFILL = (
+    f"INSERT INTO {FTS_TABLE}(rowid, spot_id, name, description, area, tags) "
+    "SELECT s.rowid, s.id, s.name, COALESCE(s.description, ''), COALESCE(s.area, ''), "
+    + _SQLITE_TAGS_EXPR.format(row="s") + " FROM spots AS s"
+)
+
+# 検索条件とインデックスで同じ式を使う必要がある（式インデックスのため）
+_PG_SEARCH_EXPR = (
+    "(coalesce(spots.name, '') || ' ' || coalesce(spots.description, '') || ' ' || "
+    "coalesce(spots.area, '') || ' ' || coalesce(spots.tags::text, ''))"
+)
+
+_PG_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    f"CREATE INDEX IF NOT EXISTS {PG_INDEX_NAME} ON spots USING gin ({_PG_SEARCH_EXPR} gin_trgm_ops)",
+]
+
+# バインド（エンジンURL）ごとの索引有無キャッシュ
+_ready: Dict[str, bool] = {}
+_ready_lock = threading.Lock()
+
+
+def _bind_key(bind) -> str:
+    return str(getattr(bind, "url", bind))
+
+
+def _dialect_name(bind) -> str:
+    return bind.dialect.name
+
+
+def ensure_search_index(bind: Engine) -> bool:
+    """検索インデックスを作成する（冪等）。作成できなければ False（従来検索にフォールバック）
+
+    SQLite では FTS 側の行数・rowid が spots とずれていれば再構築する
+    （VACUUM で spots の rowid が振り直された場合など）。
+    """
+    if not settings.SPOT_SEARCH_INDEX_ENABLED:
+        return False
+
+    dialect = _dialect_name(bind)
+    try:
+        if dialect == "sqlite":
+            with bind.connect() as conn:
+                exists = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {"name": FTS_TABLE},
+                ).first()
+                for stmt in _SQLITE_DDL:
+                    conn.execute(text(stmt))
+                conn.commit()
+            if not exists or not _sqlite_index_in_sync(bind):
+                rebuild_search_index(bind)
+        elif dialect == "postgresql":
+            with bind.connect() as conn:
+                for stmt in _PG_DDL:
+                    conn.execute(text(stmt))
+                conn.commit()
+        else:
+            return False
+    except Exception as e:
+        # FTS5/trigram 非対応の SQLite（3.34 未満）や拡張作成権限がない場合
+        log_error("SEARCH_INDEX_ERROR", f"検索インデックスの作成に失敗しました: {e}", {"dialect": dialect})
+        with _ready_lock:
+            _ready[_bind_key(bind)] = False
+        return False
+
+    with _ready_lock:
+        _ready[_bind_key(bind)] = True
+    return True
+
+
+def _sqlite_index_in_sync(bind: Engine) -> bool:
+    with bind.connect() as conn:
+        spot_count = conn.execute(text("SELECT COUNT(*) FROM spots")).scalar() or 0
+        linked = conn.execute(
+            text(
+                f"SELECT COUNT(*) FROM spots AS s JOIN {FTS_TABLE} AS f "
+                "ON f.rowid = s.rowid AND f.spot_id = s.id"
+            )
+        ).scalar() or 0
+        fts_count = conn.execute(text(f"SELECT COUNT(*) FROM {FTS_TABLE}")).scalar() or 0
+    return spot_count == linked == fts_count
+
+
+def rebuild_search_index(bind: Engine) -> int:
+    """検索インデックスを全件から作り直す（バックフィル用）。索引した件数を返す"""
+    dialect = _dialect_name(bind)
+    with metrics.timed("spot_search.rebuild_ms", dialect=dialect):
+        with bind.connect() as conn:
+            if dialect == "sqlite":
+                conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+                conn.execute(text(_SQLITE_BACKFILL))
+                conn.execute(text(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('optimize')"))
+            elif dialect == "postgresql":
+                conn.execute(text(f"REINDEX INDEX {PG_INDEX_NAME}"))
+            count = conn.execute(text("SELECT COUNT(*) FROM spots")).scalar() or 0
+            conn.commit()
+    return int(count)
+
+
+def is_search_index_ready(bind) -> bool:
+    """このバインドで索引検索が使えるか（init_db を経ないスクリプトでも判定できるよう遅延確認）"""
+    if not settings.SPOT_SEARCH_INDEX_ENABLED:
+        return False
+    key = _bind_key(bind)
+    with _ready_lock:
+        if key in _ready:
+            return _ready[key]
+
+    dialect = _dialect_name(bind)
+    ready = False
+    try:
+        with bind.connect() as conn:
+            if dialect == "sqlite":
+                ready = conn.execute(
+                    text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+                    {"name": FTS_TABLE},
+                ).first() is not None
+            elif dialect == "postgresql":
+                ready = conn.execute(
+                    text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")
+                ).first() is not None
+    except Exception:
+        ready = False
+
+    with _ready_lock:
+        _ready[key] = ready
+    return ready
+
+
+def split_keyword(keyword: str) -> List[str]:
+    """検索語を空白（全角含む）で分割する。各語は AND 条件"""
+    return [t for t in re.split(r"\s+", keyword.strip()) if t]
+
+
+def _escape_like(token: str) -> str:
+    return token.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def _fts_phrase(token: str) -> str:
+    return '"' + token.replace('"', '""') + '"'
+
+
+def apply_keyword_search(query, keyword: str) -> Tuple[object, bool]:
+    """Spot クエリに keyword 条件と関連度順の並びを付ける
+
+    Returns:
+        (query, with_snippet)。with_snippet が True のとき結果の各行は (Spot, snippet)。
+        索引が使えない場合は従来の部分一致（name / description）に戻す。
+    """
+    from app.models.spot import Spot
+
+    tokens = split_keyword(keyword)
+    if not tokens:
+        return query, False
+
+    bind = query.session.get_bind()
+    if not is_search_index_ready(bind):
+        for token in tokens:
+            query = query.filter(Spot.name.contains(token) | Spot.description.contains(token))
+        return query, False
+
+    metrics.increment("spot_search.queries", dialect=_dialect_name(bind))
+    if _dialect_name(bind) == "postgresql":
+        return _apply_pg_search(query, tokens), False
+    return _apply_sqlite_search(query, tokens)
+
+
+def _apply_sqlite_search(query, tokens: List[str]):
+    from app.models.spot import Spot
+
+    long_tokens = [t for t in tokens if len(t) >= MIN_INDEXED_TOKEN_LENGTH]
+    short_tokens = [t for t in tokens if len(t) < MIN_INDEXED_TOKEN_LENGTH]
+
+    params = {}
+    conditions = []
+    for i, token in enumerate(short_tokens):
+        params[f"short_{i}"] = f"%{_escape_like(token)}%"
+        conditions.append(
+            f"(name LIKE :short_{i} ESCAPE '\\' OR description LIKE :short_{i} ESCAPE '\\' "
+            f"OR area LIKE :short_{i} ESCAPE '\\' OR tags LIKE :short_{i} ESCAPE '\\')"
+        )
+
+    if long_tokens:
+        params["match"] = " AND ".join(_fts_phrase(t) for t in long_tokens)
+        params["hl_open"] = _HL_OPEN
+        params["hl_close"] = _HL_CLOSE
+        where = " AND ".join([f"{FTS_TABLE} MATCH :match"] + conditions)
+        sql = (
+            f"SELECT spot_id, bm25({FTS_TABLE}, {_BM25_WEIGHTS}) AS score, "
+            f"snippet({FTS_TABLE}, -1, :hl_open, :hl_close, '…', 16) AS snippet "
+            f"FROM {FTS_TABLE} WHERE {where}"
+        )
+        with_snippet = True
+    else:
+        # 2 文字以下の語のみ（「温泉」「京都」など）: FTS テーブル上の部分一致。名前一致を上位にする
+        sql = (
+            "SELECT spot_id, CASE WHEN name LIKE :short_0 ESCAPE '\\' THEN -1.0 ELSE 0.0 END AS score, "
+            "NULL AS snippet "
+            f"FROM {FTS_TABLE} WHERE {' AND '.join(conditions)}"
+        )
+        with_snippet = False
+
+    hits = (
+        text(sql)
+        .bindparams(**params)
+        .columns(spot_id=String, score=Float, snippet=String)
+        .subquery("spot_search_hits")
+    )
+    query = query.join(hits, hits.c.spot_id == Spot.id).order_by(hits.c.score, Spot.name)
+    if with_snippet:
+        query = query.add_columns(hits.c.snippet)
+    return query, with_snippet
+
+
+def _apply_pg_search(query, tokens: List[str]):
+    from app.models.spot import Spot
+
+    params = {"kw": " ".join(tokens)}
+    conditions = []
+    for i, token in enumerate(tokens):
+        params[f"pattern_{i}"] = f"%{_escape_like(token)}%"
+        conditions.append(f"{_PG_SEARCH_EXPR} ILIKE :pattern_{i}")
+
+    query = query.filter(text(" AND ".join(conditions)).bindparams(**params))
+    rank = text(
+        "(coalesce(spots.name, '') ILIKE :rank_pattern) DESC, "
+        f"word_similarity(:rank_kw, {_PG_SEARCH_EXPR}) DESC"
+    ).bindparams(rank_kw=params.pop("kw"), rank_pattern=params["pattern_0"])
+    return query.order_by(rank, Spot.name)
+
+
+def render_snippet(snippet: Optional[str]) -> Optional[str]:
+    """FTS の snippet をエスケープし、一致箇所を <mark> で囲んだ HTML 断片にする"""
+    if not snippet:
+        return None
+    escaped = html.escape(snippet)
+    return escaped.replace(_HL_OPEN, "<mark>").replace(_HL_CLOSE, "</mark>")
+
+
+def build_highlight(spot, keyword: str) -> Optional[str]:
+    """索引の snippet が無い場合（PostgreSQL・短い語）に Python 側でハイライトを作る"""
+    tokens = split_keyword(keyword)
+    if not tokens:
+        return None
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(tokens, key=len, reverse=True)), re.IGNORECASE)
+
+    for source in (spot.name, spot.description, spot.area):
+        if not source:
+            continue
+        match = pattern.search(source)
+        if not match:
+            continue
+        start = max(0, match.start() - _SNIPPET_CHARS // 2)
+        end = min(len(source), match.end() + _SNIPPET_CHARS // 2)
+        excerpt = pattern.sub(lambda m: f"{_HL_OPEN}{m.group(0)}{_HL_CLOSE}", source[start:end])
+        prefix = "…" if start > 0 else ""
+        suffix = "…" if end < len(source) else ""
+        return render_snippet(prefix + excerpt + suffix)
+    return None
@@ -4,10 +4,9 @@
 """
 import os
 from sqlalchemy.orm import Session
-from sqlalchemy import and_
 from typing import Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
-from app.models.subscription import Subscription, Usage
+from app.models.subscription import Subscription
 
 
 # プラン定義
@@ -43,80 +42,30 @@ PLANS = {
 
 
 def get_user_plan(db: Session, user_id: str) -> str:
-    """ユーザーのプランを取得（デフォルト: free）"""
-    subscription = db.query(Subscription).filter(
-        Subscription.user_id == user_id
-    ).first()
-    
-    if not subscription:
-        return "free"
-    
-    # 有効期限チェック
-    if subscription.expires_at and datetime.now() > subscription.expires_at:
-        return "free"
-    
-    return subscription.plan_name
+    """ユーザーのプランを取得（デフォルト: free。短時間キャッシュ）"""
+    from app.services.entitlement_service import get_plan_name
+    return get_plan_name(db, user_id)
 
 
 def can_generate_plan(db: Session, user_id: str) -> Tuple[bool, str, int]:
     """
-    プラン生成可能かチェック
+    プラン生成可能かチェック（表示用。生成時は entitlement_service.reserve_plan_generation で枠を確保する）
     Returns: (can_generate, message, remaining)
     """
-    
-    plan_name = get_user_plan(db, user_id)
-    
-    plan = PLANS[plan_name]
-    
-    # 無制限プラン
-    if plan["monthly_plans"] == -1:
-        return True, "", -1
-    
-    # 使用量取得
-    now = datetime.now()
-    current_month = f"{now.year}-{now.month:02d}"
-    
-    usage = db.query(Usage).filter(
-        and_(
-            Usage.user_id == user_id,
-            Usage.month == current_month
-        )
-    ).first()
-    
-    monthly_usage = usage.count if usage else 0
-    
-    remaining = plan["monthly_plans"] - monthly_usage
-    
-    if remaining > 0:
-        return True, f"残り{remaining}回", remaining
-    else:
-        return False, f"今月のプラン生成上限に達しました（{monthly_usage}/{plan['monthly_plans']}回使用済み）。来月までお待ちいただくか、プランをアップグレードしてください。", 0
+    from app.services.entitlement_service import get_entitlement
+    entitlement = get_entitlement(db, user_id)
+    return entitlement.can_generate, entitlement.message, entitlement.remaining
 
 
 def record_plan_generation(db: Session, user_id: str):
-    """プラン生成を記録"""
-    now = datetime.now()
-    current_month = f"{now.year}-{now.month:02d}"
-    
-    usage = db.query(Usage).filter(
-        and_(
-            Usage.user_id == user_id,
-            Usage.month == current_month
-        )
-    ).first()
-    
-    if usage:
-        usage.count += 1
-        usage.updated_at = datetime.now()
-    else:
-        usage = Usage(
-            user_id=user_id,
-            month=current_month,
-            count=1
-        )
-        db.add(usage)
-    
-    db.commit()
+    """プラン生成を記録（上限チェックなしで原子的に1加算）"""
+    from app.services.entitlement_service import record_plan_generation as _record
+    _record(db, user_id)
+
+
+def _publish_subscription_change(user_id: str) -> None:
+    from app.services.entitlement_service import publish_subscription_change
+    publish_subscription_change(user_id)
 
 
 def upgrade_plan(
@@ -154,6 +103,7 @@ def upgrade_plan(
         db.add(subscription)
 
     db.commit()
+    _publish_subscription_change(user_id)
 
 
 def get_subscription_by_stripe_ids(
@@ -183,6 +133,7 @@ def extend_subscription(db: Session, subscription: Subscription, expires_at: dat
         subscription.updated_at = datetime.now()
     # 呼び出し元での付随変更（stripe_subscription_id の補完等）も含めて確定する
     db.commit()
+    _publish_subscription_change(subscription.user_id)
 
 
 def downgrade_to_free(db: Session, user_id: str):
@@ -197,6 +148,7 @@ def downgrade_to_free(db: Session, user_id: str):
     subscription.stripe_subscription_id = None
     subscription.updated_at = datetime.now()
     db.commit()
+    _publish_subscription_change(user_id)
 
 
 def get_plan_features(db: Session, user_id: str) -> Dict[str, Any]:
@@ -207,15 +159,14 @@ def get_plan_features(db: Session, user_id: str) -> Dict[str, Any]:
 
 def check_feature_access(db: Session, user_id: str, feature: str) -> bool:
     """特定機能へのアクセス権をチェック"""
-    plan_features = get_plan_features(db, user_id)
-    plan = PLANS[get_user_plan(db, user_id)]
-    
+    plan = get_plan_features(db, user_id)
+
     if feature == "pdf_export":
         return plan["pdf_export"]
     elif feature == "advanced_optimization":
         return plan["advanced_optimization"]
     elif feature == "no_ads":
-        return "no_ads" in plan_features["features"]
+        return "no_ads" in plan["features"]
     
     return True  # デフォルトは許可
 
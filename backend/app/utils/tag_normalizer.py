@@ -6,17 +6,29 @@ import os
 from pathlib import Path
 from typing import List, Dict, Optional, Any
 from app.schemas.tag import Tag, TagCategory, TagPriority, TagSource
+from app.utils import invalidation_bus
 
 
 # カテゴリ定義ファイルのパス
 SCRIPT_DIR = Path(__file__).parent.parent.parent
 CATEGORIES_FILE = SCRIPT_DIR / "data" / "tag_categories.json"
 
-# カテゴリ定義をキャッシュ
+# カテゴリ定義をキャッシュ（更新時は無効化バスで全ワーカーから捨てる）
+TAG_CATEGORIES_NAMESPACE = "tag_categories"
 _categories_cache: Optional[Dict[str, Any]] = None
 _synonyms_cache: Optional[Dict[str, str]] = None
 
 
+def invalidate_tag_categories(payload: Optional[Dict[str, Any]] = None) -> None:
+    """カテゴリ定義・同義語辞書のキャッシュを捨てる（次の参照でファイルを読み直す）"""
+    global _categories_cache, _synonyms_cache
+    _categories_cache = None
+    _synonyms_cache = None
+
+
+invalidation_bus.register(TAG_CATEGORIES_NAMESPACE, invalidate_tag_categories)
+
+
 def load_tag_categories() -> Dict[str, Any]:
     """カテゴリ定義ファイルを読み込む"""
     global _categories_cache
@@ -43,6 +55,18 @@ def load_tag_categories() -> Dict[str, Any]:
         }
 
 
+def save_tag_categories(categories_data: Dict[str, Any]) -> Dict[str, Any]:
+    """カテゴリ定義ファイルを書き換え、全ワーカーのキャッシュを無効化する"""
+    CATEGORIES_FILE.parent.mkdir(parents=True, exist_ok=True)
+    # 読み込み中の他ワーカーが途中までの JSON を読まないよう、一時ファイルから置き換える
+    tmp_path = CATEGORIES_FILE.with_suffix(".json.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(categories_data, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_path, CATEGORIES_FILE)
+    invalidation_bus.publish(TAG_CATEGORIES_NAMESPACE)
+    return categories_data
+
+
 def get_synonyms_dict() -> Dict[str, str]:
     """同義語辞書を取得"""
     global _synonyms_cache
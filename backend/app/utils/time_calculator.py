@@ -4,7 +4,7 @@
 """
 from typing import List, Dict, Any, Optional, Tuple
 from datetime import datetime, timedelta
-from app.utils.route_service import get_route_info
+from app.utils.route_service import get_leg_info
 
 
 def calculate_spot_distances(
@@ -47,7 +47,7 @@ def calculate_spot_distances(
         
         if lat1 and lng1 and lat2 and lng2:
             try:
-                route_info = get_route_info(
+                route_info = get_leg_info(
                     coordinates=[(lat1, lng1), (lat2, lng2)],
                     profile=profile
                 )
@@ -66,6 +66,30 @@ def calculate_spot_distances(
     return distances
 
 
+def calculate_proximity_clusters(
+    spots: List[Dict[str, Any]],
+    transportation: Optional[str] = None
+) -> List[List[str]]:
+    """
+    移動行列上で互いに近いスポットのまとまりを求める（外部APIは呼ばない）
+    
+    Args:
+        spots: スポットリスト（location情報を含む）
+        transportation: 交通手段（徒歩なら walking、それ以外は driving の行列）
+    
+    Returns:
+        スポット名のまとまりのリスト（行列が無ければ空）
+    """
+    from app.services.travel_matrix_service import proximity_clusters
+    
+    profile = "walking" if transportation == "徒歩" else "driving"
+    try:
+        return proximity_clusters(spots, profile=profile)
+    except Exception:
+        # まとまりはプロンプトの補助情報のため、失敗しても生成は続ける
+        return []
+
+
 def recalculate_spot_times(
     spots: List[Dict[str, Any]],
     start_time: str = "09:00",
@@ -156,7 +180,7 @@ def recalculate_spot_times(
                         profile = profile_map.get(day_transportation, "driving")
                         
                         try:
-                            route_info = get_route_info(
+                            route_info = get_leg_info(
                                 coordinates=[(hotel_lat, hotel_lng), (next_lat, next_lng)],
                                 profile=profile
                             )
@@ -231,7 +255,7 @@ def recalculate_spot_times(
                     profile = profile_map.get(day_transportation, "driving")
                     
                     try:
-                        route_info = get_route_info(
+                        route_info = get_leg_info(
                             coordinates=[(hotel_lat, hotel_lng), (first_lat, first_lng)],
                             profile=profile
                         )
@@ -320,7 +344,7 @@ def recalculate_spot_times(
                         profile = profile_map.get(day_transportation, "driving")
                         
                         try:
-                            route_info = get_route_info(
+                            route_info = get_leg_info(
                                 coordinates=[(lat1, lng1), (lat2, lng2)],
                                 profile=profile
                             )
@@ -0,0 +1,14 @@
+"""
+負荷試験ハーネス（外部 API の枠を消費せずに単一インスタンスの限界を測る）
+
+- providers.py: OSRM（route / table）・Places（searchText / details / photo）・YouTube（search）の
+  応答を真似るローカル HTTP サーバー
+- fake_gemini.py: プロンプトの種類（プラン生成・スポットリサーチ・動画/SNS 要約）に応じた応答を返す
+  google.generativeai の代わり
+- asgi.py: フェイク Gemini を組み込んだ app（uvicorn loadtest.asgi:app で起動）
+- faults.py: 遅延・エラー・無応答の注入設定（各スタンドイン共通）
+- driver.py: 利用シナリオ（閲覧・生成・編集・エクスポート・一括追加）を混ぜて流し、
+  エンドポイントごとのスループットと p50 / p95 / p99 を出す
+
+使い方は backend/README.md の「負荷試験」を参照。
+"""
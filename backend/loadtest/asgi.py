@@ -0,0 +1,14 @@
+"""
+フェイク Gemini を組み込んだアプリ（負荷試験用）
+
+    uvicorn loadtest.asgi:app --workers 4
+
+ワーカーごとに import されるため、各ワーカーでフェイクが有効になる。
+遅延・エラーは LOADTEST_GEMINI_*（loadtest/faults.py）で指定する。
+OSRM / Places / YouTube は *_BASE_URL を loadtest.providers のサーバーに向けること。
+"""
+from app.main import app  # noqa: F401
+from loadtest.fake_gemini import install
+from loadtest.faults import FaultConfig
+
+install(FaultConfig.from_env("LOADTEST_GEMINI"))
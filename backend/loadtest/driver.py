@@ -0,0 +1,457 @@
+"""
+負荷試験のシナリオドライバー
+
+仮想ユーザー（スレッド）ごとにシナリオを重み付きで選んで繰り返し実行し、
+エンドポイントごとのスループット・エラー数・p50 / p95 / p99 を出す。
+
+シナリオ（--mix で重みを指定。例: browse=60,generate=15,agent=5,edit=15,export=5,import=0）:
+    browse    スポット一覧 → 詳細 → エリア別一覧
+    generate  POST /api/plans/generate-plan
+    agent     POST /api/v1/ai/generate-plan（APIキー認証）
+    edit      プラン取得 → 滞在時間を変えて PUT
+    export    iCal エクスポート
+    import    都道府県一括追加（管理者、同期実行。YouTube / Gemini / Places を一通り通る）
+
+アカウント（無制限プランのユーザー・APIキー・管理者）はアプリと同じ DATABASE_URL に直接作る。
+
+使い方:
+    # スタンドイン・uvicorn（4ワーカー）を起動して 60 秒流す（一時 SQLite に data/spots.json を投入）
+    python -m loadtest.driver --spawn --workers 4 --users 32 --duration 60 --latency-ms 80 --gemini-latency-ms 2000
+    # 起動済みのサーバーに流す（DATABASE_URL はサーバーと同じものを設定しておく）
+    python -m loadtest.driver --base-url http://127.0.0.1:8000 --users 16 --output result.json
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+
+from loadtest.faults import FaultConfig
+from loadtest.providers import add_fault_arguments, faults_from_args, make_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_PATH = os.path.join(os.path.dirname(BACKEND_DIR), "data", "spots.json")
+
+DEFAULT_MIX = "browse=60,generate=15,agent=5,edit=15,export=5,import=0"
+DESTINATIONS = ["鹿児島", "指宿", "霧島"]
+THEMES = [["グルメ"], ["自然", "温泉"], ["歴史", "文化"]]
+
+logger = logging.getLogger(__name__)
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
+# アプリを import するとルートロガーにもハンドラーが付くため、二重に出さない
+logger.propagate = False
+
+
+# ---- 計測結果 ----
+
+def _percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(math.ceil(len(sorted_values) * pct / 100)))
+    return sorted_values[rank - 1]
+
+
+class Recorder:
+    """エンドポイントごとの応答時間とステータス"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, List[float]] = {}
+        self._statuses: Dict[str, Dict[str, int]] = {}
+
+    def record(self, label: str, status: str, elapsed_ms: float) -> None:
+        with self._lock:
+            self._latencies.setdefault(label, []).append(elapsed_ms)
+            counts = self._statuses.setdefault(label, {})
+            counts[status] = counts.get(status, 0) + 1
+
+    def report(self, elapsed_sec: float) -> Dict[str, Any]:
+        with self._lock:
+            endpoints = {}
+            total = 0
+            for label, values in sorted(self._latencies.items()):
+                values = sorted(values)
+                statuses = self._statuses[label]
+                errors = sum(n for s, n in statuses.items() if not s.isdigit() or int(s) >= 400)
+                total += len(values)
+                endpoints[label] = {
+                    "count": len(values),
+                    "rps": round(len(values) / elapsed_sec, 2) if elapsed_sec else 0.0,
+                    "errors": errors,
+                    "statuses": dict(statuses),
+                    "p50_ms": round(_percentile(values, 50), 1),
+                    "p95_ms": round(_percentile(values, 95), 1),
+                    "p99_ms": round(_percentile(values, 99), 1),
+                    "max_ms": round(values[-1], 1),
+                }
+        return {
+            "duration_sec": round(elapsed_sec, 1),
+            "requests": total,
+            "rps": round(total / elapsed_sec, 2) if elapsed_sec else 0.0,
+            "endpoints": endpoints,
+        }
+
+
+# ---- 仮想ユーザー ----
+
+class VirtualUser:
+    def __init__(self, base_url: str, account: Dict[str, str], shared: Dict[str, Any],
+                 recorder: Recorder, seed: int, timeout: float) -> None:
+        self.base_url = base_url.rstrip("/")
+        self.account = account
+        self.shared = shared
+        self.recorder = recorder
+        self.rng = random.Random(seed)
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.plan_ids: List[str] = []
+
+    def call(self, label: str, method: str, path: str, headers: Optional[dict] = None, **kwargs):
+        """1リクエストを送り、label で記録する。失敗時は None"""
+        if headers is None:
+            headers = {"Authorization": f"Bearer {self.account['token']}"}
+        start = time.perf_counter()
+        try:
+            res = self.session.request(method, self.base_url + path, headers=headers, timeout=self.timeout, **kwargs)
+        except requests.RequestException as e:
+            self.recorder.record(label, type(e).__name__, (time.perf_counter() - start) * 1000)
+            return None
+        self.recorder.record(label, str(res.status_code), (time.perf_counter() - start) * 1000)
+        return res
+
+    # ---- シナリオ ----
+
+    def browse(self) -> None:
+        area = self.rng.choice(DESTINATIONS)
+        self.call("GET /api/spots", "GET", "/api/spots", params={"area": area, "limit": 50})
+        spot_ids = self.shared["spot_ids"]
+        if spot_ids:
+            self.call("GET /api/spots/{id}", "GET", f"/api/spots/{self.rng.choice(spot_ids)}")
+        self.call("GET /api/spots/area/{area}", "GET", f"/api/spots/area/{area}")
+
+    def _plan_request(self) -> dict:
+        # 選択スポットはプラン生成の候補に入るものから選ぶ（候補外はデータベース照合で 400 になる）
+        destination = self.rng.choice(DESTINATIONS)
+        themes = self.rng.choice(THEMES)
+        names = self.shared["pending_candidates"].get((destination, tuple(themes))) or []
+        pending = [{"name": n} for n in self.rng.sample(names, min(2, len(names)))]
+        return {
+            "destination": destination,
+            "days": self.rng.randint(1, 3),
+            "budget": "普通",
+            "themes": themes,
+            "pending_spots": pending,
+            "transportation": "電車",
+        }
+
+    def generate(self) -> None:
+        res = self.call("POST /api/plans/generate-plan", "POST", "/api/plans/generate-plan", json=self._plan_request())
+        if res is not None and res.status_code == 201:
+            self.plan_ids.append(res.json()["id"])
+
+    def agent(self) -> None:
+        self.call(
+            "POST /api/v1/ai/generate-plan", "POST", "/api/v1/ai/generate-plan",
+            headers={"X-API-Key": self.account["api_key"]}, json=self._plan_request(),
+        )
+
+    def edit(self) -> None:
+        if not self.plan_ids:
+            self.generate()
+            if not self.plan_ids:
+                return
+        plan_id = self.rng.choice(self.plan_ids)
+        res = self.call("GET /api/plans/{id}", "GET", f"/api/plans/{plan_id}")
+        if res is None or res.status_code != 200:
+            return
+        spots = res.json().get("spots") or []
+        for spot in spots:
+            if isinstance(spot.get("spot"), dict) and spot["spot"].get("category") != "Hotel":
+                spot["spot"]["durationMinutes"] = self.rng.choice([45, 60, 90, 120])
+                break
+        self.call("PUT /api/plans/{id}", "PUT", f"/api/plans/{plan_id}", json={"spots": spots})
+
+    def export(self) -> None:
+        if not self.plan_ids:
+            self.generate()
+            if not self.plan_ids:
+                return
+        self.call("GET /api/plans/{id}/export/ical", "GET", f"/api/plans/{self.rng.choice(self.plan_ids)}/export/ical")
+
+    def bulk_import(self) -> None:
+        self.call(
+            "POST /api/spots/bulk-add-by-prefecture", "POST", "/api/spots/bulk-add-by-prefecture",
+            headers={"Authorization": f"Bearer {self.shared['admin_token']}"},
+            json={"prefecture": "鹿児島県", "max_keywords": 1, "max_results_per_keyword": 2,
+                  "max_total_videos": 2, "run_async": False},
+        )
+
+    def run(self, mix: Dict[str, int], deadline: float, think_ms: float) -> None:
+        scenarios: Dict[str, Callable[[], None]] = {
+            "browse": self.browse, "generate": self.generate, "agent": self.agent,
+            "edit": self.edit, "export": self.export, "import": self.bulk_import,
+        }
+        names = [n for n, w in mix.items() if w > 0]
+        weights = [mix[n] for n in names]
+        while time.monotonic() < deadline:
+            scenarios[self.rng.choices(names, weights)[0]]()
+            if think_ms:
+                time.sleep(self.rng.uniform(0, think_ms * 2) / 1000)
+
+
+def parse_mix(raw: str) -> Dict[str, int]:
+    mix = {}
+    for part in raw.split(","):
+        name, sep, weight = part.partition("=")
+        if sep:
+            mix[name.strip()] = int(weight)
+    unknown = set(mix) - {"browse", "generate", "agent", "edit", "export", "import"}
+    if unknown:
+        raise ValueError(f"不明なシナリオ: {', '.join(sorted(unknown))}")
+    if not any(w > 0 for w in mix.values()):
+        raise ValueError("重みが正のシナリオがありません")
+    return mix
+
+
+# ---- 準備（DB に直接作成） ----
+
+def seed_spots_if_empty() -> int:
+    """spots が空なら data/spots.json を投入する（件数を返す）"""
+    from app.utils.database import SessionLocal
+    from app.models.spot import Spot
+
+    db = SessionLocal()
+    try:
+        if db.query(Spot.id).first() is not None:
+            return 0
+        with open(SEED_PATH, "r", encoding="utf-8") as f:
+            seed = json.load(f)
+        rows = []
+        for row in seed:
+            tags = row.get("tags")
+            if isinstance(tags, str):
+                try:
+                    tags = json.loads(tags)
+                except ValueError:
+                    tags = []
+            rows.append({
+                "id": row.get("id") or str(uuid.uuid4()),
+                "name": row["name"],
+                "description": row.get("description"),
+                "area": row.get("area"),
+                "category": row.get("category"),
+                "duration_minutes": row.get("duration_minutes") or 60,
+                "rating": row.get("rating"),
+                "image": row.get("image") or "",
+                "tags": tags or [],
+                "latitude": row.get("latitude"),
+                "longitude": row.get("longitude"),
+                "verification_status": "verified",
+                "source": "manual",
+            })
+        db.execute(Spot.__table__.insert(), rows)
+        db.commit()
+        return len(rows)
+    finally:
+        db.close()
+
+
+def prepare_accounts(count: int) -> Dict[str, Any]:
+    """無制限プランのユーザー・APIキーと管理者を作り、トークンを返す"""
+    from app.utils.database import SessionLocal
+    from app.models.spot import Spot
+    from app.models.subscription import Subscription
+    from app.models.user import User
+    from app.services.api_key_service import create_api_key
+    from app.services.spot_service import get_spots_for_plan
+    from app.utils.jwt_manager import generate_token
+
+    run_id = uuid.uuid4().hex[:8]
+    db = SessionLocal()
+    try:
+        accounts = []
+        for i in range(count):
+            user = User(username=f"loadtest_{run_id}_{i}", email=f"loadtest_{run_id}_{i}@example.com",
+                        hashed_password="!", name=f"負荷試験 {i}")
+            db.add(user)
+            db.flush()
+            db.add(Subscription(user_id=user.id, plan_name="premium"))
+            db.commit()
+            _, plain_key = create_api_key(
+                db, name=f"loadtest {run_id} {i}", user_id=user.id,
+                rate_limit_per_minute=100000, rate_limit_per_hour=1000000, rate_limit_per_day=10000000,
+                monthly_plan_limit=10000000,
+            )
+            accounts.append({
+                "token": generate_token(user.id, user.username, user.email),
+                "api_key": plain_key,
+            })
+        admin = User(username=f"loadtest_{run_id}_admin", email=f"loadtest_{run_id}_admin@example.com",
+                     hashed_password="!", name="負荷試験 管理者", role="admin")
+        db.add(admin)
+        db.commit()
+        spot_ids = [spot_id for (spot_id,) in db.query(Spot.id).filter(Spot.category != "Hotel").limit(2000)]
+        return {
+            "accounts": accounts,
+            "admin_token": generate_token(admin.id, admin.username, admin.email),
+            "spot_ids": spot_ids,
+            # アプリと同じ条件で候補を引いておく
+            "pending_candidates": {
+                (d, tuple(t)): [s.name for s in get_spots_for_plan(db, d, t, limit=100) if s.category != "Hotel"]
+                for d in DESTINATIONS for t in THEMES
+            },
+        }
+    finally:
+        db.close()
+
+
+# ---- サーバー起動（--spawn） ----
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _wait_healthy(base_url: str, proc: subprocess.Popen, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"uvicorn が終了しました（終了コード {proc.returncode}）")
+        try:
+            if requests.get(base_url + "/health", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.2)
+    raise TimeoutError(f"{timeout} 秒以内に /health が応答しませんでした")
+
+
+def _spawn_environment(work_dir: str, provider_url: str, gemini_faults: FaultConfig) -> Dict[str, str]:
+    env = {
+        "DATABASE_URL": os.environ.get("DATABASE_URL") or f"sqlite:///{os.path.join(work_dir, 'loadtest.db')}",
+        "GEMINI_API_KEY": "loadtest",
+        "GOOGLE_MAPS_API_KEY": "loadtest",
+        "YOUTUBE_API_KEY": "loadtest",
+        # ジオコーディングは本物の API に出ていくため使わない（座標は Places のスタンドインから付く）
+        "GEOCODE_PROVIDERS": "",
+        "OSRM_BASE_URL": provider_url,
+        "PLACES_API_BASE_URL": provider_url,
+        "YOUTUBE_API_BASE_URL": provider_url,
+        "DEBUG_LOG_ENABLED": "false",
+    }
+    env.update(gemini_faults.to_env("LOADTEST_GEMINI"))
+    return env
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="負荷試験のシナリオドライバー")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="対象サーバー（--spawn 時は無視）")
+    parser.add_argument("--spawn", action="store_true", help="スタンドインと uvicorn をこのプロセスから起動する")
+    parser.add_argument("--workers", type=int, default=4, help="--spawn 時の uvicorn ワーカー数")
+    parser.add_argument("--users", type=int, default=16, help="仮想ユーザー数（同時実行数）")
+    parser.add_argument("--duration", type=float, default=60.0, help="実行時間（秒）")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="シナリオの重み")
+    parser.add_argument("--think-ms", type=float, default=0.0, help="シナリオ間の平均待ち時間（ミリ秒）")
+    parser.add_argument("--timeout", type=float, default=120.0, help="1リクエストのタイムアウト（秒）")
+    parser.add_argument("--seed", type=int, default=1, help="乱数シード")
+    parser.add_argument("--output", help="結果 JSON の保存先")
+    add_fault_arguments(parser)
+    add_fault_arguments(parser, prefix="gemini-")
+    args = parser.parse_args()
+    mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory(prefix="satotrip-loadtest-") as work_dir:
+        provider_server = None
+        proc = None
+        base_url = args.base_url
+        try:
+            if args.spawn:
+                provider_server = make_server("127.0.0.1", 0, faults_from_args(args))
+                threading.Thread(target=provider_server.serve_forever, daemon=True).start()
+                provider_url = f"http://127.0.0.1:{provider_server.server_address[1]}"
+                env = _spawn_environment(work_dir, provider_url, faults_from_args(args, prefix="gemini-"))
+                os.environ.update(env)
+
+            sys.path.insert(0, BACKEND_DIR)
+            # 全モデルをテーブル作成前に登録するため、アプリごと import する
+            import app.main  # noqa: F401
+            from app.utils.database import init_db
+            init_db()
+            seeded = seed_spots_if_empty()
+            if seeded:
+                logger.info("data/spots.json から %d 件のスポットを投入しました", seeded)
+            shared = prepare_accounts(args.users)
+
+            if args.spawn:
+                port = _free_port()
+                base_url = f"http://127.0.0.1:{port}"
+                proc = subprocess.Popen(
+                    [sys.executable, "-m", "uvicorn", "loadtest.asgi:app", "--host", "127.0.0.1",
+                     "--port", str(port), "--workers", str(args.workers), "--log-level", "warning"],
+                    cwd=BACKEND_DIR, env=dict(os.environ),
+                )
+                _wait_healthy(base_url, proc, timeout=120)
+                logger.info("uvicorn（%d ワーカー）を起動しました: %s", args.workers, base_url)
+
+            recorder = Recorder()
+            users = [
+                VirtualUser(base_url, shared["accounts"][i], shared, recorder, args.seed * 1000 + i, args.timeout)
+                for i in range(args.users)
+            ]
+            logger.info("%d ユーザーで %.0f 秒実行します（%s）", args.users, args.duration, args.mix)
+            start = time.monotonic()
+            deadline = start + args.duration
+            threads = [threading.Thread(target=u.run, args=(mix, deadline, args.think_ms), daemon=True) for u in users]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            result = recorder.report(time.monotonic() - start)
+            result["config"] = {
+                "users": args.users, "workers": args.workers if args.spawn else None,
+                "mix": mix, "duration_sec": args.duration,
+            }
+            if provider_server is not None:
+                result["provider_requests"] = dict(provider_server.RequestHandlerClass.stats.counts)
+        finally:
+            if proc is not None:
+                proc.terminate()
+                try:
+                    proc.wait(timeout=15)
+                except subprocess.TimeoutExpired:
+                    proc.kill()
+            if provider_server is not None:
+                provider_server.shutdown()
+                provider_server.server_close()
+
+    logger.info("合計 %d リクエスト / %.1f 秒（%.2f req/s）", result["requests"], result["duration_sec"], result["rps"])
+    for label, stat in result["endpoints"].items():
+        logger.info(
+            "%-42s %6d件 %7.2f req/s  エラー %4d  p50 %8.1fms  p95 %8.1fms  p99 %8.1fms",
+            label, stat["count"], stat["rps"], stat["errors"], stat["p50_ms"], stat["p95_ms"], stat["p99_ms"],
+        )
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        logger.info("結果を保存しました: %s", args.output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
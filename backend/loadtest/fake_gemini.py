@@ -0,0 +1,136 @@
+"""
+google.generativeai の代わり（負荷試験用）
+
+プロンプトの種類を見分けて、アプリが解析できる JSON を返す:
+- プラン生成: プロンプトに載っている選択スポット・DB スポットの名前で日程を組む
+- スポットリサーチ: カテゴリ・説明・タグ・滞在時間
+- 動画 / SNS 要約: タイトル先頭の語を店舗名候補にした要約 JSON
+
+遅延・エラーは LOADTEST_GEMINI_* の環境変数（faults.py）で注入する。
+エラーは SDK と同じく例外（"429 Resource exhausted" など）で表す。
+"""
+import json
+import re
+import types
+from typing import Any, List
+
+from loadtest.faults import FaultConfig
+
+SPOTS_PER_DAY = 4
+
+_SPOT_SECTION_HEADERS = ("【選択されたスポット", "【データベース内の利用可能なスポット")
+_DAYS_RE = re.compile(r"(\d+)日間")
+_TITLE_RE = re.compile(r"^- タイトル: (.+)$", re.MULTILINE)
+
+
+def _spot_names(prompt: str) -> List[str]:
+    """プロンプトのスポット一覧（"- 名前 (エリア): ..."）から名前を取り出す"""
+    names: List[str] = []
+    in_section = False
+    for raw in prompt.splitlines():
+        line = raw.strip()
+        if line.startswith("【"):
+            in_section = line.startswith(_SPOT_SECTION_HEADERS)
+            continue
+        if not in_section or not line.startswith("- "):
+            continue
+        name = line[2:]
+        for sep in (" (", ": "):
+            name = name.split(sep, 1)[0]
+        name = name.strip()
+        if name and name not in names:
+            names.append(name)
+    return names
+
+
+def _plan_response(prompt: str) -> dict:
+    match = _DAYS_RE.search(prompt)
+    days = int(match.group(1)) if match else 1
+    names = _spot_names(prompt)[:days * SPOTS_PER_DAY]
+    spots = []
+    for i, name in enumerate(names):
+        spots.append({
+            "day": i // SPOTS_PER_DAY + 1,
+            "name": name,
+            "description": f"{name}を訪れます。",
+            "category": "Culture",
+            "durationMinutes": 60,
+            "transportMode": "train",
+            "transportDuration": 0,
+            "startTime": f"{9 + (i % SPOTS_PER_DAY) * 2:02d}:00",
+        })
+    return {"title": f"{days}日間の旅行プラン", "spots": spots}
+
+
+def _research_response(prompt: str) -> dict:
+    return {
+        "category": "Culture",
+        "description": "推定情報を含みます。地域で親しまれている観光スポットです。",
+        "duration_minutes": 60,
+        "tags": ["観光", "文化", "散策"],
+    }
+
+
+def _summary_response(prompt: str) -> dict:
+    match = _TITLE_RE.search(prompt)
+    title = match.group(1).strip() if match else "スポット"
+    place = title.split()[0]
+    return {
+        "theme": "観光",
+        "area": "鹿児島市",
+        "places": [place],
+        "items": [],
+        "recommend": f"{place}は気軽に立ち寄れるおすすめスポットです。",
+        "mood": "活気",
+    }
+
+
+def respond(prompt: str) -> str:
+    """プロンプトに応じた応答テキスト"""
+    if "旅行プランを作成" in prompt:
+        payload = _plan_response(prompt)
+    elif "タグ生成のルール" in prompt:
+        payload = _research_response(prompt)
+    else:
+        payload = _summary_response(prompt)
+    return json.dumps(payload, ensure_ascii=False)
+
+
+class FakeGenerativeModel:
+    def __init__(self, owner: "FakeGenAI", model_name: str = "") -> None:
+        self._owner = owner
+        self.model_name = model_name
+
+    def generate_content(self, prompt: Any, **kwargs):
+        status = self._owner.faults.apply()
+        if status == 429:
+            raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+        if status is not None:
+            raise RuntimeError(f"{status} Internal error encountered.")
+        text = respond(str(prompt))
+        # おおよその使用量（ガバナーの TPM 補正用）
+        usage = types.SimpleNamespace(total_token_count=len(str(prompt)) // 2 + len(text) // 2)
+        return types.SimpleNamespace(text=text, usage_metadata=usage, prompt_feedback=None)
+
+
+class FakeGenAI:
+    """google.generativeai モジュールの代わり（configure / GenerativeModel だけ）"""
+
+    def __init__(self, faults: FaultConfig) -> None:
+        self.faults = faults
+
+    def configure(self, **kwargs) -> None:
+        pass
+
+    def GenerativeModel(self, model_name: str = "", **kwargs) -> FakeGenerativeModel:  # noqa: N802 (SDK と同じ名前)
+        return FakeGenerativeModel(self, model_name)
+
+
+def install(faults: FaultConfig) -> FakeGenAI:
+    """アプリの Gemini 呼び出し箇所をフェイクに差し替える"""
+    from app.services import gemini_service, sns_collection_service, youtube_collection_service
+
+    fake = FakeGenAI(faults)
+    for module in (gemini_service, youtube_collection_service, sns_collection_service):
+        module.genai = fake
+    return fake
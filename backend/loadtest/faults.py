@@ -0,0 +1,77 @@
+"""
+スタンドイン共通の遅延・エラー注入
+
+環境変数（prefix は LOADTEST_HTTP / LOADTEST_GEMINI など）:
+    {prefix}_LATENCY_MS   基本の応答時間
+    {prefix}_JITTER_MS    応答時間に加える 0〜N ミリ秒の揺らぎ
+    {prefix}_ERROR_RATE   エラーを返す割合（0〜1）
+    {prefix}_ERROR_STATUS エラー時の HTTP ステータス（既定 503）
+    {prefix}_HANG_RATE    応答しない（HANG_SEC 待ってから返す）割合。タイムアウトの再現用
+    {prefix}_HANG_SEC     無応答とみなす待ち時間（既定 30 秒）
+"""
+import os
+import random
+import time
+from typing import Optional
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        return default
+
+
+class FaultConfig:
+    """遅延・エラー・無応答の注入設定"""
+
+    def __init__(
+        self,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        hang_rate: float = 0.0,
+        hang_sec: float = 30.0,
+        seed: Optional[int] = None,
+    ) -> None:
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.hang_rate = hang_rate
+        self.hang_sec = hang_sec
+        self._rng = random.Random(seed)
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "FaultConfig":
+        return cls(
+            latency_ms=_env_float(f"{prefix}_LATENCY_MS", 0.0),
+            jitter_ms=_env_float(f"{prefix}_JITTER_MS", 0.0),
+            error_rate=_env_float(f"{prefix}_ERROR_RATE", 0.0),
+            error_status=int(_env_float(f"{prefix}_ERROR_STATUS", 503)),
+            hang_rate=_env_float(f"{prefix}_HANG_RATE", 0.0),
+            hang_sec=_env_float(f"{prefix}_HANG_SEC", 30.0),
+        )
+
+    def to_env(self, prefix: str) -> dict:
+        """子プロセス（uvicorn ワーカー）へ渡す環境変数"""
+        return {
+            f"{prefix}_LATENCY_MS": str(self.latency_ms),
+            f"{prefix}_JITTER_MS": str(self.jitter_ms),
+            f"{prefix}_ERROR_RATE": str(self.error_rate),
+            f"{prefix}_ERROR_STATUS": str(self.error_status),
+            f"{prefix}_HANG_RATE": str(self.hang_rate),
+            f"{prefix}_HANG_SEC": str(self.hang_sec),
+        }
+
+    def apply(self) -> Optional[int]:
+        """遅延を入れ、エラーにすべきならそのステータスを返す（正常なら None）"""
+        if self.hang_rate and self._rng.random() < self.hang_rate:
+            time.sleep(self.hang_sec)
+        delay = self.latency_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+        if self.error_rate and self._rng.random() < self.error_rate:
+            return self.error_status
+        return None
@@ -0,0 +1,313 @@
+"""
+外部 API のローカルスタンドイン（OSRM / Places API (New) / YouTube Data API）
+
+アプリが解析するフィールドだけを決定的に返す。座標はクエリ文字列のハッシュから
+九州付近に散らし、所要時間は直線距離から求める。
+
+起動:
+    python -m loadtest.providers --port 9100 --latency-ms 80 --jitter-ms 40 --error-rate 0.01
+
+アプリ側は次の設定でこのサーバーへ向ける:
+    OSRM_BASE_URL=http://127.0.0.1:9100
+    PLACES_API_BASE_URL=http://127.0.0.1:9100
+    YOUTUBE_API_BASE_URL=http://127.0.0.1:9100
+"""
+import argparse
+import hashlib
+import json
+import logging
+import math
+import struct
+import sys
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from loadtest.faults import FaultConfig
+
+logger = logging.getLogger(__name__)
+
+
+def _tiny_png() -> bytes:
+    """1x1 の PNG（写真プロキシの応答用。標準ライブラリだけで作る）"""
+    def chunk(kind: bytes, data: bytes) -> bytes:
+        return struct.pack(">I", len(data)) + kind + data + struct.pack(">I", zlib.crc32(kind + data))
+    header = struct.pack(">IIBBBBB", 1, 1, 8, 2, 0, 0, 0)
+    pixels = zlib.compress(b"\x00\x80\xa0\xc0")
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", pixels) + chunk(b"IEND", b"")
+
+
+_TINY_PNG = _tiny_png()
+
+
+def _haversine_m(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """(lng, lat) 2点間の距離（メートル）"""
+    lng1, lat1, lng2, lat2 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371000 * math.asin(math.sqrt(h))
+
+
+def _point_for(text: str) -> Tuple[float, float]:
+    """文字列から決定的な (lat, lng) を作る（九州付近）"""
+    digest = hashlib.md5(text.encode("utf-8")).digest()
+    lat = 31.0 + digest[0] / 255 * 3.0
+    lng = 129.8 + digest[1] / 255 * 2.0
+    return round(lat, 6), round(lng, 6)
+
+
+def _place_id_for(text: str) -> str:
+    return "loadtest" + hashlib.md5(text.encode("utf-8")).hexdigest()[:20]
+
+
+def _parse_coords(path_tail: str) -> List[Tuple[float, float]]:
+    coords = []
+    for part in path_tail.split(";"):
+        lng, lat = part.split(",")[:2]
+        coords.append((float(lng), float(lat)))
+    return coords
+
+
+class ProviderStats:
+    """エンドポイントごとの受信数と、検索で返した place_id -> 名前（詳細で同じ名前を返すため）"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+        self.place_names: Dict[str, str] = {}
+
+    def record(self, name: str) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "SatoTripLoadtest/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # ThreadingHTTPServer から設定される
+    faults: FaultConfig = FaultConfig()
+    stats: ProviderStats = ProviderStats()
+    # 直線距離を約 30km/h で移動する想定
+    speed_mps: float = 8.0
+
+    def log_message(self, format, *args):  # noqa: A002 (BaseHTTPRequestHandler と同じ引数名)
+        logger.debug(format, *args)
+
+    # ---- 応答 ----
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_bytes(self, status: int, body: bytes, content_type: str) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        try:
+            return json.loads(self.rfile.read(length))
+        except ValueError:
+            return {}
+
+    def _dispatch(self, method: str) -> None:
+        url = urlsplit(self.path)
+        path = unquote(url.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        body = self._read_json() if method == "POST" else {}
+
+        route = self._route(method, path)
+        if route is None:
+            self._send_json(404, {"error": {"message": f"not found: {path}"}})
+            return
+        name, handler = route
+        self.stats.record(name)
+        status = self.faults.apply()
+        if status is not None:
+            self._send_json(status, {"error": {"code": status, "message": "injected error"}})
+            return
+        handler(path, query, body)
+
+    def _route(self, method: str, path: str):
+        if method == "GET" and path.startswith("/route/v1/"):
+            return "osrm.route", self._osrm_route
+        if method == "GET" and path.startswith("/table/v1/"):
+            return "osrm.table", self._osrm_table
+        if method == "POST" and path == "/v1/places:searchText":
+            return "places.search_text", self._places_search
+        if method == "GET" and path.startswith("/v1/places/") and path.endswith("/media"):
+            return "places.photo", self._places_photo
+        if method == "GET" and path.startswith("/v1/places/"):
+            return "places.details", self._places_details
+        if method == "GET" and path == "/youtube/v3/search":
+            return "youtube.search", self._youtube_search
+        if method == "GET" and path == "/stats":
+            return "stats", self._stats
+        return None
+
+    def do_GET(self):  # noqa: N802
+        self._dispatch("GET")
+
+    def do_POST(self):  # noqa: N802
+        self._dispatch("POST")
+
+    # ---- OSRM ----
+
+    def _osrm_route(self, path: str, query: dict, body: dict) -> None:
+        coords = _parse_coords(path.rsplit("/", 1)[-1])
+        legs = []
+        for a, b in zip(coords, coords[1:]):
+            meters = _haversine_m(a, b)
+            legs.append({"distance": meters, "duration": meters / self.speed_mps})
+        self._send_json(200, {
+            "code": "Ok",
+            "routes": [{
+                "geometry": {"type": "LineString", "coordinates": [list(c) for c in coords]},
+                "legs": legs,
+                "distance": sum(leg["distance"] for leg in legs),
+                "duration": sum(leg["duration"] for leg in legs),
+            }],
+        })
+
+    def _osrm_table(self, path: str, query: dict, body: dict) -> None:
+        coords = _parse_coords(path.rsplit("/", 1)[-1])
+        sources = [int(i) for i in query["sources"].split(";")] if query.get("sources") else range(len(coords))
+        destinations = (
+            [int(i) for i in query["destinations"].split(";")] if query.get("destinations") else range(len(coords))
+        )
+        distances = [[_haversine_m(coords[s], coords[d]) for d in destinations] for s in sources]
+        self._send_json(200, {
+            "code": "Ok",
+            "durations": [[m / self.speed_mps for m in row] for row in distances],
+            "distances": distances,
+        })
+
+    # ---- Places ----
+
+    def _place(self, name: str, place_id: Optional[str] = None, details: bool = False) -> dict:
+        place_id = place_id or _place_id_for(name)
+        lat, lng = _point_for(place_id)
+        place = {
+            "id": place_id,
+            "displayName": {"text": name, "languageCode": "ja"},
+            "formattedAddress": f"日本、〒890-0000 鹿児島県鹿児島市 {name}",
+            "shortFormattedAddress": f"鹿児島市 {name}",
+            "location": {"latitude": lat, "longitude": lng},
+            "types": ["tourist_attraction", "point_of_interest"],
+            "primaryType": "tourist_attraction",
+            "businessStatus": "OPERATIONAL",
+        }
+        if details:
+            place.update({
+                "rating": 4.2,
+                "userRatingCount": 120,
+                "nationalPhoneNumber": "099-000-0000",
+                "websiteUri": "https://example.com/",
+                "regularOpeningHours": {
+                    "periods": [
+                        {"open": {"day": d, "hour": 9, "minute": 0}, "close": {"day": d, "hour": 18, "minute": 0}}
+                        for d in range(7)
+                    ],
+                    "weekdayDescriptions": ["9時00分～18時00分"] * 7,
+                },
+                "photos": [{"name": f"places/{place_id}/photos/loadtestphoto0", "widthPx": 800, "heightPx": 600}],
+            })
+        return place
+
+    def _places_search(self, path: str, query: dict, body: dict) -> None:
+        text = (body.get("textQuery") or "").strip()
+        if not text:
+            self._send_json(400, {"error": {"code": 400, "message": "textQuery is required"}})
+            return
+        # 先頭の語を店名として返す（都道府県などの補足語は付けない）
+        name = text.split()[0]
+        place = self._place(name)
+        self.stats.place_names[place["id"]] = name
+        self._send_json(200, {"places": [place]})
+
+    def _places_details(self, path: str, query: dict, body: dict) -> None:
+        place_id = path[len("/v1/places/"):]
+        name = self.stats.place_names.get(place_id, f"スポット{place_id[-6:]}")
+        self._send_json(200, self._place(name, place_id=place_id, details=True))
+
+    def _places_photo(self, path: str, query: dict, body: dict) -> None:
+        self._send_bytes(200, _TINY_PNG, "image/png")
+
+    # ---- YouTube ----
+
+    def _youtube_search(self, path: str, query: dict, body: dict) -> None:
+        keyword = query.get("q", "")
+        count = min(int(query.get("maxResults", 5) or 5), 50)
+        items = []
+        for i in range(count):
+            video_id = hashlib.md5(f"{keyword}:{i}".encode("utf-8")).hexdigest()[:11]
+            items.append({
+                "id": {"kind": "youtube#video", "videoId": video_id},
+                "snippet": {"title": f"{keyword} おすすめスポット {i + 1}", "channelTitle": "loadtest"},
+            })
+        self._send_json(200, {"items": items})
+
+    def _stats(self, path: str, query: dict, body: dict) -> None:
+        self._send_json(200, {"requests": dict(self.stats.counts)})
+
+
+def make_server(host: str, port: int, faults: FaultConfig, stats: Optional[ProviderStats] = None) -> ThreadingHTTPServer:
+    """スタンドインの HTTP サーバーを作る（serve_forever は呼び出し側で）"""
+    handler = type("ProviderHandler", (_Handler,), {"faults": faults, "stats": stats or ProviderStats()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser, prefix: str = "") -> None:
+    """遅延・エラー注入の引数を追加する（driver と共通）"""
+    parser.add_argument(f"--{prefix}latency-ms", type=float, default=0.0, help="基本の応答時間（ミリ秒）")
+    parser.add_argument(f"--{prefix}jitter-ms", type=float, default=0.0, help="応答時間の揺らぎ（ミリ秒）")
+    parser.add_argument(f"--{prefix}error-rate", type=float, default=0.0, help="エラーを返す割合（0〜1）")
+    parser.add_argument(f"--{prefix}error-status", type=int, default=503, help="エラー時のステータス")
+    parser.add_argument(f"--{prefix}hang-rate", type=float, default=0.0, help="無応答にする割合（0〜1）")
+
+
+def faults_from_args(args: argparse.Namespace, prefix: str = "") -> FaultConfig:
+    key = prefix.replace("-", "_")
+    return FaultConfig(
+        latency_ms=getattr(args, f"{key}latency_ms"),
+        jitter_ms=getattr(args, f"{key}jitter_ms"),
+        error_rate=getattr(args, f"{key}error_rate"),
+        error_status=getattr(args, f"{key}error_status"),
+        hang_rate=getattr(args, f"{key}hang_rate"),
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="外部 API のローカルスタンドイン")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s", stream=sys.stdout)
+    server = make_server(args.host, args.port, faults_from_args(args))
+    logger.info("スタンドインを起動しました: http://%s:%d", args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,448 @@
+"""
+プラン生成のホットパスのオフラインベンチマーク
+
+外部サービスには一切つながない:
+- DB: 一時ディレクトリの SQLite。data/spots.json を元に指定件数（既定 1k / 10k / 100k）の
+  合成スポットを投入する（名前に連番を付け、座標を少しずらし、都道府県を振り分ける）
+- Gemini: DB のスポット名から決定的なプランを返すフェイク（--gemini-latency-ms で待ち時間を再現）
+- OSRM / Google Directions / Places: HTTP を送らず、直線距離から所要時間を返すフェイク
+  （--http-latency-ms で待ち時間を再現）
+
+計測対象:
+    get_spots_for_plan / filter_pending_spots_by_database / convert_generated_spots_to_plan_spots /
+    recalculate_spot_times / generate_ai_plan（キャッシュなし、ハンドラ全体）/ update_plan_endpoint
+
+使い方:
+    python scripts/benchmark_plan_generation.py                                  # 計測して表示
+    python scripts/benchmark_plan_generation.py --sizes 1000,10000 --runs 10
+    python scripts/benchmark_plan_generation.py --save benchmarks/plan_baseline.json
+    python scripts/benchmark_plan_generation.py --baseline benchmarks/plan_baseline.json  # 退行チェック
+"""
+import argparse
+import asyncio
+import copy
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import types
+import uuid
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_PATH = os.path.join(os.path.dirname(BACKEND_DIR), "data", "spots.json")
+
+# 合成スポットを振り分ける都道府県（元データは鹿児島県のみ）
+PREFECTURES = ["鹿児島県", "宮崎県", "熊本県", "福岡県", "長崎県", "大分県", "佐賀県", "沖縄県"]
+
+DESTINATION = "鹿児島"
+THEMES = ["グルメ", "自然"]
+PLAN_DAYS = 3
+SPOTS_PER_DAY = 4
+PENDING_COUNT = 5
+
+logger = logging.getLogger(__name__)
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
+# アプリを import するとルートロガーにもハンドラーが付くため、二重に出さない
+logger.propagate = False
+
+
+def _prepare_environment(work_dir: str) -> None:
+    """app を import する前に、一時 DB と外部サービスなしの設定にする"""
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(work_dir, 'benchmark.db')}"
+    os.environ["DATABASE_READ_REPLICA_URL"] = ""
+    os.environ["REDIS_URL"] = ""
+    os.environ["GEMINI_API_KEY"] = "benchmark"
+    os.environ["GOOGLE_MAPS_API_KEY"] = ""
+    os.environ["DEBUG_LOG_ENABLED"] = "false"
+    os.environ["ENVIRONMENT"] = "development"
+    sys.path.insert(0, BACKEND_DIR)
+
+
+# ---- フェイク ----
+
+def _haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * 6371 * math.asin(math.sqrt(a))
+
+
+class FakeResponse:
+    def __init__(self, status_code: int, payload: dict) -> None:
+        self.status_code = status_code
+        self._payload = payload
+        self.text = json.dumps(payload)
+        self.content = self.text.encode()
+        self.headers = {"Content-Type": "application/json"}
+
+    def json(self) -> dict:
+        return self._payload
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+class FakeHttp:
+    """OSRM / Google Directions / Places の代わりに決定的な応答を返す"""
+
+    def __init__(self, latency_ms: float) -> None:
+        self.latency_ms = latency_ms
+        self.calls = 0
+
+    def request(self, method: str, url: str, params=None, **kwargs) -> FakeResponse:
+        self.calls += 1
+        if self.latency_ms:
+            time.sleep(self.latency_ms / 1000)
+        if "router.project-osrm.org" in url:
+            coords = [tuple(map(float, c.split(","))) for c in url.rsplit("/", 1)[-1].split(";")]
+            meters = sum(
+                _haversine_km(a[1], a[0], b[1], b[0]) * 1000 for a, b in zip(coords, coords[1:])
+            )
+            seconds = meters / 8.0  # 約 30km/h
+            return FakeResponse(200, {
+                "code": "Ok",
+                "routes": [{
+                    "geometry": {"coordinates": [list(c) for c in coords]},
+                    "legs": [{"distance": meters, "duration": seconds}],
+                }],
+            })
+        if "places.googleapis.com" in url:
+            return FakeResponse(200, {"places": []})
+        return FakeResponse(404, {})
+
+
+class FakeGenerativeModel:
+    def __init__(self, owner: "FakeGenAI") -> None:
+        self._owner = owner
+
+    def generate_content(self, prompt, **kwargs):
+        if self._owner.latency_ms:
+            time.sleep(self._owner.latency_ms / 1000)
+        return types.SimpleNamespace(text=json.dumps(self._owner.plan, ensure_ascii=False), usage_metadata=None)
+
+
+class FakeGenAI:
+    """google.generativeai の代わり。与えたスポット名で決定的なプランを返す"""
+
+    def __init__(self, latency_ms: float) -> None:
+        self.latency_ms = latency_ms
+        self.plan: dict = {}
+
+    def configure(self, **kwargs) -> None:
+        pass
+
+    def GenerativeModel(self, *args, **kwargs) -> FakeGenerativeModel:  # noqa: N802 (SDK と同じ名前)
+        return FakeGenerativeModel(self)
+
+    def set_spot_names(self, names) -> None:
+        spots = []
+        for i, name in enumerate(names):
+            spots.append({
+                "day": i // SPOTS_PER_DAY + 1,
+                "name": name,
+                "description": "",
+                "category": "Culture",
+                "durationMinutes": 60,
+                "transportMode": "train",
+                "transportDuration": 0,
+                "startTime": f"{9 + (i % SPOTS_PER_DAY) * 2:02d}:00",
+            })
+        self.plan = {"title": f"{DESTINATION}の{PLAN_DAYS}日間旅行", "area": DESTINATION, "spots": spots}
+
+
+# ---- データ投入 ----
+
+def _load_seed() -> list:
+    with open(SEED_PATH, "r", encoding="utf-8") as f:
+        seed = json.load(f)
+    for row in seed:
+        tags = row.get("tags")
+        if isinstance(tags, str):
+            try:
+                row["tags"] = json.loads(tags)
+            except ValueError:
+                row["tags"] = []
+    return seed
+
+
+def synthesize_spots(seed: list, size: int) -> list:
+    """seed を元に size 件のスポット行を作る（同じ size なら毎回同じ内容）"""
+    rng = random.Random(size)
+    rows = []
+    for i in range(size):
+        base = seed[i % len(seed)]
+        generation = i // len(seed)
+        area = base.get("area") or "鹿児島県"
+        name = base["name"]
+        if generation:
+            name = f"{name} {generation}号"
+            # 元の都道府県に残すのは一部だけ（カタログが全国に広がった状態を再現）
+            prefecture = PREFECTURES[generation % len(PREFECTURES)]
+            area = area.replace("鹿児島県", prefecture, 1)
+        lat = base.get("latitude")
+        lng = base.get("longitude")
+        rows.append({
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "name": name,
+            "description": base.get("description"),
+            "area": area,
+            "category": base.get("category"),
+            "duration_minutes": base.get("duration_minutes") or 60,
+            "rating": base.get("rating"),
+            "image": base.get("image") or "",
+            "tags": base.get("tags") or [],
+            "latitude": lat + rng.uniform(-0.02, 0.02) if lat else None,
+            "longitude": lng + rng.uniform(-0.02, 0.02) if lng else None,
+            "verification_status": "verified",
+            "source": "manual",
+        })
+    return rows
+
+
+def seed_catalog(rows: list) -> None:
+    """spots を入れ替えてカタログ世代を進める"""
+    from app.utils.database import SessionLocal
+    from app.models.spot import Spot
+    from app.models.plan_cache import PlanCache
+
+    db = SessionLocal()
+    try:
+        db.query(PlanCache).delete()
+        db.query(Spot).delete()
+        for i in range(0, len(rows), 2000):
+            db.execute(Spot.__table__.insert(), rows[i:i + 2000])
+        db.commit()
+    finally:
+        db.close()
+    from app.utils.response_cache import bump_catalog_version
+    bump_catalog_version()
+
+
+def _create_user():
+    from app.utils.database import SessionLocal
+    from app.models.user import User
+    from app.models.subscription import Subscription
+
+    db = SessionLocal()
+    try:
+        user = User(
+            username=f"bench_{uuid.uuid4().hex[:8]}",
+            email=f"bench_{uuid.uuid4().hex[:8]}@example.com",
+            hashed_password="x",
+            name="benchmark",
+        )
+        db.add(user)
+        db.flush()
+        # 生成回数の上限に当たらないよう無制限プランにする
+        db.add(Subscription(user_id=user.id, plan_name="premium"))
+        db.commit()
+        return user.id
+    finally:
+        db.close()
+
+
+# ---- 計測 ----
+
+def _measure(func, runs: int, setup=None) -> dict:
+    """1回のウォームアップの後、runs 回計測する（setup は計測に含めない）"""
+    samples = []
+    for i in range(runs + 1):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        if i:
+            samples.append(elapsed)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(math.ceil(len(samples) * 0.95)) - 1)]
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(p95, 3),
+        "min_ms": round(samples[0], 3),
+    }
+
+
+def run_size(size: int, seed: list, runs: int, fake_genai: FakeGenAI, user_id: str) -> dict:
+    from app.api import plans
+    from app.models.plan_cache import PlanCache
+    from app.models.user import User
+    from app.schemas.plan import PlanGenerateRequest, PlanUpdate
+    from app.services.spot_service import get_spots_for_plan
+    from app.utils import route_service
+    from app.utils.database import SessionLocal
+    from app.utils.time_calculator import recalculate_spot_times
+
+    started = time.perf_counter()
+    seed_catalog(synthesize_spots(seed, size))
+    logger.info("%d 件を投入しました（%.1f秒）", size, time.perf_counter() - started)
+
+    db = SessionLocal()
+    try:
+        user = db.query(User).filter(User.id == user_id).one()
+        db_spots = get_spots_for_plan(db=db, area=DESTINATION, themes=THEMES, limit=100)
+        candidates = [s for s in db_spots if s.category != "Hotel"]
+        names = [s.name for s in candidates[:PLAN_DAYS * SPOTS_PER_DAY]]
+        fake_genai.set_spot_names(names)
+        pending = [{"name": name} for name in names[:PENDING_COUNT]]
+        generated_spots = fake_genai.plan["spots"]
+
+        request = PlanGenerateRequest(
+            destination=DESTINATION,
+            days=PLAN_DAYS,
+            budget="普通",
+            themes=THEMES,
+            pending_spots=pending,
+            transportation="電車",
+        )
+        plan_spots, _ = plans.convert_generated_spots_to_plan_spots(
+            generated_spots=generated_spots, db_spots=db_spots, request=request, generated_plan=fake_genai.plan,
+        )
+
+        def _clear_route_cache():
+            route_service._route_cache.clear()
+
+        def _clear_caches():
+            db.query(PlanCache).delete()
+            db.commit()
+            _clear_route_cache()
+
+        results = {
+            "get_spots_for_plan": _measure(
+                lambda: get_spots_for_plan(db=db, area=DESTINATION, themes=THEMES, limit=100), runs,
+            ),
+            "filter_pending_spots_by_database": _measure(
+                lambda: plans.filter_pending_spots_by_database(pending_spots=pending, db_spots=db_spots), runs,
+            ),
+            "convert_generated_spots_to_plan_spots": _measure(
+                lambda: plans.convert_generated_spots_to_plan_spots(
+                    generated_spots=generated_spots, db_spots=db_spots,
+                    request=request, generated_plan=fake_genai.plan,
+                ),
+                runs,
+            ),
+            "recalculate_spot_times": _measure(
+                lambda: recalculate_spot_times(copy.deepcopy(plan_spots), "09:00", "18:00", "電車"),
+                runs, setup=_clear_route_cache,
+            ),
+            "generate_ai_plan": _measure(
+                lambda: asyncio.run(plans.generate_ai_plan(
+                    request=request.model_copy(deep=True), current_user=user, db=db,
+                )),
+                runs, setup=_clear_caches,
+            ),
+        }
+
+        plan = asyncio.run(plans.generate_ai_plan(request=request.model_copy(deep=True), current_user=user, db=db))
+        # PLAN_FAST_JSON_ENABLED のときはレスポンス（JSON のバイト列）が返る
+        plan = json.loads(plan.body) if hasattr(plan, "body") else {"id": plan.id, "spots": plan.spots}
+        edited = copy.deepcopy(plan["spots"])
+        if edited and isinstance(edited[0].get("spot"), dict):
+            edited[0]["spot"]["durationMinutes"] = 90
+        results["update_plan_endpoint"] = _measure(
+            lambda: asyncio.run(plans.update_plan_endpoint(
+                plan_id=plan["id"], plan_data=PlanUpdate(spots=copy.deepcopy(edited)), current_user=user, db=db,
+            )),
+            runs, setup=_clear_route_cache,
+        )
+        return results
+    finally:
+        db.close()
+
+
+def compare(result: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list:
+    """ベースラインに対する退行の一覧（空なら問題なし）"""
+    problems = []
+    for size, benches in result.get("results", {}).items():
+        base_benches = baseline.get("results", {}).get(size, {})
+        for name, stat in benches.items():
+            base = base_benches.get(name)
+            if not base:
+                continue
+            limit = base["median_ms"] * (1 + tolerance)
+            if stat["median_ms"] > limit and stat["median_ms"] - base["median_ms"] > min_delta_ms:
+                problems.append(
+                    f"{name}@{size}: {stat['median_ms']}ms（基準 {base['median_ms']}ms、許容 {limit:.1f}ms）"
+                )
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="プラン生成のオフラインベンチマーク")
+    parser.add_argument("--sizes", default="1000,10000,100000", help="カタログ件数（カンマ区切り）")
+    parser.add_argument("--runs", type=int, default=5, help="各計測の回数（ウォームアップ1回を除く）")
+    parser.add_argument("--gemini-latency-ms", type=float, default=0.0, help="フェイク Gemini の応答時間")
+    parser.add_argument("--http-latency-ms", type=float, default=0.0, help="フェイク OSRM / Places の応答時間")
+    parser.add_argument("--save", help="結果をベースラインとして保存するパス")
+    parser.add_argument("--baseline", help="比較するベースライン JSON のパス")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="許容する悪化率（0.25 = 25%%）")
+    parser.add_argument("--min-delta-ms", type=float, default=1.0, help="これ未満の悪化は誤差として無視する")
+    args = parser.parse_args()
+    sizes = [int(s) for s in args.sizes.split(",") if s.strip()]
+
+    with tempfile.TemporaryDirectory(prefix="satotrip-bench-") as work_dir:
+        _prepare_environment(work_dir)
+        # ログ出力を抑える（計測のノイズになるため）
+        logging.getLogger("app").setLevel(logging.WARNING)
+
+        # 全モデルをテーブル作成前に登録するため、アプリごと import する
+        import app.main  # noqa: F401
+        from app.utils.database import init_db
+        from app.utils import resilience
+        from app.services import gemini_service
+        from app.api import plans
+
+        init_db()
+        fake_http = FakeHttp(args.http_latency_ms)
+        resilience.requests = types.SimpleNamespace(
+            request=fake_http.request, RequestException=resilience.requests.RequestException,
+        )
+        fake_genai = FakeGenAI(args.gemini_latency_ms)
+        gemini_service.genai = fake_genai
+        # レート制限は計測対象外（同じユーザーで繰り返し生成するため）
+        plans.rate_limiter.check_limit = lambda *a, **k: (True, None)
+        user_id = _create_user()
+
+        seed = _load_seed()
+        result = {
+            "python": sys.version.split()[0],
+            "runs": args.runs,
+            "gemini_latency_ms": args.gemini_latency_ms,
+            "http_latency_ms": args.http_latency_ms,
+            "results": {},
+        }
+        for size in sizes:
+            result["results"][str(size)] = run_size(size, seed, args.runs, fake_genai, user_id)
+            for name, stat in result["results"][str(size)].items():
+                logger.info("%7d件 %-40s 中央値 %9.2fms  p95 %9.2fms", size, name, stat["median_ms"], stat["p95_ms"])
+        result["fake_http_calls"] = fake_http.calls
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        logger.info("ベースラインを保存しました: %s", args.save)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        for problem in problems:
+            logger.error("退行: %s", problem)
+        if problems:
+            return 1
+        logger.info("ベースラインとの比較: 問題なし")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
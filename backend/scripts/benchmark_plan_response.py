@@ -0,0 +1,226 @@
+"""
+プランレスポンスの JSON 化のベンチマーク（1日 / 3日 / 7日のプラン）
+
+data/spots.json のスポットを埋め込んだ保存済みプラン相当のオブジェクトを作り、
+次の3通りでレスポンス本文を作る時間とピークメモリ（tracemalloc）を比べる。DB・外部サービスは使わない。
+
+- pydantic+json: PlanResponse で検証 → model_dump(mode="json") → 標準 json（FastAPI の従来の経路）
+- pydantic: PlanResponse で検証 → model_dump_json（response_model の最速経路）
+- fast: plan_response_content → FastJSONResponse（PLAN_FAST_JSON_ENABLED の経路。orjson があれば orjson）
+
+詳細（1件）と一覧（--list-size 件）を計測し、出力が同じ JSON になることも確認する。
+
+使い方:
+    python scripts/benchmark_plan_response.py
+    python scripts/benchmark_plan_response.py --days 1,3,7 --runs 50 --list-size 20
+    python scripts/benchmark_plan_response.py --save benchmarks/plan_response_baseline.json
+    python scripts/benchmark_plan_response.py --baseline benchmarks/plan_response_baseline.json  # 退行チェック
+"""
+import argparse
+import copy
+import json
+import logging
+import math
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+import types
+import uuid
+from datetime import datetime, timedelta, timezone
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SEED_PATH = os.path.join(os.path.dirname(BACKEND_DIR), "data", "spots.json")
+sys.path.append(BACKEND_DIR)
+
+SPOTS_PER_DAY = 6
+
+logger = logging.getLogger(__name__)
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
+
+
+def _load_seed() -> list:
+    with open(SEED_PATH, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data if isinstance(data, list) else data.get("spots", [])
+
+
+def build_plan(seed: list, days: int, offset: int = 0) -> types.SimpleNamespace:
+    """保存済みプラン（ORM の Plan）と同じ属性を持つオブジェクトを作る"""
+    spots = []
+    for day in range(1, days + 1):
+        minutes = 9 * 60
+        for order in range(SPOTS_PER_DAY):
+            source = copy.deepcopy(seed[(offset + len(spots)) % len(seed)])
+            source.setdefault("id", str(uuid.uuid4()))
+            duration = source.get("durationMinutes") or 60
+            spots.append({
+                "id": str(uuid.uuid4()),
+                "spotId": source["id"],
+                "day": day,
+                "startTime": f"{minutes // 60:02d}:{minutes % 60:02d}",
+                "durationMinutes": duration,
+                "transportMode": "train",
+                "transportDuration": 20,
+                "note": f"{source.get('name', '')}を見学",
+                "isMustVisit": order == 0,
+                "spot": source,
+            })
+            minutes += duration + 20
+    created = datetime(2026, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=offset)
+    return types.SimpleNamespace(
+        id=str(uuid.uuid4()),
+        user_id=str(uuid.uuid4()),
+        title=f"{days}日間の旅行プラン",
+        area="鹿児島県",
+        days=days,
+        people=2,
+        budget=100000.0,
+        thumbnail=spots[0]["spot"].get("image") if spots else None,
+        spots=spots,
+        grounding_urls=["https://example.com/a", "https://example.com/b"],
+        is_favorite=False,
+        folder_id=None,
+        check_in_date="2026-05-01",
+        check_out_date=None,
+        created_at=created,
+        updated_at=created + timedelta(hours=1),
+    )
+
+
+def _measure(func, runs: int) -> dict:
+    """1回のウォームアップの後 runs 回計測し、最後にピークメモリを1回測る"""
+    samples = []
+    for i in range(runs + 1):
+        start = time.perf_counter()
+        func()
+        elapsed = (time.perf_counter() - start) * 1000
+        if i:
+            samples.append(elapsed)
+    samples.sort()
+    p95 = samples[min(len(samples) - 1, int(math.ceil(len(samples) * 0.95)) - 1)]
+    tracemalloc.start()
+    body = func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(p95, 3),
+        "min_ms": round(samples[0], 3),
+        "peak_kb": round(peak / 1024, 1),
+        "body_kb": round(len(body) / 1024, 1),
+    }
+
+
+def _serializers(many: bool):
+    from pydantic import TypeAdapter
+    from typing import List
+    from app.schemas.plan import PlanResponse, plan_response_content
+    from app.utils.fast_json import FastJSONResponse
+
+    adapter = TypeAdapter(List[PlanResponse]) if many else TypeAdapter(PlanResponse)
+
+    def validate(value):
+        if many:
+            return [PlanResponse.model_validate(p, from_attributes=True) for p in value]
+        return PlanResponse.model_validate(value, from_attributes=True)
+
+    def pydantic_json(value) -> bytes:
+        dumped = adapter.dump_python(validate(value), mode="json")
+        return json.dumps(dumped, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+    def pydantic(value) -> bytes:
+        return adapter.dump_json(validate(value))
+
+    def fast(value) -> bytes:
+        content = [plan_response_content(p) for p in value] if many else plan_response_content(value)
+        return FastJSONResponse(content).body
+
+    return {"pydantic+json": pydantic_json, "pydantic": pydantic, "fast": fast}
+
+
+def run(seed: list, days_list: list, runs: int, list_size: int) -> dict:
+    results = {}
+    for days in days_list:
+        detail = build_plan(seed, days)
+        listing = [build_plan(seed, days, offset=i) for i in range(list_size)]
+        for kind, value, many in (("detail", detail, False), (f"list{list_size}", listing, True)):
+            serializers = _serializers(many)
+            outputs = {name: json.loads(fn(value)) for name, fn in serializers.items()}
+            if outputs["fast"] != outputs["pydantic"]:
+                raise RuntimeError(f"{days}日 {kind}: fast の出力が PlanResponse と一致しません")
+            for name, fn in serializers.items():
+                stat = _measure(lambda fn=fn, value=value: fn(value), runs)
+                results[f"{days}d.{kind}.{name}"] = stat
+    return results
+
+
+def compare(result: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list:
+    """fast 経路の中央値がベースラインより tolerance 超悪化した項目を返す"""
+    problems = []
+    for name, stat in result["results"].items():
+        if not name.endswith(".fast"):
+            continue
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            continue
+        delta = stat["median_ms"] - base["median_ms"]
+        if delta > min_delta_ms and stat["median_ms"] > base["median_ms"] * (1 + tolerance):
+            problems.append(f"{name}: {base['median_ms']}ms → {stat['median_ms']}ms")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="プランレスポンスの JSON 化のベンチマーク")
+    parser.add_argument("--days", default="1,3,7", help="プランの日数（カンマ区切り）")
+    parser.add_argument("--runs", type=int, default=30, help="各計測の回数（ウォームアップ1回を除く）")
+    parser.add_argument("--list-size", type=int, default=20, help="一覧レスポンスのプラン件数")
+    parser.add_argument("--save", help="結果をベースラインとして保存するパス")
+    parser.add_argument("--baseline", help="比較するベースライン JSON のパス")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="許容する悪化率（0.25 = 25%%）")
+    parser.add_argument("--min-delta-ms", type=float, default=0.5, help="これ未満の悪化は誤差として無視する")
+    args = parser.parse_args()
+    days_list = [int(d) for d in args.days.split(",") if d.strip()]
+
+    from app.utils.fast_json import ORJSON_AVAILABLE
+
+    result = {
+        "python": sys.version.split()[0],
+        "runs": args.runs,
+        "spots_per_day": SPOTS_PER_DAY,
+        "orjson": ORJSON_AVAILABLE,
+        "results": run(_load_seed(), days_list, args.runs, args.list_size),
+    }
+    for name, stat in result["results"].items():
+        logger.info(
+            "%-28s 中央値 %8.3fms  p95 %8.3fms  ピーク %8.1fKB  本文 %7.1fKB",
+            name, stat["median_ms"], stat["p95_ms"], stat["peak_kb"], stat["body_kb"],
+        )
+    if not ORJSON_AVAILABLE:
+        logger.warning("orjson が無いため fast は標準 json で計測しています")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        logger.info("ベースラインを保存しました: %s", args.save)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(result, baseline, args.tolerance, args.min_delta_ms)
+        for problem in problems:
+            logger.error("退行: %s", problem)
+        if problems:
+            return 1
+        logger.info("ベースラインとの比較: 問題なし")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
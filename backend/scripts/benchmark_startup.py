@@ -0,0 +1,156 @@
+"""
+起動時間のベンチマークスクリプト
+
+- import 時間: 新しいプロセスで `import app.main` にかかる時間（複数回の中央値）
+- 初回応答時間: uvicorn を起動してから /health が 200 を返すまでの時間
+- 起動直後に読み込まれている重い SDK（遅延 import できているかの確認）
+
+使い方:
+    python scripts/benchmark_startup.py                       # 計測して表示
+    python scripts/benchmark_startup.py --save benchmarks/startup_baseline.json
+    python scripts/benchmark_startup.py --baseline benchmarks/startup_baseline.json  # 退行チェック
+"""
+import argparse
+import json
+import logging
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 起動時に読み込まれていてはいけない重い SDK
+HEAVY_MODULES = [
+    "google.generativeai",
+    "reportlab",
+    "stripe",
+    "googleapiclient",
+    "bs4",
+    "PIL",
+    "feedparser",
+]
+
+logger = logging.getLogger(__name__)
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
+
+_IMPORT_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import app.main  # noqa: F401
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"import_ms": elapsed, "heavy_loaded": heavy}}))
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def measure_import(runs: int) -> dict:
+    """新しいプロセスで app.main を import する時間を計測する"""
+    samples = []
+    heavy_loaded = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", _IMPORT_PROBE.format(heavy=HEAVY_MODULES)],
+            cwd=BACKEND_DIR, capture_output=True, text=True, check=True,
+        )
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        samples.append(result["import_ms"])
+        heavy_loaded = result["heavy_loaded"]
+    return {
+        "import_ms_median": round(statistics.median(samples), 1),
+        "import_ms_min": round(min(samples), 1),
+        "heavy_modules_loaded": heavy_loaded,
+    }
+
+
+def measure_first_health(timeout_sec: float) -> float:
+    """uvicorn を起動し、/health が 200 を返すまでのミリ秒を返す"""
+    port = _free_port()
+    start = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port)],
+        cwd=BACKEND_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        url = f"http://127.0.0.1:{port}/health"
+        while time.perf_counter() - start < timeout_sec:
+            if proc.poll() is not None:
+                raise RuntimeError(f"uvicorn が終了しました（終了コード {proc.returncode}）")
+            try:
+                with urllib.request.urlopen(url, timeout=1) as resp:
+                    if resp.status == 200:
+                        return round((time.perf_counter() - start) * 1000, 1)
+            except OSError:
+                time.sleep(0.05)
+        raise TimeoutError(f"{timeout_sec} 秒以内に /health が応答しませんでした")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> list:
+    """ベースラインに対する退行の一覧（空なら問題なし）"""
+    problems = []
+    for key in ("import_ms_median", "first_health_ms"):
+        if key not in baseline or key not in result:
+            continue
+        limit = baseline[key] * (1 + tolerance)
+        if result[key] > limit:
+            problems.append(f"{key}: {result[key]}ms（基準 {baseline[key]}ms、許容 {limit:.1f}ms）")
+    if result.get("heavy_modules_loaded"):
+        problems.append(f"起動時に重い SDK が読み込まれています: {', '.join(result['heavy_modules_loaded'])}")
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="起動時間のベンチマーク")
+    parser.add_argument("--runs", type=int, default=5, help="import 時間の計測回数")
+    parser.add_argument("--timeout", type=float, default=60.0, help="/health 応答待ちの上限（秒）")
+    parser.add_argument("--skip-server", action="store_true", help="/health の計測を省略する")
+    parser.add_argument("--save", help="結果をベースラインとして保存するパス")
+    parser.add_argument("--baseline", help="比較するベースライン JSON のパス")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="許容する悪化率（0.25 = 25%%）")
+    args = parser.parse_args()
+
+    result = measure_import(args.runs)
+    if not args.skip_server:
+        result["first_health_ms"] = measure_first_health(args.timeout)
+    result["python"] = sys.version.split()[0]
+    logger.info("計測結果: %s", json.dumps(result, ensure_ascii=False))
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        logger.info("ベースラインを保存しました: %s", args.save)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        problems = compare(result, baseline, args.tolerance)
+        for problem in problems:
+            logger.error("退行: %s", problem)
+        if problems:
+            return 1
+        logger.info("ベースラインとの比較: 問題なし")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,51 @@
+"""
+エリアごとの移動時間・距離行列を作成・差分更新するスクリプト
+初回作成や、OSRM が使えなかった間に推定値で埋めた行列を作り直すとき（--full）に使用
+"""
+import sys
+import os
+import argparse
+import logging
+
+# プロジェクトルートをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.database import SessionLocal, engine
+from app.models.travel_matrix import TravelMatrix
+from app.services.travel_matrix_service import NUMPY_AVAILABLE, refresh_matrices
+
+logger = logging.getLogger(__name__)
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+for _name in (__name__, "app.services.travel_matrix_service"):
+    logging.getLogger(_name).addHandler(_handler)
+    logging.getLogger(_name).setLevel(logging.INFO)
+
+
+def main() -> int:
+    """行列を作成・更新する。終了コードを返す"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--full", action="store_true", help="保存済みの行列を使わず全件を計算し直す")
+    args = parser.parse_args()
+
+    if not NUMPY_AVAILABLE:
+        logger.error("numpy がインストールされていないため行列を作成できません")
+        return 1
+    TravelMatrix.__table__.create(bind=engine, checkfirst=True)
+    db = SessionLocal()
+    try:
+        stats = refresh_matrices(db, full=args.full)
+    except Exception as e:
+        logger.exception("移動行列の作成中にエラーが発生しました: %s", e)
+        return 1
+    finally:
+        db.close()
+    logger.info(
+        "移動行列を更新しました: エリア %d件、計算したスポット %d件、削除 %d件",
+        stats["areas_updated"], stats["spots_computed"], stats["matrices_deleted"],
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,37 @@
+"""
+スポット全文検索インデックスを再構築するスクリプト
+既存データのバックフィルや、SQLite で VACUUM した後（rowid が振り直される）に使用
+"""
+import sys
+import os
+import logging
+
+# プロジェクトルートをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.database import engine
+from app.utils.spot_search import ensure_search_index, rebuild_search_index
+
+logger = logging.getLogger(__name__)
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
+
+
+def main() -> int:
+    """インデックスを作成（未作成時）してから全件で作り直す。終了コードを返す"""
+    if not ensure_search_index(engine):
+        logger.error("検索インデックスを作成できませんでした（SPOT_SEARCH_INDEX_ENABLED / DB の対応状況を確認してください）")
+        return 1
+    try:
+        count = rebuild_search_index(engine)
+    except Exception as e:
+        logger.exception("検索インデックスの再構築中にエラーが発生しました: %s", e)
+        return 1
+    logger.info("検索インデックスを再構築しました: %d件", count)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,38 @@
+"""
+タグ統計（tag_stats）を全スポットから再構築するスクリプト
+初回のバックフィルや、集計がずれた場合の修復に使用
+"""
+import sys
+import os
+import logging
+
+# プロジェクトルートをパスに追加
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.utils.database import SessionLocal, init_db
+from app.services.tag_stats_service import rebuild_tag_stats
+
+logger = logging.getLogger(__name__)
+_handler = logging.StreamHandler(sys.stdout)
+_handler.setFormatter(logging.Formatter("%(asctime)s [%(levelname)s] %(message)s"))
+logger.addHandler(_handler)
+logger.setLevel(logging.INFO)
+
+
+def main() -> int:
+    """tag_stats を作り直す。終了コードを返す"""
+    init_db()
+    db = SessionLocal()
+    try:
+        count = rebuild_tag_stats(db)
+        logger.info("タグ統計を再構築しました: %d種類", count)
+        return 0
+    except Exception as e:
+        logger.exception("タグ統計の再構築中にエラーが発生しました: %s", e)
+        return 1
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())